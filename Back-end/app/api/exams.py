@@ -15,6 +15,7 @@ from app.api.deps import get_current_user, require_teacher
 from app.models.user import User
 from app.models.exam import ExamStatus, AttemptStatus
 from app.services.exam_service import ExamService
+from app.services.grading_queue_service import grading_queue
 from app.schemas.exam import (
     ExamCreate, ExamUpdate, ExamResponse, ExamDetail, ExamListResponse,
     AttemptResponse, AttemptListResponse, AnswerSubmit,
@@ -439,9 +440,9 @@ async def submit_exam(
             detail="无法提交考试"
         )
 
-    # 直接启动线程执行批改（不使用BackgroundTasks）
-    print(f"[提交] 考试ID={exam_id} 学生ID={current_user.id} → 启动后台批改")
-    _background_grade_attempt(exam_id, current_user.id)
+    # 批改任务已随提交写入数据库, 唤醒后台批改队列
+    print(f"[提交] 考试ID={exam_id} 学生ID={current_user.id} → 进入批改队列")
+    grading_queue.wake()
 
     # 立即返回 SUBMITTED 状态
     return AttemptResponse(
@@ -748,43 +749,3 @@ async def get_exam_result(
     return result
 
 
-
-# ===================================
-# Background Tasks
-# ===================================
-
-def _background_grade_attempt(exam_id: int, student_id: int):
-    """后台批改任务(使用线程运行)"""
-    import threading
-    import asyncio
-
-    def run_in_thread():
-        """在新线程中运行异步批改"""
-        async def _do_grade():
-            from app.db import async_session_maker
-
-            async with async_session_maker() as db:
-                service = ExamService(db)
-                try:
-                    print(f"[批改] 开始批改 考试ID={exam_id} 学生ID={student_id}")
-                    result = await service.grade_submitted_attempt(exam_id, student_id)
-                    if result:
-                        print(f"[批改] ✓ 完成! 状态={result.status.value} 总分={result.total_score}")
-                    else:
-                        print(f"[批改] ✗ 失败: 未找到答题记录")
-                    return result
-                except Exception as e:
-                    print(f"[批改] ✗ 错误: {e}")
-                    return None
-
-        # Create new event loop for this thread
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        try:
-            loop.run_until_complete(_do_grade())
-        finally:
-            loop.close()
-
-    # Start thread
-    thread = threading.Thread(target=run_in_thread, daemon=True)
-    thread.start()
\ No newline at end of file
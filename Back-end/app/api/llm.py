@@ -5,17 +5,21 @@ Endpoints for direct LLM interaction (testing and simple use cases)
 """
 
 import json
+from datetime import datetime
 from typing import Optional, List
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db import get_db
-from app.api.deps import CurrentUser, DbSession
-from app.services.llm_service import LLMService, get_llm_service
+from app.api.deps import CurrentUser, DbSession, require_admin
+from app.services.llm_service import LLMService, get_llm_service, provider_registry
+from app.services.llm_usage_service import LLMUsageService, GROUP_BY_FIELDS
 from app.core.llm.base import Message
+from app.core.llm.http_client import get_pool_stats
+from app.core.llm.log_writer import llm_log_writer
 from app.models.llm_log import LLMScene
 
 
@@ -35,7 +39,7 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     """Chat completion request"""
     messages: List[ChatMessage] = Field(..., description="List of chat messages")
-    provider: Optional[str] = Field(None, description="LLM provider (deepseek/qwen/glm)")
+    provider: Optional[str] = Field(None, description="LLM provider (deepseek/qwen/glm/mock)")
     temperature: Optional[float] = Field(None, ge=0, le=2, description="Sampling temperature")
     max_tokens: Optional[int] = Field(None, ge=1, le=8000, description="Maximum tokens")
     stream: bool = Field(False, description="Enable streaming response")
@@ -67,7 +71,6 @@ class ChatResponse(BaseModel):
 async def chat_completion(
     request: ChatRequest,
     current_user: CurrentUser,
-    db: DbSession,
 ):
     """
     Send chat completion request to LLM
@@ -80,7 +83,7 @@ async def chat_completion(
             detail="Use /llm/chat/stream endpoint for streaming",
         )
 
-    llm_service = get_llm_service(db)
+    llm_service = get_llm_service()
 
     # Convert to Message objects
     messages = [Message(role=m.role, content=m.content) for m in request.messages]
@@ -127,7 +130,6 @@ async def chat_completion(
 async def chat_completion_stream(
     request: ChatRequest,
     current_user: CurrentUser,
-    db: DbSession,
 ):
     """
     Send streaming chat completion request to LLM
@@ -135,7 +137,7 @@ async def chat_completion_stream(
     Returns Server-Sent Events (SSE) stream.
     Requires authentication.
     """
-    llm_service = get_llm_service(db)
+    llm_service = get_llm_service()
 
     # Convert to Message objects
     messages = [Message(role=m.role, content=m.content) for m in request.messages]
@@ -182,7 +184,6 @@ async def chat_completion_stream(
 async def simple_chat(
     request: SimpleChatRequest,
     current_user: CurrentUser,
-    db: DbSession,
 ):
     """
     Simple chat with single prompt
@@ -195,7 +196,7 @@ async def simple_chat(
             detail="Use /llm/simple/stream endpoint for streaming",
         )
 
-    llm_service = get_llm_service(db)
+    llm_service = get_llm_service()
 
     try:
         content = await llm_service.simple_chat(
@@ -204,6 +205,7 @@ async def simple_chat(
             scene=LLMScene.OTHER,
             provider_type=request.provider,
             user_id=current_user.id,
+            hedge=True,
         )
 
         return {"content": content}
@@ -224,14 +226,13 @@ async def simple_chat(
 async def simple_chat_stream(
     request: SimpleChatRequest,
     current_user: CurrentUser,
-    db: DbSession,
 ):
     """
     Simple streaming chat with single prompt
 
     Returns Server-Sent Events (SSE) stream.
     """
-    llm_service = get_llm_service(db)
+    llm_service = get_llm_service()
 
     async def generate():
         try:
@@ -288,9 +289,125 @@ async def list_providers(current_user: CurrentUser):
             "model": settings.GLM_MODEL,
             "is_default": settings.LLM_PROVIDER == "glm",
         },
+        "mock": {
+            "configured": True,
+            "model": settings.MOCK_LLM_MODEL,
+            "is_default": settings.LLM_PROVIDER == "mock",
+        },
     }
 
     return {
         "default_provider": settings.LLM_PROVIDER,
         "providers": providers,
     }
+
+
+@router.get("/stats")
+async def llm_stats(current_user: CurrentUser):
+    """
+    Runtime statistics of the LLM layer
+
+    Reports shared HTTP connection pool utilization, per-provider
+    rate limiter queue depth / wait times, routing stats, circuit
+    breaker states, hedging win rate, response cache hit rate and
+    single-flight coalescing counters, and the call log writer's
+    buffer and batch counters.
+    """
+    return {
+        "http_pool": get_pool_stats(),
+        "rate_limiters": provider_registry.limiter_stats(),
+        "routing": provider_registry.router.snapshot(),
+        "circuit_breakers": provider_registry.breaker_stats(),
+        "hedging": provider_registry.hedge_stats(),
+        "cache": provider_registry.cache_stats(),
+        "single_flight": provider_registry.flight_stats(),
+        "log_writer": llm_log_writer.snapshot(),
+    }
+
+
+# ===================================
+# Usage Analytics (admin)
+# ===================================
+
+def _window(
+    service: LLMUsageService,
+    start: Optional[datetime],
+    end: Optional[datetime],
+) -> tuple[datetime, datetime]:
+    start, end = service.resolve_window(start, end)
+    if start >= end:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="start 必须早于 end",
+        )
+    return start, end
+
+
+@router.get("/usage/summary", dependencies=[Depends(require_admin)])
+async def usage_summary(
+    db: DbSession,
+    start: Optional[datetime] = Query(None, description="Window start (default: 24h before end)"),
+    end: Optional[datetime] = Query(None, description="Window end, exclusive (default: now)"),
+    provider: Optional[str] = None,
+    model: Optional[str] = None,
+    scene: Optional[LLMScene] = None,
+    user_id: Optional[int] = None,
+    group_by: Optional[str] = Query(None, description="provider / model / scene / user_id"),
+):
+    """
+    LLM usage for a time window
+
+    Calls, error rate, token spend and latency percentiles, optionally
+    broken down by one dimension. Served from pre-aggregated rollups.
+    """
+    if group_by and group_by not in GROUP_BY_FIELDS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"group_by 必须是 {', '.join(GROUP_BY_FIELDS)} 之一",
+        )
+    service = LLMUsageService(db)
+    start, end = _window(service, start, end)
+    return await service.summary(start, end, provider, model, scene, user_id, group_by)
+
+
+@router.get("/usage/top-users", dependencies=[Depends(require_admin)])
+async def usage_top_users(
+    db: DbSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    limit: int = Query(10, ge=1, le=100),
+    order_by: str = Query("tokens", pattern="^(tokens|calls)$"),
+    scene: Optional[LLMScene] = None,
+):
+    """Users with the highest token spend (or call count) in a window"""
+    service = LLMUsageService(db)
+    start, end = _window(service, start, end)
+    return {
+        "start": start,
+        "end": end,
+        "users": await service.top_users(start, end, limit, order_by, scene),
+    }
+
+
+@router.get("/usage/timeseries", dependencies=[Depends(require_admin)])
+async def usage_timeseries(
+    db: DbSession,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    granularity: str = Query("hour", pattern="^(minute|hour|day)$"),
+    provider: Optional[str] = None,
+    scene: Optional[LLMScene] = None,
+):
+    """Usage per minute/hour/day bucket in a window"""
+    service = LLMUsageService(db)
+    start, end = _window(service, start, end)
+    return {
+        "granularity": granularity,
+        "points": await service.timeseries(start, end, granularity, provider, scene),
+    }
+
+
+@router.post("/usage/prune", dependencies=[Depends(require_admin)])
+async def usage_prune(db: DbSession):
+    """Apply the retention settings now (also runs periodically)"""
+    return {"deleted": await LLMUsageService(db).prune()}
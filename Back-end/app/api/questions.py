@@ -4,17 +4,24 @@ Question Generation API
 Endpoints for generating questions using the quality control pipeline
 """
 
+import asyncio
 from typing import Optional, List
 from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 import json
 
-from app.api.deps import CurrentActiveUser, require_teacher
+from app.api.deps import CurrentActiveUser, DbSession, require_teacher
+from app.config import settings
+from app.db.session import async_session_maker
+from app.models.generation_job import GenerationJob, GenerationJobStatus
+from app.services.generation_job_service import GenerationJobService
 from app.services import get_llm_service, GenerationPipeline
 from app.schemas.question import (
     QuestionType,
     GenerationRequest,
+    BatchGenerationRequest,
     GeneratedQuestion,
 )
 
@@ -31,6 +38,29 @@ class GenerateRequest(BaseModel):
     count: int = Field(1, ge=1, le=10, description="生成数量 1-10")
     language: str = Field("zh", description="语言 zh/en")
     additional_requirements: Optional[str] = Field(None, description="额外要求")
+    pipelined: bool = Field(False, description="流水线模式: 边生成边校验、审核")
+    target: bool = Field(False, description="目标模式: 补题直到审核通过的题数达到count")
+    token_budget: Optional[int] = Field(None, ge=0, description="目标模式token预算, 0为不限制")
+
+
+class BatchGenerateRequest(BaseModel):
+    """Request for sharded generation of a question bank"""
+    course_name: str = Field(..., description="课程/科目名称", min_length=1)
+    knowledge_point: Optional[str] = Field(None, description="知识点")
+    question_type: QuestionType = Field(..., description="题型")
+    difficulty: int = Field(3, ge=1, le=5, description="难度等级 1-5")
+    count: int = Field(
+        ..., ge=1, le=settings.PIPELINE_BATCH_MAX_COUNT,
+        description=f"生成数量 1-{settings.PIPELINE_BATCH_MAX_COUNT}",
+    )
+    language: str = Field("zh", description="语言 zh/en")
+    additional_requirements: Optional[str] = Field(None, description="额外要求")
+
+
+class GenerationJobRequest(BatchGenerateRequest):
+    """Request for an asynchronous generation job"""
+    target: bool = Field(False, description="目标模式: 补题直到审核通过的题数达到count")
+    token_budget: Optional[int] = Field(None, ge=0, description="目标模式token预算, 0为不限制")
 
 
 class QuestionResponse(BaseModel):
@@ -50,6 +80,12 @@ class GenerateResponse(BaseModel):
     approved_questions: List[dict]
     needs_review_questions: List[dict]
     rejected_questions: List[dict]
+    usage: Optional[dict] = None
+
+
+class BatchGenerateResponse(GenerateResponse):
+    """Response for sharded generation"""
+    shards: List[dict]
 
 
 class QuickGenerateResponse(BaseModel):
@@ -103,7 +139,13 @@ async def generate_questions(
     pipeline = GenerationPipeline(llm_service)
 
     try:
-        result = await pipeline.generate(gen_request, user_id=current_user.id)
+        result = await pipeline.generate(
+            gen_request,
+            user_id=current_user.id,
+            pipelined=request.pipelined,
+            target=request.target,
+            token_budget=request.token_budget,
+        )
         return result.to_dict()
     except Exception as e:
         raise HTTPException(
@@ -112,6 +154,62 @@ async def generate_questions(
         )
 
 
+@router.post(
+    "/generate/batch",
+    response_model=BatchGenerateResponse,
+    summary="批量生成题目（分片并发）",
+    description="将大数量拆分为多片并发生成，跨分片去重后合并结果，部分分片失败时返回其余结果",
+)
+async def generate_questions_batch(
+    request: BatchGenerateRequest,
+    current_user: CurrentActiveUser,
+):
+    """
+    Generate a question bank of up to PIPELINE_BATCH_MAX_COUNT questions
+
+    The count is split into shards that fit the generation token budget;
+    the shards run concurrently through the full pipeline. The response is
+    the merged result (as /generate returns) plus a report per shard.
+    Failed shards are listed with their error; the request only fails if
+    every shard does.
+
+    Requires teacher role or above.
+    """
+    if current_user.role not in ["teacher", "admin"]:
+        raise HTTPException(
+            status_code=403,
+            detail="只有教师才能生成题目哦，笨蛋！(￣へ￣)"
+        )
+
+    gen_request = BatchGenerationRequest(
+        course_name=request.course_name,
+        knowledge_point=request.knowledge_point,
+        question_type=request.question_type,
+        difficulty=request.difficulty,
+        count=request.count,
+        language=request.language,
+        additional_requirements=request.additional_requirements,
+    )
+
+    llm_service = get_llm_service()
+    pipeline = GenerationPipeline(llm_service)
+
+    try:
+        result, shards = await pipeline.generate_batch(gen_request, user_id=current_user.id)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"题目生成失败了...本小姐也很无奈呢 (￣_￣;) 错误: {str(e)}"
+        )
+
+    if all("error" in shard for shard in shards):
+        raise HTTPException(
+            status_code=500,
+            detail=f"题目生成失败了...所有分片都失败了 (￣_￣;) 错误: {shards[0]['error']}"
+        )
+    return {**result.to_dict(), "shards": shards}
+
+
 @router.post(
     "/generate/quick",
     response_model=QuickGenerateResponse,
@@ -174,10 +272,13 @@ async def generate_questions_stream(
     """
     Stream question generation process
 
-    Returns Server-Sent Events (SSE) stream with:
-    - Progress updates
-    - Generated content as it's produced
-    - Final questions
+    Returns Server-Sent Events (SSE) stream with, per question and as soon
+    as each stage finishes for it:
+    - generated: the question, parsed from the model output while the rest
+      of the batch is still being written
+    - validated / reviewed / fixed: stage results
+    - question: final status and data, same shape as in the full pipeline
+    Then one complete event with the full result (as /generate returns).
 
     Requires teacher role or above.
     """
@@ -205,14 +306,9 @@ async def generate_questions_stream(
         yield f"data: {json.dumps({'event': 'start', 'message': '开始生成题目...'})}\n\n"
 
         try:
-            # Generate questions (full pipeline)
-            result = await pipeline.generate(gen_request, user_id=current_user.id)
-
-            # Send progress
-            yield f"data: {json.dumps({'event': 'progress', 'message': '题目生成完成，正在处理结果...'})}\n\n"
-
-            # Send result
-            yield f"data: {json.dumps({'event': 'complete', 'data': result.to_dict()})}\n\n"
+            # Each question is validated and reviewed as soon as it is generated
+            async for event in pipeline.generate_stream(gen_request, user_id=current_user.id):
+                yield f"data: {json.dumps(event)}\n\n"
 
         except Exception as e:
             yield f"data: {json.dumps({'event': 'error', 'message': str(e)})}\n\n"
@@ -230,6 +326,176 @@ async def generate_questions_stream(
     )
 
 
+# Generation jobs
+@router.post(
+    "/jobs",
+    status_code=202,
+    summary="提交出题任务（异步）",
+    description="立即返回任务ID，由后台worker执行完整流水线；进度与结果持久化，服务重启后自动继续",
+)
+async def create_generation_job(
+    request: GenerationJobRequest,
+    current_user: CurrentActiveUser,
+    db: DbSession,
+):
+    """
+    Queue an asynchronous generation job
+
+    Poll GET /questions/jobs/{id} or follow GET /questions/jobs/{id}/stream
+    for progress. Each user may have at most GENERATION_JOB_MAX_ACTIVE_PER_USER
+    queued or running jobs, of which GENERATION_JOB_MAX_RUNNING_PER_USER run
+    at a time.
+
+    Requires teacher role or above.
+    """
+    if current_user.role not in ["teacher", "admin"]:
+        raise HTTPException(
+            status_code=403,
+            detail="只有教师才能生成题目哦，笨蛋！(￣へ￣)"
+        )
+
+    gen_request = BatchGenerationRequest(
+        course_name=request.course_name,
+        knowledge_point=request.knowledge_point,
+        question_type=request.question_type,
+        difficulty=request.difficulty,
+        count=request.count,
+        language=request.language,
+        additional_requirements=request.additional_requirements,
+    )
+
+    service = GenerationJobService(db)
+    job, error = await service.create_job(
+        current_user.id, gen_request, target=request.target, token_budget=request.token_budget,
+    )
+    if not job:
+        raise HTTPException(status_code=429, detail=error)
+    return service.to_dict(job)
+
+
+@router.get(
+    "/jobs",
+    summary="我的出题任务",
+    description="按提交时间倒序列出当前用户的出题任务",
+)
+async def list_generation_jobs(
+    current_user: CurrentActiveUser,
+    db: DbSession,
+    status: Optional[GenerationJobStatus] = Query(None, description="按状态筛选"),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """List the current user's generation jobs (without questions)"""
+    service = GenerationJobService(db)
+    jobs = await service.list_jobs(current_user.id, status, limit)
+    return [service.to_dict(job) for job in jobs]
+
+
+async def _get_job_or_404(service: GenerationJobService, job_id: int, current_user) -> GenerationJob:
+    job = await service.get_job(job_id, current_user)
+    if not job:
+        raise HTTPException(status_code=404, detail="出题任务不存在")
+    return job
+
+
+@router.get(
+    "/jobs/{job_id}",
+    summary="出题任务状态与结果",
+    description="返回任务进度；已生成的题目按审核结果分组（任务未结束时为部分结果）",
+)
+async def get_generation_job(
+    job_id: int,
+    current_user: CurrentActiveUser,
+    db: DbSession,
+):
+    """Job status, progress and the questions produced so far"""
+    service = GenerationJobService(db)
+    job = await _get_job_or_404(service, job_id, current_user)
+    items = await service.get_items(job.id)
+    return service.to_dict(job, items)
+
+
+@router.post(
+    "/jobs/{job_id}/cancel",
+    summary="取消出题任务",
+    description="排队中的任务立即取消；执行中的任务在当前分片中断后停止，已生成的题目保留",
+)
+async def cancel_generation_job(
+    job_id: int,
+    current_user: CurrentActiveUser,
+    db: DbSession,
+):
+    """Cancel a queued or running job"""
+    service = GenerationJobService(db)
+    job = await _get_job_or_404(service, job_id, current_user)
+    job, error = await service.cancel_job(job)
+    if not job:
+        raise HTTPException(status_code=409, detail=error)
+    return service.to_dict(job)
+
+
+@router.get(
+    "/jobs/{job_id}/stream",
+    summary="出题任务进度（SSE）",
+    description="推送任务进度与新生成的题目，任务结束时推送最终状态",
+)
+async def stream_generation_job(
+    job_id: int,
+    current_user: CurrentActiveUser,
+    db: DbSession,
+):
+    """
+    Follow a job with Server-Sent Events
+
+    Events, read from the database every GENERATION_JOB_STREAM_INTERVAL_SECONDS
+    (so any process may be running the job):
+    - question: a produced question with its status, as committed per shard
+    - progress: the job (as GET /questions/jobs/{id} without questions)
+      whenever its status or counts change
+    - complete / failed / cancelled: the final job state, then the stream ends
+    Reconnecting replays the questions from the start.
+    """
+    service = GenerationJobService(db)
+    job = await _get_job_or_404(service, job_id, current_user)
+
+    def sse(event: str, **data) -> str:
+        return f"data: {json.dumps(jsonable_encoder({'event': event, **data}))}\n\n"
+
+    async def event_generator():
+        last_item = 0
+        last_state = None
+        while True:
+            async with async_session_maker() as session:
+                poll = GenerationJobService(session)
+                current = await session.get(GenerationJob, job.id)
+                items = await poll.get_items(job.id, after_id=last_item)
+
+            for item in items:
+                yield sse("question", status=item.status, **item.data)
+                last_item = item.id
+
+            state = poll.to_dict(current)
+            key = (state["status"], state["progress"]["requested"], state["progress"]["generated"])
+            if key != last_state:
+                last_state = key
+                yield sse("progress", job=state)
+            if current.is_finished:
+                yield sse(current.status.value, job=state)
+                break
+            await asyncio.sleep(settings.GENERATION_JOB_STREAM_INTERVAL_SECONDS)
+
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        }
+    )
+
+
 @router.get(
     "/types",
     summary="获取支持的题型",
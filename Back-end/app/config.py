@@ -4,7 +4,7 @@
 使用Pydantic Settings管理环境变量和配置
 """
 
-from typing import List
+from typing import List, Dict, Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -68,11 +68,136 @@ class Settings(BaseSettings):
     GLM_BASE_URL: str = "https://open.bigmodel.cn/api/paas/v4"
     GLM_MODEL: str = "glm-4-flash"
 
+    # Mock (离线压测用, LLM_PROVIDER=mock 启用, 不访问网络)
+    MOCK_LLM_MODEL: str = "mock-llm"
+    MOCK_LLM_LATENCY_DIST: str = "lognormal"  # fixed / uniform / lognormal
+    MOCK_LLM_LATENCY_MS: float = 800.0  # 延迟中位数 (流式为首token延迟)
+    MOCK_LLM_LATENCY_SPREAD: float = 0.5  # lognormal为sigma, uniform为±比例
+    MOCK_LLM_TOKENS_PER_SECOND: float = 200.0  # 流式输出速度, 0为不限速
+    MOCK_LLM_ERROR_RATE: float = 0.0  # 5xx比例
+    MOCK_LLM_RATE_LIMIT_RATE: float = 0.0  # 429比例
+    MOCK_LLM_RETRY_AFTER: float = 1.0  # 429响应的Retry-After秒数
+    MOCK_LLM_TIMEOUT_RATE: float = 0.0  # 超时比例 (等待LLM_TIMEOUT后失败)
+    MOCK_LLM_MALFORMED_RATE: float = 0.0  # 返回截断JSON的比例
+    MOCK_LLM_REJECT_RATE: float = 0.1  # 审核判定不通过的比例
+    MOCK_LLM_SEED: Optional[int] = None  # 固定随机种子以复现压测
+
     # LLM通用配置
     LLM_TEMPERATURE: float = 0.7
     LLM_MAX_TOKENS: int = 4000
     LLM_TIMEOUT: int = 60
 
+    # LLM HTTP连接池 (所有Provider共享, 随应用生命周期创建/关闭)
+    LLM_HTTP_MAX_CONNECTIONS: int = 100
+    LLM_HTTP_MAX_KEEPALIVE: int = 20
+    LLM_HTTP_KEEPALIVE_EXPIRY: float = 30.0  # 空闲连接保活秒数
+    LLM_HTTP2: bool = False  # 需要安装 httpx[http2]
+    LLM_WARMUP_ON_STARTUP: bool = True  # 启动时为已配置的Provider预建连接
+
+    # LLM限流 (每个Provider独立计数, 0表示不限制)
+    LLM_RATE_LIMIT_RPS: float = 5.0  # 每秒请求数
+    LLM_RATE_LIMIT_TPM: int = 0  # 每分钟token数
+    LLM_MAX_CONCURRENCY: int = 8  # 最大并发调用数
+    LLM_QUEUE_TIMEOUT: float = 120.0  # 排队等待上限(秒), 同时不超过本次调用剩余的截止时间
+    # 按Provider覆盖, 例如 {"deepseek": {"rps": 10, "tpm": 300000, "max_concurrency": 16}}
+    LLM_RATE_LIMITS: Dict[str, Dict[str, float]] = {}
+
+    # LLM重试 (按场景覆盖默认策略, 场景: generate/review/grade/other)
+    # 例如 {"grade": {"max_attempts": 5, "base_delay": 1, "max_delay": 16, "deadline": 300}}
+    LLM_RETRY_POLICIES: Dict[str, Dict[str, float]] = {}
+
+    # LLM路由与故障转移 (在已配置API密钥的Provider之间)
+    # 按场景选择策略: primary(默认Provider优先) / fastest / healthiest / cheapest
+    # 例如 {"grade": "cheapest", "generate": "fastest"}
+    LLM_ROUTING_POLICIES: Dict[str, str] = {}
+    # 相对成本 (cheapest策略使用)
+    LLM_PROVIDER_COSTS: Dict[str, float] = {"deepseek": 1.0, "qwen": 1.5, "glm": 0.1}
+    LLM_ROUTER_WINDOW_SECONDS: float = 300.0  # 延迟/错误率统计窗口
+    LLM_ROUTER_MIN_SAMPLES: int = 5  # 判定降级所需的最少样本数
+    LLM_ROUTER_ERROR_THRESHOLD: float = 0.5  # 错误率达到该值视为降级
+
+    # LLM熔断 (连续失败/超时达到阈值后快速失败, 冷却后放行单个探测请求)
+    LLM_BREAKER_FAILURE_THRESHOLD: int = 5
+    LLM_BREAKER_RECOVERY_SECONDS: float = 30.0
+
+    # LLM对冲请求 (仅交互式接口启用: 主请求超过该场景近期延迟百分位仍未返回时, 再发一个备份请求)
+    LLM_HEDGE_PERCENTILE: float = 95.0
+    LLM_HEDGE_DELAY_MS: int = 10000  # 样本不足时的对冲等待时间
+    LLM_HEDGE_MIN_DELAY_MS: int = 500
+    LLM_HEDGE_MAX_RATIO: float = 0.1  # 对冲请求占启用对冲调用的比例上限
+
+    # LLM响应缓存 (按请求内容哈希; 默认仅缓存低温度的审核/批改调用)
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_SCENES: List[str] = ["review", "grade"]
+    LLM_CACHE_MAX_TEMPERATURE: float = 0.3
+    LLM_CACHE_MAX_ENTRIES: int = 2000
+    LLM_CACHE_TTL_SECONDS: Dict[str, float] = {
+        "generate": 3600,
+        "review": 7 * 24 * 3600,
+        "grade": 7 * 24 * 3600,
+        "other": 600,
+    }
+    LLM_CACHE_SQLITE_PATH: str = ""  # 设置后缓存持久化到该SQLite文件, 如 ./llm_cache.db
+
+    # 合并相同的并发LLM请求 (共享一次上游调用/一条上游流)
+    LLM_SINGLE_FLIGHT: bool = True
+
+    # 流式调用请求返回token用量 (stream_options.include_usage), 用于日志与TPM限流结算
+    LLM_STREAM_INCLUDE_USAGE: bool = True
+
+    # LLM调用日志异步批量写入 (后台任务使用独立会话, 每N毫秒或M条写入一次)
+    LLM_LOG_BATCH_SIZE: int = 200
+    LLM_LOG_FLUSH_INTERVAL_MS: int = 500
+    LLM_LOG_MAX_BUFFER: int = 10000  # 缓冲区上限
+    LLM_LOG_OVERFLOW_POLICY: str = "drop"  # 缓冲区满时: drop(丢弃新日志) / block(等待写入, 反压调用方)
+
+    # LLM用量统计与保留期 (按分钟/小时/天预聚合, 写日志时增量更新; 0 = 永久保留)
+    LLM_LOG_RETENTION_DAYS: int = 30  # llm_logs 原始记录
+    LLM_USAGE_RETENTION_DAYS: Dict[str, int] = {"minute": 2, "hour": 90, "day": 0}
+    LLM_RETENTION_INTERVAL_HOURS: float = 6.0  # 清理任务执行间隔
+
+    # ===================================
+    # 出题流水线配置
+    # ===================================
+    # 同时进行审核→修正→复审的题目数 (实际并发仍受 LLM_MAX_CONCURRENCY 限制)
+    PIPELINE_REVIEW_CONCURRENCY: int = 5
+    PIPELINE_QUEUE_SIZE: int = 10  # 流水线模式各阶段之间的队列长度, 下游积压时上游暂停
+    # 批量出题: 大数量拆分为多片并发生成, 每片题数受 LLM_MAX_TOKENS 与每题预估输出token限制
+    PIPELINE_BATCH_MAX_COUNT: int = 200  # 单次批量出题的题目数上限
+    PIPELINE_SHARD_SIZE: int = 10  # 每片最多题数
+    PIPELINE_SHARD_CONCURRENCY: int = 4  # 同时生成的分片数
+    LLM_GENERATE_TOKENS_PER_QUESTION: Dict[str, int] = {"single": 350, "multiple": 400, "blank": 250, "short": 500}
+    # 目标模式: 按滚动通过率超量出题, 不足时补题, 直到审核通过数达到目标或token预算用完
+    PIPELINE_TARGET_PRIOR_RATE: float = 0.8  # 无历史数据时的预估通过率
+    PIPELINE_TARGET_RATE_WINDOW: int = 50  # 通过率按最近约N道题滚动计算 (课程+题型+难度)
+    PIPELINE_TARGET_MAX_OVERSAMPLE: float = 2.0  # 超量出题倍数上限
+    PIPELINE_TARGET_MAX_ROUNDS: int = 4  # 最多出题轮数 (首轮 + 补题)
+    PIPELINE_TARGET_TOKEN_BUDGET: int = 60000  # 单次请求的token预算, 0 = 不限制
+    # 批量审核: 一次请求审核多道题, 1为逐题审核
+    LLM_REVIEW_BATCH_SIZE: int = 5
+    LLM_REVIEW_BATCH_VERDICT_TOKENS: int = 600  # 每道题审核结果预留的输出token, 与max_tokens共同限制批大小
+    LLM_REVIEW_BATCH_PROMPT_TOKENS: int = 12000  # 单次批量审核提示词的token上限
+
+    # ===================================
+    # 出题任务队列配置
+    # ===================================
+    GENERATION_JOB_WORKERS: int = 2  # 每个进程同时执行的出题任务数
+    GENERATION_JOB_MAX_RUNNING_PER_USER: int = 1  # 每个用户同时执行的任务数
+    GENERATION_JOB_MAX_ACTIVE_PER_USER: int = 5  # 每个用户排队+执行中的任务数上限
+    GENERATION_JOB_POLL_INTERVAL_SECONDS: float = 2.0  # 空闲worker查询新任务的间隔
+    GENERATION_JOB_LEASE_SECONDS: float = 60.0  # 心跳超过该时间未更新的任务视为中断, 重新排队
+    GENERATION_JOB_MAX_ATTEMPTS: int = 3  # 任务中断重试次数上限
+    GENERATION_JOB_STREAM_INTERVAL_SECONDS: float = 1.0  # SSE进度推送的轮询间隔
+
+    # ===================================
+    # 批改队列配置
+    # ===================================
+    GRADING_WORKERS: int = 8  # 每个进程同时批改的答卷数 (主事件循环中的worker数)
+    GRADING_POLL_INTERVAL_SECONDS: float = 2.0  # 空闲worker查询新批改任务的间隔
+    GRADING_LEASE_SECONDS: float = 120.0  # 租约到期未续的批改任务视为中断, 重新领取
+    GRADING_MAX_ATTEMPTS: int = 3  # 每份答卷的批改尝试次数上限
+    GRADING_RETRY_BACKOFF_SECONDS: float = 5.0  # 批改失败后首次重试的等待时间 (之后每次翻倍)
+
     # ===================================
     # 日志配置
     # ===================================
@@ -80,6 +205,27 @@ class Settings(BaseSettings):
     LOG_FILE: str = "logs/app.log"
     SQL_ECHO: bool = False  # 是否输出 SQL 查询日志（开发时可开启调试）
 
+    # ===================================
+    # 监控指标配置 (Prometheus, GET /metrics)
+    # ===================================
+    METRICS_ENABLED: bool = True
+    # 多worker部署时设置为各worker共享的目录, /metrics 汇总所有worker的指标
+    METRICS_MULTIPROC_DIR: str = ""
+    METRICS_FLUSH_SECONDS: float = 5.0  # 各worker写入指标快照的间隔
+
+    # ===================================
+    # 链路追踪配置 (API → 服务 → 数据库 → LLM)
+    # ===================================
+    TRACING_ENABLED: bool = True
+    # 导出方式: none(只生成trace ID写入调用日志) / file(JSON Lines) / otlp(OTLP/HTTP JSON)
+    TRACING_EXPORTER: str = "none"
+    TRACING_FILE: str = "logs/traces.jsonl"
+    TRACING_OTLP_ENDPOINT: str = "http://localhost:4318/v1/traces"
+    TRACING_SERVICE_NAME: str = "quiz-backend"
+    TRACING_SAMPLE_RATIO: float = 1.0  # 新建trace的采样比例, 传入traceparent时沿用调用方的决定
+    TRACING_EXPORT_INTERVAL_SECONDS: float = 5.0
+    TRACING_MAX_BUFFER: int = 20000  # 待导出span上限, 超出时丢弃最旧的
+
     # Pydantic配置
     model_config = SettingsConfigDict(
         env_file=".env",
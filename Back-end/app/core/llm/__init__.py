@@ -10,6 +10,7 @@ from app.core.llm.base import (
     LLMResponse,
     StreamChunk,
 )
+from app.core.llm.openai_compat import OpenAICompatibleProvider
 from app.core.llm.deepseek import DeepSeekProvider
 from app.core.llm.qwen import QwenProvider
 from app.core.llm.glm import GLMProvider
@@ -19,6 +20,7 @@ __all__ = [
     "Message",
     "LLMResponse",
     "StreamChunk",
+    "OpenAICompatibleProvider",
     "DeepSeekProvider",
     "QwenProvider",
     "GLMProvider",
@@ -8,6 +8,9 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass
 from typing import AsyncIterator, Optional, List, Dict, Any
 
+import httpx
+
+from app.core.llm.http_client import get_http_client
 
 @dataclass
 class Message:
@@ -34,6 +37,10 @@ class StreamChunk:
     content: str
     is_final: bool = False
     finish_reason: Optional[str] = None
+    # Token usage, only set on the final chunk (when the API reports it)
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    total_tokens: Optional[int] = None
 
 
 class BaseLLMProvider(ABC):
@@ -51,6 +58,7 @@ class BaseLLMProvider(ABC):
         temperature: float = 0.7,
         max_tokens: int = 4000,
         timeout: int = 60,
+        http_client: Optional[httpx.AsyncClient] = None,
     ):
         """
         Initialize LLM provider
@@ -62,6 +70,7 @@ class BaseLLMProvider(ABC):
             temperature: Sampling temperature (0-2)
             max_tokens: Maximum tokens to generate
             timeout: Request timeout in seconds
+            http_client: Optional client (defaults to the shared pooled client)
         """
         self.api_key = api_key
         self.base_url = base_url.rstrip("/")
@@ -69,6 +78,14 @@ class BaseLLMProvider(ABC):
         self.temperature = temperature
         self.max_tokens = max_tokens
         self.timeout = timeout
+        self._http_client = http_client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """HTTP client used for API calls (shared, keep-alive pooled)"""
+        if self._http_client is not None:
+            return self._http_client
+        return get_http_client()
 
     @property
     @abstractmethod
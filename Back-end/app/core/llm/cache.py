@@ -0,0 +1,291 @@
+"""
+LLM Response Cache
+
+Content-addressed cache of chat completions: in-memory LRU with per-scene
+TTL, optionally backed by a SQLite file that survives restarts
+"""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict
+from typing import Callable, Dict, Any, List, Optional, Tuple
+
+from app.config import settings
+from app.core.llm.base import Message, LLMResponse
+from app.models.llm_log import LLMScene
+
+
+def cache_key(
+    provider: str,
+    model: str,
+    messages: List[Message],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+) -> str:
+    """
+    Fingerprint of a chat request
+
+    Returns:
+        sha256 hex digest of the canonical JSON of all inputs that affect
+        the completion
+    """
+    payload = json.dumps(
+        {
+            "provider": provider,
+            "model": model,
+            "messages": [[m.role, m.content] for m in messages],
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class CacheStats:
+    """Hit/miss counters for one scene"""
+    hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    stores: int = 0
+    evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class SQLiteCacheBackend:
+    """
+    On-disk cache table in a standalone SQLite file
+
+    Uses the stdlib driver from a worker thread so lookups never block the
+    event loop and work from any loop.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+        return self._conn
+
+    def _get(self, key: str) -> Optional[Tuple[float, str]]:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT expires_at, value FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return row
+
+    def _set(self, key: str, value: str, expires_at: float) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            conn.commit()
+
+    def _delete(self, keys: List[str]) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("DELETE FROM llm_cache WHERE key = ?", [(k,) for k in keys])
+            conn.commit()
+
+    def _purge(self) -> int:
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            conn.commit()
+            return cursor.rowcount
+
+    async def get(self, key: str) -> Optional[Tuple[float, str]]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def set(self, key: str, value: str, expires_at: float) -> None:
+        await asyncio.to_thread(self._set, key, value, expires_at)
+
+    async def delete(self, keys: List[str]) -> None:
+        await asyncio.to_thread(self._delete, keys)
+
+    async def purge_expired(self) -> int:
+        """Delete expired rows, returns the number removed"""
+        return await asyncio.to_thread(self._purge)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class ResponseCache:
+    """
+    Two-level response cache
+
+    Entries live in a size-bounded LRU (LLM_CACHE_MAX_ENTRIES); with
+    LLM_CACHE_SQLITE_PATH set they are also written through to disk, and a
+    memory miss falls back to the disk copy.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        sqlite_path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        """
+        Initialize cache
+
+        Args:
+            max_entries: In-memory LRU size (defaults to LLM_CACHE_MAX_ENTRIES)
+            sqlite_path: Disk copy (defaults to LLM_CACHE_SQLITE_PATH, "" = none)
+            clock: Wall clock for expiry times (stored on disk, so not monotonic)
+        """
+        self._clock = clock
+        self.max_entries = max_entries if max_entries is not None else settings.LLM_CACHE_MAX_ENTRIES
+        path = sqlite_path if sqlite_path is not None else settings.LLM_CACHE_SQLITE_PATH
+        self.backend = SQLiteCacheBackend(path) if path else None
+        self._entries: "OrderedDict[str, Tuple[float, LLMResponse]]" = OrderedDict()
+        self._stats: Dict[str, CacheStats] = {}
+
+    def stats(self, scene: LLMScene) -> CacheStats:
+        stats = self._stats.get(scene.value)
+        if stats is None:
+            stats = CacheStats()
+            self._stats[scene.value] = stats
+        return stats
+
+    @staticmethod
+    def ttl_for(scene: LLMScene) -> float:
+        """Time to live in seconds for a scene (0 = not cached)"""
+        return float(settings.LLM_CACHE_TTL_SECONDS.get(scene.value, 0))
+
+    @staticmethod
+    def is_cacheable(scene: LLMScene, temperature: float) -> bool:
+        """
+        Whether a call is cached by default
+
+        Only scenes listed in LLM_CACHE_SCENES at a near-deterministic
+        temperature: replaying a sampled answer would hide the variety the
+        caller asked for.
+        """
+        return (
+            settings.LLM_CACHE_ENABLED
+            and scene.value in settings.LLM_CACHE_SCENES
+            and temperature <= settings.LLM_CACHE_MAX_TEMPERATURE
+        )
+
+    def _put_memory(self, scene: LLMScene, key: str, expires_at: float, response: LLMResponse) -> None:
+        self._entries[key] = (expires_at, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats(scene).evictions += 1
+
+    async def get(self, scene: LLMScene, keys: List[str]) -> Optional[LLMResponse]:
+        """
+        Look up the first live entry among candidate keys
+
+        Args:
+            scene: Usage scene (for counters)
+            keys: Keys in preference order (one per candidate provider)
+
+        Returns:
+            Cached response or None
+        """
+        now = self._clock()
+        stats = self.stats(scene)
+
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            expires_at, response = entry
+            if expires_at < now:
+                del self._entries[key]
+                continue
+            self._entries.move_to_end(key)
+            stats.hits += 1
+            return response
+
+        if self.backend is not None:
+            for key in keys:
+                row = await self.backend.get(key)
+                if row is None or row[0] < now:
+                    continue
+                response = LLMResponse(**json.loads(row[1]))
+                self._put_memory(scene, key, row[0], response)
+                stats.hits += 1
+                stats.disk_hits += 1
+                return response
+
+        stats.misses += 1
+        return None
+
+    async def set(self, scene: LLMScene, key: str, response: LLMResponse) -> None:
+        """
+        Store a response under the scene's TTL
+
+        Only complete answers (finish_reason "stop") are stored: a truncated
+        one would be replayed for every identical input until it expires.
+        """
+        ttl = self.ttl_for(scene)
+        if ttl <= 0 or self.max_entries <= 0 or response.finish_reason != "stop":
+            return
+        expires_at = self._clock() + ttl
+        self._put_memory(scene, key, expires_at, response)
+        self.stats(scene).stores += 1
+        if self.backend is not None:
+            value = json.dumps(asdict(response), ensure_ascii=False)
+            await self.backend.set(key, value, expires_at)
+
+    async def evict(self, keys: List[str]) -> None:
+        """Drop entries from memory and disk (a response the caller could not use)"""
+        for key in keys:
+            self._entries.pop(key, None)
+        if self.backend is not None:
+            await self.backend.delete(keys)
+
+    def clear(self) -> None:
+        """Drop all in-memory entries (the disk copy is kept)"""
+        self._entries.clear()
+
+    async def purge_expired(self) -> int:
+        """Drop expired disk rows (startup housekeeping)"""
+        if self.backend is None:
+            return 0
+        return await self.backend.purge_expired()
+
+    def close(self) -> None:
+        if self.backend is not None:
+            self.backend.close()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Size and per-scene counters for reporting"""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "sqlite": self.backend.path if self.backend is not None else None,
+            "scenes": {
+                name: {**asdict(stats), "hit_rate": round(stats.hit_rate, 3)}
+                for name, stats in self._stats.items()
+            },
+        }
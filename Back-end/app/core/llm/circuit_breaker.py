@@ -0,0 +1,146 @@
+"""
+LLM Circuit Breaker
+
+Per-provider circuit breaker: opens after consecutive failures, fails
+fast while open and lets a single probe through when half-open
+"""
+
+import time
+from enum import Enum
+from typing import Dict, Any, Optional, Tuple
+
+import httpx
+
+from app.core.llm.retry import is_timeout
+
+
+class CircuitState(str, Enum):
+    """Circuit breaker state"""
+    CLOSED = "closed"          # Normal operation
+    OPEN = "open"              # Failing fast, provider considered down
+    HALF_OPEN = "half_open"    # One probe request allowed through
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit is open"""
+    pass
+
+
+# (old_state, new_state)
+Transition = Tuple[CircuitState, CircuitState]
+
+
+def counts_as_failure(error: BaseException) -> bool:
+    """
+    Whether an error says the provider is unhealthy
+
+    Timeouts, connection errors and 5xx count; other 4xx responses mean the
+    provider is up and rejected this particular request.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+        return status_code >= 500 or status_code == 408
+    return isinstance(error, httpx.TransportError) or is_timeout(error)
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one provider
+
+    Not locked: it is only touched from the event loop, and every method
+    runs without awaiting.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, recovery_timeout: float):
+        """
+        Initialize breaker
+
+        Args:
+            name: Provider name
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds to stay open before probing
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.open_count = 0
+        self.rejected_count = 0
+        self._probe_in_flight = False
+
+    def _recovery_due(self) -> bool:
+        return (
+            self.opened_at is not None
+            and time.monotonic() - self.opened_at >= self.recovery_timeout
+        )
+
+    def available(self) -> bool:
+        """Whether a call would currently be let through (without taking it)"""
+        if self.state == CircuitState.CLOSED:
+            return True
+        if self.state == CircuitState.OPEN:
+            return self._recovery_due()
+        return not self._probe_in_flight
+
+    def allow(self) -> Tuple[bool, Optional[Transition]]:
+        """
+        Ask to make a call
+
+        Returns:
+            (allowed, transition) - transition is set when an open circuit
+            moved to half-open to let this call through as the probe
+        """
+        if self.state == CircuitState.CLOSED:
+            return True, None
+
+        if self.state == CircuitState.OPEN and self._recovery_due():
+            self.state = CircuitState.HALF_OPEN
+            self._probe_in_flight = True
+            return True, (CircuitState.OPEN, CircuitState.HALF_OPEN)
+
+        if self.state == CircuitState.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True, None
+
+        self.rejected_count += 1
+        return False, None
+
+    def record_success(self) -> Optional[Transition]:
+        """Record a healthy response; closes a half-open circuit"""
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        if self.state != CircuitState.CLOSED:
+            old = self.state
+            self.state = CircuitState.CLOSED
+            self.opened_at = None
+            return old, CircuitState.CLOSED
+        return None
+
+    def record_failure(self) -> Optional[Transition]:
+        """Record a failure; may open (or re-open) the circuit"""
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == CircuitState.HALF_OPEN or (
+            self.state == CircuitState.CLOSED
+            and self.consecutive_failures >= self.failure_threshold
+        ):
+            old = self.state
+            self.state = CircuitState.OPEN
+            self.opened_at = time.monotonic()
+            self.open_count += 1
+            return old, CircuitState.OPEN
+        return None
+
+    def release(self) -> None:
+        """Give back a probe slot whose call ended without a verdict (probe calls only)"""
+        self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.state.value,
+            "consecutive_failures": self.consecutive_failures,
+            "open_count": self.open_count,
+            "rejected_count": self.rejected_count,
+        }
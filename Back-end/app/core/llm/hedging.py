@@ -0,0 +1,124 @@
+"""
+LLM Request Hedging
+
+Speculative duplicate requests for latency-critical calls: if the primary
+call is slower than the scene's usual tail latency, a second call is fired
+and whichever succeeds first wins
+"""
+
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, Tuple
+
+from app.config import settings
+from app.core.llm.router import ProviderStats
+from app.models.llm_log import LLMScene
+
+
+@dataclass
+class HedgeStats:
+    """Hedging outcome counters"""
+    requests: int = 0          # hedge-enabled calls
+    hedged: int = 0            # calls that fired a second request
+    hedge_wins: int = 0        # the second request answered first
+    primary_wins: int = 0      # the primary answered first after all
+    budget_denied: int = 0     # a hedge was due but the budget was spent
+
+    @property
+    def hedge_ratio(self) -> float:
+        return self.hedged / self.requests if self.requests else 0.0
+
+    @property
+    def win_rate(self) -> float:
+        return self.hedge_wins / self.hedged if self.hedged else 0.0
+
+
+class HedgeBudget:
+    """
+    Caps hedges at a fraction of hedge-enabled traffic
+
+    Every hedge-enabled call earns `ratio` credit and every hedge spends
+    one, so hedges can never exceed ratio * calls. Credit is capped at
+    `burst` so a quiet period cannot be saved up for a hedge storm.
+    """
+
+    def __init__(self, ratio: float, burst: float = 5.0):
+        self.ratio = ratio
+        self.burst = max(burst, 1.0)
+        self.credit = 0.0
+
+    def earn(self) -> None:
+        self.credit = min(self.burst, self.credit + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self.credit >= 1.0:
+            self.credit -= 1.0
+            return True
+        return False
+
+
+class HedgeController:
+    """
+    Hedge delay and budget for LLMService
+
+    Latency is tracked per (scene, provider): a quick review and a 20-question
+    generation differ by orders of magnitude, so one provider-wide percentile
+    would hedge one far too early and the other far too late.
+    """
+
+    def __init__(self):
+        self.budget = HedgeBudget(settings.LLM_HEDGE_MAX_RATIO)
+        self.stats = HedgeStats()
+        self._latency: Dict[Tuple[str, str], ProviderStats] = {}
+
+    def _stats_for(self, scene: LLMScene, provider: str) -> ProviderStats:
+        key = (scene.value, provider)
+        stats = self._latency.get(key)
+        if stats is None:
+            stats = ProviderStats(settings.LLM_ROUTER_WINDOW_SECONDS, max_samples=500)
+            self._latency[key] = stats
+        return stats
+
+    def record_latency(self, scene: LLMScene, provider: str, latency_ms: int) -> None:
+        """Feed the latency of a successful call"""
+        self._stats_for(scene, provider).record(latency_ms, ok=True)
+
+    def delay_for(self, scene: LLMScene, provider: str) -> float:
+        """
+        Seconds to wait for the primary before hedging
+
+        The configured percentile of recent successful calls, or
+        LLM_HEDGE_DELAY_MS until enough samples exist.
+        """
+        stats = self._stats_for(scene, provider)
+        delay_ms: Optional[int] = None
+        if stats.samples >= settings.LLM_ROUTER_MIN_SAMPLES:
+            delay_ms = stats.percentile(settings.LLM_HEDGE_PERCENTILE)
+        if delay_ms is None:
+            delay_ms = settings.LLM_HEDGE_DELAY_MS
+        return max(delay_ms, settings.LLM_HEDGE_MIN_DELAY_MS) / 1000
+
+    def start(self) -> None:
+        """Count a hedge-enabled call"""
+        self.stats.requests += 1
+        self.budget.earn()
+
+    def try_hedge(self) -> bool:
+        """Take budget for a hedge; False if over the cap"""
+        if self.budget.try_spend():
+            self.stats.hedged += 1
+            return True
+        self.stats.budget_denied += 1
+        return False
+
+    def record_winner(self, hedge_won: bool) -> None:
+        if hedge_won:
+            self.stats.hedge_wins += 1
+        else:
+            self.stats.primary_wins += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = asdict(self.stats)
+        data["hedge_ratio"] = round(self.stats.hedge_ratio, 3)
+        data["win_rate"] = round(self.stats.win_rate, 3)
+        data["max_ratio"] = self.budget.ratio
+        return data
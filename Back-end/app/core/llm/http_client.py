@@ -0,0 +1,119 @@
+"""
+Shared LLM HTTP Client
+
+Long-lived, connection-pooled httpx client shared by all LLM providers
+"""
+
+import asyncio
+from typing import Dict, Any, Optional
+
+import httpx
+
+from app.config import settings
+
+
+# One client per event loop: httpx connections are bound to the loop that
+# opened them, and scripts may drive the services from their own loops.
+_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+_requests_total: int = 0
+
+
+def _http2_available() -> bool:
+    """Check whether the optional h2 package is installed"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def _count_request(request: httpx.Request) -> None:
+    """Event hook counting outgoing requests"""
+    global _requests_total
+    _requests_total += 1
+
+
+def _create_client() -> httpx.AsyncClient:
+    """Create a pooled client from settings"""
+    http2 = settings.LLM_HTTP2
+    if http2 and not _http2_available():
+        print("[LLM] 未安装 h2, HTTP/2 已禁用 (pip install httpx[http2])")
+        http2 = False
+
+    limits = httpx.Limits(
+        max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+    return httpx.AsyncClient(
+        limits=limits,
+        http2=http2,
+        timeout=settings.LLM_TIMEOUT,
+        event_hooks={"request": [_count_request]},
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared client for the running event loop
+
+    Created lazily so scripts and background loops work without the app
+    lifespan; the main loop's client is created at startup.
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = _create_client()
+        _clients[loop] = client
+    return client
+
+
+async def init_http_client() -> httpx.AsyncClient:
+    """Create the shared client for the current loop (app startup)"""
+    return get_http_client()
+
+
+async def close_http_client() -> None:
+    """Close the shared client for the current loop (app shutdown)"""
+    loop = asyncio.get_running_loop()
+    client = _clients.pop(loop, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """
+    Snapshot of connection pool utilization for the current loop
+
+    Returns:
+        Dict with pool limits, connection counts and request counter
+    """
+    stats: Dict[str, Any] = {
+        "max_connections": settings.LLM_HTTP_MAX_CONNECTIONS,
+        "max_keepalive_connections": settings.LLM_HTTP_MAX_KEEPALIVE,
+        "keepalive_expiry": settings.LLM_HTTP_KEEPALIVE_EXPIRY,
+        "http2": settings.LLM_HTTP2 and _http2_available(),
+        "clients": len(_clients),
+        "requests_total": _requests_total,
+        "connections": 0,
+        "active_connections": 0,
+        "idle_connections": 0,
+        "utilization": 0.0,
+    }
+
+    try:
+        client: Optional[httpx.AsyncClient] = _clients.get(asyncio.get_running_loop())
+    except RuntimeError:
+        client = None
+    # httpx does not expose its pool publicly; degrade to counters only
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    if connections:
+        active = sum(1 for conn in connections if not conn.is_idle())
+        stats["connections"] = len(connections)
+        stats["active_connections"] = active
+        stats["idle_connections"] = len(connections) - active
+        stats["utilization"] = round(active / max(settings.LLM_HTTP_MAX_CONNECTIONS, 1), 3)
+
+    return stats
@@ -0,0 +1,107 @@
+"""
+Incremental JSON Array Parser
+
+Pulls the objects of a JSON array out of a streamed completion as soon as
+each one is complete, so a batch of generated questions can be processed
+one by one while the model is still writing the rest
+"""
+
+import json
+from typing import Any, Dict, List
+
+
+class JSONArrayStreamParser:
+    """
+    Incremental parser for a top-level JSON array of objects
+
+    Text is fed as it arrives; every character is scanned once. Prose or a
+    ```json fence before the array is skipped: the array starts at the
+    first "[" whose next non-blank character is "{". Strings and escapes
+    are tracked, so braces inside stems and explanations don't count.
+    Each element is json-decoded when its closing brace arrives; elements
+    that fail to decode are counted in `errors` and skipped.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._pos = 0
+        self._state = "seek"        # seek -> open -> array -> done
+        self._depth = 0             # nesting inside the array (1 = element level)
+        self._start = -1            # start of the current element
+        self._in_string = False
+        self._escaped = False
+        self.emitted = 0
+        self.errors = 0
+
+    @property
+    def done(self) -> bool:
+        """The closing bracket of the array has been seen"""
+        return self._state == "done"
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Add streamed text
+
+        Returns:
+            Objects completed by this chunk, in order
+        """
+        self._text += chunk
+        text = self._text
+        objects: List[Dict[str, Any]] = []
+
+        i = self._pos
+        end = len(text)
+        while i < end and self._state != "done":
+            ch = text[i]
+
+            if self._state == "seek":
+                if ch == "[":
+                    self._state = "open"
+            elif self._state == "open":
+                # Only "[" followed by "{" starts the array of questions
+                if ch == "{":
+                    self._state = "array"
+                    self._depth = 1
+                    continue  # handle "{" as the first element's start
+                if not ch.isspace():
+                    self._state = "seek"
+                    continue
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 1 and ch == "{":
+                    self._start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and ch == "}" and self._start >= 0:
+                    self._emit(text[self._start:i + 1], objects)
+                    self._start = -1
+                elif self._depth == 0:
+                    self._state = "done"
+            i += 1
+
+        # Drop what can no longer be needed, keeping an open element
+        keep = self._start if self._start >= 0 else i
+        self._text = text[keep:]
+        self._pos = i - keep
+        if self._start >= 0:
+            self._start = 0
+        return objects
+
+    def _emit(self, raw: str, objects: List[Dict[str, Any]]) -> None:
+        try:
+            value = json.loads(raw)
+        except json.JSONDecodeError:
+            self.errors += 1
+            return
+        if isinstance(value, dict):
+            objects.append(value)
+            self.emitted += 1
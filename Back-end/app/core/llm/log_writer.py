@@ -0,0 +1,174 @@
+"""
+LLM Call Log Writer
+
+Buffers LLMLog rows in memory and bulk-inserts them from a background
+task with its own session, keeping the log write off the LLM call path.
+Usage rollups are updated in the same transaction.
+"""
+
+import asyncio
+from collections import deque
+from dataclasses import dataclass, asdict
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Optional, Tuple
+
+from sqlalchemy import insert
+
+from app.config import settings
+from app.core.llm.usage import apply_rollups
+from app.db.session import async_session_maker
+from app.models.llm_log import LLMLog
+
+
+@dataclass
+class LogWriterStats:
+    """Writer counters"""
+    enqueued: int = 0        # rows accepted into the buffer
+    written: int = 0         # rows inserted
+    dropped: int = 0         # rows lost: buffer full (drop policy) or failed insert
+    blocked: int = 0         # writes that waited for space (block policy)
+    batches: int = 0         # successful bulk inserts
+    failed_batches: int = 0
+
+
+class LLMLogWriter:
+    """
+    Batched, asynchronous LLMLog writer
+
+    write() only appends to a bounded in-memory buffer. A background task
+    drains it every LLM_LOG_FLUSH_INTERVAL_MS, or as soon as
+    LLM_LOG_BATCH_SIZE rows are waiting, with one INSERT per batch. When
+    the buffer is full, LLM_LOG_OVERFLOW_POLICY either drops the new row
+    or makes the caller wait for the next flush.
+
+    The flusher starts on first use and is bound to the running event loop;
+    call stop() on shutdown to write out what is still buffered.
+    """
+
+    def __init__(
+        self,
+        batch_size: Optional[int] = None,
+        flush_interval_ms: Optional[int] = None,
+        max_buffer: Optional[int] = None,
+        overflow_policy: Optional[str] = None,
+    ):
+        self.batch_size = max(1, batch_size or settings.LLM_LOG_BATCH_SIZE)
+        interval = flush_interval_ms if flush_interval_ms is not None else settings.LLM_LOG_FLUSH_INTERVAL_MS
+        self.flush_interval = max(interval, 1) / 1000
+        self.max_buffer = max(1, max_buffer or settings.LLM_LOG_MAX_BUFFER)
+        self.overflow_policy = overflow_policy or settings.LLM_LOG_OVERFLOW_POLICY
+        self.stats = LogWriterStats()
+
+        self._buffer: Deque[Tuple[Dict[str, Any], bool]] = deque()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    def start(self) -> None:
+        """Start the background flusher on the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Events are bound to the loop they are first awaited on
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._space = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = loop.create_task(self._run())
+
+    async def write(self, rollup: bool = True, **values: Any) -> None:
+        """
+        Queue one LLMLog row
+
+        Args:
+            rollup: Count the row in the usage rollups (False for events
+                such as circuit breaker transitions, which are not calls)
+            **values: LLMLog column values
+        """
+        self.start()
+
+        if len(self._buffer) >= self.max_buffer:
+            if self.overflow_policy != "block":
+                self.stats.dropped += 1
+                return
+            self.stats.blocked += 1
+            while len(self._buffer) >= self.max_buffer:
+                self._space.clear()
+                self._wakeup.set()
+                await self._space.wait()
+
+        # Stamp the call time now; the row is inserted up to one interval later
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        values.setdefault("created_at", now)
+        values.setdefault("updated_at", now)
+        self._buffer.append((values, rollup))
+        self.stats.enqueued += 1
+
+        if len(self._buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+        await self.flush()
+
+    async def flush(self) -> int:
+        """
+        Insert everything buffered so far
+
+        Returns:
+            Number of rows written
+        """
+        written = 0
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+            rows = [values for values, _ in batch]
+            if self._space is not None:
+                self._space.set()
+            try:
+                async with async_session_maker() as db:
+                    await db.execute(insert(LLMLog), rows)
+                    await apply_rollups(db, [values for values, rollup in batch if rollup])
+                    await db.commit()
+            except Exception as e:
+                # Logs are best effort: drop the batch rather than retry into
+                # a database that is failing anyway
+                self.stats.failed_batches += 1
+                self.stats.dropped += len(rows)
+                print(f"[LLM] 调用日志写入失败, 丢弃 {len(rows)} 条: {e}")
+                break
+            self.stats.batches += 1
+            written += len(rows)
+        self.stats.written += written
+        return written
+
+    async def stop(self) -> None:
+        """Flush the buffer and stop the flusher (application shutdown)"""
+        task = self._task
+        self._task = None
+        if task is not None and not task.done() and self._loop is asyncio.get_running_loop():
+            self._stopping = True
+            self._wakeup.set()
+            await task
+        else:
+            await self.flush()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            **asdict(self.stats),
+            "buffered": len(self._buffer),
+            "max_buffer": self.max_buffer,
+            "batch_size": self.batch_size,
+            "overflow_policy": self.overflow_policy,
+        }
+
+
+# Process-wide writer shared by all LLMService instances
+llm_log_writer = LLMLogWriter()
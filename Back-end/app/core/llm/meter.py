@@ -0,0 +1,55 @@
+"""
+LLM Token Meter
+
+Counts the tokens spent by the LLM calls made within a block of code, for
+per-operation budgets. The active meter is held in a contextvar, so calls
+made from tasks spawned inside the block (gather, create_task) are counted
+too; meters nest, and a call counts towards every enclosing meter.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+
+@dataclass
+class TokenMeter:
+    """Tokens spent by upstream LLM calls (cache hits and coalesced calls are free)"""
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    parent: Optional["TokenMeter"] = None
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+        meter: Optional[TokenMeter] = self
+        while meter is not None:
+            meter.calls += 1
+            meter.prompt_tokens += prompt_tokens or 0
+            meter.completion_tokens += completion_tokens or 0
+            meter = meter.parent
+
+
+_current_meter: ContextVar[Optional[TokenMeter]] = ContextVar("llm_token_meter", default=None)
+
+
+@contextmanager
+def metered() -> Iterator[TokenMeter]:
+    """Count the tokens of LLM calls made inside the block"""
+    meter = TokenMeter(parent=_current_meter.get())
+    token = _current_meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _current_meter.reset(token)
+
+
+def record_tokens(prompt_tokens: Optional[int], completion_tokens: Optional[int]) -> None:
+    """Charge a successful upstream call to the active meters"""
+    meter = _current_meter.get()
+    if meter is not None:
+        meter.add(prompt_tokens, completion_tokens)
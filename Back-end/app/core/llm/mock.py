@@ -0,0 +1,291 @@
+"""
+Mock LLM Provider
+
+Offline provider for load testing: answers generation, review, fix and
+grading prompts with schema-valid JSON, with configurable latency and
+failure profiles (MOCK_LLM_* settings). No network access.
+"""
+
+import asyncio
+import json
+import math
+import random
+import re
+from typing import AsyncIterator, Optional, List, Dict, Any
+
+import httpx
+
+from app.config import settings
+from app.core.llm.base import (
+    BaseLLMProvider,
+    Message,
+    LLMResponse,
+    StreamChunk,
+)
+
+
+# Question type as named in the generation prompt -> schema type
+_TYPE_NAMES = {
+    "单选题": "single",
+    "多选题": "multiple",
+    "填空题": "blank",
+    "简答题": "short",
+}
+
+
+class MockProvider(BaseLLMProvider):
+    """
+    Mock provider for benchmarks and offline development
+
+    Selected with LLM_PROVIDER=mock. Every call sleeps for a sampled
+    latency, may fail as configured (5xx, 429 with Retry-After, timeout,
+    malformed JSON), and otherwise returns content matching the prompt.
+    Failures are raised as real httpx errors so retry, failover and circuit
+    breaking behave as they would against a real API.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._random = random.Random(settings.MOCK_LLM_SEED)
+
+    @property
+    def provider_name(self) -> str:
+        return "mock"
+
+    # ---------------------------------------------------------------
+    # Latency and failure injection
+    # ---------------------------------------------------------------
+
+    def _sample_latency(self) -> float:
+        """Seconds before the (first token of the) response"""
+        median = settings.MOCK_LLM_LATENCY_MS / 1000
+        spread = settings.MOCK_LLM_LATENCY_SPREAD
+        dist = settings.MOCK_LLM_LATENCY_DIST
+        if dist == "fixed" or median <= 0:
+            return max(median, 0.0)
+        if dist == "uniform":
+            return self._random.uniform(median * (1 - spread), median * (1 + spread))
+        # lognormal: median stays put, spread is sigma; gives a realistic long tail
+        return self._random.lognormvariate(math.log(median), spread)
+
+    def _http_error(self, status_code: int, headers: Optional[Dict[str, str]] = None) -> httpx.HTTPStatusError:
+        request = httpx.Request("POST", f"{self.base_url}/chat/completions")
+        response = httpx.Response(status_code, headers=headers, request=request)
+        return httpx.HTTPStatusError(
+            f"Mock error '{status_code}' for url '{request.url}'",
+            request=request,
+            response=response,
+        )
+
+    async def _maybe_fail(self) -> None:
+        """Raise an injected failure, after the latency a real one would take"""
+        roll = self._random.random()
+
+        threshold = settings.MOCK_LLM_RATE_LIMIT_RATE
+        if roll < threshold:
+            # Rate limiting is answered quickly
+            await asyncio.sleep(0.01)
+            raise self._http_error(429, {"Retry-After": str(settings.MOCK_LLM_RETRY_AFTER)})
+
+        threshold += settings.MOCK_LLM_ERROR_RATE
+        if roll < threshold:
+            await asyncio.sleep(self._sample_latency())
+            raise self._http_error(self._random.choice([500, 502, 503]))
+
+        threshold += settings.MOCK_LLM_TIMEOUT_RATE
+        if roll < threshold:
+            await asyncio.sleep(self.timeout)
+            raise httpx.ReadTimeout("Mock read timeout")
+
+    def _malformed(self) -> bool:
+        return self._random.random() < settings.MOCK_LLM_MALFORMED_RATE
+
+    # ---------------------------------------------------------------
+    # Content
+    # ---------------------------------------------------------------
+
+    def _question(self, q_type: str, index: int, difficulty: int, knowledge_point: str) -> Dict[str, Any]:
+        """One schema-valid question (passes ValidatorService)"""
+        tag = f"{knowledge_point} #{index + 1}-{self._random.randrange(10 ** 6):06d}"
+        question: Dict[str, Any] = {
+            "type": q_type,
+            "difficulty": difficulty,
+            "knowledge_point": knowledge_point,
+            "explanation": f"这是关于{knowledge_point}的模拟解析，说明正确答案成立的原因。",
+        }
+
+        if q_type == "single":
+            question["stem"] = f"关于{tag}，下列说法正确的是？"
+            question["options"] = {k: f"模拟选项{k}（{tag}）" for k in "ABCD"}
+            question["answer"] = self._random.choice("ABCD")
+        elif q_type == "multiple":
+            question["stem"] = f"关于{tag}，下列说法正确的有（多选）？"
+            question["options"] = {k: f"模拟选项{k}（{tag}）" for k in "ABCD"}
+            question["answer"] = sorted(self._random.sample("ABCD", self._random.choice([2, 3])))
+        elif q_type == "blank":
+            blanks = self._random.choice([1, 2])
+            question["stem"] = f"{tag}的核心概念是____" + ("，其典型应用是____。" if blanks == 2 else "。")
+            question["options"] = None
+            question["answer"] = [f"模拟答案{i + 1}" for i in range(blanks)]
+        else:
+            question["stem"] = f"请简述{tag}的基本原理及其应用场景。"
+            question["options"] = None
+            question["answer"] = f"{knowledge_point}的基本原理是模拟参考答案，应用场景包括教学与练习。"
+            question["keywords"] = ["基本原理", "应用场景", knowledge_point]
+            question["rubric"] = "包含基本原理得2分，包含应用场景得2分，表述完整得1分"
+
+        return question
+
+    def _generate(self, prompt: str) -> str:
+        count = int(_search(r"生成(\d+)道", prompt, "1"))
+        type_name = _search(r"生成\d+道(单选题|多选题|填空题|简答题)", prompt, "单选题")
+        difficulty = int(_search(r"难度等级: (\d)", prompt, "3"))
+        knowledge_point = _search(r"知识点: (.+)", prompt, "模拟知识点").strip()
+
+        q_type = _TYPE_NAMES.get(type_name, "single")
+        questions = [self._question(q_type, i, difficulty, knowledge_point) for i in range(count)]
+        return "```json\n" + json.dumps(questions, ensure_ascii=False, indent=2) + "\n```"
+
+    def _review(self) -> Dict[str, Any]:
+        approved = self._random.random() >= settings.MOCK_LLM_REJECT_RATE
+        if approved:
+            return {"is_correct": True, "issues": [], "comment": "题目质量良好（模拟审核）", "fixed_question": None}
+        return {
+            "is_correct": False,
+            "issues": [{
+                "type": "unclear_stem",
+                "description": "题干表述不够清晰（模拟审核）",
+                "severity": "error",
+            }],
+            "comment": "题干需要修改（模拟审核）",
+            "fixed_question": None,
+        }
+
+    def _review_batch(self, prompt: str) -> List[Dict[str, Any]]:
+        count = int(_search(r"审核以下 (\d+) 道题目", prompt, "1"))
+        return [{"index": i, **self._review()} for i in range(count)]
+
+    def _fix(self, prompt: str) -> Dict[str, Any]:
+        original = _search(r"\*\*原题目\*\*:\s*([\s\S]*?)\s*\*\*发现的问题\*\*", prompt, "")
+        try:
+            question = json.loads(original)
+        except ValueError:
+            question = self._question("single", 0, 3, "模拟知识点")
+        question["stem"] = f"{question.get('stem', '')}（已修正）"
+        return question
+
+    def _grade_short(self, prompt: str) -> Dict[str, Any]:
+        max_score = float(_search(r"满分为 ([\d.]+) 分", prompt, "10"))
+        score = round(max_score * self._random.choice([0, 0.25, 0.5, 0.75, 1.0]), 1)
+        return {
+            "score": score,
+            "feedback": f"模拟评分：得 {score} 分",
+            "analysis": "模拟分析：答案覆盖了部分关键点。",
+        }
+
+    def _grade_blank(self, prompt: str) -> Dict[str, Any]:
+        blanks = int(_search(r"共有 (\d+) 个空", prompt, "1"))
+        max_score = float(_search(r"总分 ([\d.]+) 分", prompt, "10"))
+        per_blank = max_score / max(blanks, 1)
+        blank_scores = [per_blank if self._random.random() < 0.7 else 0 for _ in range(blanks)]
+        return {
+            "score": sum(blank_scores),
+            "feedback": f"模拟评分：答对 {sum(1 for s in blank_scores if s)}/{blanks} 个空",
+            "blank_scores": blank_scores,
+        }
+
+    def _respond(self, messages: List[Message]) -> str:
+        """Pick a response shape from the prompt"""
+        prompt = messages[-1].content if messages else ""
+
+        if "请根据以下要求生成" in prompt:
+            return self._generate(prompt)
+        if "请修复以下有问题的题目" in prompt:
+            data: Any = self._fix(prompt)
+        elif "批量审核" in prompt:
+            data = self._review_batch(prompt)
+        elif "审核要点" in prompt:
+            data = self._review()
+        elif "批改学生的简答题" in prompt:
+            data = self._grade_short(prompt)
+        elif "批改学生的填空题" in prompt:
+            data = self._grade_blank(prompt)
+        else:
+            return f"这是模拟回复（{len(prompt)} 字符的提示词）。"
+        return "```json\n" + json.dumps(data, ensure_ascii=False) + "\n```"
+
+    def _content(self, messages: List[Message]) -> str:
+        content = self._respond(messages)
+        if self._malformed():
+            # Cut the JSON off mid-way, like a truncated completion
+            content = content[: max(1, len(content) // 2)]
+        return content
+
+    @staticmethod
+    def _prompt_tokens(messages: List[Message]) -> int:
+        return sum(len(m.content) for m in messages) // 2
+
+    # ---------------------------------------------------------------
+    # Provider interface
+    # ---------------------------------------------------------------
+
+    async def chat(
+        self,
+        messages: List[Message],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs,
+    ) -> LLMResponse:
+        """Return a mock completion after the sampled latency"""
+        await self._maybe_fail()
+        await asyncio.sleep(self._sample_latency())
+
+        content = self._content(messages)
+        prompt_tokens = self._prompt_tokens(messages)
+        completion_tokens = len(content) // 2
+
+        return LLMResponse(
+            content=content,
+            model=self.model,
+            provider=self.provider_name,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            finish_reason="stop",
+        )
+
+    async def chat_stream(
+        self,
+        messages: List[Message],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs,
+    ) -> AsyncIterator[StreamChunk]:
+        """Stream a mock completion a few characters at a time"""
+        await self._maybe_fail()
+        await asyncio.sleep(self._sample_latency())
+
+        content = self._content(messages)
+        rate = settings.MOCK_LLM_TOKENS_PER_SECOND
+        # About two characters per token, like Chinese text
+        for start in range(0, len(content), 2):
+            if rate > 0:
+                await asyncio.sleep(1 / rate)
+            yield StreamChunk(content=content[start:start + 2])
+
+        prompt_tokens = self._prompt_tokens(messages)
+        completion_tokens = len(content) // 2
+        yield StreamChunk(
+            content="",
+            is_final=True,
+            finish_reason="stop",
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+
+
+def _search(pattern: str, text: str, default: str) -> str:
+    """First capture group of pattern in text, or default"""
+    match = re.search(pattern, text)
+    return match.group(1) if match else default
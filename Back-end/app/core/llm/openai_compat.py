@@ -0,0 +1,148 @@
+"""
+OpenAI-Compatible LLM Provider
+
+Shared implementation of the /chat/completions API used by DeepSeek, Qwen
+(DashScope compatible mode) and GLM
+"""
+
+from typing import AsyncIterator, Optional, List, Dict, Any
+
+from app.config import settings
+from app.core.llm.base import (
+    BaseLLMProvider,
+    Message,
+    LLMResponse,
+    StreamChunk,
+)
+from app.core.llm.sse import iter_sse_data, loads, parse_json_event
+
+
+class OpenAICompatibleProvider(BaseLLMProvider):
+    """
+    Provider for any OpenAI-compatible chat completions endpoint
+
+    Subclasses only set the provider name and, where the API differs,
+    the class attributes below.
+    """
+
+    # Ask for a usage chunk at the end of streams (stream_options.include_usage)
+    stream_usage: bool = True
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+        }
+
+    def _payload(
+        self,
+        messages: List[Message],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        stream: bool,
+        kwargs: Dict[str, Any],
+    ) -> Dict[str, Any]:
+        payload = {
+            "model": self.model,
+            "messages": self._build_messages(messages),
+            # `or` would turn an explicit temperature of 0 into the default
+            "temperature": self.temperature if temperature is None else temperature,
+            "max_tokens": max_tokens or self.max_tokens,
+            "stream": stream,
+        }
+        if stream and self.stream_usage and settings.LLM_STREAM_INCLUDE_USAGE:
+            payload["stream_options"] = {"include_usage": True}
+        payload.update(kwargs)
+        return payload
+
+    async def chat(
+        self,
+        messages: List[Message],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs,
+    ) -> LLMResponse:
+        """Send chat completion request"""
+        response = await self.client.post(
+            f"{self.base_url}/chat/completions",
+            headers=self._headers(),
+            json=self._payload(messages, temperature, max_tokens, False, kwargs),
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        data = loads(response.content)
+
+        choice = data["choices"][0]
+        usage = data.get("usage") or {}
+
+        return LLMResponse(
+            content=choice["message"]["content"],
+            model=data.get("model", self.model),
+            provider=self.provider_name,
+            prompt_tokens=usage.get("prompt_tokens"),
+            completion_tokens=usage.get("completion_tokens"),
+            total_tokens=usage.get("total_tokens"),
+            finish_reason=choice.get("finish_reason"),
+        )
+
+    async def chat_stream(
+        self,
+        messages: List[Message],
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        **kwargs,
+    ) -> AsyncIterator[StreamChunk]:
+        """
+        Send streaming chat completion request
+
+        Content chunks are followed by one final chunk carrying the finish
+        reason and, when the API reports it, token usage.
+        """
+        async with self.client.stream(
+            "POST",
+            f"{self.base_url}/chat/completions",
+            headers=self._headers(),
+            json=self._payload(messages, temperature, max_tokens, True, kwargs),
+            timeout=self.timeout,
+        ) as response:
+            response.raise_for_status()
+
+            usage: Dict[str, Any] = {}
+            finish_reason: Optional[str] = None
+
+            async for data in iter_sse_data(response):
+                if data == b"[DONE]":
+                    break
+
+                event = parse_json_event(data)
+                if not isinstance(event, dict):
+                    continue
+
+                # With include_usage the last event has usage and no choices;
+                # some APIs attach usage to the final choice event instead
+                if event.get("usage"):
+                    usage = event["usage"]
+
+                choices = event.get("choices")
+                if not choices:
+                    continue
+                choice = choices[0]
+                content = (choice.get("delta") or {}).get("content") or ""
+                if choice.get("finish_reason"):
+                    finish_reason = choice["finish_reason"]
+
+                if content:
+                    yield StreamChunk(
+                        content=content,
+                        is_final=choice.get("finish_reason") is not None,
+                        finish_reason=choice.get("finish_reason"),
+                    )
+
+            yield StreamChunk(
+                content="",
+                is_final=True,
+                finish_reason=finish_reason,
+                prompt_tokens=usage.get("prompt_tokens"),
+                completion_tokens=usage.get("completion_tokens"),
+                total_tokens=usage.get("total_tokens"),
+            )
@@ -0,0 +1,236 @@
+"""
+LLM Rate Limiting
+
+Per-provider admission control: requests per second, tokens per minute
+and maximum in-flight calls, behind a single FIFO queue
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import AsyncIterator, Dict, Any, List, Optional
+
+from app.core.llm.base import Message
+
+
+class RateLimitTimeout(asyncio.TimeoutError):
+    """Raised when a call waits in the limiter queue longer than allowed"""
+    pass
+
+
+def estimate_tokens(messages: List[Message], max_tokens: Optional[int] = None) -> int:
+    """
+    Rough token estimate for a chat request
+
+    Chinese text is about one token per 1-2 characters, so chars / 2 is a
+    reasonable upper-middle estimate; the reservation is settled with the
+    real usage once the call returns.
+    """
+    prompt_chars = sum(len(m.content) for m in messages)
+    return prompt_chars // 2 + (max_tokens or 0)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate` tokens per second
+
+    Not locked: callers are serialized by ProviderLimiter's admission queue.
+    The balance may go negative when real usage exceeds the reservation.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, amount: float = 1.0, deadline_at: Optional[float] = None) -> float:
+        """
+        Wait until `amount` tokens are available, then take them
+
+        Args:
+            amount: Tokens to take
+            deadline_at: Monotonic time by which they must be taken (None = no limit)
+
+        Returns:
+            The amount actually taken (clamped to the bucket capacity)
+
+        Raises:
+            asyncio.TimeoutError: If the refill would finish after deadline_at
+        """
+        # A request larger than the bucket could never be admitted otherwise
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return amount
+            wait = (amount - self.tokens) / self.rate
+            # Fail now rather than sleep past the deadline
+            if deadline_at is not None and time.monotonic() + wait > deadline_at:
+                raise asyncio.TimeoutError()
+            await asyncio.sleep(wait)
+
+    def adjust(self, delta: float) -> None:
+        """Give back (positive) or charge (negative) tokens after the fact"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+
+@dataclass
+class LimiterStats:
+    """Queue and wait-time counters for one provider"""
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    in_flight: int = 0
+    admitted_total: int = 0
+    timeouts_total: int = 0
+    wait_ms_total: float = 0.0
+    wait_ms_max: float = 0.0
+
+    @property
+    def wait_ms_avg(self) -> float:
+        if self.admitted_total == 0:
+            return 0.0
+        return self.wait_ms_total / self.admitted_total
+
+
+class LimiterSlot:
+    """An admitted call; settle() reconciles the token reservation"""
+
+    def __init__(self, limiter: "ProviderLimiter", reserved_tokens: int, wait_ms: float):
+        self._limiter = limiter
+        self.reserved_tokens = reserved_tokens
+        self.wait_ms = wait_ms
+
+    def settle(self, actual_tokens: Optional[int]) -> None:
+        """Correct the tokens-per-minute bucket with real usage"""
+        bucket = self._limiter.tpm_bucket
+        if bucket is None or actual_tokens is None:
+            return
+        bucket.adjust(self.reserved_tokens - actual_tokens)
+        self.reserved_tokens = actual_tokens
+
+
+class ProviderLimiter:
+    """
+    Admission control for one LLM provider
+
+    Waiters are admitted strictly in arrival order: the head of the queue
+    holds the admission lock (asyncio.Lock is FIFO) while it waits for a
+    concurrency slot and for both token buckets, so a large request cannot
+    be starved by a stream of small ones.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rps: float = 0,
+        tpm: float = 0,
+        max_concurrency: int = 0,
+        queue_timeout: Optional[float] = None,
+    ):
+        """
+        Initialize limiter
+
+        Args:
+            name: Provider name (for metrics)
+            rps: Requests per second (0 = unlimited)
+            tpm: Tokens per minute (0 = unlimited)
+            max_concurrency: Maximum in-flight calls (0 = unlimited)
+            queue_timeout: Maximum seconds to wait for admission
+        """
+        self.name = name
+        self.rps = rps
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+
+        # Burst of one second's worth of requests, one minute's worth of tokens
+        self.rps_bucket = TokenBucket(rps, max(rps, 1.0)) if rps > 0 else None
+        self.tpm_bucket = TokenBucket(tpm / 60.0, tpm) if tpm > 0 else None
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+        self._admission = asyncio.Lock()
+        self.stats = LimiterStats()
+
+    async def _admit(self, tokens: int, deadline_at: Optional[float]) -> int:
+        """Take a concurrency slot and both buckets; returns the tokens reserved"""
+        async with self._admission:
+            if self._semaphore is not None:
+                await self._semaphore.acquire()
+            try:
+                if self.rps_bucket is not None:
+                    await self.rps_bucket.acquire(1, deadline_at)
+                if self.tpm_bucket is not None:
+                    tokens = int(await self.tpm_bucket.acquire(tokens, deadline_at))
+            except BaseException:
+                if self._semaphore is not None:
+                    self._semaphore.release()
+                raise
+        return tokens
+
+    @asynccontextmanager
+    async def slot(
+        self,
+        estimated_tokens: int = 0,
+        timeout: Optional[float] = None,
+    ) -> AsyncIterator[LimiterSlot]:
+        """
+        Wait for admission and hold a slot for the duration of the call
+
+        Args:
+            estimated_tokens: Token reservation for the TPM bucket
+            timeout: Seconds left before the caller's deadline (None = no deadline);
+                the wait is bounded by the smaller of this and queue_timeout
+
+        Raises:
+            RateLimitTimeout: If admission takes, or would take, longer than that
+        """
+        limits = [t for t in (self.queue_timeout, timeout) if t is not None]
+        wait_limit = min(limits) if limits else None
+
+        stats = self.stats
+        stats.queue_depth += 1
+        stats.max_queue_depth = max(stats.max_queue_depth, stats.queue_depth)
+        start = time.monotonic()
+        deadline_at = start + wait_limit if wait_limit is not None else None
+        try:
+            reserved = await asyncio.wait_for(self._admit(estimated_tokens, deadline_at), wait_limit)
+        except asyncio.TimeoutError:
+            stats.timeouts_total += 1
+            raise RateLimitTimeout(
+                f"{self.name}: a rate limit slot would take more than {wait_limit:.1f}s"
+            )
+        finally:
+            stats.queue_depth -= 1
+
+        wait_ms = (time.monotonic() - start) * 1000
+        stats.admitted_total += 1
+        stats.wait_ms_total += wait_ms
+        stats.wait_ms_max = max(stats.wait_ms_max, wait_ms)
+        stats.in_flight += 1
+        try:
+            yield LimiterSlot(self, reserved, wait_ms)
+        finally:
+            stats.in_flight -= 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Limits and queue metrics for reporting"""
+        data = asdict(self.stats)
+        data["wait_ms_avg"] = round(self.stats.wait_ms_avg, 1)
+        data["wait_ms_total"] = round(self.stats.wait_ms_total, 1)
+        data["wait_ms_max"] = round(self.stats.wait_ms_max, 1)
+        data["limits"] = {
+            "rps": self.rps,
+            "tpm": self.tpm,
+            "max_concurrency": self.max_concurrency,
+        }
+        return data
@@ -0,0 +1,134 @@
+"""
+LLM Retry Policy
+
+Capped exponential backoff with full jitter, Retry-After support and a
+per-request deadline, configurable per usage scene
+"""
+
+import asyncio
+import random
+import time
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import httpx
+
+from app.config import settings
+from app.models.llm_log import LLMScene
+
+
+# HTTP statuses worth retrying: rate limited or transient upstream failures
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Retry settings for one scene"""
+    max_attempts: int = 3
+    base_delay: float = 0.5  # seconds
+    max_delay: float = 8.0  # seconds
+    deadline: Optional[float] = 60.0  # total seconds across all attempts
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter delay after the given (1-based) failed attempt"""
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return random.uniform(0, cap)
+
+    def next_delay(
+        self,
+        attempt: int,
+        error: BaseException,
+        deadline_at: Optional[float] = None,
+    ) -> Optional[float]:
+        """
+        Decide whether to retry after a failed attempt
+
+        Args:
+            attempt: Number of the attempt that just failed (1-based)
+            error: The exception raised by that attempt
+            deadline_at: time.monotonic() value after which no retry starts
+
+        Returns:
+            Seconds to wait before the next attempt, or None to give up
+        """
+        if attempt >= self.max_attempts or not is_retryable(error):
+            return None
+
+        delay = self.backoff(attempt)
+        server_delay = retry_after_seconds(error)
+        if server_delay is not None:
+            # The server knows best, but never wait longer than max_delay * 4
+            delay = min(max(delay, server_delay), self.max_delay * 4)
+
+        if deadline_at is not None and time.monotonic() + delay >= deadline_at:
+            return None
+        return delay
+
+
+# Generation is expensive and user-facing, so it retries less and waits
+# longer; grading runs in the background and should rarely fall back.
+DEFAULT_SCENE_POLICIES: Dict[LLMScene, RetryPolicy] = {
+    LLMScene.GENERATE: RetryPolicy(max_attempts=2, base_delay=1.0, max_delay=8.0, deadline=180.0),
+    LLMScene.REVIEW: RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=8.0, deadline=90.0),
+    LLMScene.GRADE: RetryPolicy(max_attempts=4, base_delay=1.0, max_delay=16.0, deadline=180.0),
+    LLMScene.OTHER: RetryPolicy(max_attempts=2, base_delay=0.5, max_delay=4.0, deadline=60.0),
+}
+
+
+def get_retry_policy(scene: LLMScene) -> RetryPolicy:
+    """
+    Retry policy for a scene
+
+    Built-in defaults, overridden by settings.LLM_RETRY_POLICIES, e.g.
+    {"grade": {"max_attempts": 5, "deadline": 300}}
+    """
+    policy = DEFAULT_SCENE_POLICIES.get(scene, DEFAULT_SCENE_POLICIES[LLMScene.OTHER])
+    overrides = settings.LLM_RETRY_POLICIES.get(scene.value)
+    if overrides:
+        overrides = dict(overrides)
+        if "max_attempts" in overrides:
+            overrides["max_attempts"] = int(overrides["max_attempts"])
+        policy = replace(policy, **overrides)
+    return policy
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an error is transient and the call may succeed if repeated"""
+    if isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in RETRYABLE_STATUS_CODES
+    # Timeouts, connection resets, protocol errors
+    return isinstance(error, httpx.TransportError)
+
+
+def is_timeout(error: BaseException) -> bool:
+    """Whether an error is a request or deadline timeout"""
+    return isinstance(error, (httpx.TimeoutException, asyncio.TimeoutError))
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """
+    Parse the Retry-After header of an HTTP error
+
+    Supports both delta-seconds and HTTP-date forms.
+    """
+    if not isinstance(error, httpx.HTTPStatusError):
+        return None
+
+    value = error.response.headers.get("retry-after")
+    if not value:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,172 @@
+"""
+LLM Provider Router
+
+Tracks rolling latency and error rate per provider and orders the
+configured providers for each call according to a per-scene policy
+"""
+
+import time
+from collections import deque
+from enum import Enum
+from typing import Deque, Dict, List, Optional, Tuple, Any
+
+from app.config import settings
+from app.models.llm_log import LLMScene
+
+
+class RoutingPolicy(str, Enum):
+    """How to order candidate providers"""
+    PRIMARY = "primary"          # settings.LLM_PROVIDER first, others as fallbacks
+    FASTEST = "fastest"          # unmeasured first, then lowest rolling p50 latency
+    HEALTHIEST = "healthiest"    # lowest error rate, then lowest p95
+    CHEAPEST = "cheapest"        # lowest configured cost (LLM_PROVIDER_COSTS)
+
+
+def _percentile(sorted_values: List[int], pct: float) -> Optional[int]:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class ProviderStats:
+    """Rolling window of call outcomes for one provider"""
+
+    def __init__(self, window_seconds: float, max_samples: int):
+        self.window_seconds = window_seconds
+        self._samples: Deque[Tuple[float, int, bool]] = deque(maxlen=max_samples)
+        self._sorted: Optional[List[int]] = None
+
+    def record(self, latency_ms: int, ok: bool) -> None:
+        """Add one call outcome"""
+        self._samples.append((time.monotonic(), latency_ms, ok))
+        self._sorted = None
+
+    def _prune(self) -> None:
+        cutoff = time.monotonic() - self.window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+            self._sorted = None
+
+    def _latencies(self) -> List[int]:
+        self._prune()
+        if self._sorted is None:
+            # Only successful calls say anything about how fast a provider is
+            self._sorted = sorted(lat for _, lat, ok in self._samples if ok)
+        return self._sorted
+
+    @property
+    def samples(self) -> int:
+        self._prune()
+        return len(self._samples)
+
+    @property
+    def error_rate(self) -> float:
+        self._prune()
+        if not self._samples:
+            return 0.0
+        return sum(1 for _, _, ok in self._samples if not ok) / len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[int]:
+        """Latency percentile (ms) of successful calls in the window"""
+        return _percentile(self._latencies(), pct)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "error_rate": round(self.error_rate, 3),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+        }
+
+
+class LLMRouter:
+    """
+    Latency- and health-aware provider ordering
+
+    A provider is degraded when its rolling error rate reaches
+    LLM_ROUTER_ERROR_THRESHOLD over at least LLM_ROUTER_MIN_SAMPLES calls;
+    degraded providers are only tried after all healthy ones.
+    """
+
+    def __init__(
+        self,
+        window_seconds: Optional[float] = None,
+        max_samples: int = 500,
+    ):
+        self.window_seconds = window_seconds or settings.LLM_ROUTER_WINDOW_SECONDS
+        self.max_samples = max_samples
+        self._stats: Dict[str, ProviderStats] = {}
+
+    def stats(self, provider: str) -> ProviderStats:
+        """Rolling stats for a provider (created on first use)"""
+        stats = self._stats.get(provider)
+        if stats is None:
+            stats = ProviderStats(self.window_seconds, self.max_samples)
+            self._stats[provider] = stats
+        return stats
+
+    def record(self, provider: str, latency_ms: int, ok: bool) -> None:
+        """Record the outcome of one upstream call"""
+        self.stats(provider).record(latency_ms, ok)
+
+    def is_degraded(self, provider: str) -> bool:
+        stats = self.stats(provider)
+        return (
+            stats.samples >= settings.LLM_ROUTER_MIN_SAMPLES
+            and stats.error_rate >= settings.LLM_ROUTER_ERROR_THRESHOLD
+        )
+
+    @staticmethod
+    def policy_for(scene: LLMScene) -> RoutingPolicy:
+        """Configured routing policy for a scene"""
+        value = settings.LLM_ROUTING_POLICIES.get(scene.value, RoutingPolicy.PRIMARY.value)
+        try:
+            return RoutingPolicy(value)
+        except ValueError:
+            return RoutingPolicy.PRIMARY
+
+    def _sort_key(self, provider: str, policy: RoutingPolicy) -> Tuple:
+        stats = self.stats(provider)
+        p50 = stats.percentile(50)
+        p95 = stats.percentile(95)
+        if policy == RoutingPolicy.FASTEST:
+            # Never-called providers go first so they get measured at all;
+            # ones that have only failed sort after those with a latency
+            return (stats.samples > 0, p50 is None, p50 or 0)
+        # Providers without data sort as "unknown" after measured ones
+        if policy == RoutingPolicy.HEALTHIEST:
+            return (stats.error_rate, p95 is None, p95 or 0)
+        if policy == RoutingPolicy.CHEAPEST:
+            return (settings.LLM_PROVIDER_COSTS.get(provider, float("inf")),)
+        return (provider != settings.LLM_PROVIDER,)
+
+    def rank(self, scene: LLMScene, candidates: List[str]) -> List[str]:
+        """
+        Order candidate providers for a call
+
+        Args:
+            scene: Usage scene (selects the routing policy)
+            candidates: Configured provider types
+
+        Returns:
+            Providers to try, best first; degraded ones last
+        """
+        policy = self.policy_for(scene)
+        # sorted() is stable, so ties keep the primary-first default order
+        base = sorted(candidates, key=lambda p: p != settings.LLM_PROVIDER)
+        return sorted(
+            base,
+            key=lambda p: (self.is_degraded(p), self._sort_key(p, policy)),
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Per-provider rolling stats and routing policies for reporting"""
+        return {
+            "policies": {scene.value: self.policy_for(scene).value for scene in LLMScene},
+            "providers": {
+                name: {**stats.snapshot(), "degraded": self.is_degraded(name)}
+                for name, stats in self._stats.items()
+            },
+        }
@@ -0,0 +1,173 @@
+"""
+LLM Single-Flight
+
+Coalesces identical in-flight LLM calls: concurrent callers with the same
+request share one upstream call, and one upstream stream is fanned out to
+every subscriber
+"""
+
+import asyncio
+import hashlib
+import json
+from dataclasses import dataclass, asdict
+from typing import AsyncIterator, Awaitable, Callable, Dict, Any, List, Optional, Tuple
+
+from app.core.llm.base import Message, LLMResponse, StreamChunk
+from app.models.llm_log import LLMScene
+
+
+def request_fingerprint(
+    scene: LLMScene,
+    provider_type: Optional[str],
+    messages: List[Message],
+    kwargs: Dict[str, Any],
+) -> str:
+    """sha256 of everything that determines what a call returns"""
+    payload = json.dumps(
+        {
+            "scene": scene.value,
+            "provider": provider_type,
+            "messages": [[m.role, m.content] for m in messages],
+            "kwargs": kwargs,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class FlightStats:
+    """Coalescing counters"""
+    calls: int = 0              # chat() calls that reached the upstream layer
+    coalesced: int = 0          # of those, joined an in-flight call
+    streams: int = 0            # chat_stream() subscriptions
+    streams_coalesced: int = 0  # of those, joined an in-flight stream
+
+
+class _StreamFlight:
+    """
+    One upstream stream shared by several subscribers
+
+    Chunks are buffered so a subscriber that joins late replays what it
+    missed. The upstream is cancelled once every subscriber has gone.
+    """
+
+    def __init__(self):
+        self.chunks: List[StreamChunk] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._cond = asyncio.Condition()
+
+    async def produce(self, source: AsyncIterator[StreamChunk]) -> None:
+        try:
+            async for chunk in source:
+                async with self._cond:
+                    self.chunks.append(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            # Wake subscribers so they see the end (or the error)
+            async with self._cond:
+                self._cond.notify_all()
+            # Cancelled between chunks the source is left suspended: close it
+            # (and the upstream response) now, not when it is collected
+            aclose = getattr(source, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    async def subscribe(self) -> AsyncIterator[StreamChunk]:
+        index = 0
+        while True:
+            async with self._cond:
+                await self._cond.wait_for(lambda: self.done or len(self.chunks) > index)
+                new = self.chunks[index:]
+                finished = self.done
+            for chunk in new:
+                yield chunk
+            index += len(new)
+            if finished and index >= len(self.chunks):
+                if self.error is not None:
+                    raise self.error
+                return
+
+
+class SingleFlight:
+    """
+    Registry of in-flight calls, keyed by request fingerprint
+
+    Flights are tracked per event loop: tasks and futures cannot be awaited
+    from another loop.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Tuple[asyncio.AbstractEventLoop, str], asyncio.Task] = {}
+        self._streams: Dict[Tuple[asyncio.AbstractEventLoop, str], _StreamFlight] = {}
+        self.stats = FlightStats()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[LLMResponse]]) -> LLMResponse:
+        """
+        Run fn() unless an identical call is already in flight
+
+        The shared call runs as its own task and is shielded, so one caller
+        giving up does not cancel it for the others.
+        """
+        flight_key = (asyncio.get_running_loop(), key)
+        self.stats.calls += 1
+
+        task = self._calls.get(flight_key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            task = asyncio.create_task(fn())
+            self._calls[flight_key] = task
+            task.add_done_callback(lambda t: self._forget(self._calls, flight_key, t))
+        return await asyncio.shield(task)
+
+    async def stream(
+        self,
+        key: str,
+        fn: Callable[[], AsyncIterator[StreamChunk]],
+    ) -> AsyncIterator[StreamChunk]:
+        """Subscribe to an identical in-flight stream, or start one"""
+        flight_key = (asyncio.get_running_loop(), key)
+        self.stats.streams += 1
+
+        flight = self._streams.get(flight_key)
+        if flight is not None:
+            self.stats.streams_coalesced += 1
+        else:
+            flight = _StreamFlight()
+            self._streams[flight_key] = flight
+            flight.task = asyncio.create_task(flight.produce(fn()))
+            flight.task.add_done_callback(lambda _: self._forget(self._streams, flight_key, flight))
+
+        flight.subscribers += 1
+        try:
+            async for chunk in flight.subscribe():
+                yield chunk
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening any more; later callers start afresh
+                # rather than joining a truncated stream
+                self._forget(self._streams, flight_key, flight)
+                flight.task.cancel()
+
+    @staticmethod
+    def _forget(flights: Dict, flight_key: Tuple, flight: Any) -> None:
+        """Remove a finished flight unless a newer one took its key"""
+        if flights.get(flight_key) is flight:
+            del flights[flight_key]
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = asdict(self.stats)
+        data["in_flight_calls"] = len(self._calls)
+        data["in_flight_streams"] = len(self._streams)
+        return data
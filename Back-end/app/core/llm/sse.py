@@ -0,0 +1,100 @@
+"""
+Server-Sent Events Decoder
+
+Incremental byte-level SSE parser for streamed chat completions, with an
+optional orjson fast path for the JSON payloads
+"""
+
+import json
+from typing import Any, AsyncIterator, List, Optional
+
+import httpx
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def loads(data: bytes) -> Any:
+    """Parse a JSON payload (orjson when installed)"""
+    if orjson is not None:
+        return orjson.loads(data)
+    # json.loads(bytes) sniffs the encoding and decodes with surrogatepass,
+    # noticeably slower than a plain UTF-8 decode for small payloads
+    return json.loads(data.decode("utf-8"))
+
+
+class SSEDecoder:
+    """
+    Incremental SSE decoder working on raw bytes
+
+    Network chunks are split on b"\\n" directly, without decoding every line
+    to str first; only `data:` fields are kept (event/id/retry and comments
+    are not used by chat completion streams). An event is dispatched at the
+    blank line that ends it, multi-line data joined with b"\\n".
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._data: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """
+        Add received bytes
+
+        Returns:
+            Data payloads of the events completed by this chunk
+        """
+        if self._buffer:
+            chunk = self._buffer + chunk
+        lines = chunk.split(b"\n")
+        # The last piece is an incomplete line (or b"" after a newline)
+        self._buffer = lines.pop()
+
+        events: List[bytes] = []
+        data = self._data
+        for line in lines:
+            if line.endswith(b"\r"):
+                line = line[:-1]
+            if not line:
+                if data:
+                    events.append(data[0] if len(data) == 1 else b"\n".join(data))
+                    data.clear()
+            elif line.startswith(b"data:"):
+                value = line[5:]
+                data.append(value[1:] if value.startswith(b" ") else value)
+        return events
+
+    def flush(self) -> List[bytes]:
+        """Dispatch whatever is pending when the stream ends"""
+        events = self.feed(b"\n\n") if (self._buffer or self._data) else []
+        self._buffer = b""
+        return events
+
+
+async def iter_sse_data(response: httpx.Response) -> AsyncIterator[bytes]:
+    """
+    Yield the data payload of every event in a streamed response
+
+    Args:
+        response: An httpx response opened with client.stream()
+
+    Yields:
+        Raw payload bytes (e.g. b'{"choices": ...}' or b"[DONE]")
+    """
+    decoder = SSEDecoder()
+    async for chunk in response.aiter_bytes():
+        for data in decoder.feed(chunk):
+            yield data
+    for data in decoder.flush():
+        yield data
+
+
+def parse_json_event(data: bytes) -> Optional[Any]:
+    """Decode one event payload, None if it is not valid JSON"""
+    try:
+        return loads(data)
+    except ValueError:
+        # json.JSONDecodeError and orjson.JSONDecodeError both subclass it
+        return None
@@ -0,0 +1,249 @@
+"""
+LLM Usage Rollups
+
+Incremental per-minute/hour/day aggregation of LLM call logs, so usage
+queries read a bounded number of pre-aggregated rows instead of scanning
+llm_logs
+"""
+
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.llm_log import LLMScene, LLMStatus, LLMUsageRollup
+
+
+GRANULARITIES: Dict[str, timedelta] = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+
+# Upper bounds (ms) of the latency histogram buckets; one extra bucket
+# counts everything slower than the last bound
+LATENCY_BUCKETS_MS: List[int] = [
+    50, 100, 200, 300, 500, 750, 1000, 1500, 2000, 3000, 5000,
+    7500, 10000, 15000, 20000, 30000, 45000, 60000, 90000, 120000,
+]
+
+RollupKey = Tuple[str, datetime, str, str, LLMScene, Optional[int]]
+
+
+def bucket_start(ts: datetime, granularity: str) -> datetime:
+    """Start of the bucket containing ts"""
+    ts = ts.replace(second=0, microsecond=0)
+    if granularity == "minute":
+        return ts
+    ts = ts.replace(minute=0)
+    if granularity == "hour":
+        return ts
+    return ts.replace(hour=0)
+
+
+def bucket_ceil(ts: datetime, granularity: str) -> datetime:
+    """First bucket boundary at or after ts"""
+    start = bucket_start(ts, granularity)
+    return start if start == ts else start + GRANULARITIES[granularity]
+
+
+def latency_bucket(latency_ms: int) -> int:
+    for index, bound in enumerate(LATENCY_BUCKETS_MS):
+        if latency_ms <= bound:
+            return index
+    return len(LATENCY_BUCKETS_MS)
+
+
+def empty_histogram() -> List[int]:
+    return [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+
+def histogram_percentile(histogram: List[int], pct: float, max_ms: int = 0) -> Optional[float]:
+    """
+    Estimate a percentile from histogram counts
+
+    Interpolates linearly inside the bucket holding the target rank; the
+    overflow bucket is bounded by the observed maximum.
+
+    Returns:
+        Latency in ms, or None for an empty histogram
+    """
+    total = sum(histogram)
+    if total == 0:
+        return None
+    rank = pct / 100 * total
+    seen = 0
+    for index, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            lower = LATENCY_BUCKETS_MS[index - 1] if index > 0 else 0
+            upper = LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else max(max_ms, lower)
+            if max_ms:
+                upper = min(upper, max(max_ms, lower))
+            fraction = (rank - seen) / count
+            return round(lower + (upper - lower) * fraction, 1)
+        seen += count
+    return float(max_ms)
+
+
+def window_segments(start: datetime, end: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """
+    Cover [start, end) with the fewest rollup buckets
+
+    Whole days are read from day rollups, the hours at either edge from
+    hour rollups and the remaining minutes from minute rollups, so the
+    number of buckets read is at most ~160 plus one per day in the window.
+    Minute resolution is the finest: start and end are truncated to it.
+
+    Returns:
+        (granularity, from, to) ranges of bucket_start values
+    """
+    start = bucket_start(start, "minute")
+    end = bucket_start(end, "minute")
+    if end <= start:
+        return []
+
+    h0, h1 = bucket_ceil(start, "hour"), bucket_start(end, "hour")
+    if h0 >= h1:
+        return [("minute", start, end)]
+
+    segments = []
+    if start < h0:
+        segments.append(("minute", start, h0))
+    if h1 < end:
+        segments.append(("minute", h1, end))
+
+    d0, d1 = bucket_ceil(h0, "day"), bucket_start(h1, "day")
+    if d0 >= d1:
+        segments.append(("hour", h0, h1))
+    else:
+        if h0 < d0:
+            segments.append(("hour", h0, d0))
+        if d1 < h1:
+            segments.append(("hour", d1, h1))
+        segments.append(("day", d0, d1))
+    return segments
+
+
+def segments_clause(segments: List[Tuple[str, datetime, datetime]]):
+    """WHERE clause selecting the rollup rows of window_segments()"""
+    return or_(*(
+        and_(
+            LLMUsageRollup.granularity == granularity,
+            LLMUsageRollup.bucket_start >= lower,
+            LLMUsageRollup.bucket_start < upper,
+        )
+        for granularity, lower, upper in segments
+    ))
+
+
+def _rollup_key(granularity: str, row: Dict[str, Any]) -> RollupKey:
+    return (
+        granularity,
+        bucket_start(row["created_at"], granularity),
+        row["provider"],
+        row["model"],
+        LLMScene(row["scene"]),
+        row.get("user_id"),
+    )
+
+
+def _existing_key(rollup: LLMUsageRollup) -> RollupKey:
+    return (
+        rollup.granularity,
+        rollup.bucket_start,
+        rollup.provider,
+        rollup.model,
+        rollup.scene,
+        rollup.user_id,
+    )
+
+
+async def apply_rollups(db: AsyncSession, rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Fold a batch of call log rows into the rollup tables
+
+    Runs in the same transaction as the raw insert. On SQLite that insert
+    already holds the database write lock, so the read-modify-write of the
+    rollup rows cannot interleave with another writer.
+
+    Args:
+        db: Session the batch is being written with (not committed here)
+        rows: LLMLog column values as queued by the log writer
+
+    Returns:
+        Number of rollup rows touched
+    """
+    deltas: Dict[RollupKey, Dict[str, Any]] = {}
+    for row in rows:
+        for granularity in GRANULARITIES:
+            key = _rollup_key(granularity, row)
+            delta = deltas.get(key)
+            if delta is None:
+                delta = {
+                    "calls": 0, "success": 0, "failed": 0, "timeout": 0,
+                    "prompt_tokens": 0, "completion_tokens": 0,
+                    "latency_sum": 0, "latency_max": 0, "histogram": empty_histogram(),
+                }
+                deltas[key] = delta
+            delta["calls"] += 1
+            status = LLMStatus(row["status"])
+            if status == LLMStatus.SUCCESS:
+                delta["success"] += 1
+            elif status == LLMStatus.TIMEOUT:
+                delta["timeout"] += 1
+            else:
+                delta["failed"] += 1
+            delta["prompt_tokens"] += row.get("prompt_tokens") or 0
+            delta["completion_tokens"] += row.get("completion_tokens") or 0
+            latency = row.get("latency_ms")
+            if latency is not None:
+                delta["latency_sum"] += latency
+                delta["latency_max"] = max(delta["latency_max"], latency)
+                delta["histogram"][latency_bucket(latency)] += 1
+
+    if not deltas:
+        return 0
+
+    # One query for every bucket this batch touches
+    buckets = {(key[0], key[1]) for key in deltas}
+    result = await db.execute(
+        select(LLMUsageRollup).where(or_(*(
+            and_(LLMUsageRollup.granularity == g, LLMUsageRollup.bucket_start == b)
+            for g, b in buckets
+        )))
+    )
+    existing = {_existing_key(r): r for r in result.scalars()}
+
+    for key, delta in deltas.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            granularity, start, provider, model, scene, user_id = key
+            rollup = LLMUsageRollup(
+                granularity=granularity,
+                bucket_start=start,
+                provider=provider,
+                model=model,
+                scene=scene,
+                user_id=user_id,
+                calls=0, success_count=0, failed_count=0, timeout_count=0,
+                prompt_tokens=0, completion_tokens=0,
+                latency_sum_ms=0, latency_max_ms=0,
+                latency_histogram=empty_histogram(),
+            )
+            db.add(rollup)
+        rollup.calls += delta["calls"]
+        rollup.success_count += delta["success"]
+        rollup.failed_count += delta["failed"]
+        rollup.timeout_count += delta["timeout"]
+        rollup.prompt_tokens += delta["prompt_tokens"]
+        rollup.completion_tokens += delta["completion_tokens"]
+        rollup.latency_sum_ms += delta["latency_sum"]
+        rollup.latency_max_ms = max(rollup.latency_max_ms, delta["latency_max"])
+        # Assign a new list: in-place changes to a JSON column are not tracked
+        histogram = list(rollup.latency_histogram or empty_histogram())
+        histogram += [0] * (len(delta["histogram"]) - len(histogram))
+        rollup.latency_histogram = [a + b for a, b in zip(histogram, delta["histogram"])]
+
+    await db.flush()
+    return len(deltas)
@@ -0,0 +1,479 @@
+"""
+Prometheus Metrics
+
+Dependency-free counters, gauges and histograms rendered in the Prometheus
+text exposition format, an ASGI middleware for per-route request metrics,
+and database engine instrumentation.
+
+Multi-worker: with METRICS_MULTIPROC_DIR set, every worker periodically
+writes a snapshot of its metrics to that directory and /metrics merges the
+snapshots of all workers, so any worker answers for the whole service.
+"""
+
+import asyncio
+import glob
+import json
+import math
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from app.config import settings
+
+
+LabelValues = Tuple[str, ...]
+
+# Default buckets (seconds)
+HTTP_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+LLM_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 30, 60, 120, 300)
+
+
+# ===================================
+# Metric types
+# ===================================
+
+class _Histogram:
+    """Bucket counts (non-cumulative, last = +Inf), sum and count"""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the duration of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Metric:
+    """
+    A named metric family
+
+    Children are created per label value tuple and cached, so recording is
+    a dict lookup and an addition. Metrics are updated from the event loop
+    thread only and need no locking.
+    """
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[LabelValues, Any] = {}
+        REGISTRY.register(self)
+
+    def _new_child(self) -> Any:
+        return _Value()
+
+    def labels(self, *values: Any) -> Any:
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._new_child()
+            self._children[key] = child
+        return child
+
+    def samples(self) -> Dict[LabelValues, Any]:
+        """Current state per label tuple (float, or histogram state)"""
+        return {key: child.value for key, child in self._children.items()}
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    """
+    Gauge; set_function() makes it computed when metrics are collected
+    (e.g. a queue length), so nothing is recorded on the hot path
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def set_function(self, fn: Callable[[], float]) -> None:
+        self._function = fn
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def samples(self) -> Dict[LabelValues, Any]:
+        if self._function is not None:
+            try:
+                return {(): float(self._function())}
+            except Exception:
+                return {}
+        return super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = HTTP_BUCKETS,
+    ):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self) -> _Histogram:
+        return _Histogram(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def samples(self) -> Dict[LabelValues, Any]:
+        return {
+            key: child.counts + [child.sum, child.count]
+            for key, child in self._children.items()
+        }
+
+
+# ===================================
+# Registry and exposition
+# ===================================
+
+class MetricsRegistry:
+    """All metrics of the process"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> None:
+        if metric.name in self._metrics:
+            raise ValueError(f"Duplicate metric {metric.name}")
+        self._metrics[metric.name] = metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        """This process's samples in a JSON-serializable form"""
+        return {
+            "pid": os.getpid(),
+            "metrics": {
+                name: [[list(key), value] for key, value in metric.samples().items()]
+                for name, metric in self._metrics.items()
+            },
+        }
+
+    # -------------------------------
+    # Multi-worker snapshots
+    # -------------------------------
+
+    @staticmethod
+    def _snapshot_path(directory: str, pid: int) -> str:
+        return os.path.join(directory, f"metrics_{pid}.json")
+
+    def write_snapshot(self, directory: str) -> None:
+        """Atomically replace this worker's snapshot file"""
+        path = self._snapshot_path(directory, os.getpid())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.snapshot(), f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    def _merged_samples(self, directory: str) -> Dict[str, Dict[LabelValues, Any]]:
+        """
+        Sum the snapshots of all workers
+
+        Counters and histograms of exited workers are kept, so totals never
+        go backwards; gauges (in-flight requests, queue depth) only count
+        workers that are still alive.
+        """
+        merged: Dict[str, Dict[LabelValues, Any]] = {name: {} for name in self._metrics}
+        for path in glob.glob(os.path.join(directory, "metrics_*.json")):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # being replaced or truncated
+            alive = _pid_alive(data.get("pid", 0))
+            for name, samples in data.get("metrics", {}).items():
+                metric = self._metrics.get(name)
+                if metric is None or (metric.kind == "gauge" and not alive):
+                    continue
+                target = merged[name]
+                for key, value in samples:
+                    key = tuple(key)
+                    current = target.get(key)
+                    if current is None:
+                        target[key] = value
+                    elif isinstance(value, list):
+                        if len(current) == len(value):
+                            target[key] = [a + b for a, b in zip(current, value)]
+                    else:
+                        target[key] = current + value
+        return merged
+
+    def render(self, directory: Optional[str] = None) -> str:
+        """
+        Prometheus text exposition format (version 0.0.4)
+
+        Args:
+            directory: Snapshot directory to merge (multi-worker), or None
+                for this process only
+        """
+        if directory:
+            self.write_snapshot(directory)
+            samples_by_name = self._merged_samples(directory)
+        else:
+            samples_by_name = {name: m.samples() for name, m in self._metrics.items()}
+
+        lines: List[str] = []
+        for name, metric in self._metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            for key, value in sorted(samples_by_name.get(name, {}).items()):
+                labels = list(zip(metric.labelnames, key))
+                if metric.kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip(list(metric.buckets) + [math.inf], value):
+                        cumulative += count
+                        le = "+Inf" if bound == math.inf else _format_value(bound)
+                        lines.append(f"{name}_bucket{_format_labels(labels + [('le', le)])} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(value[-2])}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {_format_value(value[-1])}")
+                else:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: List[Tuple[str, str]]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = MetricsRegistry()
+
+
+def render_metrics() -> str:
+    """Exposition text for the /metrics endpoint"""
+    return REGISTRY.render(settings.METRICS_MULTIPROC_DIR or None)
+
+
+async def run_snapshot_writer() -> None:
+    """Write this worker's snapshot every METRICS_FLUSH_SECONDS (multi-worker mode)"""
+    directory = settings.METRICS_MULTIPROC_DIR
+    os.makedirs(directory, exist_ok=True)
+    try:
+        while True:
+            try:
+                REGISTRY.write_snapshot(directory)
+            except OSError as e:
+                print(f"[监控] 写入指标快照失败: {e}")
+            await asyncio.sleep(settings.METRICS_FLUSH_SECONDS)
+    finally:
+        # Final counts of a worker that is shutting down
+        try:
+            REGISTRY.write_snapshot(directory)
+        except OSError:
+            pass
+
+
+# ===================================
+# Application metrics
+# ===================================
+
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route",
+    ["method", "route"], buckets=HTTP_BUCKETS,
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being served")
+
+DB_ACQUIRE_SECONDS = Histogram(
+    "db_connection_acquire_seconds", "Time to check a connection out of the pool",
+    buckets=DB_BUCKETS,
+)
+DB_COMMIT_SECONDS = Histogram(
+    "db_commit_duration_seconds", "Time of database commits (includes SQLite lock waits)",
+    buckets=DB_BUCKETS,
+)
+
+LLM_REQUESTS = Counter(
+    "llm_requests_total", "LLM call attempts by provider, scene and outcome",
+    ["provider", "scene", "status"],
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "llm_request_duration_seconds", "LLM call attempt latency",
+    ["provider", "scene"], buckets=LLM_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "llm_tokens_total", "LLM tokens by provider, scene and kind (prompt/completion)",
+    ["provider", "scene", "kind"],
+)
+
+PIPELINE_STAGE_SECONDS = Histogram(
+    "pipeline_stage_duration_seconds", "Question pipeline stage duration (generate/validate/review/fix)",
+    ["stage"], buckets=LLM_BUCKETS,
+)
+
+PIPELINE_STAGE_BUSY = Gauge(
+    "pipeline_stage_busy_workers", "Pipelined generation workers currently working, by stage", ["stage"],
+)
+PIPELINE_STAGE_STATE_SECONDS = Counter(
+    "pipeline_stage_state_seconds_total",
+    "Pipelined generation worker time by stage, provider and state (busy/starved/blocked)",
+    ["stage", "provider", "state"],
+)
+PIPELINE_QUEUE_DEPTH = Gauge(
+    "pipeline_queue_depth", "Questions waiting in the queue in front of a pipelined stage", ["queue"],
+)
+
+GENERATION_JOBS_RUNNING = Gauge("generation_jobs_running", "Generation jobs running in this process")
+GENERATION_JOBS_FINISHED = Counter(
+    "generation_jobs_finished_total", "Generation jobs finished, by final status", ["status"],
+)
+
+GRADING_QUEUE_DEPTH = Gauge("grading_queue_depth", "Submitted attempts waiting for or in background grading")
+GRADING_QUEUE_OLDEST_SECONDS = Gauge(
+    "grading_queue_oldest_age_seconds", "Age of the oldest attempt in the grading queue",
+)
+GRADING_TASKS_FINISHED = Counter(
+    "grading_tasks_finished_total", "Grading tries finished, by outcome (done/retried/failed)", ["outcome"],
+)
+
+
+# ===================================
+# Instrumentation
+# ===================================
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency, status and in-flight
+    count
+
+    Routes are labelled with their path template (/api/exams/{exam_id}),
+    so label cardinality stays bounded. Streaming responses are timed to
+    the last byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_REQUEST_SECONDS.labels(method, path).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, path, status_code).inc()
+
+
+def instrument_engine(sync_engine) -> None:
+    """
+    Time connection checkout and commits on a SQLAlchemy engine
+
+    Wraps the engine's raw_connection() (pool checkout, including waiting
+    for a free connection) and its dialect's do_commit() (on SQLite this
+    is where a writer waits for the database lock).
+    """
+    raw_connection = sync_engine.raw_connection
+    do_commit = sync_engine.dialect.do_commit
+
+    def timed_raw_connection(*args, **kwargs):
+        with DB_ACQUIRE_SECONDS.time():
+            return raw_connection(*args, **kwargs)
+
+    def timed_commit(dbapi_connection):
+        with DB_COMMIT_SECONDS.time():
+            do_commit(dbapi_connection)
+
+    sync_engine.raw_connection = timed_raw_connection
+    sync_engine.dialect.do_commit = timed_commit
@@ -0,0 +1,430 @@
+"""
+Request Tracing
+
+Lightweight spans following one request from the API through the services
+and the database to the LLM providers. The current span lives in a
+contextvar, so child spans and log rows pick up the trace without any
+plumbing; background tasks created inside a span inherit it too.
+
+Finished spans are buffered and exported in batches by a background task,
+either as OTLP/HTTP JSON to a collector (Jaeger, Tempo, the OpenTelemetry
+Collector, ...) or as JSON lines to a local file. The OpenTelemetry SDK is
+not required: the wire format is produced here.
+"""
+
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from app.config import settings
+
+
+# OTLP span kinds
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+# Longest SQL statement kept on a db span
+_MAX_STATEMENT = 500
+
+
+@dataclass
+class Span:
+    """One timed operation within a trace"""
+    name: str
+    trace_id: str                       # 32 hex chars
+    span_id: str                        # 16 hex chars
+    parent_id: Optional[str] = None
+    kind: int = KIND_INTERNAL
+    sampled: bool = True
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            tracer.on_end(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Flat form written by the file exporter"""
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """OTLP/JSON span"""
+        span: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(getattr(value, "value", value))}
+    return {"key": key, "value": typed}
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace ID of the running request, if any (stored on LLMLog rows)"""
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """
+    Parse a W3C traceparent header
+
+    Returns:
+        (trace_id, parent span_id, sampled), or None if absent or invalid
+    """
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    trace_id, span_id, flags = parts[1].lower(), parts[2].lower(), parts[3]
+    try:
+        int(trace_id, 16), int(span_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return trace_id, span_id, sampled
+
+
+class Tracer:
+    """
+    Span factory and export buffer
+
+    The sampling decision is made once per trace (at the root span, or by
+    the caller's traceparent) and inherited by every child. Unsampled spans
+    are still created, so trace IDs reach the call logs, but never exported.
+    With TRACING_EXPORTER=none nothing is buffered at all.
+    """
+
+    def __init__(self):
+        self.exporter = settings.TRACING_EXPORTER if settings.TRACING_ENABLED else "none"
+        self.sample_ratio = settings.TRACING_SAMPLE_RATIO
+        self._buffer: Deque[Span] = deque()
+        self.exported = 0
+        self.dropped = 0
+
+    @property
+    def exporting(self) -> bool:
+        return self.exporter != "none"
+
+    def start_span(
+        self,
+        name: str,
+        kind: int = KIND_INTERNAL,
+        attributes: Optional[Dict[str, Any]] = None,
+        parent: Optional[Span] = None,
+        remote_parent: Optional[Tuple[str, str, bool]] = None,
+    ) -> Span:
+        """
+        Create a span without making it current (call end() when done)
+
+        Args:
+            parent: Parent span; defaults to the current span
+            remote_parent: (trace_id, span_id, sampled) from an incoming
+                traceparent header, used when there is no local parent
+        """
+        parent = parent or _current_span.get()
+        if parent is not None:
+            trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+        elif remote_parent is not None:
+            trace_id, parent_id, sampled = remote_parent
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+            sampled = random.random() < self.sample_ratio
+        return Span(
+            name=name,
+            trace_id=trace_id,
+            span_id=os.urandom(8).hex(),
+            parent_id=parent_id,
+            kind=kind,
+            sampled=sampled,
+            attributes=dict(attributes) if attributes else {},
+        )
+
+    @contextmanager
+    def span(self, name: str, kind: int = KIND_INTERNAL, **attributes: Any) -> Iterator[Span]:
+        """Run the with-block as the current span"""
+        span = self.start_span(name, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def on_end(self, span: Span) -> None:
+        if not (span.sampled and self.exporting):
+            return
+        if len(self._buffer) >= settings.TRACING_MAX_BUFFER:
+            # Drop the oldest: the exporter is behind or the collector is down
+            self._buffer.popleft()
+            self.dropped += 1
+        self._buffer.append(span)
+
+    async def flush(self) -> int:
+        """
+        Export everything buffered so far
+
+        Returns:
+            Number of spans exported
+        """
+        if not self._buffer:
+            return 0
+        spans = list(self._buffer)
+        self._buffer.clear()
+        try:
+            if self.exporter == "otlp":
+                await self._export_otlp(spans)
+            else:
+                await asyncio.to_thread(self._export_file, spans)
+        except Exception as e:
+            # Tracing is best effort: losing a batch must not affect requests
+            self.dropped += len(spans)
+            print(f"[监控] 导出追踪数据失败, 丢弃 {len(spans)} 条: {e}")
+            return 0
+        self.exported += len(spans)
+        return len(spans)
+
+    def _export_file(self, spans: List[Span]) -> None:
+        path = settings.TRACING_FILE
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n")
+
+    async def _export_otlp(self, spans: List[Span]) -> None:
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    _otlp_attribute("service.name", settings.TRACING_SERVICE_NAME),
+                    _otlp_attribute("service.version", settings.APP_VERSION),
+                    _otlp_attribute("deployment.environment", settings.ENVIRONMENT),
+                ]},
+                "scopeSpans": [{
+                    "scope": {"name": "app.core.tracing"},
+                    "spans": [span.to_otlp() for span in spans],
+                }],
+            }],
+        }
+        async with httpx.AsyncClient(timeout=10) as client:
+            response = await client.post(settings.TRACING_OTLP_ENDPOINT, json=payload)
+            response.raise_for_status()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "exporter": self.exporter,
+            "sample_ratio": self.sample_ratio,
+            "buffered": len(self._buffer),
+            "exported": self.exported,
+            "dropped": self.dropped,
+        }
+
+
+# Process-wide tracer
+tracer = Tracer()
+
+
+def span(name: str, kind: int = KIND_INTERNAL, **attributes: Any):
+    """Shorthand for tracer.span()"""
+    return tracer.span(name, kind, **attributes)
+
+
+async def run_exporter() -> None:
+    """Export buffered spans every TRACING_EXPORT_INTERVAL_SECONDS (background task)"""
+    try:
+        while True:
+            await asyncio.sleep(settings.TRACING_EXPORT_INTERVAL_SECONDS)
+            await tracer.flush()
+    finally:
+        # Spans of the last requests before shutdown
+        await asyncio.shield(tracer.flush())
+
+
+# ===================================
+# ASGI and database instrumentation
+# ===================================
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening the root span of every HTTP request
+
+    Continues the caller's trace when a traceparent header is sent, and
+    returns the trace ID in an X-Trace-Id response header so a slow or
+    failed request can be looked up in the collector and in llm_logs.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        method = scope.get("method", "")
+        root = tracer.start_span(
+            f"{method} {scope.get('path', '')}",
+            kind=KIND_SERVER,
+            attributes={"http.method": method, "http.target": scope.get("path", "")},
+            remote_parent=parse_traceparent(traceparent),
+        )
+        token = _current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    root.error = root.error or f"HTTP {message['status']}"
+                headers = list(message.get("headers", []))
+                headers.append((b"x-trace-id", root.trace_id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            root.record_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            # Name by route template so spans group like the metrics do
+            route = scope.get("route")
+            path = getattr(route, "path", None)
+            if path:
+                root.name = f"{method} {path}"
+                root.set_attribute("http.route", path)
+            root.end()
+
+
+def instrument_engine(sync_engine) -> None:
+    """
+    Record a span for every statement and commit on a SQLAlchemy engine
+
+    DB spans are leaves and are only created while exporting, inside a
+    sampled trace; they never become the current span.
+    """
+    from sqlalchemy import event
+
+    system = sync_engine.dialect.name
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        parent = _current_span.get()
+        if parent is None or not parent.sampled or not tracer.exporting:
+            return
+        operation = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "SQL"
+        context._trace_span = tracer.start_span(
+            f"db.{operation.lower()}",
+            kind=KIND_CLIENT,
+            attributes={
+                "db.system": system,
+                "db.operation": operation,
+                "db.statement": statement[:_MAX_STATEMENT],
+                "db.executemany": executemany,
+            },
+            parent=parent,
+        )
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        span = getattr(context, "_trace_span", None)
+        if span is not None:
+            if cursor.rowcount is not None and cursor.rowcount >= 0:
+                span.set_attribute("db.rowcount", cursor.rowcount)
+            span.end()
+
+    @event.listens_for(sync_engine, "handle_error")
+    def _error(exception_context):
+        span = getattr(exception_context.execution_context, "_trace_span", None)
+        if span is not None:
+            span.record_error(exception_context.original_exception)
+            span.end()
+
+    do_commit = sync_engine.dialect.do_commit
+
+    def traced_commit(dbapi_connection):
+        parent = _current_span.get()
+        if parent is None or not parent.sampled or not tracer.exporting:
+            do_commit(dbapi_connection)
+            return
+        span = tracer.start_span("db.commit", KIND_CLIENT, {"db.system": system}, parent=parent)
+        try:
+            do_commit(dbapi_connection)
+        except BaseException as e:
+            span.record_error(e)
+            raise
+        finally:
+            span.end()
+
+    sync_engine.dialect.do_commit = traced_commit
@@ -4,6 +4,7 @@ Database Initialization
 Create all tables and initial data
 """
 
+from sqlalchemy import inspect
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.base import Base
@@ -18,14 +19,60 @@ async def init_db() -> None:
     """
     async with engine.begin() as conn:
         # Import all models here to ensure they are registered
-        from app.models import user, course, question, exam, llm_log  # noqa: F401
+        from app.models import user, course, question, exam, llm_log, generation_job  # noqa: F401
 
         # Create all tables
         await conn.run_sync(Base.metadata.create_all)
+        # create_all skips new columns and indexes of tables that already exist
+        await conn.run_sync(_add_missing_columns)
+        await conn.run_sync(_create_missing_indexes)
 
         print("[启动] 数据库初始化完成")
 
 
+def _add_missing_columns(conn) -> None:
+    """
+    Add columns added to models after their table was created
+
+    Nullable columns are added as they are; NOT NULL columns only when they
+    have a server default to fill existing rows. Anything else (e.g. a NOT
+    NULL column without a server default) needs a real migration and is
+    reported instead of skipped silently.
+    """
+    inspector = inspect(conn)
+    ddl_compiler = conn.dialect.ddl_compiler(conn.dialect, None)
+    tables = set(inspector.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {c["name"] for c in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if column.primary_key or (not column.nullable and column.server_default is None):
+                print(
+                    f"[启动] ⚠ 警告: 数据表 {table.name} 缺少字段 {column.name}, "
+                    f"无法自动添加 (NOT NULL 且无默认值), 请手动迁移数据库"
+                )
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            ddl = f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" {column_type}'
+            default = ddl_compiler.get_column_default_string(column)
+            if default is not None:
+                ddl += f" DEFAULT {default}"
+            if not column.nullable:
+                ddl += " NOT NULL"
+            conn.exec_driver_sql(ddl)
+            print(f"[启动] 数据表 {table.name} 新增字段 {column.name}")
+
+
+def _create_missing_indexes(conn) -> None:
+    """Create indexes added to models after their table was created"""
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
 async def create_initial_data(db: AsyncSession) -> None:
     """
     Create initial data for the application
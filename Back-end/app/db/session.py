@@ -12,6 +12,8 @@ from sqlalchemy.ext.asyncio import (
 )
 
 from app.config import settings
+from app.core.metrics import instrument_engine
+from app.core import tracing
 
 
 # Create async engine with SQLite
@@ -24,6 +26,14 @@ engine = create_async_engine(
     connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
 )
 
+if settings.METRICS_ENABLED:
+    # Connection acquire and commit time for /metrics
+    instrument_engine(engine.sync_engine)
+
+if settings.TRACING_ENABLED:
+    # Per-statement and commit spans under the current request's trace
+    tracing.instrument_engine(engine.sync_engine)
+
 # Create async session factory
 async_session_maker = async_sessionmaker(
     engine,
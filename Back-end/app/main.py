@@ -4,13 +4,22 @@ FastAPI Application Entry Point
 High-performance FastAPI backend service for LLM-powered quiz system
 """
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
 from app.config import settings
 from app.db import init_db
+from app.core.llm.http_client import init_http_client, close_http_client
+from app.core.llm.log_writer import llm_log_writer
+from app.core.metrics import MetricsMiddleware, render_metrics, run_snapshot_writer
+from app.core.tracing import TracingMiddleware, run_exporter, tracer
+from app.services.llm_service import provider_registry
+from app.services.llm_usage_service import run_retention
+from app.services.generation_job_service import generation_job_runner
+from app.services.grading_queue_service import grading_queue
 from app.api import auth_router, llm_router, questions_router, courses_router, exams_router, question_bank_router
 
 
@@ -24,9 +33,48 @@ async def lifespan(app: FastAPI):
     # Initialize database
     await init_db()
 
+    # Shared LLM HTTP connection pool and provider registry
+    await init_http_client()
+    purged = await provider_registry.cache.purge_expired()
+    if purged:
+        print(f"[启动] 清理过期LLM缓存 {purged} 条")
+    llm_log_writer.start()
+    # Generation job workers (resume jobs interrupted by a restart)
+    generation_job_runner.start()
+    # Grading workers (resume grading left pending by a restart)
+    grading_queue.start()
+    retention_task = asyncio.create_task(run_retention())
+    metrics_task = None
+    if settings.METRICS_ENABLED and settings.METRICS_MULTIPROC_DIR:
+        metrics_task = asyncio.create_task(run_snapshot_writer())
+    tracing_task = None
+    if tracer.exporting:
+        tracing_task = asyncio.create_task(run_exporter())
+        print(f"[启动] 链路追踪导出: {tracer.exporter}")
+    warmup_task = None
+    if settings.LLM_WARMUP_ON_STARTUP:
+        # Don't block startup on slow or unreachable providers
+        warmup_task = asyncio.create_task(provider_registry.warmup())
+
     yield
 
     # Shutdown
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    retention_task.cancel()
+    # Running generation jobs go back to the queue
+    await generation_job_runner.stop()
+    # Attempts being graded go back to the grading queue
+    await grading_queue.stop()
+    if metrics_task:
+        metrics_task.cancel()
+    if tracing_task:
+        tracing_task.cancel()
+        await asyncio.gather(tracing_task, return_exceptions=True)
+    # Write out buffered LLM call logs before the loop goes away
+    await llm_log_writer.stop()
+    await close_http_client()
+    provider_registry.cache.close()
     print(f"[关闭] {settings.APP_NAME} 已停止")
 
 
@@ -49,9 +97,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition"],
+    expose_headers=["Content-Disposition", "X-Trace-Id"],
 )
 
+# 请求延迟/状态码/并发数指标 (按路由模板统计)
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# 链路追踪: 每个请求的根span, 响应头返回 X-Trace-Id
+if settings.TRACING_ENABLED:
+    app.add_middleware(TracingMiddleware)
+
 
 # ===================================
 # API Routers
@@ -101,6 +157,23 @@ async def api_health_check():
     )
 
 
+# ===================================
+# 监控指标接口
+# ===================================
+if settings.METRICS_ENABLED:
+    @app.get("/metrics", tags=["系统"], response_class=PlainTextResponse)
+    async def metrics():
+        """
+        Prometheus指标接口
+
+        HTTP请求、数据库连接与提交、LLM调用、出题流水线各阶段与批改队列的指标
+        """
+        return PlainTextResponse(
+            render_metrics(),
+            media_type="text/plain; version=0.0.4; charset=utf-8",
+        )
+
+
 # ===================================
 # 根路由
 # ===================================
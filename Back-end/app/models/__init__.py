@@ -19,8 +19,11 @@ from app.models.exam import (
     Attempt,
     AttemptStatus,
     AttemptAnswer,
+    GradingTask,
+    GradingTaskStatus,
 )
-from app.models.llm_log import LLMLog, LLMScene, LLMStatus
+from app.models.llm_log import LLMLog, LLMScene, LLMStatus, LLMUsageRollup
+from app.models.generation_job import GenerationJob, GenerationJobItem, GenerationJobStatus
 
 __all__ = [
     # User
@@ -41,8 +44,15 @@ __all__ = [
     "Attempt",
     "AttemptStatus",
     "AttemptAnswer",
+    "GradingTask",
+    "GradingTaskStatus",
     # LLM Log
     "LLMLog",
     "LLMScene",
     "LLMStatus",
+    "LLMUsageRollup",
+    # Generation Job
+    "GenerationJob",
+    "GenerationJobItem",
+    "GenerationJobStatus",
 ]
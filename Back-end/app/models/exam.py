@@ -8,7 +8,7 @@ import enum
 from datetime import datetime
 from typing import Optional, List, TYPE_CHECKING
 
-from sqlalchemy import String, Text, Integer, ForeignKey, Enum, JSON, DateTime, UniqueConstraint
+from sqlalchemy import String, Text, Integer, ForeignKey, Enum, JSON, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base, TimestampMixin
@@ -33,6 +33,14 @@ class AttemptStatus(str, enum.Enum):
     GRADED = "graded"            # Final graded by teacher
 
 
+class GradingTaskStatus(str, enum.Enum):
+    """Grading task status enumeration"""
+    PENDING = "pending"   # Waiting for a worker (or for its retry time)
+    RUNNING = "running"   # Claimed by a worker, until its lease expires
+    DONE = "done"         # Attempt graded
+    FAILED = "failed"     # Gave up after GRADING_MAX_ATTEMPTS tries
+
+
 class Exam(Base, TimestampMixin):
     """
     Exam model
@@ -209,3 +217,54 @@ class AttemptAnswer(Base, TimestampMixin):
 
     def __repr__(self) -> str:
         return f"<AttemptAnswer(attempt_id={self.attempt_id}, question_id={self.question_id})>"
+
+
+class GradingTask(Base, TimestampMixin):
+    """
+    GradingTask model
+
+    Background grading of a submitted attempt, queued in the same
+    transaction as the submission so no submission is lost
+
+    Attributes:
+        id: Primary key
+        attempt_id: Foreign key to the attempt to grade (one task per attempt)
+        status: Task status
+        attempts: Times the task was claimed
+        enqueued_at: When the attempt was submitted for grading
+        available_at: Not claimed before this time (retry backoff)
+        lease_expires_at: A running task whose lease expired is claimed again
+        last_error: Error of the last failed try
+        finished_at: When the task was done or given up
+    """
+
+    __tablename__ = "grading_tasks"
+    __table_args__ = (
+        # Claiming the next due task
+        Index("ix_grading_tasks_status_available_at", "status", "available_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    attempt_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("attempts.id", ondelete="CASCADE"),
+        nullable=False,
+        unique=True,
+    )
+    status: Mapped[GradingTaskStatus] = mapped_column(
+        Enum(GradingTaskStatus),
+        default=GradingTaskStatus.PENDING,
+        nullable=False,
+    )
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    enqueued_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    available_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    lease_expires_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    # Relationships
+    attempt: Mapped["Attempt"] = relationship("Attempt")
+
+    def __repr__(self) -> str:
+        return f"<GradingTask(id={self.id}, attempt_id={self.attempt_id}, status={self.status})>"
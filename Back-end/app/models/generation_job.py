@@ -0,0 +1,143 @@
+"""
+Generation Job Models
+
+Defines the GenerationJob table for asynchronous question generation and
+the GenerationJobItem table holding the questions it has produced
+"""
+
+import enum
+from datetime import datetime
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+from sqlalchemy import String, Text, Integer, ForeignKey, Enum, JSON, DateTime, Index, Boolean
+from sqlalchemy.orm import Mapped, mapped_column, relationship
+
+from app.db.base import Base, TimestampMixin
+
+if TYPE_CHECKING:
+    from app.models.user import User
+
+
+class GenerationJobStatus(str, enum.Enum):
+    """Generation job status enumeration"""
+    QUEUED = "queued"         # Waiting for a worker (also after a restart)
+    RUNNING = "running"       # Claimed by a worker
+    COMPLETED = "completed"   # Finished, all requested questions generated
+    FAILED = "failed"         # Finished with an error (partial results kept)
+    CANCELLED = "cancelled"   # Cancelled by the user (partial results kept)
+
+
+class GenerationJob(Base, TimestampMixin):
+    """
+    GenerationJob model
+
+    One asynchronous run of the generation pipeline. Work is done in units
+    (one shard of the request each); a finished unit's questions and counts
+    are committed together, so a job interrupted by a restart resumes with
+    only the missing questions.
+
+    Attributes:
+        id: Primary key
+        user_id: Foreign key to the teacher who submitted the job
+        status: Job status
+        request: Generation parameters (course, type, difficulty, count, ...)
+        target: Target mode: count is the number of approved questions wanted
+        token_budget: Target mode token budget (None = default)
+        total: Questions requested (approved questions in target mode)
+        requested: Questions asked for by finished units
+        approved/needs_review/rejected: Questions produced so far, by status
+        total_tokens: LLM tokens spent by finished units
+        attempts: Times the job was claimed (> 1 after a restart)
+        cancel_requested: Set by the cancel endpoint, checked by the worker
+        error: Error message of a failed job
+        started_at: First claimed by a worker
+        heartbeat_at: Last sign of life from the worker running the job
+        finished_at: When the job completed, failed or was cancelled
+    """
+
+    __tablename__ = "generation_jobs"
+    __table_args__ = (
+        # Claiming the oldest queued job and counting a user's active jobs
+        Index("ix_generation_jobs_status_id", "status", "id"),
+        Index("ix_generation_jobs_user_id_status", "user_id", "status"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    user_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        nullable=False,
+    )
+    status: Mapped[GenerationJobStatus] = mapped_column(
+        Enum(GenerationJobStatus),
+        default=GenerationJobStatus.QUEUED,
+        nullable=False,
+    )
+    request: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=False)
+    target: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    token_budget: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    total: Mapped[int] = mapped_column(Integer, nullable=False)
+    requested: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    approved: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    needs_review: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    rejected: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    total_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    cancel_requested: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    heartbeat_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    # Relationships
+    user: Mapped["User"] = relationship("User")
+    items: Mapped[List["GenerationJobItem"]] = relationship(
+        "GenerationJobItem",
+        back_populates="job",
+        cascade="all, delete-orphan",
+        order_by="GenerationJobItem.id",
+    )
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (
+            GenerationJobStatus.COMPLETED,
+            GenerationJobStatus.FAILED,
+            GenerationJobStatus.CANCELLED,
+        )
+
+    def __repr__(self) -> str:
+        return f"<GenerationJob(id={self.id}, status={self.status}, total={self.total})>"
+
+
+class GenerationJobItem(Base, TimestampMixin):
+    """
+    GenerationJobItem model
+
+    One question produced by a generation job, in the form the pipeline
+    API returns it
+
+    Attributes:
+        id: Primary key (also the order questions were produced in)
+        job_id: Foreign key to the job
+        status: Pipeline outcome (approved/needs_review/rejected)
+        data: Question with review comment, issues or validation errors
+    """
+
+    __tablename__ = "generation_job_items"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    job_id: Mapped[int] = mapped_column(
+        Integer,
+        ForeignKey("generation_jobs.id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    status: Mapped[str] = mapped_column(String(20), nullable=False)
+    data: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=False)
+
+    # Relationships
+    job: Mapped["GenerationJob"] = relationship("GenerationJob", back_populates="items")
+
+    def __repr__(self) -> str:
+        return f"<GenerationJobItem(id={self.id}, job_id={self.job_id}, status={self.status})>"
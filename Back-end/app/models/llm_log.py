@@ -1,13 +1,15 @@
 """
 LLM Log Model
 
-Defines the LLMLog table for tracking LLM API calls
+Defines the LLMLog table for tracking LLM API calls, and the
+LLMUsageRollup table aggregating it
 """
 
 import enum
+from datetime import datetime
 from typing import Optional
 
-from sqlalchemy import String, Text, Integer, ForeignKey, Enum
+from sqlalchemy import String, Text, Integer, ForeignKey, Enum, JSON, DateTime, Index, UniqueConstraint
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base, TimestampMixin
@@ -46,9 +48,15 @@ class LLMLog(Base, TimestampMixin):
         status: Call status
         error_message: Error message if failed
         request_summary: Brief summary of the request
+        attempt: Attempt number within one logical request (1 = first try)
+        trace_id: Trace of the request that made the call (see app/core/tracing.py)
     """
 
     __tablename__ = "llm_logs"
+    __table_args__ = (
+        # Time-range scans and retention pruning
+        Index("ix_llm_logs_created_at", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[Optional[int]] = mapped_column(
@@ -73,9 +81,68 @@ class LLMLog(Base, TimestampMixin):
     )
     error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     request_summary: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    attempt: Mapped[int] = mapped_column(Integer, default=1, server_default="1", nullable=False)
+    trace_id: Mapped[Optional[str]] = mapped_column(String(32), nullable=True, index=True)
 
     # Relationships
     user = relationship("User", foreign_keys=[user_id])
 
     def __repr__(self) -> str:
         return f"<LLMLog(id={self.id}, scene={self.scene}, status={self.status})>"
+
+
+class LLMUsageRollup(Base):
+    """
+    LLMUsageRollup model
+
+    Pre-aggregated LLM usage per time bucket, maintained incrementally by
+    the call log writer. One row per (granularity, bucket_start, provider,
+    model, scene, user_id).
+
+    Attributes:
+        id: Primary key
+        granularity: Bucket size (minute/hour/day)
+        bucket_start: Start of the bucket (UTC)
+        provider: Provider name
+        model: Model name
+        scene: Usage scene
+        user_id: User who initiated the calls (None = system/anonymous)
+        calls: Number of calls
+        success_count / failed_count / timeout_count: Calls by status
+        prompt_tokens / completion_tokens: Token totals
+        latency_sum_ms: Sum of latencies (for the mean)
+        latency_max_ms: Slowest call
+        latency_histogram: Counts per latency bucket (see app.core.llm.usage)
+    """
+
+    __tablename__ = "llm_usage_rollups"
+    __table_args__ = (
+        UniqueConstraint(
+            "granularity", "bucket_start", "provider", "model", "scene", "user_id",
+            name="uq_llm_usage_rollup",
+        ),
+        Index("ix_llm_usage_rollups_bucket", "granularity", "bucket_start"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    granularity: Mapped[str] = mapped_column(String(10), nullable=False)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    provider: Mapped[str] = mapped_column(String(50), nullable=False)
+    model: Mapped[str] = mapped_column(String(100), nullable=False)
+    scene: Mapped[LLMScene] = mapped_column(Enum(LLMScene), nullable=False)
+    user_id: Mapped[Optional[int]] = mapped_column(Integer, nullable=True, index=True)
+    calls: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    success_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    failed_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    timeout_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    prompt_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    completion_tokens: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    latency_sum_ms: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    latency_max_ms: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    latency_histogram: Mapped[list] = mapped_column(JSON, nullable=False)
+
+    def __repr__(self) -> str:
+        return (
+            f"<LLMUsageRollup({self.granularity} {self.bucket_start}, "
+            f"{self.provider}/{self.scene}, calls={self.calls})>"
+        )
@@ -13,6 +13,7 @@ from app.schemas.user import (
 from app.schemas.question import (
     QuestionType,
     GenerationRequest,
+    BatchGenerationRequest,
     GeneratedQuestion,
 )
 
@@ -27,5 +28,6 @@ __all__ = [
     # Question
     "QuestionType",
     "GenerationRequest",
+    "BatchGenerationRequest",
     "GeneratedQuestion",
 ]
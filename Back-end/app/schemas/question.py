@@ -126,6 +126,11 @@ class GenerationRequest(BaseModel):
     additional_requirements: Optional[str] = Field(None, description="Additional requirements")
 
 
+class BatchGenerationRequest(GenerationRequest):
+    """Request schema for sharded generation of a large question bank"""
+    count: int = Field(..., ge=1, description="Total number of questions to generate")
+
+
 class ValidationResult(BaseModel):
     """Result of question validation"""
     is_valid: bool
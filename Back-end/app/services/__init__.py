@@ -3,7 +3,12 @@ Services module exports
 """
 
 from app.services.auth import AuthService
-from app.services.llm_service import LLMService, get_llm_service
+from app.services.llm_service import (
+    LLMService,
+    ProviderRegistry,
+    get_llm_service,
+    provider_registry,
+)
 from app.services.generator_service import GeneratorService
 from app.services.validator_service import ValidatorService, ValidationResult, ValidationError
 from app.services.reviewer_service import ReviewerService, ReviewResult, ReviewIssue
@@ -22,7 +27,9 @@ __all__ = [
     "AuthService",
     # LLM
     "LLMService",
+    "ProviderRegistry",
     "get_llm_service",
+    "provider_registry",
     # Generation Pipeline
     "GeneratorService",
     "ValidatorService",
@@ -11,7 +11,11 @@ from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
-from app.models.exam import Exam, Attempt, AttemptAnswer, ExamStatus, AttemptStatus
+from app.core.tracing import span
+from app.models.exam import (
+    Exam, Attempt, AttemptAnswer, ExamStatus, AttemptStatus,
+    GradingTask, GradingTaskStatus,
+)
 from app.models.question import Paper, PaperQuestion, Question
 from app.models.user import User
 from app.schemas.exam import (
@@ -404,11 +408,28 @@ class ExamService:
 
         attempt.submitted_at = datetime.now(timezone.utc)
         attempt.status = AttemptStatus.SUBMITTED
+        # 批改任务与提交在同一事务中写入, 由后台批改队列执行
+        await self._enqueue_grading(attempt)
 
         await self.db.commit()
         await self.db.refresh(attempt)
         return attempt
 
+    async def _enqueue_grading(self, attempt: Attempt) -> None:
+        """Queue (or re-queue) background grading of an attempt; committed by the caller"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        task = await self.db.scalar(select(GradingTask).where(GradingTask.attempt_id == attempt.id))
+        if task is None:
+            self.db.add(GradingTask(attempt_id=attempt.id, enqueued_at=now, available_at=now))
+            return
+        task.status = GradingTaskStatus.PENDING
+        task.attempts = 0
+        task.enqueued_at = now
+        task.available_at = now
+        task.lease_expires_at = None
+        task.last_error = None
+        task.finished_at = None
+
     async def submit_attempt(
         self,
         exam_id: int,
@@ -432,45 +453,60 @@ class ExamService:
     async def grade_submitted_attempt(
         self,
         exam_id: int,
-        student_id: int
+        student_id: int,
+        strict: bool = False,
     ) -> Optional[Attempt]:
-        """后台批改已提交的考试（不检查状态，直接批改）"""
+        """
+        后台批改已提交的考试（不检查状态，直接批改）
+
+        strict=True 时, 只要有题目因AI调用失败而使用了兜底分数就抛出
+        GradingUnavailableError 且不提交, 由批改队列稍后重试
+        """
         attempt = await self.get_attempt(exam_id, student_id)
         if not attempt:
             return None
 
         # 直接执行批改，不检查状态
-        await self._auto_grade_attempt(attempt)
+        await self._auto_grade_attempt(attempt, strict)
 
         await self.db.commit()
         await self.db.refresh(attempt)
         return attempt
 
-    async def _auto_grade_attempt(self, attempt: Attempt):
+    async def _auto_grade_attempt(self, attempt: Attempt, strict: bool = False):
         """自动评分（客观题直接判分，主观题调用AI）"""
-        from app.services.grading_service import create_grading_service
-
-        # 获取考试和题目信息
-        exam = await self.get_exam(attempt.exam_id)
-        if not exam or not exam.paper_id:
-            return
-
-        # 获取题目和正确答案
-        query = (
-            select(PaperQuestion)
-            .options(selectinload(PaperQuestion.question))
-            .where(PaperQuestion.paper_id == exam.paper_id)
-        )
-        result = await self.db.execute(query)
-        paper_questions = {pq.question_id: pq for pq in result.scalars().all()}
+        with span("grading.attempt", **{"attempt.id": attempt.id, "exam.id": attempt.exam_id}) as attempt_span:
+            await self._grade_attempt(attempt, strict)
+            attempt_span.set_attribute("attempt.status", attempt.status.value)
+            if attempt.total_score is not None:
+                attempt_span.set_attribute("attempt.total_score", attempt.total_score)
+
+    async def _grade_attempt(self, attempt: Attempt, strict: bool = False):
+        """逐题评分并汇总总分与状态 (strict: AI评分失败时抛出GradingUnavailableError)"""
+        from app.services.grading_service import GradingUnavailableError, create_grading_service
+
+        with span("grading.load"):
+            # 获取考试和题目信息
+            exam = await self.get_exam(attempt.exam_id)
+            if not exam or not exam.paper_id:
+                return
+
+            # 获取题目和正确答案
+            query = (
+                select(PaperQuestion)
+                .options(selectinload(PaperQuestion.question))
+                .where(PaperQuestion.paper_id == exam.paper_id)
+            )
+            result = await self.db.execute(query)
+            paper_questions = {pq.question_id: pq for pq in result.scalars().all()}
 
-        # 获取学生答案
-        answer_query = (
-            select(AttemptAnswer)
-            .where(AttemptAnswer.attempt_id == attempt.id)
-        )
-        answer_result = await self.db.execute(answer_query)
-        answers = list(answer_result.scalars().all())
+            # 获取学生答案
+            answer_query = (
+                select(AttemptAnswer)
+                .where(AttemptAnswer.attempt_id == attempt.id)
+            )
+            answer_result = await self.db.execute(answer_query)
+            answers = list(answer_result.scalars().all())
 
         # 创建AI批改服务
         grading_service = None
@@ -482,6 +518,8 @@ class ExamService:
 
         total_score = 0
         has_subjective = False
+        # 因AI不可用而使用兜底分数的题目/空数
+        ai_failures = 0
 
         for answer in answers:
             pq = paper_questions.get(answer.question_id)
@@ -492,118 +530,134 @@ class ExamService:
             correct_answer = question.answer
             question_type = question.type.value
 
-            # 根据题型评分
-            if question_type in ('single', 'multiple'):
-                # 选择题：直接判断对错
-                is_correct = self._check_answer(
-                    question_type,
-                    answer.student_answer,
-                    correct_answer
-                )
-                answer.is_correct = is_correct
-                answer.score = pq.score if is_correct else 0
-                answer.ai_score = answer.score
-                total_score += answer.score
-
-            elif question_type == 'blank':
-                # 填空题：按空独立评分，每个空单独判断
-                blanks = correct_answer.get('blanks') or correct_answer.get('correct', [])
-                student_blanks = answer.student_answer if isinstance(answer.student_answer, list) else []
-
-                # 确保学生答案数量与正确答案数量一致
-                while len(student_blanks) < len(blanks):
-                    student_blanks.append("")
-
-                if not blanks:
-                    # 没有正确答案，跳过
-                    answer.is_correct = None
-                    answer.score = 0
-                    answer.ai_score = 0
-                    answer.ai_feedback = "题目缺少正确答案"
-                else:
-                    # 每个空的分值
-                    score_per_blank = pq.score / len(blanks)
-                    blank_scores = []
-                    blank_feedbacks = []
-
-                    for i, (student_ans, correct_ans) in enumerate(zip(student_blanks, blanks)):
-                        student_str = str(student_ans).strip().lower() if student_ans else ""
-                        correct_str = str(correct_ans).strip().lower()
-
-                        # 精确匹配（忽略大小写和首尾空格）
-                        if student_str == correct_str:
-                            blank_scores.append(score_per_blank)
-                            blank_feedbacks.append(f"第{i+1}空正确")
-                        else:
-                            # 不匹配，尝试AI评分
-                            if grading_service:
-                                try:
-                                    # 对单个空进行AI评分
-                                    ai_result = await grading_service.grade_fill_blank(
-                                        question_stem=f"第{i+1}空: {question.stem}",
-                                        correct_blanks=[correct_ans],
-                                        student_blanks=[student_ans or ""],
-                                        max_score=score_per_blank
-                                    )
-                                    blank_scores.append(ai_result["score"])
-                                    blank_feedbacks.append(ai_result.get("feedback", f"第{i+1}空AI评分"))
-                                except Exception as e:
+            with span("grading.answer", **{"question.id": question.id, "question.type": question_type}) as answer_span:
+                # 根据题型评分
+                if question_type in ('single', 'multiple'):
+                    # 选择题：直接判断对错
+                    is_correct = self._check_answer(
+                        question_type,
+                        answer.student_answer,
+                        correct_answer
+                    )
+                    answer.is_correct = is_correct
+                    answer.score = pq.score if is_correct else 0
+                    answer.ai_score = answer.score
+                    total_score += answer.score
+
+                elif question_type == 'blank':
+                    # 填空题：按空独立评分，每个空单独判断
+                    blanks = correct_answer.get('blanks') or correct_answer.get('correct', [])
+                    student_blanks = answer.student_answer if isinstance(answer.student_answer, list) else []
+
+                    # 确保学生答案数量与正确答案数量一致
+                    while len(student_blanks) < len(blanks):
+                        student_blanks.append("")
+
+                    if not blanks:
+                        # 没有正确答案，跳过
+                        answer.is_correct = None
+                        answer.score = 0
+                        answer.ai_score = 0
+                        answer.ai_feedback = "题目缺少正确答案"
+                    else:
+                        # 每个空的分值
+                        score_per_blank = pq.score / len(blanks)
+                        blank_scores = []
+                        blank_feedbacks = []
+
+                        for i, (student_ans, correct_ans) in enumerate(zip(student_blanks, blanks)):
+                            student_str = str(student_ans).strip().lower() if student_ans else ""
+                            correct_str = str(correct_ans).strip().lower()
+
+                            # 精确匹配（忽略大小写和首尾空格）
+                            if student_str == correct_str:
+                                blank_scores.append(score_per_blank)
+                                blank_feedbacks.append(f"第{i+1}空正确")
+                            else:
+                                # 不匹配，尝试AI评分
+                                if grading_service:
+                                    try:
+                                        # 对单个空进行AI评分
+                                        ai_result = await grading_service.grade_fill_blank(
+                                            question_stem=f"第{i+1}空: {question.stem}",
+                                            correct_blanks=[correct_ans],
+                                            student_blanks=[student_ans or ""],
+                                            max_score=score_per_blank
+                                        )
+                                        blank_scores.append(ai_result["score"])
+                                        blank_feedbacks.append(ai_result.get("feedback", f"第{i+1}空AI评分"))
+                                        if ai_result.get("fallback"):
+                                            ai_failures += 1
+                                    except Exception as e:
+                                        ai_failures += 1
+                                        blank_scores.append(0)
+                                        blank_feedbacks.append(f"第{i+1}空错误")
+                                else:
+                                    # 无AI服务，直接判错
+                                    ai_failures += 1
                                     blank_scores.append(0)
                                     blank_feedbacks.append(f"第{i+1}空错误")
-                            else:
-                                # 无AI服务，直接判错
-                                blank_scores.append(0)
-                                blank_feedbacks.append(f"第{i+1}空错误")
-
-                    # 计算总分
-                    total_blank_score = sum(blank_scores)
-                    answer.score = int(total_blank_score)
-                    answer.ai_score = total_blank_score
-                    answer.ai_feedback = "; ".join(blank_feedbacks)
-
-                    # 判断正确性：满分为完全正确，0分为完全错误，其他为部分正确
-                    if total_blank_score >= pq.score:
-                        answer.is_correct = True
-                    elif total_blank_score <= 0:
-                        answer.is_correct = False
-                    else:
-                        # 部分正确：is_correct 设为 None，让前端显示"部分正确"
-                        answer.is_correct = None
 
-                    # 如果有不匹配的空且使用了AI，标记为主观题
-                    if any(s < score_per_blank for s in blank_scores) and grading_service:
-                        has_subjective = True
-
-                total_score += answer.score or 0
-
-            elif question_type == 'short':
-                # 简答题：AI评分
-                has_subjective = True
-                if grading_service and correct_answer:
-                    reference = correct_answer.get('reference') or correct_answer.get('correct', '')
-                    student_text = str(answer.student_answer) if answer.student_answer else ''
-                    try:
-                        ai_result = await grading_service.grade_short_answer(
-                            question_stem=question.stem,
-                            reference_answer=reference,
-                            student_answer=student_text,
-                            max_score=pq.score,
-                            explanation=question.explanation
-                        )
-                        answer.ai_score = ai_result["score"]
-                        answer.ai_feedback = ai_result["feedback"]
-                        answer.score = int(ai_result["score"])
-                        # 简答题不设置is_correct，留给教师判断
+                        # 计算总分
+                        total_blank_score = sum(blank_scores)
+                        answer.score = int(total_blank_score)
+                        answer.ai_score = total_blank_score
+                        answer.ai_feedback = "; ".join(blank_feedbacks)
+
+                        # 判断正确性：满分为完全正确，0分为完全错误，其他为部分正确
+                        if total_blank_score >= pq.score:
+                            answer.is_correct = True
+                        elif total_blank_score <= 0:
+                            answer.is_correct = False
+                        else:
+                            # 部分正确：is_correct 设为 None，让前端显示"部分正确"
+                            answer.is_correct = None
+
+                        # 如果有不匹配的空且使用了AI，标记为主观题
+                        if any(s < score_per_blank for s in blank_scores) and grading_service:
+                            has_subjective = True
+
+                    total_score += answer.score or 0
+
+                elif question_type == 'short':
+                    # 简答题：AI评分
+                    has_subjective = True
+                    if grading_service and correct_answer:
+                        reference = correct_answer.get('reference') or correct_answer.get('correct', '')
+                        student_text = str(answer.student_answer) if answer.student_answer else ''
+                        try:
+                            ai_result = await grading_service.grade_short_answer(
+                                question_stem=question.stem,
+                                reference_answer=reference,
+                                student_answer=student_text,
+                                max_score=pq.score,
+                                explanation=question.explanation
+                            )
+                            answer.ai_score = ai_result["score"]
+                            answer.ai_feedback = ai_result["feedback"]
+                            answer.score = int(ai_result["score"])
+                            # 简答题不设置is_correct，留给教师判断
+                            answer.is_correct = None
+                            if ai_result.get("fallback"):
+                                ai_failures += 1
+                        except Exception as e:
+                            ai_failures += 1
+                            answer.ai_feedback = f"AI评分失败: {str(e)}"
+                            answer.score = None
+                            answer.is_correct = None
+                    else:
+                        # 无AI服务，等待教师批改
+                        if correct_answer:
+                            ai_failures += 1
                         answer.is_correct = None
-                    except Exception as e:
-                        answer.ai_feedback = f"AI评分失败: {str(e)}"
                         answer.score = None
-                        answer.is_correct = None
-                else:
-                    # 无AI服务，等待教师批改
-                    answer.is_correct = None
-                    answer.score = None
-                total_score += answer.score or 0
+                    total_score += answer.score or 0
+                if answer.score is not None:
+                    answer_span.set_attribute("answer.score", answer.score)
+
+        if strict and ai_failures:
+            # 不保存兜底分数, 由调用方回滚并稍后重试
+            raise GradingUnavailableError(f"{ai_failures} 处AI评分失败")
 
         attempt.total_score = total_score
         # 如果有主观题，状态设为AI_GRADED等待教师确认；否则直接GRADED
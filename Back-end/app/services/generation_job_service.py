@@ -0,0 +1,486 @@
+"""
+Generation Job Service
+
+Asynchronous question generation: jobs are submitted, persisted in the
+generation_jobs table and run by a pool of background workers, which
+commit each finished shard of questions as they go
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.metrics import GENERATION_JOBS_FINISHED, GENERATION_JOBS_RUNNING
+from app.core.tracing import span
+from app.db.session import async_session_maker
+from app.models.generation_job import GenerationJob, GenerationJobItem, GenerationJobStatus
+from app.models.user import User
+from app.schemas.question import BatchGenerationRequest
+from app.services.generation_pipeline import GenerationPipeline, PipelineResult
+from app.services.llm_service import get_llm_service
+
+
+ACTIVE_STATUSES = (GenerationJobStatus.QUEUED, GenerationJobStatus.RUNNING)
+
+
+def _now() -> datetime:
+    """Timestamps are stored as naive UTC"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class GenerationJobService:
+    """Submitting, querying and cancelling generation jobs"""
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create_job(
+        self,
+        user_id: int,
+        request: BatchGenerationRequest,
+        target: bool = False,
+        token_budget: Optional[int] = None,
+    ) -> Tuple[Optional[GenerationJob], Optional[str]]:
+        """
+        Queue a generation job
+
+        Returns:
+            (job, None), or (None, error) when the user already has
+            GENERATION_JOB_MAX_ACTIVE_PER_USER queued or running jobs
+        """
+        active = await self.db.scalar(
+            select(func.count(GenerationJob.id)).where(
+                GenerationJob.user_id == user_id,
+                GenerationJob.status.in_(ACTIVE_STATUSES),
+            )
+        )
+        if active >= settings.GENERATION_JOB_MAX_ACTIVE_PER_USER:
+            return None, f"进行中的出题任务已达上限 ({settings.GENERATION_JOB_MAX_ACTIVE_PER_USER} 个)"
+
+        job = GenerationJob(
+            user_id=user_id,
+            status=GenerationJobStatus.QUEUED,
+            request=request.model_dump(mode="json"),
+            target=target,
+            token_budget=token_budget,
+            total=request.count,
+        )
+        self.db.add(job)
+        await self.db.commit()
+        await self.db.refresh(job)
+        generation_job_runner.wake()
+        return job, None
+
+    async def get_job(self, job_id: int, user: User) -> Optional[GenerationJob]:
+        """A job of the user (any job for admins)"""
+        job = await self.db.get(GenerationJob, job_id)
+        if job is None or (job.user_id != user.id and user.role != "admin"):
+            return None
+        return job
+
+    async def list_jobs(
+        self,
+        user_id: int,
+        status: Optional[GenerationJobStatus] = None,
+        limit: int = 20,
+    ) -> List[GenerationJob]:
+        """The user's jobs, newest first"""
+        query = select(GenerationJob).where(GenerationJob.user_id == user_id)
+        if status:
+            query = query.where(GenerationJob.status == status)
+        result = await self.db.execute(query.order_by(GenerationJob.id.desc()).limit(limit))
+        return list(result.scalars().all())
+
+    async def get_items(self, job_id: int, after_id: int = 0) -> List[GenerationJobItem]:
+        """Questions produced by a job, in the order they were produced"""
+        result = await self.db.execute(
+            select(GenerationJobItem)
+            .where(GenerationJobItem.job_id == job_id, GenerationJobItem.id > after_id)
+            .order_by(GenerationJobItem.id)
+        )
+        return list(result.scalars().all())
+
+    async def cancel_job(self, job: GenerationJob) -> Tuple[Optional[GenerationJob], Optional[str]]:
+        """
+        Cancel a job
+
+        A queued job is cancelled at once. A running job is flagged; the
+        worker running it stops within a heartbeat (at once if it runs in
+        this process). Questions already produced are kept.
+        """
+        if job.is_finished:
+            return None, "任务已结束，无法取消"
+
+        if job.status == GenerationJobStatus.QUEUED:
+            result = await self.db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job.id, GenerationJob.status == GenerationJobStatus.QUEUED)
+                .values(status=GenerationJobStatus.CANCELLED, cancel_requested=True, finished_at=_now())
+            )
+            if result.rowcount:
+                GENERATION_JOBS_FINISHED.labels(GenerationJobStatus.CANCELLED.value).inc()
+                await self.db.commit()
+                await self.db.refresh(job)
+                return job, None
+
+        # Running (or claimed since it was read)
+        job.cancel_requested = True
+        await self.db.commit()
+        generation_job_runner.cancel(job.id)
+        await self.db.refresh(job)
+        return job, None
+
+    @staticmethod
+    def to_dict(job: GenerationJob, items: Optional[List[GenerationJobItem]] = None) -> Dict[str, Any]:
+        """API form; with items, the questions grouped as /generate returns them"""
+        produced = job.approved + job.needs_review + job.rejected
+        data: Dict[str, Any] = {
+            "id": job.id,
+            "status": job.status.value,
+            "request": job.request,
+            "target": job.target,
+            "token_budget": job.token_budget,
+            "progress": {
+                "total": job.total,
+                "requested": job.requested,
+                "generated": produced,
+                "approved": job.approved,
+                "needs_review": job.needs_review,
+                "rejected": job.rejected,
+                "percent": round(
+                    min((job.approved if job.target else job.requested) / job.total, 1.0) * 100, 1
+                ) if job.total else 0.0,
+            },
+            "total_tokens": job.total_tokens,
+            "tokens_per_approved": round(job.total_tokens / job.approved, 1) if job.approved else None,
+            "attempts": job.attempts,
+            "cancel_requested": job.cancel_requested,
+            "error": job.error,
+            "created_at": job.created_at,
+            "started_at": job.started_at,
+            "finished_at": job.finished_at,
+        }
+        if items is not None:
+            grouped: Dict[str, List[Dict[str, Any]]] = {"approved": [], "needs_review": [], "rejected": []}
+            for item in items:
+                grouped.setdefault(item.status, []).append(item.data)
+            data["approved_questions"] = grouped["approved"]
+            data["needs_review_questions"] = grouped["needs_review"]
+            data["rejected_questions"] = grouped["rejected"]
+        return data
+
+
+class GenerationJobRunner:
+    """
+    Pool of GENERATION_JOB_WORKERS workers running queued jobs
+
+    Workers claim the oldest queued job whose owner runs fewer than
+    GENERATION_JOB_MAX_RUNNING_PER_USER jobs (claims are serialized within
+    the process; across processes the conditional UPDATE makes each job go
+    to one worker). A running job's heartbeat is refreshed every third of
+    GENERATION_JOB_LEASE_SECONDS; a job whose heartbeat is older than the
+    lease (its process died) is queued again and resumes with the
+    questions still missing, until it has been claimed
+    GENERATION_JOB_MAX_ATTEMPTS times. Jobs interrupted by a clean shutdown
+    are queued again at once.
+    """
+
+    def __init__(self):
+        self._workers: List[asyncio.Task] = []
+        self._running: Dict[int, asyncio.Task] = {}
+        self._cancelled: Set[int] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self._stopping = False
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def start(self) -> None:
+        """Start the workers on the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._claim_lock = asyncio.Lock()
+        self._stopping = False
+        self._workers = [w for w in self._workers if not w.done()]
+        while len(self._workers) < max(settings.GENERATION_JOB_WORKERS, 0):
+            self._workers.append(loop.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        """Stop the workers; running jobs go back to the queue (application shutdown)"""
+        self._stopping = True
+        for worker in self._workers:
+            worker.cancel()
+        jobs = list(self._running.values())
+        for task in jobs:
+            task.cancel()
+        await asyncio.gather(*self._workers, *jobs, return_exceptions=True)
+        self._workers = []
+
+    def wake(self) -> None:
+        """A job was queued"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def cancel(self, job_id: int) -> bool:
+        """Cancel a job running in this process"""
+        task = self._running.get(job_id)
+        if task is None:
+            return False
+        self._cancelled.add(job_id)
+        task.cancel()
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                job_id = await self._claim()
+            except Exception as e:
+                print(f"[出题] 领取出题任务失败: {type(e).__name__}: {e}")
+                job_id = None
+
+            if job_id is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.GENERATION_JOB_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            task = asyncio.create_task(self._execute(job_id))
+            self._running[job_id] = task
+            try:
+                # wait() rather than await: cancelling the job must not end the worker
+                await asyncio.wait({task})
+            finally:
+                self._running.pop(job_id, None)
+                self._cancelled.discard(job_id)
+
+    async def _claim(self) -> Optional[int]:
+        """Claim the next runnable job, if any"""
+        async with self._claim_lock, async_session_maker() as db:
+            await self._requeue_stale(db)
+
+            busy_users = (
+                select(GenerationJob.user_id)
+                .where(GenerationJob.status == GenerationJobStatus.RUNNING)
+                .group_by(GenerationJob.user_id)
+                .having(func.count(GenerationJob.id) >= settings.GENERATION_JOB_MAX_RUNNING_PER_USER)
+            )
+            candidates = await db.scalars(
+                select(GenerationJob.id)
+                .where(
+                    GenerationJob.status == GenerationJobStatus.QUEUED,
+                    GenerationJob.user_id.not_in(busy_users),
+                )
+                .order_by(GenerationJob.id)
+                .limit(5)
+            )
+            now = _now()
+            for job_id in candidates.all():
+                result = await db.execute(
+                    update(GenerationJob)
+                    .where(GenerationJob.id == job_id, GenerationJob.status == GenerationJobStatus.QUEUED)
+                    .values(
+                        status=GenerationJobStatus.RUNNING,
+                        attempts=GenerationJob.attempts + 1,
+                        started_at=func.coalesce(GenerationJob.started_at, now),
+                        heartbeat_at=now,
+                    )
+                )
+                await db.commit()
+                if result.rowcount:
+                    return job_id
+            return None
+
+    @staticmethod
+    async def _requeue_stale(db: AsyncSession) -> None:
+        """Queue again (or give up on) running jobs whose worker stopped heartbeating"""
+        cutoff = _now() - timedelta(seconds=settings.GENERATION_JOB_LEASE_SECONDS)
+        stale = (
+            GenerationJob.status == GenerationJobStatus.RUNNING,
+            GenerationJob.heartbeat_at < cutoff,
+        )
+        failed = await db.execute(
+            update(GenerationJob)
+            .where(*stale, GenerationJob.attempts >= settings.GENERATION_JOB_MAX_ATTEMPTS)
+            .values(status=GenerationJobStatus.FAILED, error="任务多次中断, 已停止重试", finished_at=_now())
+        )
+        requeued = await db.execute(
+            update(GenerationJob).where(*stale).values(status=GenerationJobStatus.QUEUED)
+        )
+        if failed.rowcount or requeued.rowcount:
+            await db.commit()
+            if failed.rowcount:
+                GENERATION_JOBS_FINISHED.labels(GenerationJobStatus.FAILED.value).inc(failed.rowcount)
+            print(f"[出题] 恢复中断的出题任务 {requeued.rowcount} 个, 放弃 {failed.rowcount} 个")
+
+    async def _execute(self, job_id: int) -> None:
+        """Run one claimed job to completion, failure or cancellation"""
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, asyncio.current_task()))
+        try:
+            with span("generation_job", **{"job.id": job_id}):
+                status, error = await self._run(job_id)
+        except asyncio.CancelledError:
+            if job_id in self._cancelled:
+                status, error = GenerationJobStatus.CANCELLED, None
+            elif self._stopping:
+                # Shutdown: resume on the next start
+                status, error = GenerationJobStatus.QUEUED, None
+            else:
+                # Nobody asked for it (e.g. raised inside the pipeline)
+                print(f"[出题] ✗ 出题任务 {job_id} 被意外取消")
+                status, error = GenerationJobStatus.FAILED, "任务被意外取消 (CancelledError)"
+        except Exception as e:
+            print(f"[出题] ✗ 出题任务 {job_id} 失败: {type(e).__name__}: {e}")
+            status, error = GenerationJobStatus.FAILED, f"{type(e).__name__}: {e}"
+        finally:
+            heartbeat.cancel()
+
+        async with async_session_maker() as db:
+            values: Dict[str, Any] = {"status": status, "error": error}
+            if status != GenerationJobStatus.QUEUED:
+                values["finished_at"] = _now()
+            await db.execute(update(GenerationJob).where(GenerationJob.id == job_id).values(**values))
+            await db.commit()
+        if status != GenerationJobStatus.QUEUED:
+            GENERATION_JOBS_FINISHED.labels(status.value).inc()
+        print(f"[出题] 出题任务 {job_id}: {status.value}")
+
+    async def _heartbeat(self, job_id: int, job_task: asyncio.Task) -> None:
+        """Keep the lease of a running job, and notice cancellation from other processes"""
+        interval = max(settings.GENERATION_JOB_LEASE_SECONDS / 3, 0.1)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with async_session_maker() as db:
+                    await db.execute(
+                        update(GenerationJob).where(GenerationJob.id == job_id).values(heartbeat_at=_now())
+                    )
+                    await db.commit()
+                    cancel = await db.scalar(
+                        select(GenerationJob.cancel_requested).where(GenerationJob.id == job_id)
+                    )
+            except Exception as e:
+                print(f"[出题] 出题任务 {job_id} 心跳失败: {e}")
+                continue
+            if cancel:
+                self._cancelled.add(job_id)
+                job_task.cancel()
+                return
+
+    async def _run(self, job_id: int) -> Tuple[GenerationJobStatus, Optional[str]]:
+        """
+        Generate what the job is still missing
+
+        Returns:
+            Final status and error message
+        """
+        async with async_session_maker() as db:
+            job = await db.get(GenerationJob, job_id)
+            if job is None:
+                return GenerationJobStatus.FAILED, "任务不存在"
+            if job.cancel_requested:
+                return GenerationJobStatus.CANCELLED, None
+            earlier = await db.scalars(
+                select(GenerationJobItem.data).where(GenerationJobItem.job_id == job_id)
+            )
+            exclude = [data["question"] for data in earlier.all()]
+            user_id, total, target = job.user_id, job.total, job.target
+            missing = total - (job.approved if target else job.requested)
+            budget_left = None
+            if target:
+                budget = settings.PIPELINE_TARGET_TOKEN_BUDGET if job.token_budget is None else job.token_budget
+                budget_left = max(budget - job.total_tokens, 1) if budget > 0 else 0
+            request_data = dict(job.request)
+
+        if missing <= 0:
+            return GenerationJobStatus.COMPLETED, None
+        if exclude:
+            print(f"[出题] 出题任务 {job_id} 从中断处继续, 还需 {missing} 道")
+
+        pipeline = GenerationPipeline(get_llm_service())
+
+        async def save_shard(result: PipelineResult, report: Dict[str, Any]) -> None:
+            await self._save_shard(job_id, result, report)
+
+        request_data["count"] = missing
+        if target:
+            await pipeline.generate_target(
+                BatchGenerationRequest(**request_data),
+                user_id,
+                token_budget=budget_left,
+                exclude=exclude,
+                on_shard=save_shard,
+            )
+            approved = await self._trim_surplus(job_id, total)
+            if approved < total:
+                return GenerationJobStatus.FAILED, f"仅 {approved}/{total} 道题目通过审核 (轮数或token预算已用完)"
+            return GenerationJobStatus.COMPLETED, None
+
+        _, shards = await pipeline.generate_batch(
+            BatchGenerationRequest(**request_data),
+            user_id,
+            exclude=exclude,
+            on_shard=save_shard,
+        )
+        errors = [report["error"] for report in shards if "error" in report]
+        if errors:
+            return GenerationJobStatus.FAILED, f"{len(errors)}/{len(shards)} 个分片生成失败: {errors[0]}"
+        return GenerationJobStatus.COMPLETED, None
+
+    @staticmethod
+    async def _save_shard(job_id: int, result: PipelineResult, report: Dict[str, Any]) -> None:
+        """Commit a finished shard's questions and counts together"""
+        async with async_session_maker() as db:
+            db.add_all(
+                GenerationJobItem(job_id=job_id, status=pq.status.value, data=pq.to_dict())
+                for pq in result.approved + result.needs_review + result.rejected
+            )
+            await db.execute(
+                update(GenerationJob)
+                .where(GenerationJob.id == job_id)
+                .values(
+                    requested=GenerationJob.requested + report["requested"],
+                    approved=GenerationJob.approved + len(result.approved),
+                    needs_review=GenerationJob.needs_review + len(result.needs_review),
+                    rejected=GenerationJob.rejected + len(result.rejected),
+                    total_tokens=GenerationJob.total_tokens + report["tokens"],
+                    heartbeat_at=_now(),
+                )
+            )
+            await db.commit()
+
+    @staticmethod
+    async def _trim_surplus(job_id: int, target: int) -> int:
+        """Drop approved questions beyond the target (newest first); returns approved count"""
+        async with async_session_maker() as db:
+            approved_ids = (await db.scalars(
+                select(GenerationJobItem.id)
+                .where(GenerationJobItem.job_id == job_id, GenerationJobItem.status == "approved")
+                .order_by(GenerationJobItem.id)
+            )).all()
+            surplus = approved_ids[target:]
+            if surplus:
+                for item in (await db.scalars(
+                    select(GenerationJobItem).where(GenerationJobItem.id.in_(surplus))
+                )).all():
+                    await db.delete(item)
+                await db.execute(
+                    update(GenerationJob).where(GenerationJob.id == job_id).values(approved=target)
+                )
+                await db.commit()
+            return min(len(approved_ids), target)
+
+
+# Process-wide worker pool, started and stopped with the application
+generation_job_runner = GenerationJobRunner()
+GENERATION_JOBS_RUNNING.set_function(lambda: generation_job_runner.running)
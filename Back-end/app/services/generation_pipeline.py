@@ -5,15 +5,36 @@ Orchestrates the three-stage quality control pipeline:
 Generator → Validator → Reviewer
 """
 
-from typing import List, Optional, Dict, Any
+import asyncio
+import math
+import time
+from contextlib import contextmanager
+from typing import AsyncIterator, Awaitable, Callable, Iterator, List, Optional, Dict, Any, Tuple
 from dataclasses import dataclass, field
 from enum import Enum
 
+from app.config import settings
+from app.core.llm.meter import metered
+from app.core.metrics import (
+    PIPELINE_QUEUE_DEPTH,
+    PIPELINE_STAGE_BUSY,
+    PIPELINE_STAGE_SECONDS,
+    PIPELINE_STAGE_STATE_SECONDS,
+)
+from app.core.tracing import span
+from app.models.llm_log import LLMScene
 from app.services.llm_service import LLMService
 from app.services.generator_service import GeneratorService
 from app.services.validator_service import ValidatorService, ValidationResult
 from app.services.reviewer_service import ReviewerService, ReviewResult
-from app.schemas.question import GenerationRequest, QuestionType
+from app.schemas.question import BatchGenerationRequest, GenerationRequest, QuestionType
+
+
+@contextmanager
+def _stage(name: str) -> Iterator[None]:
+    """Time a pipeline stage for /metrics and trace it as a span"""
+    with PIPELINE_STAGE_SECONDS.labels(name).time(), span(f"pipeline.{name}"):
+        yield
 
 
 class QuestionStatus(str, Enum):
@@ -32,6 +53,42 @@ class ProcessedQuestion:
     review_result: Optional[ReviewResult] = None
     original_question: Optional[Dict[str, Any]] = None  # Before fixes
 
+    def to_dict(self) -> Dict[str, Any]:
+        """API form, by status"""
+        if self.status == QuestionStatus.APPROVED:
+            return {
+                "question": self.question,
+                "review_comment": self.review_result.review_comment if self.review_result else None,
+            }
+        if self.status == QuestionStatus.NEEDS_REVIEW:
+            return {
+                "question": self.question,
+                "original": self.original_question,
+                "issues": _issues(self.review_result),
+            }
+        return {
+            "question": self.question,
+            "validation_errors": _validation_errors(self.validation_result),
+        }
+
+
+def _issues(review_result: Optional[ReviewResult]) -> List[Dict[str, str]]:
+    return [
+        {"type": issue.type, "description": issue.description}
+        for issue in (review_result.issues if review_result else [])
+    ]
+
+
+def _validation_errors(validation_result: Optional[ValidationResult]) -> List[Dict[str, str]]:
+    return [
+        {"field": err.field, "message": err.message}
+        for err in (validation_result.errors if validation_result else [])
+    ]
+
+
+# Progress callback of the streaming pipeline: notify(event, **data)
+Notify = Callable[..., None]
+
 
 @dataclass
 class PipelineResult:
@@ -39,6 +96,17 @@ class PipelineResult:
     approved: List[ProcessedQuestion] = field(default_factory=list)
     needs_review: List[ProcessedQuestion] = field(default_factory=list)
     rejected: List[ProcessedQuestion] = field(default_factory=list)
+    usage: Optional[Dict[str, Any]] = None  # Target mode: rounds and token spend
+
+    def add_all(self, items) -> None:
+        """Categorize processed questions, keeping their order"""
+        buckets = {
+            QuestionStatus.APPROVED: self.approved,
+            QuestionStatus.NEEDS_REVIEW: self.needs_review,
+            QuestionStatus.REJECTED: self.rejected,
+        }
+        for item in items:
+            buckets[item.status].append(item)
 
     @property
     def total_generated(self) -> int:
@@ -60,37 +128,130 @@ class PipelineResult:
                 "rejected": len(self.rejected),
                 "success_rate": round(self.success_rate * 100, 1),
             },
-            "approved_questions": [
-                {
-                    "question": pq.question,
-                    "review_comment": pq.review_result.review_comment if pq.review_result else None,
-                }
-                for pq in self.approved
-            ],
-            "needs_review_questions": [
-                {
-                    "question": pq.question,
-                    "original": pq.original_question,
-                    "issues": [
-                        {"type": issue.type, "description": issue.description}
-                        for issue in (pq.review_result.issues if pq.review_result else [])
-                    ],
-                }
-                for pq in self.needs_review
-            ],
-            "rejected_questions": [
-                {
-                    "question": pq.question,
-                    "validation_errors": [
-                        {"field": err.field, "message": err.message}
-                        for err in (pq.validation_result.errors if pq.validation_result else [])
-                    ],
-                }
-                for pq in self.rejected
-            ],
+            "approved_questions": [pq.to_dict() for pq in self.approved],
+            "needs_review_questions": [pq.to_dict() for pq in self.needs_review],
+            "rejected_questions": [pq.to_dict() for pq in self.rejected],
+            **({"usage": self.usage} if self.usage is not None else {}),
         }
 
 
+# Called as each shard of a batch finishes: on_shard(result, report)
+ShardCallback = Callable[["PipelineResult", Dict[str, Any]], Awaitable[None]]
+
+
+class _StageClock:
+    """
+    Busy / starved / blocked time of one pipelined stage during one run,
+    also exported as pipeline_stage_state_seconds_total
+    """
+
+    def __init__(self, stage: str, provider: str, workers: int):
+        self.stage = stage
+        self.provider = provider
+        self.workers = workers
+        self.seconds = {"busy": 0.0, "starved": 0.0, "blocked": 0.0}
+
+    @contextmanager
+    def state(self, name: str) -> Iterator[None]:
+        if name == "busy":
+            PIPELINE_STAGE_BUSY.labels(self.stage).inc()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.seconds[name] += elapsed
+            PIPELINE_STAGE_STATE_SECONDS.labels(self.stage, self.provider, name).inc(elapsed)
+            if name == "busy":
+                PIPELINE_STAGE_BUSY.labels(self.stage).dec()
+
+    def snapshot(self, elapsed: float) -> Dict[str, Any]:
+        capacity = self.workers * elapsed
+        return {
+            "provider": self.provider,
+            "workers": self.workers,
+            **{f"{name}_s": round(value, 3) for name, value in self.seconds.items()},
+            "utilization": round(self.seconds["busy"] / capacity, 3) if capacity else 0.0,
+        }
+
+
+class _StageQueue(asyncio.Queue):
+    """Bounded queue between two stages, reported as pipeline_queue_depth"""
+
+    def __init__(self, name: str, maxsize: int):
+        super().__init__(max(1, maxsize))
+        self._depth = PIPELINE_QUEUE_DEPTH.labels(name)
+        self._counted = 0
+
+    async def put(self, item: Any) -> None:
+        await super().put(item)
+        if item is not None:
+            self._depth.inc()
+            self._counted += 1
+
+    async def get(self) -> Any:
+        item = await super().get()
+        if item is not None:
+            self._depth.dec()
+            self._counted -= 1
+        return item
+
+    def close(self) -> None:
+        """Forget items left behind by a cancelled run"""
+        self._depth.dec(self._counted)
+        self._counted = 0
+
+
+# Approved stems quoted in a top-up prompt so the model avoids repeating them
+_AVOID_STEMS = 20
+
+ApprovalKey = Tuple[str, str, int]
+
+
+class ApprovalRates:
+    """
+    Rolling approval rate and token cost per (course, question type, difficulty)
+
+    Exponentially weighted averages over roughly the last
+    PIPELINE_TARGET_RATE_WINDOW questions; the rate starts from
+    PIPELINE_TARGET_PRIOR_RATE, the cost is unknown until a round has been
+    recorded. Held in memory for the process.
+    """
+
+    def __init__(self):
+        self._rates: Dict[ApprovalKey, float] = {}
+        self._costs: Dict[ApprovalKey, float] = {}
+
+    @staticmethod
+    def key(request: GenerationRequest) -> ApprovalKey:
+        return (request.course_name.strip().lower(), request.question_type.value, request.difficulty)
+
+    def rate(self, key: ApprovalKey) -> float:
+        """Expected approval rate, floored at 1 / PIPELINE_TARGET_MAX_OVERSAMPLE"""
+        rate = self._rates.get(key, settings.PIPELINE_TARGET_PRIOR_RATE)
+        return max(rate, 1 / max(settings.PIPELINE_TARGET_MAX_OVERSAMPLE, 1.0))
+
+    def cost(self, key: ApprovalKey) -> Optional[float]:
+        """Expected tokens per requested question (generation and review), if known"""
+        return self._costs.get(key)
+
+    def record(self, key: ApprovalKey, approved: int, requested: int, tokens: int) -> None:
+        """Fold in one round: approved questions and tokens spent for those requested"""
+        if requested <= 0:
+            return
+        window = max(settings.PIPELINE_TARGET_RATE_WINDOW, 1)
+        weight = 1 - (1 - 1 / window) ** requested
+        previous = self._rates.get(key, settings.PIPELINE_TARGET_PRIOR_RATE)
+        observed = min(approved / requested, 1.0)
+        self._rates[key] = previous + weight * (observed - previous)
+        per_question = tokens / requested
+        previous = self._costs.get(key, per_question)
+        self._costs[key] = previous + weight * (per_question - previous)
+
+
+approval_rates = ApprovalRates()
+
+
 class GenerationPipeline:
     """
     Question Generation Pipeline
@@ -103,6 +264,11 @@ class GenerationPipeline:
     Strategies:
     - Validation failure: Reject (cannot auto-fix format issues)
     - Review failure: Attempt one fix, then mark as needs_review
+    - Questions are reviewed concurrently, at most
+      PIPELINE_REVIEW_CONCURRENCY at a time
+    - Large counts are generated in shards (see generate_batch)
+    - Target mode tops up until enough questions are approved
+      (see generate_target)
     """
 
     def __init__(self, llm_service: LLMService):
@@ -122,6 +288,10 @@ class GenerationPipeline:
         request: GenerationRequest,
         user_id: Optional[int] = None,
         skip_review: bool = False,
+        hedge: bool = False,
+        pipelined: bool = False,
+        target: bool = False,
+        token_budget: Optional[int] = None,
     ) -> PipelineResult:
         """
         Run the full generation pipeline
@@ -130,100 +300,684 @@ class GenerationPipeline:
             request: Generation request parameters
             user_id: Optional user ID for logging
             skip_review: Skip AI review stage (for testing/speed)
+            hedge: Hedge the generation call against tail latency
+            pipelined: Review questions while the rest are still being
+                generated (see generate_pipelined)
+            target: Treat request.count as the number of approved questions
+                wanted and top up until it is reached (see generate_target)
+            token_budget: Target mode token budget (default
+                PIPELINE_TARGET_TOKEN_BUDGET, 0 = unlimited)
 
         Returns:
             PipelineResult with categorized questions
         """
-        result = PipelineResult()
+        with span(
+            "pipeline",
+            **{"question.type": request.question_type.value, "question.count": request.count},
+        ) as pipeline_span:
+            if target:
+                result = await self.generate_target(request, user_id, skip_review, token_budget)
+            elif pipelined:
+                result, _ = await self.generate_pipelined(request, user_id, skip_review)
+            else:
+                result = await self._run(request, user_id, skip_review, hedge)
+            pipeline_span.set_attribute("pipeline.approved", len(result.approved))
+            pipeline_span.set_attribute("pipeline.needs_review", len(result.needs_review))
+            pipeline_span.set_attribute("pipeline.rejected", len(result.rejected))
+            return result
 
+    async def _run(
+        self,
+        request: GenerationRequest,
+        user_id: Optional[int],
+        skip_review: bool,
+        hedge: bool,
+    ) -> PipelineResult:
+        """Generate → validate → review (→ fix → review) for one request"""
         # Stage 1: Generate questions
         try:
-            raw_questions = await self.generator.generate(request, user_id)
+            with _stage("generate"):
+                raw_questions = await self.generator.generate(request, user_id, hedge=hedge)
             print(f"[出题] 生成 {len(raw_questions)} 道题目")
         except Exception as e:
             # Generation failed completely
             print(f"[出题] ✗ 生成失败: {type(e).__name__}: {e}")
             import traceback
             traceback.print_exc()
-            return result
+            return PipelineResult()
 
-        # Stage 2: Validate all questions
-        validated = self.validator.validate_batch(raw_questions)
-
-        for question, validation_result in validated:
-            if not validation_result.is_valid:
-                # Validation failed - reject
-                result.rejected.append(ProcessedQuestion(
-                    question=question,
-                    status=QuestionStatus.REJECTED,
-                    validation_result=validation_result,
-                ))
-                continue
-
-            # Stage 3: AI Review (if not skipped)
-            if skip_review:
-                # Skip review - approve directly
-                result.approved.append(ProcessedQuestion(
-                    question=question,
-                    status=QuestionStatus.APPROVED,
-                    validation_result=validation_result,
-                ))
-                continue
-
-            # Perform AI review
-            review_result = await self.reviewer.review(question, user_id)
-
-            if review_result.is_approved:
-                # Passed review - approve
-                result.approved.append(ProcessedQuestion(
-                    question=question,
-                    status=QuestionStatus.APPROVED,
-                    validation_result=validation_result,
-                    review_result=review_result,
-                ))
-            else:
-                # Review failed - try to fix once
-                original = question.copy()
+        self.validator.reset_duplicates()
+        return await self._check(raw_questions, user_id, skip_review)
 
-                if review_result.fixed_question:
-                    # Use fix from review response
-                    fixed_question = review_result.fixed_question
-                else:
-                    # Try to fix
-                    fixed_question = await self.reviewer.fix(
-                        question, review_result.issues, user_id
+    async def _check(
+        self,
+        raw_questions: List[Dict[str, Any]],
+        user_id: Optional[int],
+        skip_review: bool,
+    ) -> PipelineResult:
+        """Validate → review (→ fix → review) generated questions"""
+        result = PipelineResult()
+
+        # Stage 2: Validate all questions; duplicates are checked against
+        # every stem the validator has seen since its last reset
+        with _stage("validate"):
+            validated = [(q, self.validator.validate(q)) for q in raw_questions]
+
+        # Stage 3: First-pass review of all valid questions in batched
+        # prompts (LLM_REVIEW_BATCH_SIZE > 1), then each question's fix chain
+        # runs as its own task; gather keeps the input order, so the
+        # categorized lists are deterministic
+        initial_reviews: Dict[int, ReviewResult] = {}
+        if not skip_review and settings.LLM_REVIEW_BATCH_SIZE > 1:
+            valid = [i for i, (_, v) in enumerate(validated) if v.is_valid]
+            if valid:
+                with _stage("review"):
+                    reviews = await self.reviewer.review_many(
+                        [validated[i][0] for i in valid], user_id
                     )
+                initial_reviews = dict(zip(valid, reviews))
 
-                if fixed_question:
-                    # Re-validate fixed question
-                    fix_validation = self.validator.validate(fixed_question)
-
-                    if fix_validation.is_valid:
-                        # Re-review fixed question
-                        fix_review = await self.reviewer.review(fixed_question, user_id)
-
-                        if fix_review.is_approved:
-                            # Fixed successfully
-                            result.approved.append(ProcessedQuestion(
-                                question=fixed_question,
-                                status=QuestionStatus.APPROVED,
-                                validation_result=fix_validation,
-                                review_result=fix_review,
-                                original_question=original,
-                            ))
-                            continue
-
-                # Fix failed or still not approved - needs human review
-                result.needs_review.append(ProcessedQuestion(
-                    question=fixed_question or question,
-                    status=QuestionStatus.NEEDS_REVIEW,
-                    validation_result=validation_result,
-                    review_result=review_result,
-                    original_question=original if fixed_question else None,
-                ))
+        semaphore = asyncio.Semaphore(max(1, settings.PIPELINE_REVIEW_CONCURRENCY))
+        processed = await asyncio.gather(*(
+            self._process_question(
+                question, validation_result, user_id, skip_review, semaphore,
+                initial_reviews.get(index),
+            )
+            for index, (question, validation_result) in enumerate(validated)
+        ))
 
+        result.add_all(processed)
         return result
 
+    def plan_shards(self, request: GenerationRequest) -> List[int]:
+        """
+        Split a large question count into generation shards
+
+        A shard asks for no more questions than fit in the generation
+        provider's max_tokens at LLM_GENERATE_TOKENS_PER_QUESTION each, and
+        never more than PIPELINE_SHARD_SIZE. The count is spread evenly, so
+        25 questions at a limit of 10 become 9 + 8 + 8 rather than 10 + 10 + 5.
+
+        Returns:
+            Question count per shard
+        """
+        registry = self.llm_service.registry
+        provider = self.llm_service.get_provider(registry.route(LLMScene.GENERATE)[0])
+
+        per_question = settings.LLM_GENERATE_TOKENS_PER_QUESTION.get(
+            request.question_type.value, 500
+        )
+        size = max(1, min(settings.PIPELINE_SHARD_SIZE, provider.max_tokens // max(per_question, 1)))
+        shards = -(-request.count // size)
+        base, extra = divmod(request.count, shards)
+        return [base + 1 if i < extra else base for i in range(shards)]
+
+    async def generate_batch(
+        self,
+        request: BatchGenerationRequest,
+        user_id: Optional[int] = None,
+        skip_review: bool = False,
+        exclude: Optional[List[Dict[str, Any]]] = None,
+        on_shard: Optional[ShardCallback] = None,
+    ) -> Tuple[PipelineResult, List[Dict[str, Any]]]:
+        """
+        Generate a large question bank in shards
+
+        The count is split by plan_shards and the shards run concurrently,
+        at most PIPELINE_SHARD_CONCURRENCY at a time (the provider's rate
+        limiter and LLM_MAX_CONCURRENCY still apply to every call). Each
+        shard's prompt names its part of the batch, so the shards don't
+        ask for the same questions and aren't coalesced into one upstream
+        call. Questions are checked for duplicates across all shards; when
+        two shards produce the same stem, the shard that finishes later has
+        its copy rejected. A shard whose generation fails is reported and
+        skipped, the others still make it into the result.
+
+        Args:
+            request: Generation parameters with the total count
+            user_id: Optional user ID for logging
+            skip_review: Skip AI review stage
+            exclude: Questions from an earlier run of the same batch, which
+                new questions must not duplicate
+            on_shard: Awaited with each shard's result and report as soon
+                as the shard finishes (an error fails that shard)
+
+        Returns:
+            (merged result in shard order, per-shard report with tokens spent)
+        """
+        sizes = self.plan_shards(request)
+        self.validator.reset_duplicates()
+        self.validator.remember(exclude or [])
+        print(f"[出题] 批量生成 {request.count} 道题目, 分 {len(sizes)} 片: {sizes}")
+
+        with span(
+            "pipeline.batch",
+            **{
+                "question.type": request.question_type.value,
+                "question.count": request.count,
+                "pipeline.shards": len(sizes),
+            },
+        ) as batch_span:
+            result, shards = await self._run_shards(request, sizes, user_id, skip_review, on_shard)
+
+            failed = sum(1 for report in shards if "error" in report)
+            batch_span.set_attribute("pipeline.failed_shards", failed)
+            batch_span.set_attribute("pipeline.approved", len(result.approved))
+            print(
+                f"[出题] 批量生成完成: {result.total_generated} 道, "
+                f"通过 {len(result.approved)}, 失败分片 {failed}/{len(sizes)}"
+            )
+            return result, shards
+
+    async def _run_shards(
+        self,
+        request: BatchGenerationRequest,
+        sizes: List[int],
+        user_id: Optional[int],
+        skip_review: bool,
+        on_shard: Optional[ShardCallback] = None,
+    ) -> Tuple[PipelineResult, List[Dict[str, Any]]]:
+        """Run planned shards concurrently and merge them in shard order"""
+        semaphore = asyncio.Semaphore(max(1, settings.PIPELINE_SHARD_CONCURRENCY))
+        tokens: Dict[int, int] = {}
+
+        async def run_shard(index: int, count: int) -> PipelineResult:
+            shard_request = self._shard_request(request, index, count, len(sizes))
+            async with semaphore:
+                with span("pipeline.shard", **{"shard.index": index, "shard.count": count}), \
+                        metered() as meter:
+                    with _stage("generate"):
+                        raw_questions = await self.generator.generate(shard_request, user_id)
+                    result = await self._check(raw_questions, user_id, skip_review)
+                tokens[index] = meter.total_tokens
+                if on_shard is not None:
+                    await on_shard(result, {
+                        "shard": index,
+                        "requested": count,
+                        "generated": result.total_generated,
+                        "tokens": meter.total_tokens,
+                    })
+                return result
+
+        outcomes = await asyncio.gather(
+            *(run_shard(index, count) for index, count in enumerate(sizes)),
+            return_exceptions=True,
+        )
+
+        result = PipelineResult()
+        shards: List[Dict[str, Any]] = []
+        for index, (count, outcome) in enumerate(zip(sizes, outcomes)):
+            report: Dict[str, Any] = {"shard": index, "requested": count}
+            if isinstance(outcome, BaseException):
+                if isinstance(outcome, asyncio.CancelledError):
+                    raise outcome
+                print(f"[出题] ✗ 第 {index + 1} 片生成失败: {type(outcome).__name__}: {outcome}")
+                report.update(generated=0, error=f"{type(outcome).__name__}: {outcome}")
+            else:
+                report.update(
+                    generated=outcome.total_generated,
+                    approved=len(outcome.approved),
+                    needs_review=len(outcome.needs_review),
+                    rejected=len(outcome.rejected),
+                    tokens=tokens.get(index, 0),
+                )
+                result.add_all(outcome.approved + outcome.needs_review + outcome.rejected)
+            shards.append(report)
+        return result, shards
+
+    async def generate_target(
+        self,
+        request: GenerationRequest,
+        user_id: Optional[int] = None,
+        skip_review: bool = False,
+        token_budget: Optional[int] = None,
+        exclude: Optional[List[Dict[str, Any]]] = None,
+        on_shard: Optional[ShardCallback] = None,
+    ) -> PipelineResult:
+        """
+        Generate until request.count questions are approved
+
+        The first round asks for count / expected approval rate questions
+        (the rolling rate of this course, type and difficulty, see
+        ApprovalRates); each further round asks for the missing count the
+        same way, with the stems approved so far quoted so the model avoids
+        them. Duplicates are checked across rounds. Stops when the target
+        is reached, after PIPELINE_TARGET_MAX_ROUNDS rounds, when a round
+        generates nothing, or when the token budget runs out: each round is
+        shrunk to what the remaining budget affords at the tokens per
+        question seen so far in this run (or, for the first round, the
+        rolling cost of earlier runs). Approved questions beyond the target
+        are dropped. exclude and on_shard are as for generate_batch.
+
+        Returns:
+            PipelineResult with `usage`: rounds, stop reason and token
+            spend, including tokens per approved question
+        """
+        target = request.count
+        budget = settings.PIPELINE_TARGET_TOKEN_BUDGET if token_budget is None else token_budget
+        key = ApprovalRates.key(request)
+        result = PipelineResult()
+        rounds: List[Dict[str, Any]] = []
+        requested_total = 0
+        stopped = "max_rounds"
+        self.validator.reset_duplicates()
+        self.validator.remember(exclude or [])
+
+        with span(
+            "pipeline.target",
+            **{"question.type": request.question_type.value, "pipeline.target": target},
+        ) as target_span, metered() as meter:
+            for round_no in range(1, max(settings.PIPELINE_TARGET_MAX_ROUNDS, 1) + 1):
+                missing = target - len(result.approved)
+                if missing <= 0:
+                    stopped = "target"
+                    break
+
+                rate = approval_rates.rate(key)
+                count = min(math.ceil(missing / rate), settings.PIPELINE_BATCH_MAX_COUNT)
+                if budget > 0:
+                    remaining = budget - meter.total_tokens
+                    cost = (
+                        meter.total_tokens / requested_total
+                        if requested_total else approval_rates.cost(key)
+                    )
+                    if cost:
+                        count = min(count, int(remaining // cost))
+                    if remaining <= 0 or count < 1:
+                        stopped = "budget"
+                        break
+
+                round_request = BatchGenerationRequest(
+                    **request.model_dump(exclude={"count", "additional_requirements"}),
+                    count=count,
+                    additional_requirements=self._avoid_repeats(request, result),
+                )
+                spent_before = meter.total_tokens
+                round_result, shards = await self._run_shards(
+                    round_request, self.plan_shards(round_request), user_id, skip_review, on_shard
+                )
+                requested = sum(r["requested"] for r in shards if "error" not in r)
+                requested_total += requested
+                approval_rates.record(
+                    key, len(round_result.approved), requested, meter.total_tokens - spent_before
+                )
+                result.add_all(round_result.approved + round_result.needs_review + round_result.rejected)
+
+                rounds.append({
+                    "round": round_no,
+                    "requested": count,
+                    "expected_rate": round(rate, 3),
+                    "generated": round_result.total_generated,
+                    "approved": len(round_result.approved),
+                    "failed_shards": sum(1 for r in shards if "error" in r),
+                    "tokens": meter.total_tokens - spent_before,
+                })
+                print(
+                    f"[出题] 目标模式第 {round_no} 轮: 请求 {count} 道 (预估通过率 {rate:.0%}), "
+                    f"通过 {len(round_result.approved)}, 累计 {len(result.approved)}/{target}"
+                )
+                if requested == 0:
+                    stopped = "failed"
+                    break
+            else:
+                if len(result.approved) >= target:
+                    stopped = "target"
+
+            surplus = max(len(result.approved) - target, 0)
+            if surplus:
+                del result.approved[target:]
+
+            approved = len(result.approved)
+            result.usage = {
+                "target": target,
+                "reached": approved >= target,
+                "stopped": stopped,
+                "rounds": rounds,
+                "surplus_dropped": surplus,
+                "token_budget": budget or None,
+                "calls": meter.calls,
+                "prompt_tokens": meter.prompt_tokens,
+                "completion_tokens": meter.completion_tokens,
+                "total_tokens": meter.total_tokens,
+                "tokens_per_approved": round(meter.total_tokens / approved, 1) if approved else None,
+            }
+            target_span.set_attribute("pipeline.rounds", len(rounds))
+            target_span.set_attribute("pipeline.total_tokens", meter.total_tokens)
+            print(
+                f"[出题] 目标模式结束 ({stopped}): 通过 {approved}/{target}, "
+                f"{len(rounds)} 轮, 消耗 {meter.total_tokens} tokens"
+            )
+            return result
+
+    @staticmethod
+    def _avoid_repeats(request: GenerationRequest, result: PipelineResult) -> Optional[str]:
+        """Additional requirements of a top-up round, quoting approved stems"""
+        additional = request.additional_requirements
+        if not result.approved:
+            return additional
+        stems = "；".join(
+            pq.question.get("stem", "")[:60] for pq in result.approved[-_AVOID_STEMS:]
+        )
+        part = f"请勿与以下已有题目重复：{stems}"
+        return f"{additional}；{part}" if additional else part
+
+    @staticmethod
+    def _shard_request(
+        request: BatchGenerationRequest,
+        index: int,
+        count: int,
+        shards: int,
+    ) -> GenerationRequest:
+        """The generation request for one shard of a batch"""
+        additional = request.additional_requirements
+        if shards > 1:
+            part = (
+                f"本次为分批出题的第 {index + 1}/{shards} 批（共 {request.count} 道），"
+                f"请侧重该知识点的不同方面，避免与其他批次的题目重复"
+            )
+            additional = f"{additional}；{part}" if additional else part
+        return GenerationRequest(
+            **request.model_dump(exclude={"count", "additional_requirements"}),
+            count=count,
+            additional_requirements=additional,
+        )
+
+    async def generate_stream(
+        self,
+        request: GenerationRequest,
+        user_id: Optional[int] = None,
+        skip_review: bool = False,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the pipelined mode, reporting progress question by question
+
+        Args:
+            request: Generation request parameters
+            user_id: Optional user ID for logging
+            skip_review: Skip AI review stage
+
+        Yields:
+            Events as {"event", "index", ...}: generated, validated,
+            reviewed, fixed and question (final status) per question, in
+            the order they happen; error if generation fails part way;
+            complete with the full result, in generation order, and the
+            per-stage occupancy, last
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+
+        def emit(event: str, index: Optional[int] = None, **data: Any) -> None:
+            queue.put_nowait({"event": event, "index": index, **data})
+
+        runner = asyncio.create_task(self.generate_pipelined(request, user_id, skip_review, emit))
+        runner.add_done_callback(lambda _: queue.put_nowait(None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                yield event
+            result, stages = runner.result()
+        finally:
+            # Client went away: stop generating and reviewing
+            runner.cancel()
+
+        yield {"event": "complete", "index": None, "data": {**result.to_dict(), "stages": stages}}
+
+    async def generate_pipelined(
+        self,
+        request: GenerationRequest,
+        user_id: Optional[int] = None,
+        skip_review: bool = False,
+        notify: Optional[Notify] = None,
+    ) -> Tuple[PipelineResult, Dict[str, Any]]:
+        """
+        Pipelined mode: generator, validator and reviewers run concurrently
+
+        The streamed completion is parsed incrementally; each question goes
+        through a bounded queue to the validator and then through another
+        to PIPELINE_REVIEW_CONCURRENCY reviewers, so question k is reviewed
+        while question k+1 is still being generated. When reviewers fall
+        behind, the full queues hold back the stages upstream. Reviews are
+        single-question (not batched) so no question waits for the others.
+
+        Every stage worker's time is split into busy, starved (waiting for
+        input) and blocked (waiting for room downstream), exported as
+        pipeline_stage_state_seconds_total and returned per run: the stage
+        with the highest busy utilization is the bottleneck.
+
+        Args:
+            request: Generation request parameters
+            user_id: Optional user ID for logging
+            skip_review: Skip AI review stage
+            notify: Progress callback, notify(event, index, **data)
+
+        Returns:
+            (PipelineResult in generation order, per-stage occupancy)
+        """
+        notify = notify or (lambda event, index=None, **data: None)
+        registry = self.llm_service.registry
+        review_workers = max(1, settings.PIPELINE_REVIEW_CONCURRENCY)
+        clocks = {
+            "generate": _StageClock("generate", registry.route(LLMScene.GENERATE)[0], 1),
+            "validate": _StageClock("validate", "local", 1),
+            "review": _StageClock("review", registry.route(LLMScene.REVIEW)[0], review_workers),
+        }
+        validate_queue = _StageQueue("validate", settings.PIPELINE_QUEUE_SIZE)
+        review_queue = _StageQueue("review", settings.PIPELINE_QUEUE_SIZE)
+        processed: Dict[int, ProcessedQuestion] = {}
+
+        def finish(index: int, item: ProcessedQuestion) -> None:
+            processed[index] = item
+            notify("question", index, status=item.status.value, data=item.to_dict())
+
+        async def generate_worker() -> None:
+            clock = clocks["generate"]
+            index = 0
+            stream = self.generator.stream_questions(request, user_id).__aiter__()
+            try:
+                with _stage("generate"):
+                    while True:
+                        with clock.state("busy"):
+                            try:
+                                question = await stream.__anext__()
+                            except StopAsyncIteration:
+                                break
+                        notify("generated", index, question=question)
+                        with clock.state("blocked"):
+                            await validate_queue.put((index, question))
+                        index += 1
+                print(f"[出题] 流式生成 {index} 道题目")
+            except Exception as e:
+                # Questions already parsed are still reviewed and returned
+                print(f"[出题] ✗ 流式生成中断: {type(e).__name__}: {e}")
+                notify("error", message=str(e))
+            finally:
+                await stream.aclose()
+                await validate_queue.put(None)
+
+        async def validate_worker() -> None:
+            clock = clocks["validate"]
+            self.validator.reset_duplicates()
+            while True:
+                with clock.state("starved"):
+                    item = await validate_queue.get()
+                if item is None:
+                    break
+                index, question = item
+                with clock.state("busy"):
+                    validation_result = self.validator.validate(question)
+                notify(
+                    "validated", index,
+                    is_valid=validation_result.is_valid,
+                    errors=_validation_errors(validation_result),
+                )
+                if validation_result.is_valid and not skip_review:
+                    with clock.state("blocked"):
+                        await review_queue.put((index, question, validation_result))
+                else:
+                    finish(index, ProcessedQuestion(
+                        question=question,
+                        status=QuestionStatus.APPROVED if validation_result.is_valid else QuestionStatus.REJECTED,
+                        validation_result=validation_result,
+                    ))
+            for _ in range(review_workers):
+                await review_queue.put(None)
+
+        async def review_worker() -> None:
+            clock = clocks["review"]
+            while True:
+                with clock.state("starved"):
+                    item = await review_queue.get()
+                if item is None:
+                    break
+                index, question, validation_result = item
+                with clock.state("busy"), span(
+                    "pipeline.question", **{"question.type": question.get("type", "unknown")}
+                ):
+                    finish(index, await self._review_question(
+                        question, validation_result, user_id,
+                        notify=lambda event, index=index, **data: notify(event, index, **data),
+                    ))
+
+        with span(
+            "pipeline.pipelined",
+            **{"question.type": request.question_type.value, "question.count": request.count},
+        ):
+            started = time.perf_counter()
+            workers = [
+                asyncio.create_task(generate_worker()),
+                asyncio.create_task(validate_worker()),
+                *(asyncio.create_task(review_worker()) for _ in range(review_workers)),
+            ]
+            try:
+                await asyncio.gather(*workers)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                validate_queue.close()
+                review_queue.close()
+            elapsed = time.perf_counter() - started
+
+        result = PipelineResult()
+        result.add_all(processed[i] for i in sorted(processed))
+        stages = {name: clock.snapshot(elapsed) for name, clock in clocks.items()}
+        return result, stages
+
+    async def _process_question(
+        self,
+        question: Dict[str, Any],
+        validation_result: ValidationResult,
+        user_id: Optional[int],
+        skip_review: bool,
+        semaphore: asyncio.Semaphore,
+        review_result: Optional[ReviewResult] = None,
+        notify: Optional[Notify] = None,
+    ) -> ProcessedQuestion:
+        """
+        Review one validated question, fixing it once if the review fails
+
+        Args:
+            question: Generated question
+            validation_result: Its rule-based validation result
+            user_id: Optional user ID for logging
+            skip_review: Approve valid questions without AI review
+            semaphore: Bounds how many review chains run at once
+            review_result: First-pass verdict from a batch review, if any
+            notify: Progress callback (streaming pipeline)
+
+        Returns:
+            ProcessedQuestion with its final status
+        """
+        if not validation_result.is_valid:
+            # Validation failed - reject
+            return ProcessedQuestion(
+                question=question,
+                status=QuestionStatus.REJECTED,
+                validation_result=validation_result,
+            )
+
+        if skip_review:
+            # Skip review - approve directly
+            return ProcessedQuestion(
+                question=question,
+                status=QuestionStatus.APPROVED,
+                validation_result=validation_result,
+            )
+
+        async with semaphore:
+            with span("pipeline.question", **{"question.type": question.get("type", "unknown")}):
+                return await self._review_question(
+                    question, validation_result, user_id, review_result, notify
+                )
+
+    async def _review_question(
+        self,
+        question: Dict[str, Any],
+        validation_result: ValidationResult,
+        user_id: Optional[int],
+        review_result: Optional[ReviewResult] = None,
+        notify: Optional[Notify] = None,
+    ) -> ProcessedQuestion:
+        """Review → (fix → re-validate → re-review) chain of one question"""
+        notify = notify or (lambda event, **data: None)
+
+        if review_result is None:
+            with _stage("review"):
+                review_result = await self.reviewer.review(question, user_id)
+        notify("reviewed", round=1, approved=review_result.is_approved, issues=_issues(review_result))
+
+        if review_result.is_approved:
+            # Passed review - approve
+            return ProcessedQuestion(
+                question=question,
+                status=QuestionStatus.APPROVED,
+                validation_result=validation_result,
+                review_result=review_result,
+            )
+
+        # Review failed - try to fix once
+        original = question.copy()
+
+        if review_result.fixed_question:
+            # Use fix from review response
+            fixed_question = review_result.fixed_question
+        else:
+            # Try to fix
+            with _stage("fix"):
+                fixed_question = await self.reviewer.fix(
+                    question, review_result.issues, user_id
+                )
+
+        if fixed_question:
+            notify("fixed", question=fixed_question)
+            # Re-validate fixed question
+            fix_validation = self.validator.validate(fixed_question)
+
+            if fix_validation.is_valid:
+                # Re-review fixed question
+                with _stage("review"):
+                    fix_review = await self.reviewer.review(fixed_question, user_id)
+                notify("reviewed", round=2, approved=fix_review.is_approved, issues=_issues(fix_review))
+
+                if fix_review.is_approved:
+                    # Fixed successfully
+                    return ProcessedQuestion(
+                        question=fixed_question,
+                        status=QuestionStatus.APPROVED,
+                        validation_result=fix_validation,
+                        review_result=fix_review,
+                        original_question=original,
+                    )
+
+        # Fix failed or still not approved - needs human review
+        return ProcessedQuestion(
+            question=fixed_question or question,
+            status=QuestionStatus.NEEDS_REVIEW,
+            validation_result=validation_result,
+            review_result=review_result,
+            original_question=original if fixed_question else None,
+        )
+
     async def generate_quick(
         self,
         request: GenerationRequest,
@@ -242,7 +996,8 @@ class GenerationPipeline:
         Returns:
             List of validated questions (no AI review)
         """
-        result = await self.generate(request, user_id, skip_review=True)
+        # Interactive path: hedge the generation call against tail latency
+        result = await self.generate(request, user_id, skip_review=True, hedge=True)
         return [pq.question for pq in result.approved]
 
     async def generate_single(
@@ -6,10 +6,11 @@ Uses LLM to generate questions based on requirements
 
 import json
 import re
-from typing import List, Optional, Dict, Any
+from typing import AsyncIterator, List, Optional, Dict, Any
 
 from app.services.llm_service import LLMService
 from app.core.llm.base import Message
+from app.core.llm.json_stream import JSONArrayStreamParser
 from app.models.llm_log import LLMScene
 from app.schemas.question import (
     QuestionType,
@@ -213,6 +214,7 @@ class GeneratorService:
         self,
         request: GenerationRequest,
         user_id: Optional[int] = None,
+        hedge: bool = False,
     ) -> List[Dict[str, Any]]:
         """
         Generate questions based on request
@@ -220,6 +222,7 @@ class GeneratorService:
         Args:
             request: Generation request parameters
             user_id: Optional user ID for logging
+            hedge: Hedge the LLM call (for interactive, latency-critical use)
 
         Returns:
             List of generated question dictionaries
@@ -237,6 +240,7 @@ class GeneratorService:
             scene=LLMScene.GENERATE,
             user_id=user_id,
             request_summary=f"Generate {request.count} {request.question_type.value} questions",
+            hedge=hedge,
             temperature=0.7,  # Some creativity for question generation
         )
 
@@ -245,15 +249,67 @@ class GeneratorService:
 
         # Ensure each question has required fields
         for q in questions:
-            if 'type' not in q:
-                q['type'] = request.question_type.value
-            if 'difficulty' not in q:
-                q['difficulty'] = request.difficulty
-            if 'knowledge_point' not in q:
-                q['knowledge_point'] = request.knowledge_point
+            self._fill_defaults(q, request)
 
         return questions
 
+    def _fill_defaults(self, question: Dict[str, Any], request: GenerationRequest) -> None:
+        """Fill fields the model left out from the request"""
+        if 'type' not in question:
+            question['type'] = request.question_type.value
+        if 'difficulty' not in question:
+            question['difficulty'] = request.difficulty
+        if 'knowledge_point' not in question:
+            question['knowledge_point'] = request.knowledge_point
+
+    async def stream_questions(
+        self,
+        request: GenerationRequest,
+        user_id: Optional[int] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Generate questions, yielding each one as soon as it is complete
+
+        The streamed completion is fed to an incremental JSON array parser,
+        so the first question is available long before the model finishes
+        the batch. If nothing could be parsed incrementally (e.g. the model
+        answered with a single object), the full text is parsed at the end.
+
+        Args:
+            request: Generation request parameters
+            user_id: Optional user ID for logging
+
+        Yields:
+            Question dictionaries, in generation order
+        """
+        prompt = self._build_prompt(request)
+
+        messages = [
+            Message(role="system", content="你是一个专业的教育出题专家，擅长生成高质量的考试题目。"),
+            Message(role="user", content=prompt),
+        ]
+
+        parser = JSONArrayStreamParser()
+        chunks: List[str] = []
+        async for chunk in self.llm_service.chat_stream(
+            messages=messages,
+            scene=LLMScene.GENERATE,
+            user_id=user_id,
+            request_summary=f"Generate {request.count} {request.question_type.value} questions (stream)",
+            temperature=0.7,
+        ):
+            if not chunk.content:
+                continue
+            chunks.append(chunk.content)
+            for question in parser.feed(chunk.content):
+                self._fill_defaults(question, request)
+                yield question
+
+        if parser.emitted == 0:
+            for question in self._extract_json("".join(chunks)):
+                self._fill_defaults(question, request)
+                yield question
+
     async def generate_stream(
         self,
         request: GenerationRequest,
@@ -0,0 +1,294 @@
+"""
+Grading Queue Service
+
+Background grading of submitted attempts: a fixed pool of async workers
+in the application's event loop drains the grading_tasks table, with
+leases, retries and resumption after a restart
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, func, insert, literal, or_, select, update
+
+from app.config import settings
+from app.core.metrics import GRADING_QUEUE_DEPTH, GRADING_QUEUE_OLDEST_SECONDS, GRADING_TASKS_FINISHED
+from app.db.session import async_session_maker
+from app.models.exam import Attempt, AttemptStatus, GradingTask, GradingTaskStatus
+from app.services.exam_service import ExamService
+
+
+def _now() -> datetime:
+    """Timestamps are stored as naive UTC"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class GradingQueue:
+    """
+    Pool of GRADING_WORKERS workers grading queued attempts
+
+    A worker claims the oldest due task with a conditional UPDATE (so each
+    task goes to one worker, also across processes sharing the database)
+    and holds a lease of GRADING_LEASE_SECONDS, renewed while it grades. A
+    task whose lease expired (its process died) is claimed again.
+
+    A try fails when grading raises or when any answer could only get the
+    grading service's fallback score because the LLM call or its parsing
+    failed; nothing is saved and the task is retried after
+    GRADING_RETRY_BACKOFF_SECONDS, doubling each time. The last of the
+    GRADING_MAX_ATTEMPTS tries keeps fallback scores (the attempt is then
+    AI-graded for the teacher to review) and only fails if grading raises,
+    leaving the attempt submitted. Tasks interrupted by a clean shutdown go
+    back to pending without using up a try.
+
+    An attempt that is no longer submitted when its task is claimed (it
+    was graded before a crash let the task be claimed again) is not
+    graded twice. Submitted attempts without a task (their grading was
+    lost before tasks were persisted) are queued when the workers start.
+
+    Workers start with the application, or on the first wake().
+    """
+
+    def __init__(self):
+        self._workers: List[asyncio.Task] = []
+        self._recovery: Optional[asyncio.Task] = None
+        self._running: Dict[int, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._claim_lock: Optional[asyncio.Lock] = None
+        self._stats_at = 0.0
+        self._stopping = False
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def start(self) -> None:
+        """Start the workers on the running loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._claim_lock = asyncio.Lock()
+            self._workers = []
+        self._stopping = False
+        self._workers = [w for w in self._workers if not w.done()]
+        if not self._workers:
+            self._recovery = loop.create_task(self._enqueue_orphans())
+        while len(self._workers) < max(settings.GRADING_WORKERS, 1):
+            self._workers.append(loop.create_task(self._worker()))
+
+    async def stop(self) -> None:
+        """Stop the workers; tasks being graded go back to pending (application shutdown)"""
+        self._stopping = True
+        tasks = self._workers + ([self._recovery] if self._recovery is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers = []
+        self._recovery = None
+
+    def wake(self) -> None:
+        """A task was queued"""
+        self.start()
+        self._wakeup.set()
+
+    async def _enqueue_orphans(self) -> int:
+        """Queue a pending task for every submitted attempt that has none"""
+        now = _now()
+        orphans = (
+            select(Attempt.id, func.coalesce(Attempt.submitted_at, now), literal(now))
+            .where(
+                Attempt.status == AttemptStatus.SUBMITTED,
+                ~select(GradingTask.id).where(GradingTask.attempt_id == Attempt.id).exists(),
+            )
+        )
+        try:
+            async with async_session_maker() as db:
+                result = await db.execute(
+                    insert(GradingTask).from_select(
+                        ["attempt_id", "enqueued_at", "available_at"], orphans,
+                    )
+                )
+                await db.commit()
+        except Exception as e:
+            # Another process queued them first (attempt_id is unique), or the database is busy
+            print(f"[批改] 补充遗漏的批改任务失败: {type(e).__name__}: {e}")
+            return 0
+        if result.rowcount:
+            print(f"[批改] 已提交但未排队的答卷 {result.rowcount} 份, 已加入批改队列")
+            self._wakeup.set()
+        return result.rowcount
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                claimed = await self._claim()
+            except Exception as e:
+                print(f"[批改] 领取批改任务失败: {type(e).__name__}: {e}")
+                claimed = None
+
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), settings.GRADING_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+                continue
+
+            task_id, attempt_id, tries = claimed
+            self._running[task_id] = asyncio.current_task()
+            try:
+                await self._process(task_id, attempt_id, tries)
+            except Exception as e:
+                # Outcome not recorded: the task is claimed again when its lease expires
+                print(f"[批改] 批改任务 {task_id} 状态更新失败: {type(e).__name__}: {e}")
+            finally:
+                self._running.pop(task_id, None)
+
+    async def _claim(self) -> Optional[Tuple[int, int, int]]:
+        """Claim the next due task: (task id, attempt id, tries including this one)"""
+        async with self._claim_lock, async_session_maker() as db:
+            now = _now()
+            await self._give_up_expired(db, now)
+            await self._refresh_stats(db, now)
+
+            due = or_(
+                and_(GradingTask.status == GradingTaskStatus.PENDING, GradingTask.available_at <= now),
+                and_(GradingTask.status == GradingTaskStatus.RUNNING, GradingTask.lease_expires_at < now),
+            )
+            candidates = await db.execute(
+                select(GradingTask.id, GradingTask.attempt_id, GradingTask.attempts)
+                .where(due)
+                .order_by(GradingTask.available_at, GradingTask.id)
+                .limit(5)
+            )
+            for task_id, attempt_id, attempts in candidates.all():
+                result = await db.execute(
+                    update(GradingTask)
+                    .where(GradingTask.id == task_id, due)
+                    .values(
+                        status=GradingTaskStatus.RUNNING,
+                        attempts=GradingTask.attempts + 1,
+                        lease_expires_at=now + timedelta(seconds=settings.GRADING_LEASE_SECONDS),
+                    )
+                )
+                await db.commit()
+                if result.rowcount:
+                    return task_id, attempt_id, attempts + 1
+            return None
+
+    @staticmethod
+    async def _give_up_expired(db, now: datetime) -> None:
+        """Fail tasks whose last allowed try died with its worker"""
+        result = await db.execute(
+            update(GradingTask)
+            .where(
+                GradingTask.status == GradingTaskStatus.RUNNING,
+                GradingTask.lease_expires_at < now,
+                GradingTask.attempts >= settings.GRADING_MAX_ATTEMPTS,
+            )
+            .values(
+                status=GradingTaskStatus.FAILED,
+                last_error="批改多次中断, 已停止重试",
+                finished_at=now,
+            )
+        )
+        if result.rowcount:
+            await db.commit()
+            GRADING_TASKS_FINISHED.labels("failed").inc(result.rowcount)
+
+    async def _refresh_stats(self, db, now: datetime) -> None:
+        """Queue depth and oldest waiting submission, for /metrics (at most once a second)"""
+        loop_time = self._loop.time()
+        if loop_time - self._stats_at < 1.0:
+            return
+        self._stats_at = loop_time
+        depth, oldest = (await db.execute(
+            select(func.count(GradingTask.id), func.min(GradingTask.enqueued_at)).where(
+                GradingTask.status.in_((GradingTaskStatus.PENDING, GradingTaskStatus.RUNNING))
+            )
+        )).one()
+        GRADING_QUEUE_DEPTH.set(depth)
+        GRADING_QUEUE_OLDEST_SECONDS.set((now - oldest).total_seconds() if oldest else 0.0)
+
+    async def _process(self, task_id: int, attempt_id: int, tries: int) -> None:
+        """Grade one claimed attempt and record the outcome"""
+        heartbeat = asyncio.create_task(self._renew_lease(task_id))
+        try:
+            async with async_session_maker() as db:
+                attempt = await db.get(Attempt, attempt_id)
+                if attempt is not None and attempt.status == AttemptStatus.SUBMITTED:
+                    print(f"[批改] 开始批改 考试ID={attempt.exam_id} 学生ID={attempt.student_id} (第{tries}次)")
+                    # Until the last try, an AI grading failure fails the try instead of
+                    # saving placeholder scores; the last try keeps them for the teacher
+                    result = await ExamService(db).grade_submitted_attempt(
+                        attempt.exam_id, attempt.student_id,
+                        strict=tries < settings.GRADING_MAX_ATTEMPTS,
+                    )
+                    if result:
+                        print(f"[批改] ✓ 完成! 状态={result.status.value} 总分={result.total_score}")
+        except asyncio.CancelledError:
+            if self._stopping:
+                # Shutdown: back to pending at once, without using up a try
+                await asyncio.shield(self._finish(
+                    task_id,
+                    status=GradingTaskStatus.PENDING,
+                    attempts=GradingTask.attempts - 1,
+                    lease_expires_at=None,
+                ))
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if tries >= settings.GRADING_MAX_ATTEMPTS:
+                print(f"[批改] ✗ 错误 (已重试{tries}次, 放弃): {error}")
+                await self._finish(
+                    task_id, status=GradingTaskStatus.FAILED, last_error=error, finished_at=_now(),
+                )
+                GRADING_TASKS_FINISHED.labels("failed").inc()
+            else:
+                delay = settings.GRADING_RETRY_BACKOFF_SECONDS * 2 ** (tries - 1)
+                print(f"[批改] ✗ 错误: {error}, {delay:g}秒后重试")
+                await self._finish(
+                    task_id,
+                    status=GradingTaskStatus.PENDING,
+                    available_at=_now() + timedelta(seconds=delay),
+                    lease_expires_at=None,
+                    last_error=error,
+                )
+                GRADING_TASKS_FINISHED.labels("retried").inc()
+        else:
+            await self._finish(
+                task_id, status=GradingTaskStatus.DONE, lease_expires_at=None, finished_at=_now(),
+            )
+            GRADING_TASKS_FINISHED.labels("done").inc()
+        finally:
+            heartbeat.cancel()
+
+    @staticmethod
+    async def _finish(task_id: int, **values) -> None:
+        async with async_session_maker() as db:
+            await db.execute(update(GradingTask).where(GradingTask.id == task_id).values(**values))
+            await db.commit()
+
+    @staticmethod
+    async def _renew_lease(task_id: int) -> None:
+        """Extend the lease of a task being graded every third of GRADING_LEASE_SECONDS"""
+        lease = settings.GRADING_LEASE_SECONDS
+        while True:
+            await asyncio.sleep(max(lease / 3, 0.1))
+            try:
+                async with async_session_maker() as db:
+                    await db.execute(
+                        update(GradingTask)
+                        .where(GradingTask.id == task_id, GradingTask.status == GradingTaskStatus.RUNNING)
+                        .values(lease_expires_at=_now() + timedelta(seconds=lease))
+                    )
+                    await db.commit()
+            except Exception as e:
+                print(f"[批改] 批改任务 {task_id} 续租失败: {e}")
+
+
+# Process-wide worker pool, started with the application
+grading_queue = GradingQueue()
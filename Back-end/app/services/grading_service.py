@@ -6,7 +6,12 @@ Uses LLM to grade subjective questions (short answer, fill-in-the-blank)
 
 import json
 from typing import Optional
-from app.services.llm_service import LLMService
+from app.services.llm_service import LLMService, get_llm_service
+from app.models.llm_log import LLMScene
+
+
+class GradingUnavailableError(Exception):
+    """AI grading fell back to a placeholder score (LLM call or parsing failed)"""
 
 
 class GradingService:
@@ -69,11 +74,12 @@ class GradingService:
 只返回JSON，不要有其他内容。"""
 
         try:
-            # 使用 simple_chat 方法，它直接接受字符串并返回字符串
-            response = await self.llm.simple_chat(prompt)
+            # 使用 simple_chat 方法，GRADE 场景的重试策略在 LLMService 中生效
+            # 低温度使评分稳定, 相同答案可命中响应缓存
+            response = await self.llm.simple_chat(prompt, scene=LLMScene.GRADE, temperature=0.2)
 
             # Parse JSON response
-            result = self._parse_json_response(response, max_score)
+            result = await self._parse_or_evict(prompt, response, max_score)
             return result
 
         except Exception as e:
@@ -81,7 +87,8 @@ class GradingService:
             return {
                 "score": max_score * 0.5,
                 "feedback": f"AI评分暂时不可用: {str(e)}",
-                "analysis": "无法完成自动评分，建议教师手动批改"
+                "analysis": "无法完成自动评分，建议教师手动批改",
+                "fallback": True,
             }
 
     async def grade_fill_blank(
@@ -140,10 +147,11 @@ class GradingService:
 只返回JSON，不要有其他内容。"""
 
         try:
-            # 使用 simple_chat 方法，它直接接受字符串并返回字符串
-            response = await self.llm.simple_chat(prompt)
+            # 使用 simple_chat 方法，GRADE 场景的重试策略在 LLMService 中生效
+            # 低温度使评分稳定, 相同答案可命中响应缓存
+            response = await self.llm.simple_chat(prompt, scene=LLMScene.GRADE, temperature=0.2)
 
-            result = self._parse_json_response(response, max_score)
+            result = await self._parse_or_evict(prompt, response, max_score)
 
             # Ensure blank_scores exists
             if "blank_scores" not in result:
@@ -167,11 +175,26 @@ class GradingService:
                     if str(s).strip().lower() == str(c).strip().lower()
                     else 0
                     for s, c in zip(student_blanks, correct_blanks)
-                ]
+                ],
+                "fallback": True,
             }
 
+    async def _parse_or_evict(self, prompt: str, response: str, max_score: float) -> dict:
+        """Parse a grading response; an unparseable one is dropped from the response cache"""
+        try:
+            return self._parse_json_response(response, max_score)
+        except ValueError:
+            # 避免相同答案命中缓存后一直重放无法解析的评分
+            await self.llm.simple_evict(prompt, scene=LLMScene.GRADE, temperature=0.2)
+            raise
+
     def _parse_json_response(self, response: str, max_score: float) -> dict:
-        """Parse JSON from LLM response"""
+        """
+        Parse JSON from LLM response
+
+        Raises:
+            ValueError: Response is not a JSON object with a numeric score
+        """
         # Clean up response
         response = response.strip()
 
@@ -202,18 +225,15 @@ class GradingService:
                         break
             response = response[:end_idx]
 
-        try:
-            result = json.loads(response)
-        except json.JSONDecodeError:
-            # Fallback
-            return {
-                "score": max_score * 0.5,
-                "feedback": "AI评分解析失败",
-                "analysis": response[:200]
-            }
+        result = json.loads(response)
+        if not isinstance(result, dict):
+            raise ValueError("Expected a JSON object")
 
         # Validate and clamp score
-        score = float(result.get("score", max_score * 0.5))
+        try:
+            score = float(result.get("score", max_score * 0.5))
+        except TypeError:
+            raise ValueError(f"Invalid score: {result.get('score')!r}")
         score = max(0, min(max_score, score))
         result["score"] = score
 
@@ -226,8 +246,5 @@ class GradingService:
 
 async def create_grading_service() -> GradingService:
     """Factory function to create GradingService with LLM"""
-    # LLMService 不需要传入 settings，它会自动从全局 settings 获取配置
-    # db 参数是可选的，用于日志记录，这里不需要
-    llm_service = LLMService()
-
-    return GradingService(llm_service)
+    # 复用进程级共享的 LLMService (Provider实例和连接池在启动时创建)
+    return GradingService(get_llm_service())
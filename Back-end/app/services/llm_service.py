@@ -4,11 +4,11 @@ LLM Service
 Unified service for managing LLM providers with logging and error handling
 """
 
+import asyncio
 import time
-from typing import AsyncIterator, Optional, List, Dict, Any, Type
+from typing import AsyncIterator, Awaitable, Optional, List, Dict, Any, Type, Tuple, FrozenSet
 from enum import Enum
 
-from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import settings
 from app.core.llm.base import (
@@ -20,7 +20,25 @@ from app.core.llm.base import (
 from app.core.llm.deepseek import DeepSeekProvider
 from app.core.llm.qwen import QwenProvider
 from app.core.llm.glm import GLMProvider
-from app.models.llm_log import LLMLog, LLMScene, LLMStatus
+from app.core.llm.mock import MockProvider
+from app.core.llm.rate_limit import ProviderLimiter, estimate_tokens
+from app.core.llm.retry import get_retry_policy, is_retryable, is_timeout
+from app.core.llm.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    CircuitState,
+    Transition,
+    counts_as_failure,
+)
+from app.core.llm.router import LLMRouter
+from app.core.llm.hedging import HedgeController
+from app.core.llm.cache import ResponseCache, cache_key
+from app.core.llm.singleflight import SingleFlight, request_fingerprint
+from app.core.llm.log_writer import llm_log_writer
+from app.core.llm.meter import record_tokens
+from app.core.metrics import LLM_REQUESTS, LLM_REQUEST_SECONDS, LLM_TOKENS
+from app.core.tracing import KIND_CLIENT, current_trace_id, span, tracer
+from app.models.llm_log import LLMScene, LLMStatus
 
 
 class ProviderType(str, Enum):
@@ -28,6 +46,7 @@ class ProviderType(str, Enum):
     DEEPSEEK = "deepseek"
     QWEN = "qwen"
     GLM = "glm"
+    MOCK = "mock"  # Offline load testing, see app/core/llm/mock.py
 
 
 # Provider class mapping
@@ -35,31 +54,36 @@ PROVIDER_MAP: Dict[str, Type[BaseLLMProvider]] = {
     ProviderType.DEEPSEEK: DeepSeekProvider,
     ProviderType.QWEN: QwenProvider,
     ProviderType.GLM: GLMProvider,
+    ProviderType.MOCK: MockProvider,
 }
 
 
-class LLMService:
-    """
-    LLM Service for unified model access
+def _override(kwargs: Dict[str, Any], name: str, default: Any) -> Any:
+    """Per-call parameter if given (and not None), else the provider default"""
+    value = kwargs.get(name)
+    return default if value is None else value
 
-    Features:
-    - Multi-provider support (DeepSeek, Qwen, GLM)
-    - Automatic logging to database
-    - Error handling and retry logic
-    - Streaming support
+
+class ProviderRegistry:
     """
+    Process-wide provider registry
 
-    def __init__(self, db: Optional[AsyncSession] = None):
-        """
-        Initialize LLM service
+    Provider instances are created once per (provider, overrides) key and
+    reused by every LLMService call, so their configuration and the pooled
+    connections behind them survive across requests.
+    """
 
-        Args:
-            db: Optional database session for logging
-        """
-        self.db = db
-        self._providers: Dict[str, BaseLLMProvider] = {}
+    def __init__(self):
+        self._providers: Dict[Tuple[str, FrozenSet], BaseLLMProvider] = {}
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self.router = LLMRouter()
+        self.hedger = HedgeController()
+        self.cache = ResponseCache()
+        self.flights = SingleFlight()
 
-    def _get_provider_config(self, provider_type: str) -> Dict[str, Any]:
+    @staticmethod
+    def get_provider_config(provider_type: str) -> Dict[str, Any]:
         """Get configuration for a specific provider"""
         configs = {
             ProviderType.DEEPSEEK: {
@@ -77,10 +101,32 @@ class LLMService:
                 "base_url": settings.GLM_BASE_URL,
                 "model": settings.GLM_MODEL,
             },
+            ProviderType.MOCK: {
+                "api_key": "mock",
+                "base_url": "mock://local",
+                "model": settings.MOCK_LLM_MODEL,
+            },
         }
-        return configs.get(provider_type, {})
+        return dict(configs.get(provider_type, {}))
 
-    def get_provider(
+    def configured_providers(self) -> List[str]:
+        """
+        Provider types that have an API key configured
+
+        The mock provider is never mixed with real ones: with
+        LLM_PROVIDER=mock it is the only candidate, otherwise it is only
+        used when requested explicitly.
+        """
+        if settings.LLM_PROVIDER == ProviderType.MOCK:
+            return [ProviderType.MOCK.value]
+        return [
+            provider_type.value
+            for provider_type in ProviderType
+            if provider_type != ProviderType.MOCK
+            and self.get_provider_config(provider_type).get("api_key")
+        ]
+
+    def get(
         self,
         provider_type: Optional[str] = None,
         **override_kwargs,
@@ -98,9 +144,10 @@ class LLMService:
         provider_type = provider_type or settings.LLM_PROVIDER
 
         # Check if provider is already created
-        cache_key = f"{provider_type}_{hash(frozenset(override_kwargs.items()))}"
-        if cache_key in self._providers:
-            return self._providers[cache_key]
+        cache_key = (provider_type, frozenset(override_kwargs.items()))
+        provider = self._providers.get(cache_key)
+        if provider is not None:
+            return provider
 
         # Get provider class
         provider_class = PROVIDER_MAP.get(provider_type)
@@ -108,7 +155,7 @@ class LLMService:
             raise ValueError(f"Unknown provider type: {provider_type}")
 
         # Get configuration
-        config = self._get_provider_config(provider_type)
+        config = self.get_provider_config(provider_type)
         if not config.get("api_key"):
             raise ValueError(f"API key not configured for provider: {provider_type}")
 
@@ -126,8 +173,159 @@ class LLMService:
 
         return provider
 
+    def route(self, scene: LLMScene, provider_type: Optional[str] = None) -> List[str]:
+        """
+        Providers to try for a call, best first
+
+        An explicitly requested provider is used alone (no failover);
+        otherwise all configured providers are ranked by the router.
+        """
+        if provider_type:
+            return [provider_type]
+        candidates = self.configured_providers()
+        if not candidates:
+            # Let get() raise the usual "API key not configured" error
+            return [settings.LLM_PROVIDER]
+        ranked = self.router.rank(scene, candidates)
+        # Providers with an open circuit go last (stable sort keeps the ranking)
+        return sorted(ranked, key=lambda p: not self.get_breaker(p).available())
+
+    def get_breaker(self, provider_name: str) -> CircuitBreaker:
+        """Get the circuit breaker for a provider"""
+        breaker = self._breakers.get(provider_name)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                name=provider_name,
+                failure_threshold=settings.LLM_BREAKER_FAILURE_THRESHOLD,
+                recovery_timeout=settings.LLM_BREAKER_RECOVERY_SECONDS,
+            )
+            self._breakers[provider_name] = breaker
+        return breaker
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Response cache size and hit/miss counters"""
+        return self.cache.snapshot()
+
+    def flight_stats(self) -> Dict[str, Any]:
+        """Single-flight coalescing counters"""
+        return self.flights.snapshot()
+
+    def hedge_stats(self) -> Dict[str, Any]:
+        """Hedging counters and win rate"""
+        return self.hedger.snapshot()
+
+    def breaker_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Circuit breaker state per provider"""
+        return {name: breaker.snapshot() for name, breaker in self._breakers.items()}
+
+    def get_limiter(self, provider_name: str) -> ProviderLimiter:
+        """
+        Get the rate limiter for a provider
+
+        One limiter per provider name, shared by all of its instances, since
+        the upstream quota is per account rather than per model override.
+        """
+        limiter = self._limiters.get(provider_name)
+        if limiter is None:
+            limits = settings.LLM_RATE_LIMITS.get(provider_name, {})
+            limiter = ProviderLimiter(
+                name=provider_name,
+                rps=limits.get("rps", settings.LLM_RATE_LIMIT_RPS),
+                tpm=limits.get("tpm", settings.LLM_RATE_LIMIT_TPM),
+                max_concurrency=int(limits.get("max_concurrency", settings.LLM_MAX_CONCURRENCY)),
+                queue_timeout=settings.LLM_QUEUE_TIMEOUT or None,
+            )
+            self._limiters[provider_name] = limiter
+        return limiter
+
+    def limiter_stats(self) -> Dict[str, Dict[str, Any]]:
+        """Queue depth and wait-time metrics per provider"""
+        return {name: limiter.snapshot() for name, limiter in self._limiters.items()}
+
+    async def warmup(self, timeout: float = 5.0) -> None:
+        """
+        Create configured providers and open a pooled connection to each
+
+        Failures are ignored: warmup only saves the first caller a handshake.
+        """
+        async def _warm(provider: BaseLLMProvider) -> None:
+            if not provider.base_url.startswith("http"):
+                return
+            try:
+                await provider.client.get(
+                    f"{provider.base_url}/models",
+                    headers={"Authorization": f"Bearer {provider.api_key}"},
+                    timeout=timeout,
+                )
+            except Exception:
+                pass
+
+        providers = [self.get(provider_type) for provider_type in self.configured_providers()]
+        await asyncio.gather(*(_warm(p) for p in providers))
+        if providers:
+            print(f"[启动] LLM连接预热完成: {', '.join(p.provider_name for p in providers)}")
+
+    def clear(self) -> None:
+        """Drop all cached providers, limiters, breakers and responses"""
+        self._providers.clear()
+        self._limiters.clear()
+        self._breakers.clear()
+        self.cache.clear()
+
+
+# Global provider registry, shared by all LLMService users
+provider_registry = ProviderRegistry()
+
+
+class LLMService:
+    """
+    LLM Service for unified model access
+
+    Features:
+    - Multi-provider support (DeepSeek, Qwen, GLM, offline mock)
+    - Per-provider rate limiting (RPS, TPM, max in-flight) with a FIFO queue
+    - Automatic logging to database (one row per attempt)
+    - Retry with capped exponential backoff, jitter and Retry-After
+    - Latency/health-aware routing with automatic provider failover
+    - Per-provider circuit breaker (fail fast while a provider is down)
+    - Opt-in request hedging for latency-critical calls
+    - Content-addressed response cache (LRU + TTL, optional SQLite)
+    - Single-flight coalescing of identical in-flight calls and streams
+    - Streaming support
+
+    The service is stateless apart from the shared provider registry; call
+    log rows are written by the background log writer with its own session.
+    """
+
+    def __init__(self, registry: Optional[ProviderRegistry] = None):
+        """
+        Initialize LLM service
+
+        Args:
+            registry: Provider registry (defaults to the global registry)
+        """
+        self.registry = registry or provider_registry
+
+    def get_provider(
+        self,
+        provider_type: Optional[str] = None,
+        **override_kwargs,
+    ) -> BaseLLMProvider:
+        """
+        Get a provider instance from the registry
+
+        Args:
+            provider_type: Provider type (defaults to settings.LLM_PROVIDER)
+            **override_kwargs: Override default configuration
+
+        Returns:
+            Provider instance
+        """
+        return self.registry.get(provider_type, **override_kwargs)
+
     async def _log_call(
         self,
+        log: bool,
         scene: LLMScene,
         provider: BaseLLMProvider,
         status: LLMStatus,
@@ -137,12 +335,21 @@ class LLMService:
         error_message: Optional[str] = None,
         request_summary: Optional[str] = None,
         user_id: Optional[int] = None,
+        attempt: int = 1,
+        rollup: bool = True,
     ) -> None:
-        """Log LLM call to database"""
-        if not self.db:
+        """
+        Log LLM call to database
+
+        The row is queued on the background log writer, which inserts it in
+        a batch with its own session. Hedge legs pass log=False: their rows
+        are written by the hedging attempt once the race is decided.
+        """
+        if not log:
             return
 
-        log = LLMLog(
+        await llm_log_writer.write(
+            rollup=rollup,
             user_id=user_id,
             scene=scene,
             model=provider.model,
@@ -153,10 +360,345 @@ class LLMService:
             status=status,
             error_message=error_message,
             request_summary=request_summary,
+            attempt=attempt,
+            trace_id=current_trace_id(),
+        )
+
+    @staticmethod
+    def _deadline_at(scene: LLMScene, deadline: Optional[float]) -> Optional[float]:
+        """Absolute monotonic deadline for a request (None = unbounded)"""
+        seconds = deadline if deadline is not None else get_retry_policy(scene).deadline
+        return time.monotonic() + seconds if seconds else None
+
+    @staticmethod
+    def _remaining(deadline_at: Optional[float]) -> Optional[float]:
+        """Seconds left before the deadline"""
+        if deadline_at is None:
+            return None
+        return max(0.0, deadline_at - time.monotonic())
+
+    async def _log_transition(
+        self,
+        log: bool,
+        scene: LLMScene,
+        provider: BaseLLMProvider,
+        transition: Transition,
+        error: Optional[BaseException] = None,
+    ) -> None:
+        """Record a circuit breaker state change"""
+        old, new = transition
+        print(f"[LLM] {provider.provider_name} 熔断器状态: {old.value} → {new.value}")
+
+        if new == CircuitState.OPEN:
+            status = LLMStatus.TIMEOUT if error is not None and is_timeout(error) else LLMStatus.FAILED
+        else:
+            status = LLMStatus.SUCCESS
+
+        await self._log_call(
+            log=log,
+            scene=scene,
+            provider=provider,
+            status=status,
+            latency_ms=0,
+            error_message=f"{type(error).__name__}: {error}" if error is not None else None,
+            request_summary=f"circuit breaker {old.value} -> {new.value}",
+            rollup=False,
+        )
+
+    async def _record_success(
+        self,
+        provider: BaseLLMProvider,
+        scene: LLMScene,
+        attempt: int,
+        latency_ms: int,
+        log: bool,
+        user_id: Optional[int],
+        request_summary: Optional[str],
+        prompt_tokens: Optional[int] = None,
+        completion_tokens: Optional[int] = None,
+    ) -> None:
+        """Feed a successful attempt to the router, breaker, metrics and call log"""
+        self.registry.router.record(provider.provider_name, latency_ms, ok=True)
+        LLM_REQUESTS.labels(provider.provider_name, scene.value, LLMStatus.SUCCESS.value).inc()
+        LLM_REQUEST_SECONDS.labels(provider.provider_name, scene.value).observe(latency_ms / 1000)
+        if prompt_tokens:
+            LLM_TOKENS.labels(provider.provider_name, scene.value, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels(provider.provider_name, scene.value, "completion").inc(completion_tokens)
+        record_tokens(prompt_tokens, completion_tokens)
+        self.registry.hedger.record_latency(scene, provider.provider_name, latency_ms)
+        transition = self.registry.get_breaker(provider.provider_name).record_success()
+
+        await self._log_call(
+            log=log,
+            scene=scene,
+            provider=provider,
+            status=LLMStatus.SUCCESS,
+            latency_ms=latency_ms,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            request_summary=request_summary,
+            user_id=user_id,
+            attempt=attempt,
         )
+        if transition:
+            await self._log_transition(log, scene, provider, transition)
+
+    async def _record_failure(
+        self,
+        provider: BaseLLMProvider,
+        scene: LLMScene,
+        attempt: int,
+        latency_ms: int,
+        error: BaseException,
+        log: bool,
+        user_id: Optional[int],
+        request_summary: Optional[str],
+    ) -> None:
+        """Feed a failed attempt to the router, breaker, metrics and call log"""
+        status = LLMStatus.TIMEOUT if is_timeout(error) else LLMStatus.FAILED
+        LLM_REQUESTS.labels(provider.provider_name, scene.value, status.value).inc()
+        LLM_REQUEST_SECONDS.labels(provider.provider_name, scene.value).observe(latency_ms / 1000)
 
-        self.db.add(log)
-        await self.db.commit()
+        unhealthy = counts_as_failure(error)
+        self.registry.router.record(
+            provider.provider_name, latency_ms, ok=not (unhealthy or is_retryable(error))
+        )
+        breaker = self.registry.get_breaker(provider.provider_name)
+        # A 4xx means the provider answered: that still closes a half-open circuit
+        transition = breaker.record_failure() if unhealthy else breaker.record_success()
+
+        await self._log_call(
+            log=log,
+            scene=scene,
+            provider=provider,
+            status=status,
+            latency_ms=latency_ms,
+            error_message=str(error) or type(error).__name__,
+            request_summary=request_summary,
+            user_id=user_id,
+            attempt=attempt,
+        )
+        if transition:
+            await self._log_transition(log, scene, provider, transition, error)
+
+    async def _acquire_breaker(
+        self,
+        provider: BaseLLMProvider,
+        scene: LLMScene,
+        log: bool,
+    ) -> Tuple[CircuitBreaker, bool]:
+        """
+        Pass the provider's circuit breaker or fail fast
+
+        Returns:
+            (breaker, probe) - probe is True when this call holds the
+            half-open probe slot and must release() it when done
+        """
+        breaker = self.registry.get_breaker(provider.provider_name)
+        allowed, transition = breaker.allow()
+        # Admitted while not closed: only the probe gets through then
+        probe = allowed and breaker.state == CircuitState.HALF_OPEN
+        if transition:
+            await self._log_transition(log, scene, provider, transition)
+        if not allowed:
+            raise CircuitOpenError(f"Circuit open for provider: {provider.provider_name}")
+        return breaker, probe
+
+    async def _chat_once(
+        self,
+        provider: BaseLLMProvider,
+        messages: List[Message],
+        scene: LLMScene,
+        attempt: int,
+        deadline_at: Optional[float],
+        user_id: Optional[int],
+        request_summary: Optional[str],
+        log: bool,
+        kwargs: Dict[str, Any],
+    ) -> LLMResponse:
+        """Single upstream attempt, traced as one client span"""
+        with span(
+            "llm.request",
+            KIND_CLIENT,
+            **{"llm.provider": provider.provider_name, "llm.model": provider.model, "llm.attempt": attempt},
+        ) as request_span:
+            response = await self._chat_attempt(
+                provider, messages, scene, attempt, deadline_at,
+                user_id, request_summary, log, kwargs,
+            )
+            request_span.set_attribute("llm.prompt_tokens", response.prompt_tokens or 0)
+            request_span.set_attribute("llm.completion_tokens", response.completion_tokens or 0)
+            return response
+
+    async def _chat_attempt(
+        self,
+        provider: BaseLLMProvider,
+        messages: List[Message],
+        scene: LLMScene,
+        attempt: int,
+        deadline_at: Optional[float],
+        user_id: Optional[int],
+        request_summary: Optional[str],
+        log: bool,
+        kwargs: Dict[str, Any],
+    ) -> LLMResponse:
+        """Breaker, rate limit slot, call, log"""
+        breaker, probe = await self._acquire_breaker(provider, scene, log)
+        limiter = self.registry.get_limiter(provider.provider_name)
+        reserve = estimate_tokens(messages, kwargs.get("max_tokens") or provider.max_tokens)
+
+        try:
+            async with limiter.slot(reserve, self._remaining(deadline_at)) as slot:
+                start_time = time.time()
+
+                try:
+                    response = await asyncio.wait_for(
+                        provider.chat(messages, **kwargs),
+                        self._remaining(deadline_at),
+                    )
+                except Exception as e:
+                    latency_ms = int((time.time() - start_time) * 1000)
+                    await self._record_failure(
+                        provider, scene, attempt, latency_ms, e,
+                        log, user_id, request_summary,
+                    )
+                    raise
+
+                latency_ms = int((time.time() - start_time) * 1000)
+                slot.settle(response.total_tokens)
+        finally:
+            # Cancelled or rejected by the limiter: don't hold the probe slot.
+            # A call admitted before the circuit opened must not free the
+            # slot of the probe that is in flight now.
+            if probe:
+                breaker.release()
+
+        await self._record_success(
+            provider, scene, attempt, latency_ms, log, user_id, request_summary,
+            prompt_tokens=response.prompt_tokens,
+            completion_tokens=response.completion_tokens,
+        )
+        return response
+
+    async def _chat_hedged(
+        self,
+        candidates: List[str],
+        index: int,
+        messages: List[Message],
+        scene: LLMScene,
+        attempt: int,
+        deadline_at: Optional[float],
+        user_id: Optional[int],
+        request_summary: Optional[str],
+        log: bool,
+        kwargs: Dict[str, Any],
+    ) -> LLMResponse:
+        """
+        One attempt with a speculative backup request
+
+        If the primary hasn't answered within the hedge delay (and the hedge
+        budget allows), the same request is sent to the next available
+        provider (or the same one) and the first success wins; the loser is
+        cancelled. The legs don't log themselves; their rows are written
+        here afterwards, skipping the cancelled loser.
+        """
+        primary = self.get_provider(candidates[index])
+        if not self.registry.get_breaker(primary.provider_name).available():
+            raise CircuitOpenError(f"Circuit open for provider: {primary.provider_name}")
+
+        backup_name = next(
+            (p for p in candidates[index + 1:] if self.registry.get_breaker(p).available()),
+            candidates[index],
+        )
+        hedger = self.registry.hedger
+        hedger.start()
+        delay = hedger.delay_for(scene, primary.provider_name)
+
+        # task -> [provider, start, end]
+        legs: Dict[asyncio.Task, List[Any]] = {}
+
+        def launch(provider: BaseLLMProvider) -> asyncio.Task:
+            task = asyncio.create_task(self._chat_once(
+                provider, messages, scene, attempt, deadline_at,
+                user_id, request_summary, False, kwargs,
+            ))
+            legs[task] = [provider, time.time(), None]
+            task.add_done_callback(lambda t: legs[t].__setitem__(2, time.time()))
+            return task
+
+        primary_task = launch(primary)
+        backup_task: Optional[asyncio.Task] = None
+        winner: Optional[asyncio.Task] = None
+        try:
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+            if not done and hedger.try_hedge():
+                backup = self.get_provider(backup_name)
+                print(f"[LLM] {primary.provider_name} {delay:.1f}s 未返回, 对冲请求 {backup.provider_name}")
+                backup_task = launch(backup)
+
+            pending = set(legs)
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Prefer the primary if both landed in the same tick
+                for task in sorted(done, key=lambda t: t is not primary_task):
+                    if not task.cancelled() and task.exception() is None:
+                        winner = task
+                        break
+        finally:
+            for task in legs:
+                task.cancel()
+            await asyncio.gather(*legs, return_exceptions=True)
+
+        if backup_task is not None and winner is not None:
+            hedger.record_winner(hedge_won=winner is backup_task)
+
+        for task, (provider, start, end) in legs.items():
+            if task.cancelled():
+                continue
+            latency_ms = int(((end or time.time()) - start) * 1000)
+            error = task.exception()
+            if error is None:
+                response = task.result()
+                await self._log_call(
+                    log=log, scene=scene, provider=provider, status=LLMStatus.SUCCESS,
+                    latency_ms=latency_ms,
+                    prompt_tokens=response.prompt_tokens,
+                    completion_tokens=response.completion_tokens,
+                    request_summary=request_summary, user_id=user_id, attempt=attempt,
+                )
+            elif not isinstance(error, CircuitOpenError):
+                await self._log_call(
+                    log=log, scene=scene, provider=provider,
+                    status=LLMStatus.TIMEOUT if is_timeout(error) else LLMStatus.FAILED,
+                    latency_ms=latency_ms,
+                    error_message=str(error) or type(error).__name__,
+                    request_summary=request_summary, user_id=user_id, attempt=attempt,
+                )
+
+        if winner is not None:
+            return winner.result()
+        # Both legs failed: surface the primary's error to the retry loop
+        raise primary_task.exception()
+
+    def _cache_keys(
+        self,
+        candidates: List[str],
+        messages: List[Message],
+        kwargs: Dict[str, Any],
+    ) -> Dict[str, str]:
+        """Cache key per candidate provider, in routing order"""
+        keys: Dict[str, str] = {}
+        for name in candidates:
+            provider = self.get_provider(name)
+            keys[provider.provider_name] = cache_key(
+                provider.provider_name,
+                provider.model,
+                messages,
+                _override(kwargs, "temperature", provider.temperature),
+                _override(kwargs, "max_tokens", provider.max_tokens),
+            )
+        return keys
 
     async def chat(
         self,
@@ -165,56 +707,136 @@ class LLMService:
         provider_type: Optional[str] = None,
         user_id: Optional[int] = None,
         request_summary: Optional[str] = None,
+        log: bool = True,
+        deadline: Optional[float] = None,
+        hedge: bool = False,
+        cache: Optional[bool] = None,
         **kwargs,
     ) -> LLMResponse:
         """
         Send chat completion request
 
+        Transient failures (timeouts, connection errors, 429/5xx) are retried
+        according to the scene's RetryPolicy; every attempt is logged.
+        Cacheable calls are answered from the response cache when possible,
+        and identical concurrent calls share one upstream call.
+
         Args:
             messages: List of chat messages
-            scene: Usage scene for logging
-            provider_type: Override default provider
+            scene: Usage scene for logging, retry and routing policy
+            provider_type: Force a provider (disables routing and failover)
             user_id: User ID for logging
             request_summary: Brief description for logging
+            log: Write this call to the LLM call log
+            deadline: Total seconds for all attempts (defaults to the policy's)
+            hedge: Fire a backup request if the first attempt is slow
+            cache: Force (True) or bypass (False) the response cache;
+                None caches deterministic scenes only
             **kwargs: Additional provider parameters
 
         Returns:
             LLMResponse with generated content
         """
-        provider = self.get_provider(provider_type)
-        start_time = time.time()
+        with span("llm.chat", scene=scene.value) as call:
+            candidates = self.registry.route(scene, provider_type)
 
-        try:
-            response = await provider.chat(messages, **kwargs)
-            latency_ms = int((time.time() - start_time) * 1000)
-
-            await self._log_call(
-                scene=scene,
-                provider=provider,
-                status=LLMStatus.SUCCESS,
-                latency_ms=latency_ms,
-                prompt_tokens=response.prompt_tokens,
-                completion_tokens=response.completion_tokens,
-                request_summary=request_summary,
-                user_id=user_id,
-            )
+            keys: Dict[str, str] = {}
+            if cache is not False:
+                primary = self.get_provider(candidates[0])
+                temperature = _override(kwargs, "temperature", primary.temperature)
+                if cache or ResponseCache.is_cacheable(scene, temperature):
+                    keys = self._cache_keys(candidates, messages, kwargs)
+                    cached = await self.registry.cache.get(scene, list(keys.values()))
+                    if cached is not None:
+                        call.set_attribute("llm.cache_hit", True)
+                        return cached
+
+            def upstream() -> Awaitable[LLMResponse]:
+                return self._chat_with_retry(
+                    candidates, messages, scene, user_id, request_summary,
+                    log, deadline, hedge, kwargs,
+                )
+
+            if settings.LLM_SINGLE_FLIGHT:
+                # Identical concurrent calls share one upstream call
+                key = request_fingerprint(scene, provider_type, messages, kwargs)
+                response = await self.registry.flights.do(key, upstream)
+            else:
+                response = await upstream()
 
+            call.set_attribute("llm.provider", response.provider)
+            call.set_attribute("llm.model", response.model)
+            if response.provider in keys:
+                await self.registry.cache.set(scene, keys[response.provider], response)
             return response
 
-        except Exception as e:
-            latency_ms = int((time.time() - start_time) * 1000)
-
-            await self._log_call(
-                scene=scene,
-                provider=provider,
-                status=LLMStatus.FAILED,
-                latency_ms=latency_ms,
-                error_message=str(e),
-                request_summary=request_summary,
-                user_id=user_id,
-            )
+    async def evict(
+        self,
+        messages: List[Message],
+        scene: LLMScene = LLMScene.OTHER,
+        provider_type: Optional[str] = None,
+        **kwargs,
+    ) -> None:
+        """
+        Drop the cached responses of a call
+
+        For callers that got an answer they cannot use (e.g. unparseable
+        JSON): otherwise every identical call replays it until the TTL
+        expires. Takes the same arguments as chat().
+        """
+        candidates = self.registry.route(scene, provider_type)
+        keys = self._cache_keys(candidates, messages, kwargs)
+        await self.registry.cache.evict(list(keys.values()))
+
+    async def _chat_with_retry(
+        self,
+        candidates: List[str],
+        messages: List[Message],
+        scene: LLMScene,
+        user_id: Optional[int],
+        request_summary: Optional[str],
+        log: bool,
+        deadline: Optional[float],
+        hedge: bool,
+        kwargs: Dict[str, Any],
+    ) -> LLMResponse:
+        """Retry/failover loop over the routed candidates"""
+        policy = get_retry_policy(scene)
+        deadline_at = self._deadline_at(scene, deadline)
 
-            raise
+        index = 0
+        attempt = 0
+        while True:
+            attempt += 1
+            provider = self.get_provider(candidates[index])
+            try:
+                if hedge and attempt == 1:
+                    return await self._chat_hedged(
+                        candidates, index, messages, scene, attempt, deadline_at,
+                        user_id, request_summary, log, kwargs,
+                    )
+                return await self._chat_once(
+                    provider, messages, scene, attempt, deadline_at,
+                    user_id, request_summary, log, kwargs,
+                )
+            except CircuitOpenError:
+                # No upstream call was made, so this doesn't use up an attempt
+                if index + 1 < len(candidates):
+                    index += 1
+                    attempt -= 1
+                    continue
+                raise
+            except Exception as e:
+                delay = policy.next_delay(attempt, e, deadline_at)
+                if delay is None:
+                    raise
+                if index + 1 < len(candidates):
+                    # Fail over right away; backoff only applies to the same provider
+                    index += 1
+                    print(f"[LLM] {provider.provider_name} 调用失败, 切换到 {candidates[index]}: {type(e).__name__}: {e}")
+                    continue
+                print(f"[LLM] {provider.provider_name} 第{attempt}次调用失败, {delay:.1f}s后重试: {type(e).__name__}: {e}")
+                await asyncio.sleep(delay)
 
     async def chat_stream(
         self,
@@ -223,57 +845,142 @@ class LLMService:
         provider_type: Optional[str] = None,
         user_id: Optional[int] = None,
         request_summary: Optional[str] = None,
+        log: bool = True,
+        deadline: Optional[float] = None,
         **kwargs,
     ) -> AsyncIterator[StreamChunk]:
         """
         Send streaming chat completion request
 
+        A failed attempt is retried only if nothing was yielded yet, so the
+        caller never sees duplicated content. Identical concurrent streams
+        share one upstream stream.
+
         Args:
             messages: List of chat messages
-            scene: Usage scene for logging
-            provider_type: Override default provider
+            scene: Usage scene for logging, retry and routing policy
+            provider_type: Force a provider (disables routing and failover)
             user_id: User ID for logging
             request_summary: Brief description for logging
+            log: Write this call to the LLM call log
+            deadline: Total seconds before giving up on retries
             **kwargs: Additional provider parameters
 
         Yields:
             StreamChunk with content fragments
         """
-        provider = self.get_provider(provider_type)
-        start_time = time.time()
-        total_content = ""
+        def upstream() -> AsyncIterator[StreamChunk]:
+            return self._chat_stream_with_retry(
+                messages, scene, provider_type, user_id, request_summary,
+                log, deadline, kwargs,
+            )
 
-        try:
-            async for chunk in provider.chat_stream(messages, **kwargs):
-                total_content += chunk.content
+        if not settings.LLM_SINGLE_FLIGHT:
+            async for chunk in upstream():
                 yield chunk
+            return
 
-            latency_ms = int((time.time() - start_time) * 1000)
+        key = request_fingerprint(scene, provider_type, messages, kwargs)
+        async for chunk in self.registry.flights.stream(key, upstream):
+            yield chunk
 
-            # Log after stream completes
-            await self._log_call(
-                scene=scene,
-                provider=provider,
-                status=LLMStatus.SUCCESS,
-                latency_ms=latency_ms,
-                request_summary=request_summary,
-                user_id=user_id,
-            )
+    async def _chat_stream_with_retry(
+        self,
+        messages: List[Message],
+        scene: LLMScene,
+        provider_type: Optional[str],
+        user_id: Optional[int],
+        request_summary: Optional[str],
+        log: bool,
+        deadline: Optional[float],
+        kwargs: Dict[str, Any],
+    ) -> AsyncIterator[StreamChunk]:
+        """Retry/failover loop of one upstream stream"""
+        candidates = self.registry.route(scene, provider_type)
+        policy = get_retry_policy(scene)
+        deadline_at = self._deadline_at(scene, deadline)
 
-        except Exception as e:
-            latency_ms = int((time.time() - start_time) * 1000)
-
-            await self._log_call(
-                scene=scene,
-                provider=provider,
-                status=LLMStatus.FAILED,
-                latency_ms=latency_ms,
-                error_message=str(e),
-                request_summary=request_summary,
-                user_id=user_id,
-            )
+        index = 0
+        attempt = 0
+        while True:
+            attempt += 1
+            started = False
+            provider = self.get_provider(candidates[index])
+            try:
+                breaker, probe = await self._acquire_breaker(provider, scene, log)
+            except CircuitOpenError:
+                if index + 1 < len(candidates):
+                    index += 1
+                    attempt -= 1
+                    continue
+                raise
+            limiter = self.registry.get_limiter(provider.provider_name)
+            reserve = estimate_tokens(messages, kwargs.get("max_tokens") or provider.max_tokens)
+            # Not made current: context changes must not leak across yields
+            stream_span = tracer.start_span("llm.stream", KIND_CLIENT, {
+                "llm.provider": provider.provider_name,
+                "llm.model": provider.model,
+                "llm.attempt": attempt,
+                "scene": scene.value,
+            })
+
+            try:
+                # The slot is held for the whole stream: it is one in-flight call
+                async with limiter.slot(reserve, self._remaining(deadline_at)) as slot:
+                    start_time = time.time()
+                    usage: Optional[StreamChunk] = None
+
+                    try:
+                        async for chunk in provider.chat_stream(messages, **kwargs):
+                            started = True
+                            if chunk.total_tokens is not None or chunk.prompt_tokens is not None:
+                                usage = chunk
+                            yield chunk
+                    except Exception as e:
+                        stream_span.record_error(e)
+                        latency_ms = int((time.time() - start_time) * 1000)
+                        await self._record_failure(
+                            provider, scene, attempt, latency_ms, e,
+                            log, user_id, request_summary,
+                        )
 
-            raise
+                        delay = None if started else policy.next_delay(attempt, e, deadline_at)
+                        if delay is None:
+                            raise
+                        if index + 1 < len(candidates):
+                            index += 1
+                            delay = 0
+                            print(f"[LLM] {provider.provider_name} 流式调用失败, 切换到 {candidates[index]}: {type(e).__name__}: {e}")
+                        else:
+                            print(f"[LLM] {provider.provider_name} 流式第{attempt}次调用失败, {delay:.1f}s后重试: {type(e).__name__}: {e}")
+                    else:
+                        # Log after stream completes
+                        latency_ms = int((time.time() - start_time) * 1000)
+                        if usage is not None:
+                            slot.settle(usage.total_tokens)
+                            stream_span.set_attribute("llm.prompt_tokens", usage.prompt_tokens or 0)
+                            stream_span.set_attribute("llm.completion_tokens", usage.completion_tokens or 0)
+                        await self._record_success(
+                            provider, scene, attempt, latency_ms, log, user_id, request_summary,
+                            prompt_tokens=usage.prompt_tokens if usage else None,
+                            completion_tokens=usage.completion_tokens if usage else None,
+                        )
+                        return
+            finally:
+                if probe:
+                    breaker.release()
+                stream_span.end()
+
+            if delay:
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _simple_messages(prompt: str, system_prompt: Optional[str]) -> List[Message]:
+        messages = []
+        if system_prompt:
+            messages.append(Message(role="system", content=system_prompt))
+        messages.append(Message(role="user", content=prompt))
+        return messages
 
     async def simple_chat(
         self,
@@ -282,6 +989,8 @@ class LLMService:
         scene: LLMScene = LLMScene.OTHER,
         provider_type: Optional[str] = None,
         user_id: Optional[int] = None,
+        log: bool = True,
+        hedge: bool = False,
         **kwargs,
     ) -> str:
         """
@@ -293,15 +1002,14 @@ class LLMService:
             scene: Usage scene for logging
             provider_type: Override default provider
             user_id: User ID for logging
+            log: Write this call to the LLM call log
+            hedge: Fire a backup request if the first attempt is slow
             **kwargs: Additional parameters
 
         Returns:
             Generated text content
         """
-        messages = []
-        if system_prompt:
-            messages.append(Message(role="system", content=system_prompt))
-        messages.append(Message(role="user", content=prompt))
+        messages = self._simple_messages(prompt, system_prompt)
 
         response = await self.chat(
             messages=messages,
@@ -309,6 +1017,8 @@ class LLMService:
             provider_type=provider_type,
             user_id=user_id,
             request_summary=prompt[:100] if prompt else None,
+            log=log,
+            hedge=hedge,
             **kwargs,
         )
 
@@ -321,6 +1031,7 @@ class LLMService:
         scene: LLMScene = LLMScene.OTHER,
         provider_type: Optional[str] = None,
         user_id: Optional[int] = None,
+        log: bool = True,
         **kwargs,
     ) -> AsyncIterator[str]:
         """
@@ -332,15 +1043,13 @@ class LLMService:
             scene: Usage scene for logging
             provider_type: Override default provider
             user_id: User ID for logging
+            log: Write this call to the LLM call log
             **kwargs: Additional parameters
 
         Yields:
             Content fragments as strings
         """
-        messages = []
-        if system_prompt:
-            messages.append(Message(role="system", content=system_prompt))
-        messages.append(Message(role="user", content=prompt))
+        messages = self._simple_messages(prompt, system_prompt)
 
         async for chunk in self.chat_stream(
             messages=messages,
@@ -348,19 +1057,37 @@ class LLMService:
             provider_type=provider_type,
             user_id=user_id,
             request_summary=prompt[:100] if prompt else None,
+            log=log,
             **kwargs,
         ):
             yield chunk.content
 
+    async def simple_evict(
+        self,
+        prompt: str,
+        system_prompt: Optional[str] = None,
+        scene: LLMScene = LLMScene.OTHER,
+        provider_type: Optional[str] = None,
+        **kwargs,
+    ) -> None:
+        """Drop the cached responses of a simple_chat call (see evict)"""
+        await self.evict(
+            self._simple_messages(prompt, system_prompt),
+            scene=scene,
+            provider_type=provider_type,
+            **kwargs,
+        )
 
-def get_llm_service(db: Optional[AsyncSession] = None) -> LLMService:
-    """
-    Factory function to create LLM service
 
-    Args:
-        db: Optional database session for logging
+# Process-wide service instance
+_llm_service = LLMService()
+
+
+def get_llm_service() -> LLMService:
+    """
+    Get the shared LLM service
 
     Returns:
-        LLMService instance
+        Process-wide LLMService instance
     """
-    return LLMService(db=db)
+    return _llm_service
@@ -0,0 +1,317 @@
+"""
+LLM Usage Service
+
+Usage analytics over the pre-aggregated llm_usage_rollups table, and
+retention pruning of raw call logs and rollups
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.llm.usage import (
+    GRANULARITIES,
+    bucket_start,
+    empty_histogram,
+    histogram_percentile,
+    segments_clause,
+    window_segments,
+)
+from app.db.session import async_session_maker
+from app.models.llm_log import LLMLog, LLMScene, LLMUsageRollup
+from app.models.user import User
+
+
+# Dimensions a summary can be broken down by
+GROUP_BY_FIELDS = ("provider", "model", "scene", "user_id")
+
+# Rows deleted per statement when pruning, to keep each write lock short
+_PRUNE_CHUNK = 5000
+
+
+def utc_naive(ts: datetime) -> datetime:
+    """Timestamps are stored as naive UTC"""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+@dataclass
+class UsageTotals:
+    """Sum of rollup rows"""
+    calls: int = 0
+    success: int = 0
+    failed: int = 0
+    timeout: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_sum_ms: int = 0
+    latency_max_ms: int = 0
+    histogram: List[int] = field(default_factory=empty_histogram)
+
+    def add(self, rollup: LLMUsageRollup) -> None:
+        self.calls += rollup.calls
+        self.success += rollup.success_count
+        self.failed += rollup.failed_count
+        self.timeout += rollup.timeout_count
+        self.prompt_tokens += rollup.prompt_tokens
+        self.completion_tokens += rollup.completion_tokens
+        self.latency_sum_ms += rollup.latency_sum_ms
+        self.latency_max_ms = max(self.latency_max_ms, rollup.latency_max_ms)
+        for index, count in enumerate(rollup.latency_histogram or []):
+            if index < len(self.histogram):
+                self.histogram[index] += count
+
+    def to_dict(self) -> Dict[str, Any]:
+        latency_count = sum(self.histogram)
+        return {
+            "calls": self.calls,
+            "success": self.success,
+            "failed": self.failed,
+            "timeout": self.timeout,
+            "error_rate": round((self.failed + self.timeout) / self.calls, 4) if self.calls else 0.0,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "latency_ms": {
+                "avg": round(self.latency_sum_ms / latency_count, 1) if latency_count else None,
+                "p50": histogram_percentile(self.histogram, 50, self.latency_max_ms),
+                "p95": histogram_percentile(self.histogram, 95, self.latency_max_ms),
+                "p99": histogram_percentile(self.histogram, 99, self.latency_max_ms),
+                "max": self.latency_max_ms if latency_count else None,
+            },
+        }
+
+
+class LLMUsageService:
+    """
+    LLM usage analytics
+
+    Every query reads rollup buckets only: whole days from day rollups and
+    the edges of the window from hour and minute rollups, so the cost
+    depends on the window length and number of dimensions, not on how many
+    calls were made. Latency percentiles are estimated from the bucket
+    histograms.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    @staticmethod
+    def resolve_window(
+        start: Optional[datetime],
+        end: Optional[datetime],
+        default_hours: float = 24,
+    ) -> tuple[datetime, datetime]:
+        """Default and normalize a [start, end) window (naive UTC)"""
+        end = utc_naive(end) if end else datetime.now(timezone.utc).replace(tzinfo=None)
+        start = utc_naive(start) if start else end - timedelta(hours=default_hours)
+        return start, end
+
+    async def _rollups(
+        self,
+        start: datetime,
+        end: datetime,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        scene: Optional[LLMScene] = None,
+        user_id: Optional[int] = None,
+    ) -> List[LLMUsageRollup]:
+        segments = window_segments(start, end)
+        if not segments:
+            return []
+
+        query = select(LLMUsageRollup).where(segments_clause(segments))
+        if provider:
+            query = query.where(LLMUsageRollup.provider == provider)
+        if model:
+            query = query.where(LLMUsageRollup.model == model)
+        if scene:
+            query = query.where(LLMUsageRollup.scene == scene)
+        if user_id is not None:
+            query = query.where(LLMUsageRollup.user_id == user_id)
+
+        result = await self.db.execute(query)
+        return list(result.scalars().all())
+
+    async def summary(
+        self,
+        start: datetime,
+        end: datetime,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        scene: Optional[LLMScene] = None,
+        user_id: Optional[int] = None,
+        group_by: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Usage totals for a time window
+
+        Args:
+            start: Window start (truncated to the minute)
+            end: Window end, exclusive
+            provider/model/scene/user_id: Optional filters
+            group_by: Also break the totals down by one of GROUP_BY_FIELDS
+
+        Returns:
+            Calls, error rate, token spend and latency percentiles
+        """
+        rollups = await self._rollups(start, end, provider, model, scene, user_id)
+
+        total = UsageTotals()
+        groups: Dict[Any, UsageTotals] = {}
+        for rollup in rollups:
+            total.add(rollup)
+            if group_by:
+                value = getattr(rollup, group_by)
+                key = value.value if isinstance(value, LLMScene) else value
+                groups.setdefault(key, UsageTotals()).add(rollup)
+
+        data: Dict[str, Any] = {
+            "start": bucket_start(start, "minute"),
+            "end": bucket_start(end, "minute"),
+            **total.to_dict(),
+        }
+        if group_by:
+            data["group_by"] = group_by
+            data["groups"] = sorted(
+                ({group_by: key, **totals.to_dict()} for key, totals in groups.items()),
+                key=lambda g: g["calls"],
+                reverse=True,
+            )
+        return data
+
+    async def top_users(
+        self,
+        start: datetime,
+        end: datetime,
+        limit: int = 10,
+        order_by: str = "tokens",
+        scene: Optional[LLMScene] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Heaviest users in a window
+
+        Args:
+            order_by: "tokens" (total tokens) or "calls"
+
+        Returns:
+            Per-user totals with user name and email, heaviest first
+        """
+        rollups = await self._rollups(start, end, scene=scene)
+
+        per_user: Dict[int, UsageTotals] = {}
+        for rollup in rollups:
+            if rollup.user_id is None:
+                continue
+            per_user.setdefault(rollup.user_id, UsageTotals()).add(rollup)
+
+        if order_by == "calls":
+            rank = lambda item: item[1].calls  # noqa: E731
+        else:
+            rank = lambda item: item[1].prompt_tokens + item[1].completion_tokens  # noqa: E731
+        top = sorted(per_user.items(), key=rank, reverse=True)[:limit]
+
+        users: Dict[int, User] = {}
+        if top:
+            result = await self.db.execute(select(User).where(User.id.in_([uid for uid, _ in top])))
+            users = {u.id: u for u in result.scalars()}
+
+        return [
+            {
+                "user_id": uid,
+                "user_name": users[uid].name if uid in users else None,
+                "email": users[uid].email if uid in users else None,
+                **totals.to_dict(),
+            }
+            for uid, totals in top
+        ]
+
+    async def timeseries(
+        self,
+        start: datetime,
+        end: datetime,
+        granularity: str = "hour",
+        provider: Optional[str] = None,
+        scene: Optional[LLMScene] = None,
+    ) -> List[Dict[str, Any]]:
+        """Per-bucket totals at one granularity, oldest first"""
+        lower = bucket_start(start, granularity)
+        query = select(LLMUsageRollup).where(
+            LLMUsageRollup.granularity == granularity,
+            LLMUsageRollup.bucket_start >= lower,
+            LLMUsageRollup.bucket_start < end,
+        )
+        if provider:
+            query = query.where(LLMUsageRollup.provider == provider)
+        if scene:
+            query = query.where(LLMUsageRollup.scene == scene)
+        result = await self.db.execute(query)
+
+        buckets: Dict[datetime, UsageTotals] = {}
+        for rollup in result.scalars():
+            buckets.setdefault(rollup.bucket_start, UsageTotals()).add(rollup)
+        return [
+            {"bucket_start": ts, **buckets[ts].to_dict()}
+            for ts in sorted(buckets)
+        ]
+
+    async def _delete_before(self, model, column, cutoff: datetime, *conditions) -> int:
+        """Delete rows older than cutoff in chunks, committing each"""
+        deleted = 0
+        while True:
+            ids = select(model.id).where(column < cutoff, *conditions).limit(_PRUNE_CHUNK)
+            result = await self.db.execute(delete(model).where(model.id.in_(ids)))
+            await self.db.commit()
+            deleted += result.rowcount or 0
+            if (result.rowcount or 0) < _PRUNE_CHUNK:
+                return deleted
+
+    async def prune(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """
+        Apply the retention settings
+
+        Raw llm_logs rows older than LLM_LOG_RETENTION_DAYS go first (a
+        range scan on ix_llm_logs_created_at), then rollups per granularity
+        per LLM_USAGE_RETENTION_DAYS. A retention of 0 keeps rows forever.
+
+        Returns:
+            Rows deleted per table/granularity
+        """
+        now = utc_naive(now) if now else datetime.now(timezone.utc).replace(tzinfo=None)
+        deleted: Dict[str, int] = {}
+
+        if settings.LLM_LOG_RETENTION_DAYS > 0:
+            cutoff = now - timedelta(days=settings.LLM_LOG_RETENTION_DAYS)
+            deleted["llm_logs"] = await self._delete_before(LLMLog, LLMLog.created_at, cutoff)
+
+        for granularity in GRANULARITIES:
+            days = settings.LLM_USAGE_RETENTION_DAYS.get(granularity, 0)
+            if days > 0:
+                cutoff = now - timedelta(days=days)
+                deleted[f"rollups_{granularity}"] = await self._delete_before(
+                    LLMUsageRollup,
+                    LLMUsageRollup.bucket_start,
+                    cutoff,
+                    LLMUsageRollup.granularity == granularity,
+                )
+        return deleted
+
+
+async def run_retention(interval_hours: Optional[float] = None) -> None:
+    """Prune on startup and then every LLM_RETENTION_INTERVAL_HOURS (background task)"""
+    interval = (interval_hours or settings.LLM_RETENTION_INTERVAL_HOURS) * 3600
+    while True:
+        try:
+            async with async_session_maker() as db:
+                deleted = await LLMUsageService(db).prune()
+            if any(deleted.values()):
+                print(f"[LLM] 清理过期调用日志/用量统计: {deleted}")
+        except Exception as e:
+            print(f"[LLM] 清理过期调用日志失败: {e}")
+        await asyncio.sleep(interval)
@@ -4,11 +4,13 @@ Question Reviewer Service
 Uses LLM to review and validate generated questions
 """
 
+import asyncio
 import json
 import re
 from typing import List, Optional, Dict, Any
 from dataclasses import dataclass, field
 
+from app.config import settings
 from app.services.llm_service import LLMService
 from app.core.llm.base import Message
 from app.models.llm_log import LLMScene
@@ -78,6 +80,51 @@ REVIEW_PROMPT = """你是一个专业的教育题目审核专家。请仔细审
 如果问题严重无法修复，fixed_question为null。"""
 
 
+# Batch review prompt: the instructions once, then K questions
+BATCH_REVIEW_PROMPT = """你是一个专业的教育题目审核专家。请逐一审核以下 {count} 道题目的质量（批量审核）。
+
+**审核要点**（对每道题分别判断）:
+1. **事实正确性**: 题目内容和答案是否符合专业知识？
+2. **答案唯一性**: 对于客观题，是否只有一个(或题目要求的)正确答案？是否存在争议？
+3. **表述清晰性**: 题干是否清晰无歧义？选项是否表述准确？
+4. **难度匹配**: 题目难度是否与声称的难度等级相符？
+5. **解析完整**: 解析是否正确且有助于理解？
+
+{questions}
+
+请严格按照以下JSON数组格式输出, 每道题一个元素, index为题目编号, 共 {count} 个元素:
+```json
+[
+  {{
+    "index": 0,
+    "is_correct": true或false,
+    "issues": [
+      {{
+        "type": "问题类型(fact_error/answer_ambiguous/unclear_stem/difficulty_mismatch/explanation_error/other)",
+        "description": "问题描述",
+        "severity": "error或warning"
+      }}
+    ],
+    "comment": "总体评价(一句话)",
+    "fixed_question": null或修正后的完整题目对象(如果有问题需要修复)
+  }}
+]
+```
+
+题目没有问题时issues为空数组、is_correct为true。
+有问题但可以修复时在fixed_question中提供修正后的完整题目，无法修复时fixed_question为null。"""
+
+# One question inside BATCH_REVIEW_PROMPT
+BATCH_REVIEW_ITEM = """### 题目 {index}
+- 题型: {question_type}
+- 题干: {stem}
+- 选项: {options}
+- 答案: {answer}
+- 解析: {explanation}
+- 知识点: {knowledge_point}
+- 难度: {difficulty}/5"""
+
+
 FIX_PROMPT = """请修复以下有问题的题目。
 
 **原题目**:
@@ -136,6 +183,39 @@ class ReviewerService:
             return ", ".join(str(a) for a in answer)
         return str(answer)
 
+    def _to_result(self, review_data: Dict[str, Any]) -> ReviewResult:
+        """Build a ReviewResult from one parsed verdict"""
+        result = ReviewResult(is_approved=review_data.get('is_correct', False))
+        result.review_comment = review_data.get('comment', '')
+
+        # Process issues
+        for issue in review_data.get('issues', []):
+            result.add_issue(
+                issue_type=issue.get('type', 'other'),
+                description=issue.get('description', ''),
+                severity=issue.get('severity', 'error'),
+            )
+
+        # Get fixed question if provided
+        if review_data.get('fixed_question'):
+            result.fixed_question = review_data['fixed_question']
+
+        return result
+
+    def _extract_json_array(self, text: str) -> List[Any]:
+        """Extract a JSON array from LLM response"""
+        json_match = re.search(r'```(?:json)?\s*([\s\S]*?)```', text)
+        if json_match:
+            json_str = json_match.group(1).strip()
+        else:
+            json_match = re.search(r'\[[\s\S]*\]', text)
+            json_str = json_match.group(0) if json_match else text.strip()
+
+        data = json.loads(json_str)
+        if not isinstance(data, list):
+            raise json.JSONDecodeError("Expected a JSON array", json_str, 0)
+        return data
+
     def _extract_json(self, text: str) -> Dict[str, Any]:
         """Extract JSON from LLM response"""
         # Try to find JSON in code blocks
@@ -195,25 +275,11 @@ class ReviewerService:
 
             # Parse response
             review_data = self._extract_json(response.content)
-
-            result = ReviewResult(is_approved=review_data.get('is_correct', False))
-            result.review_comment = review_data.get('comment', '')
-
-            # Process issues
-            for issue in review_data.get('issues', []):
-                result.add_issue(
-                    issue_type=issue.get('type', 'other'),
-                    description=issue.get('description', ''),
-                    severity=issue.get('severity', 'error'),
-                )
-
-            # Get fixed question if provided
-            if review_data.get('fixed_question'):
-                result.fixed_question = review_data['fixed_question']
-
-            return result
+            return self._to_result(review_data)
 
         except json.JSONDecodeError as e:
+            # Don't let the response cache replay an unparseable review
+            await self.llm_service.evict(messages, scene=LLMScene.REVIEW, temperature=0.3)
             result = ReviewResult(is_approved=False)
             result.add_issue('parse_error', f"Failed to parse review response: {e}")
             return result
@@ -222,6 +288,153 @@ class ReviewerService:
             result.add_issue('review_error', f"Review failed: {str(e)}")
             return result
 
+    def _batch_item(self, index: int, question: Dict[str, Any]) -> str:
+        return BATCH_REVIEW_ITEM.format(
+            index=index,
+            question_type=question.get('type', 'unknown'),
+            stem=question.get('stem', ''),
+            options=self._format_options(question.get('options')),
+            answer=self._format_answer(question.get('answer')),
+            explanation=question.get('explanation', '无'),
+            knowledge_point=question.get('knowledge_point', '未指定'),
+            difficulty=question.get('difficulty', 3),
+        )
+
+    def plan_batches(self, questions: List[Dict[str, Any]]) -> List[List[int]]:
+        """
+        Split questions into review batches that fit the provider's limits
+
+        A batch holds at most LLM_REVIEW_BATCH_SIZE questions, no more
+        verdicts than fit in the provider's max_tokens at
+        LLM_REVIEW_BATCH_VERDICT_TOKENS each, and no more prompt than
+        LLM_REVIEW_BATCH_PROMPT_TOKENS (nor than the provider's
+        tokens-per-minute budget leaves room for).
+
+        Returns:
+            Question indexes per batch, in order
+        """
+        registry = self.llm_service.registry
+        provider = self.llm_service.get_provider(registry.route(LLMScene.REVIEW)[0])
+
+        max_size = min(
+            settings.LLM_REVIEW_BATCH_SIZE,
+            provider.max_tokens // max(settings.LLM_REVIEW_BATCH_VERDICT_TOKENS, 1),
+        )
+        prompt_budget = settings.LLM_REVIEW_BATCH_PROMPT_TOKENS
+        tpm = registry.get_limiter(provider.provider_name).tpm
+        if tpm > 0:
+            prompt_budget = min(prompt_budget, int(tpm) - provider.max_tokens)
+
+        # Same chars / 2 estimate the rate limiter reserves with
+        base_tokens = len(BATCH_REVIEW_PROMPT) // 2
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = base_tokens
+        for index, question in enumerate(questions):
+            tokens = len(self._batch_item(index, question)) // 2
+            if current and (len(current) >= max_size or current_tokens + tokens > prompt_budget):
+                batches.append(current)
+                current, current_tokens = [], base_tokens
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _review_batch_call(
+        self,
+        questions: List[Dict[str, Any]],
+        user_id: Optional[int] = None,
+    ) -> Dict[int, ReviewResult]:
+        """
+        Review several questions in one request
+
+        Returns:
+            Verdicts by position in `questions`; positions whose verdict is
+            missing or malformed are left out
+        """
+        if len(questions) == 1:
+            return {0: await self.review(questions[0], user_id)}
+
+        prompt = BATCH_REVIEW_PROMPT.format(
+            count=len(questions),
+            questions="\n\n".join(self._batch_item(i, q) for i, q in enumerate(questions)),
+        )
+        messages = [
+            Message(role="system", content="你是一个严格的题目审核专家，善于发现题目中的问题。"),
+            Message(role="user", content=prompt),
+        ]
+
+        try:
+            response = await self.llm_service.chat(
+                messages=messages,
+                scene=LLMScene.REVIEW,
+                user_id=user_id,
+                request_summary=f"Batch review {len(questions)} questions",
+                temperature=0.3,
+            )
+        except Exception as e:
+            print(f"[出题] 批量审核失败, 改为逐题审核: {type(e).__name__}: {e}")
+            return {}
+        try:
+            verdicts = self._extract_json_array(response.content)
+        except json.JSONDecodeError as e:
+            await self.llm_service.evict(messages, scene=LLMScene.REVIEW, temperature=0.3)
+            print(f"[出题] 批量审核失败, 改为逐题审核: {type(e).__name__}: {e}")
+            return {}
+
+        results: Dict[int, ReviewResult] = {}
+        for verdict in verdicts:
+            if not isinstance(verdict, dict) or not isinstance(verdict.get('is_correct'), bool):
+                continue
+            index = verdict.get('index')
+            if isinstance(index, int) and 0 <= index < len(questions) and index not in results:
+                results[index] = self._to_result(verdict)
+        return results
+
+    async def review_many(
+        self,
+        questions: List[Dict[str, Any]],
+        user_id: Optional[int] = None,
+    ) -> List[ReviewResult]:
+        """
+        Review questions with batched prompts
+
+        Batches (see plan_batches) are sent concurrently. Questions whose
+        verdict is missing from a malformed or partial batch response are
+        reviewed again one by one.
+
+        Args:
+            questions: Questions to review
+            user_id: Optional user ID for logging
+
+        Returns:
+            ReviewResult per question, in input order
+        """
+        if settings.LLM_REVIEW_BATCH_SIZE <= 1:
+            return list(await asyncio.gather(*(self.review(q, user_id) for q in questions)))
+
+        batches = self.plan_batches(questions)
+        batch_results = await asyncio.gather(*(
+            self._review_batch_call([questions[i] for i in batch], user_id)
+            for batch in batches
+        ))
+
+        results: Dict[int, ReviewResult] = {}
+        for batch, verdicts in zip(batches, batch_results):
+            for position, index in enumerate(batch):
+                if position in verdicts:
+                    results[index] = verdicts[position]
+
+        missing = [i for i in range(len(questions)) if i not in results]
+        if missing:
+            if len(missing) < len(questions):
+                print(f"[出题] 批量审核缺少 {len(missing)} 道题的结果, 逐题补审")
+            singles = await asyncio.gather(*(self.review(questions[i], user_id) for i in missing))
+            results.update(zip(missing, singles))
+
+        return [results[i] for i in range(len(questions))]
+
     async def fix(
         self,
         question: Dict[str, Any],
@@ -58,6 +58,12 @@ class ValidatorService:
         """Reset duplicate detection (call before new batch)"""
         self._seen_hashes.clear()
 
+    def remember(self, questions: List[Dict[str, Any]]):
+        """Count earlier questions as seen (e.g. when resuming a batch)"""
+        for q in questions:
+            if q.get('stem'):
+                self._seen_hashes.add(self._compute_stem_hash(q['stem']))
+
     def _compute_stem_hash(self, stem: str) -> str:
         """Compute hash of question stem for duplicate detection"""
         # Normalize: lowercase, remove extra whitespace
@@ -0,0 +1,6 @@
+"""
+Benchmarks
+
+Standalone performance scripts, run from Back-end/ with
+python -m benchmarks.<name>
+"""
@@ -0,0 +1,17 @@
+"""
+Benchmark Bootstrap
+
+The engine and settings are created at import time, so the benchmark
+database and the mock provider must be configured before importing app.*;
+end-to-end benchmarks import this module first
+"""
+
+import os
+import tempfile
+
+DB_DIR = tempfile.mkdtemp(prefix="load_exam_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(DB_DIR, 'bench.db')}"
+os.environ["SQL_ECHO"] = "false"
+os.environ.setdefault("LLM_PROVIDER", "mock")
+os.environ.setdefault("MOCK_LLM_LATENCY_MS", "300")
+os.environ.setdefault("MOCK_LLM_SEED", "42")
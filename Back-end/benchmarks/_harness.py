@@ -0,0 +1,113 @@
+"""
+Benchmark Harness
+
+Minimal timing helpers shared by the benchmark scripts
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+@dataclass
+class BenchResult:
+    """Timing of one benchmark case"""
+    name: str
+    runs: int
+    best_ms: float
+    median_ms: float
+    mean_ms: float
+    extra: Optional[Dict[str, Any]] = None
+
+
+def _summarize(name: str, samples: List[float], extra: Optional[Dict[str, Any]]) -> BenchResult:
+    return BenchResult(
+        name=name,
+        runs=len(samples),
+        best_ms=round(min(samples) * 1000, 3),
+        median_ms=round(statistics.median(samples) * 1000, 3),
+        mean_ms=round(statistics.fmean(samples) * 1000, 3),
+        extra=extra,
+    )
+
+
+def bench(
+    name: str,
+    fn: Callable[[], Any],
+    repeat: int = 20,
+    warmup: int = 2,
+    extra: Optional[Dict[str, Any]] = None,
+) -> BenchResult:
+    """Time a synchronous callable"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return _summarize(name, samples, extra)
+
+
+def bench_async(
+    name: str,
+    fn: Callable[[], Awaitable[Any]],
+    repeat: int = 20,
+    warmup: int = 2,
+    extra: Optional[Dict[str, Any]] = None,
+) -> BenchResult:
+    """Time a coroutine function (each run on the same event loop)"""
+
+    async def run() -> List[float]:
+        for _ in range(warmup):
+            await fn()
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            await fn()
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    return _summarize(name, asyncio.run(run()), extra)
+
+
+def report(title: str, results: List[BenchResult], baseline: Optional[str] = None) -> None:
+    """Print a result table, with speedup relative to the baseline case"""
+    base = next((r for r in results if r.name == baseline), None)
+    width = max(len(r.name) for r in results)
+    print(f"\n{title}")
+    print(f"{'case'.ljust(width)}  {'best ms':>10}  {'median ms':>10}  {'speedup':>8}")
+    for r in results:
+        speedup = f"{base.median_ms / r.median_ms:.2f}x" if base and r.median_ms else "-"
+        print(f"{r.name.ljust(width)}  {r.best_ms:>10.3f}  {r.median_ms:>10.3f}  {speedup:>8}")
+
+
+def arg_parser(description: str) -> argparse.ArgumentParser:
+    """Common CLI: --repeat and --json output path"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per case")
+    parser.add_argument("--json", dest="json_path", help="write results to this JSON file")
+    return parser
+
+
+def write_json(path: Optional[str], payload: Dict[str, Any]) -> None:
+    """Write results (dataclasses are converted) to a JSON file"""
+    if not path:
+        return
+
+    def convert(value: Any) -> Any:
+        if isinstance(value, BenchResult):
+            return asdict(value)
+        if isinstance(value, list):
+            return [convert(v) for v in value]
+        if isinstance(value, dict):
+            return {k: convert(v) for k, v in value.items()}
+        return value
+
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(convert(payload), f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {path}")
@@ -0,0 +1,279 @@
+"""
+Grading Storm Benchmark
+
+Submission storm against the grading queue, in-process: N seeded students
+(see load_exam) answer the exam, then all submit at the same moment, and
+the benchmark waits until the grading queue has drained. LLM grading goes
+to the offline mock provider.
+
+While the storm is processed, the process's thread count, resident memory
+and asyncio task count are sampled; with a fixed worker pool they should
+stay flat however many attempts are waiting. --restart-after stops and
+restarts the queue mid-storm, as a redeploy would, to check that nothing
+queued is lost.
+
+Reports submit latency, submit-to-graded time, drain time and the
+resource samples; --json writes the report so runs can be compared.
+
+Usage:
+    python -m benchmarks.bench_grading_storm [--students 300] [--restart-after 2] [--json out.json]
+"""
+
+import contextlib
+import io
+import sys
+import shutil
+
+# Configures the scratch database and the mock provider before app.* loads
+from benchmarks import load_exam
+from benchmarks.load_exam import git_revision, make_answer, seed, summarize
+
+import asyncio
+import random
+import resource
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+import httpx
+from sqlalchemy import func, select
+
+from app.config import settings
+from app.core.llm.log_writer import llm_log_writer
+from app.db.init_db import init_db
+from app.db.session import async_session_maker
+from app.main import app
+from app.models.exam import GradingTask, GradingTaskStatus
+from app.services.grading_queue_service import grading_queue
+from benchmarks._harness import arg_parser, write_json
+
+
+def rss_mb() -> float:
+    """Resident memory of this process"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # Peak instead of current where /proc is not available (KB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Sampler:
+    """Thread count, RSS and asyncio task count at a fixed interval"""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self.samples: List[Dict[str, Any]] = []
+        self.phase = "submit"
+        self._task = None
+
+    def sample(self) -> Dict[str, float]:
+        return {
+            "threads": threading.active_count(),
+            "rss_mb": round(rss_mb(), 1),
+            "tasks": len(asyncio.all_tasks()),
+        }
+
+    async def _run(self) -> None:
+        start = time.perf_counter()
+        while True:
+            self.samples.append({"t": round(time.perf_counter() - start, 2), "phase": self.phase, **self.sample()})
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+
+    def summary(self, key: str) -> Dict[str, Dict[str, float]]:
+        """min/max/last of a measure while submissions arrive and while the queue drains"""
+        result = {}
+        for phase in ("submit", "drain"):
+            values = [s[key] for s in self.samples if s["phase"] == phase]
+            if values:
+                result[phase] = {"min": min(values), "max": max(values), "last": values[-1]}
+        return result
+
+
+async def answer_all(client: httpx.AsyncClient, exam_id: int, questions: List, token: str, rng: random.Random) -> None:
+    """Start the exam and answer every question (setup, not measured)"""
+    headers = {"Authorization": f"Bearer {token}"}
+    base = f"{settings.API_PREFIX}/exams/{exam_id}"
+    await client.post(f"{base}/start", headers=headers)
+    for question_id, q_type in questions:
+        await client.post(
+            f"{base}/answer", headers=headers,
+            json={"question_id": question_id, "answer": make_answer(rng, q_type), "time_spent_seconds": 30},
+        )
+
+
+async def queue_counts() -> Dict[str, int]:
+    async with async_session_maker() as db:
+        rows = await db.execute(select(GradingTask.status, func.count(GradingTask.id)).group_by(GradingTask.status))
+        return {status.value: count for status, count in rows.all()}
+
+
+async def run(args) -> Dict[str, Any]:
+    await init_db()
+    data = await seed(args.students, args.questions)
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        setup = asyncio.Semaphore(8)
+
+        async def prepare(token: str) -> None:
+            async with setup:
+                await answer_all(client, data["exam_id"], data["questions"], token, random.Random(rng.random()))
+
+        await asyncio.gather(*(prepare(token) for token in data["tokens"]))
+
+        grading_queue.start()
+        sampler = Sampler(args.sample_ms)
+        baseline = sampler.sample()
+        sampler.start()
+
+        submit_ms: List[float] = []
+        errors = 0
+
+        async def submit(token: str, delay: float) -> None:
+            nonlocal errors
+            await asyncio.sleep(delay)
+            start = time.perf_counter()
+            response = await client.post(
+                f"{settings.API_PREFIX}/exams/{data['exam_id']}/submit",
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            submit_ms.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+        restarted = {"interrupted": 0}
+
+        async def restart() -> None:
+            await asyncio.sleep(args.restart_after)
+            restarted["interrupted"] = grading_queue.running
+            await grading_queue.stop()
+            grading_queue.start()
+
+        start = time.perf_counter()
+        restart_task = asyncio.create_task(restart()) if args.restart_after > 0 else None
+        await asyncio.gather(*(submit(token, rng.uniform(0, args.window_s)) for token in data["tokens"]))
+        submitted = time.perf_counter() - start
+        sampler.phase = "drain"
+
+        # Drained when no task is pending or being graded
+        counts: Dict[str, int] = {}
+        while time.perf_counter() - start < args.grade_timeout:
+            counts = await queue_counts()
+            if not counts.get("pending") and not counts.get("running"):
+                break
+            await asyncio.sleep(0.1)
+        drained = time.perf_counter() - start
+
+        if restart_task:
+            restart_task.cancel()
+            await asyncio.gather(restart_task, return_exceptions=True)
+        await sampler.stop()
+
+    await grading_queue.stop()
+    await llm_log_writer.stop()
+
+    async with async_session_maker() as db:
+        rows = await db.execute(
+            select(GradingTask.enqueued_at, GradingTask.finished_at, GradingTask.attempts)
+            .where(GradingTask.status == GradingTaskStatus.DONE)
+        )
+        done = rows.all()
+    graded_ms = [(finished - enqueued).total_seconds() * 1000 for enqueued, finished, _ in done]
+
+    return {
+        "submit_s": round(submitted, 3),
+        "drain_s": round(drained, 3),
+        "submit": {**summarize(submit_ms), "errors": errors},
+        "grading": {
+            **summarize(graded_ms),
+            "tasks": counts,
+            "retried": sum(1 for *_, attempts in done if attempts > 1),
+        },
+        "restart": {"after_s": args.restart_after, **restarted} if args.restart_after > 0 else None,
+        "baseline": baseline,
+        "threads": sampler.summary("threads"),
+        "rss_mb": sampler.summary("rss_mb"),
+        "asyncio_tasks": sampler.summary("tasks"),
+        "samples": sampler.samples,
+    }
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    s = result["submit"]
+    print(f"\n提交 {s['count']} 份 ({s['errors']} 失败) 用时 {result['submit_s']}s: p50 {s['p50_ms']}ms  p99 {s['p99_ms']}ms")
+    g = result["grading"]
+    print(
+        f"队列排空 {result['drain_s']}s, 批改完成 {g['count']} (重试 {g['retried']}), "
+        f"提交到批改完成 p50 {g['p50_ms']}ms  p95 {g['p95_ms']}ms  p99 {g['p99_ms']}ms"
+    )
+    print(f"任务状态 {g['tasks']}")
+    if result["restart"]:
+        print(f"第 {result['restart']['after_s']}s 重启队列, 中断 {result['restart']['interrupted']} 个批改任务")
+
+    base = result["baseline"]
+    print(f"\n{'':14}  {'storm前':>8}  {'提交中最大':>8}  {'排空中最小':>8}  {'排空中最大':>8}  {'结束':>8}")
+    for label, key, base_key in (
+        ("线程数", "threads", "threads"),
+        ("RSS MB", "rss_mb", "rss_mb"),
+        ("asyncio任务数", "asyncio_tasks", "tasks"),
+    ):
+        submit, drain = result[key].get("submit", {}), result[key].get("drain", {})
+        print(
+            f"{label:14}  {base[base_key]:>8}  {submit.get('max', '-'):>8}  "
+            f"{drain.get('min', '-'):>8}  {drain.get('max', '-'):>8}  {drain.get('last', '-'):>8}"
+        )
+
+
+def main() -> None:
+    parser = arg_parser(__doc__.split("\n")[1])
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--questions", type=int, default=5)
+    parser.add_argument("--window-s", type=float, default=1.0, help="submissions arrive within this many seconds")
+    parser.add_argument("--workers", type=int, help="override GRADING_WORKERS (e.g. --workers 300 ~ one task per submission)")
+    parser.add_argument("--sample-ms", type=float, default=100, help="resource sampling interval")
+    parser.add_argument("--restart-after", type=float, default=0, help="restart the grading queue after N seconds (0 = off)")
+    parser.add_argument("--grade-timeout", type=float, default=300, help="seconds to wait for the queue to drain")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own log output")
+    args = parser.parse_args()
+    if args.workers:
+        settings.GRADING_WORKERS = args.workers
+
+    print(
+        f"[压测] 学生 {args.students}, 题目 {args.questions}, 批改worker {settings.GRADING_WORKERS}, "
+        f"LLM={settings.LLM_PROVIDER} 延迟 {settings.MOCK_LLM_LATENCY_MS}ms"
+    )
+    sink = sys.stdout if args.verbose else io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sink):
+            result = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(load_exam._DB_DIR, ignore_errors=True)
+
+    print_report(result)
+    write_json(args.json_path, {
+        "benchmark": "bench_grading_storm",
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k != "json_path"},
+        "llm_latency_ms": settings.MOCK_LLM_LATENCY_MS,
+        **result,
+    })
+
+
+if __name__ == "__main__":
+    main()
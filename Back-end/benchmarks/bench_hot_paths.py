@@ -0,0 +1,230 @@
+"""
+Pipeline Hot Path Benchmark
+
+Times the pure functions that run for every generated question and every
+student answer: LLM output parsing (generator, reviewer, grading), batch
+validation, objective answer checking and question serialization.
+Fixtures are realistic Chinese outputs, including large batches,
+prose-wrapped JSON and truncated (malformed) completions.
+
+Usage:
+    python -m benchmarks.bench_hot_paths [--repeat 20] [--json out.json]
+"""
+
+import json
+import random
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+
+from app.models.course import Course, KnowledgePoint
+from app.models.question import Question, QuestionType, QuestionStatus
+from app.models.user import User, UserRole
+from app.services.exam_service import ExamService
+from app.services.generator_service import GeneratorService
+from app.services.grading_service import GradingService
+from app.services.question_bank_service import question_to_response
+from app.services.reviewer_service import ReviewerService
+from app.services.validator_service import ValidatorService
+from benchmarks._harness import BenchResult, arg_parser, bench, report, write_json
+
+
+_TOPICS = ["牛顿第二定律", "动量守恒", "机械能守恒", "电磁感应", "光的折射", "热力学第一定律"]
+
+
+# ===================================
+# Fixtures
+# ===================================
+
+def make_question(rng: random.Random, index: int) -> Dict[str, Any]:
+    """One generated question as the LLM returns it"""
+    topic = rng.choice(_TOPICS)
+    q_type = ["single", "multiple", "blank", "short"][index % 4]
+    question: Dict[str, Any] = {
+        "type": q_type,
+        "difficulty": rng.randint(1, 5),
+        "knowledge_point": topic,
+        "explanation": f"根据{topic}的基本规律，结合题目条件逐步分析可得正确答案。" * 2,
+    }
+    tag = f"{topic}（第{index + 1}题）"
+    if q_type == "single":
+        question["stem"] = f"关于{tag}，下列说法中正确的是？"
+        question["options"] = {k: f"关于{topic}的第{k}种说法，描述了相应的物理过程" for k in "ABCD"}
+        question["answer"] = rng.choice("ABCD")
+    elif q_type == "multiple":
+        question["stem"] = f"关于{tag}，下列说法中正确的有？"
+        question["options"] = {k: f"关于{topic}的第{k}种说法，描述了相应的物理过程" for k in "ABCD"}
+        question["answer"] = sorted(rng.sample("ABCD", 2))
+    elif q_type == "blank":
+        question["stem"] = f"{tag}中，物体所受合力等于质量与____的乘积，单位是____。"
+        question["options"] = None
+        question["answer"] = ["加速度", "牛顿"]
+    else:
+        question["stem"] = f"请简述{tag}的内容，并举例说明其在生活中的应用。"
+        question["options"] = None
+        question["answer"] = f"{topic}指出……（参考答案）。生活中的应用包括汽车安全带、火箭发射等。"
+        question["keywords"] = [topic, "应用", "举例"]
+        question["rubric"] = "内容表述正确得3分，举例恰当得2分"
+    return question
+
+
+def fenced(payload: Any) -> str:
+    return "以下是生成的题目：\n```json\n" + json.dumps(payload, ensure_ascii=False, indent=2) + "\n```\n希望对您有帮助。"
+
+
+def build_fixtures(rng: random.Random) -> Dict[str, Any]:
+    batch_10 = [make_question(rng, i) for i in range(10)]
+    batch_100 = [make_question(rng, i) for i in range(100)]
+
+    review_ok = {"is_correct": True, "issues": [], "comment": "题目表述清晰，答案正确。", "fixed_question": None}
+    review_bad = {
+        "is_correct": False,
+        "issues": [{"type": "wrong_answer", "description": "参考答案与选项不一致" * 5, "severity": "error"}],
+        "comment": "需要修改",
+        "fixed_question": batch_10[0],
+    }
+    grade = {"score": 7.5, "feedback": "回答基本正确，但举例不够具体。", "analysis": "覆盖了主要知识点。" * 20}
+
+    large_generation = fenced(batch_100)
+    return {
+        "batch_10": batch_10,
+        "batch_100": batch_100,
+        "generation": {
+            "fenced_10": fenced(batch_10),
+            "fenced_100": large_generation,
+            "raw_10": "好的，题目如下：\n" + json.dumps(batch_10, ensure_ascii=False) + "\n以上。",
+            # A completion cut off at max_tokens
+            "truncated_100": large_generation[: len(large_generation) * 2 // 3],
+        },
+        "review": {
+            "fenced": fenced(review_ok),
+            "raw_with_prose": "审核结果如下：" + json.dumps(review_bad, ensure_ascii=False) + "请参考。",
+            "truncated": fenced(review_bad)[:200],
+        },
+        "grading": {
+            "fenced": fenced(grade),
+            "raw_trailing": json.dumps(grade, ensure_ascii=False) + "\n（以上为评分结果）",
+            "truncated": json.dumps(grade, ensure_ascii=False)[:80],
+        },
+    }
+
+
+def build_answers(rng: random.Random, count: int) -> List[tuple]:
+    """(question_type, student_answer, correct_answer) as stored in attempts"""
+    answers = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            answers.append(("single", rng.choice("ABCD"), {"correct": "B"}))
+        elif kind == 1:
+            answers.append(("multiple", sorted(rng.sample("ABCD", 2)), {"correct": ["A", "C"]}))
+        else:
+            answers.append(("blank", [rng.choice(["加速度", "速度"]), " 牛顿 "], {"blanks": ["加速度", "牛顿"]}))
+    return answers
+
+
+def build_questions(rng: random.Random, count: int) -> List[Question]:
+    """Transient ORM questions with their relationships loaded"""
+    teacher = User(id=1, email="t@example.com", name="张老师", password_hash="x", role=UserRole.TEACHER)
+    course = Course(id=1, name="大学物理", teacher_id=1)
+    point = KnowledgePoint(id=1, name="牛顿运动定律", course_id=1)
+    now = datetime.now()
+
+    questions = []
+    for i in range(count):
+        data = make_question(rng, i)
+        question = Question(
+            id=i + 1,
+            type=QuestionType(data["type"]),
+            stem=data["stem"],
+            options=data["options"],
+            answer={"correct": data["answer"]},
+            explanation=data["explanation"],
+            difficulty=data["difficulty"],
+            score=10,
+            course_id=1,
+            knowledge_point_id=1,
+            created_by=1,
+            status=QuestionStatus.APPROVED,
+            created_at=now,
+            updated_at=now,
+        )
+        question.course = course
+        question.knowledge_point = point
+        question.creator = teacher
+        questions.append(question)
+    return questions
+
+
+# ===================================
+# Cases
+# ===================================
+
+def swallow(fn: Callable[[], Any]) -> Callable[[], Any]:
+    """Malformed fixtures raise; the cost of failing is what is measured"""
+
+    def run():
+        try:
+            fn()
+        except ValueError:
+            pass
+
+    return run
+
+
+def main() -> None:
+    parser = arg_parser(__doc__.split("\n")[1])
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    repeat = args.repeat
+
+    rng = random.Random(args.seed)
+    fixtures = build_fixtures(rng)
+    answers = build_answers(rng, 1000)
+    questions = build_questions(rng, 500)
+
+    # The helpers under test do not touch the LLM or the database
+    generator = GeneratorService(None)
+    reviewer = ReviewerService(None)
+    grading = GradingService(None)
+    validator = ValidatorService()
+    exam = ExamService(None)
+
+    sections: Dict[str, List[BenchResult]] = {}
+
+    sections["GeneratorService._extract_json"] = [
+        bench(name, swallow(lambda text=text: generator._extract_json(text)), repeat,
+              extra={"chars": len(text)})
+        for name, text in fixtures["generation"].items()
+    ]
+    sections["ReviewerService._extract_json"] = [
+        bench(name, swallow(lambda text=text: reviewer._extract_json(text)), repeat,
+              extra={"chars": len(text)})
+        for name, text in fixtures["review"].items()
+    ]
+    sections["GradingService._parse_json_response"] = [
+        bench(name, swallow(lambda text=text: grading._parse_json_response(text, 10.0)), repeat,
+              extra={"chars": len(text)})
+        for name, text in fixtures["grading"].items()
+    ]
+    sections["ValidatorService.validate_batch"] = [
+        bench(f"batch_{len(batch)}", lambda batch=batch: validator.validate_batch(batch), repeat,
+              extra={"questions": len(batch)})
+        for batch in (fixtures["batch_10"], fixtures["batch_100"])
+    ]
+    sections["ExamService._check_answer"] = [
+        bench("1000_answers", lambda: [exam._check_answer(t, s, c) for t, s, c in answers], repeat,
+              extra={"answers": len(answers)}),
+    ]
+    sections["question_to_response"] = [
+        bench("500_questions", lambda: [question_to_response(q) for q in questions], repeat,
+              extra={"questions": len(questions)}),
+    ]
+
+    for title, results in sections.items():
+        report(title, results)
+
+    write_json(args.json_path, {"benchmark": "bench_hot_paths", "repeat": repeat, "sections": sections})
+
+
+if __name__ == "__main__":
+    main()
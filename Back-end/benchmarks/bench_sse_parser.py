@@ -0,0 +1,147 @@
+"""
+SSE Parser Benchmark
+
+Compares the previous per-line stream parser (aiter_lines + startswith +
+json.loads) with the byte-level SSEDecoder, with and without orjson, on a
+synthetic chat completion stream.
+
+Usage:
+    python -m benchmarks.bench_sse_parser [--tokens 4000] [--chunk-size 1024]
+"""
+
+import json
+from typing import AsyncIterator, List
+
+import httpx
+
+from app.core.llm import sse
+from app.core.llm.sse import SSEDecoder, iter_sse_data, parse_json_event
+from benchmarks._harness import arg_parser, bench, bench_async, report, write_json
+
+
+def build_stream(tokens: int) -> bytes:
+    """An OpenAI-style stream of `tokens` content deltas plus usage and [DONE]"""
+    pieces = ["题目", "解析", "：", "根据", "牛顿第二定律", "，", "F", "=", "ma", "。"]
+    events = []
+    for i in range(tokens):
+        event = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 1700000000,
+            "model": "deepseek-chat",
+            "choices": [{"index": 0, "delta": {"content": pieces[i % len(pieces)]}, "finish_reason": None}],
+        }
+        events.append("data: " + json.dumps(event, ensure_ascii=False) + "\n\n")
+    usage = {"choices": [], "usage": {"prompt_tokens": 500, "completion_tokens": tokens, "total_tokens": 500 + tokens}}
+    events.append("data: " + json.dumps(usage) + "\n\n")
+    events.append("data: [DONE]\n\n")
+    return "".join(events).encode("utf-8")
+
+
+def split_chunks(body: bytes, size: int) -> List[bytes]:
+    """Cut the body into network-sized reads (boundaries fall mid-line)"""
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+class ChunkStream(httpx.AsyncByteStream):
+    def __init__(self, chunks: List[bytes]):
+        self.chunks = chunks
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for chunk in self.chunks:
+            yield chunk
+
+
+def make_response(chunks: List[bytes]) -> httpx.Response:
+    return httpx.Response(200, stream=ChunkStream(chunks), headers={"content-type": "text/event-stream"})
+
+
+async def legacy_parse(chunks: List[bytes]) -> str:
+    """The parsing loop the providers used before (plus IndexError for the usage event)"""
+    response = make_response(chunks)
+    content = []
+    async for line in response.aiter_lines():
+        if not line or not line.startswith("data: "):
+            continue
+        data_str = line[6:]
+        if data_str == "[DONE]":
+            break
+        try:
+            data = json.loads(data_str)
+            choice = data["choices"][0]
+            delta = choice.get("delta", {})
+            text = delta.get("content", "")
+            if text:
+                content.append(text)
+        except (json.JSONDecodeError, IndexError):
+            continue
+    return "".join(content)
+
+
+async def decoder_parse(chunks: List[bytes]) -> str:
+    """The OpenAICompatibleProvider loop over iter_sse_data"""
+    response = make_response(chunks)
+    content = []
+    async for data in iter_sse_data(response):
+        if data == b"[DONE]":
+            break
+        event = parse_json_event(data)
+        if not isinstance(event, dict):
+            continue
+        choices = event.get("choices")
+        if not choices:
+            continue
+        text = (choices[0].get("delta") or {}).get("content") or ""
+        if text:
+            content.append(text)
+    return "".join(content)
+
+
+def frame_only(chunks: List[bytes]) -> List[bytes]:
+    decoder = SSEDecoder()
+    return [data for chunk in chunks for data in decoder.feed(chunk)]
+
+
+def main() -> None:
+    parser = arg_parser(__doc__)
+    parser.add_argument("--tokens", type=int, default=4000, help="content deltas per stream")
+    parser.add_argument("--chunk-size", type=int, default=1024, help="bytes per network read")
+    args = parser.parse_args()
+
+    body = build_stream(args.tokens)
+    chunks = split_chunks(body, args.chunk_size)
+    extra = {"tokens": args.tokens, "bytes": len(body), "reads": len(chunks)}
+    orjson_module = sse.orjson
+
+    results = []
+
+    # Decoder only, no httpx: isolates framing cost
+    results.append(bench(
+        "framing: SSEDecoder.feed",
+        lambda: frame_only(chunks),
+        repeat=args.repeat,
+        extra=extra,
+    ))
+
+    # End to end through an httpx response
+    results.append(bench_async("legacy: aiter_lines + json", lambda: legacy_parse(chunks), repeat=args.repeat, extra=extra))
+
+    sse.orjson = None
+    results.append(bench_async("decoder + json", lambda: decoder_parse(chunks), repeat=args.repeat, extra=extra))
+    sse.orjson = orjson_module
+
+    if orjson_module is not None:
+        results.append(bench_async("decoder + orjson", lambda: decoder_parse(chunks), repeat=args.repeat, extra=extra))
+    else:
+        print("[bench] 未安装 orjson, 跳过 orjson 用例")
+
+    report(
+        f"SSE解析 ({args.tokens} tokens, {len(body)} bytes, {len(chunks)} reads)",
+        results,
+        baseline="legacy: aiter_lines + json",
+    )
+    write_json(args.json_path, {"benchmark": "sse_parser", "results": results})
+
+
+if __name__ == "__main__":
+    main()
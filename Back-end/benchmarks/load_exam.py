@@ -0,0 +1,380 @@
+"""
+Exam Load Benchmark
+
+End-to-end load test of exam taking and grading against the ASGI app
+in-process: N seeded students each start the exam, autosave answers
+periodically, submit, then poll for the result until background grading
+has finished. LLM grading goes to the offline mock provider.
+
+Reports throughput and p50/p95/p99 latency per endpoint, SQLite write and
+commit wait time, and submit-to-graded completion time; --json writes the
+report so runs can be compared between commits.
+
+Usage:
+    python -m benchmarks.load_exam [--students 50] [--autosaves 2] [--json out.json]
+"""
+
+# Scratch database and mock provider, before anything imports app.*
+from benchmarks._bootstrap import DB_DIR as _DB_DIR
+
+import asyncio
+import contextlib
+import io
+import math
+import random
+import shutil
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import httpx
+from sqlalchemy import event
+
+from app.config import settings
+from app.core.llm.log_writer import llm_log_writer
+from app.core.security import create_access_token, hash_password
+from app.db.session import engine, async_session_maker
+from app.db.init_db import init_db
+from app.main import app
+from app.models.course import Course
+from app.models.exam import Exam, ExamStatus
+from app.models.question import Question, QuestionType, QuestionStatus, Paper, PaperQuestion
+from app.models.user import User, UserRole
+from app.services.grading_queue_service import grading_queue
+from app.services.llm_service import provider_registry
+from benchmarks._harness import arg_parser, write_json
+
+
+# (type, options, answer, score) of the seeded questions, cycled to --questions
+_QUESTION_MIX = [
+    (QuestionType.SINGLE_CHOICE, {k: f"选项{k}" for k in "ABCD"}, {"correct": "B"}, 5),
+    (QuestionType.MULTIPLE_CHOICE, {k: f"选项{k}" for k in "ABCD"}, {"correct": ["A", "C"]}, 5),
+    (QuestionType.FILL_BLANK, None, {"blanks": ["牛顿", "加速度"]}, 10),
+    (QuestionType.SINGLE_CHOICE, {k: f"选项{k}" for k in "ABCD"}, {"correct": "D"}, 5),
+    (QuestionType.SHORT_ANSWER, None, {"reference": "力是改变物体运动状态的原因，F=ma。"}, 15),
+]
+
+_FINAL_STATUSES = {"ai_graded", "graded"}
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of unsorted samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, Any]:
+    return {
+        "count": len(samples_ms),
+        "p50_ms": round(percentile(samples_ms, 50), 2),
+        "p95_ms": round(percentile(samples_ms, 95), 2),
+        "p99_ms": round(percentile(samples_ms, 99), 2),
+        "max_ms": round(max(samples_ms), 2) if samples_ms else 0.0,
+        "total_ms": round(sum(samples_ms), 2),
+    }
+
+
+class DBProbe:
+    """
+    SQLite contention probe on the app engine
+
+    SQLite takes its write lock at the first write of a transaction and
+    needs an exclusive lock to commit, so under contention the wait shows
+    up as slow INSERT/UPDATE/DELETE statements and slow commits; both are
+    timed here, along with "database is locked" errors.
+    """
+
+    def __init__(self, sync_engine):
+        self.writes: List[float] = []
+        self.commits: List[float] = []
+        self.locked_errors = 0
+
+        event.listen(sync_engine, "before_cursor_execute", self._before)
+        event.listen(sync_engine, "after_cursor_execute", self._after)
+        event.listen(sync_engine, "handle_error", self._error)
+
+        dialect = sync_engine.dialect
+        do_commit = dialect.do_commit
+
+        def timed_commit(dbapi_connection):
+            start = time.perf_counter()
+            try:
+                do_commit(dbapi_connection)
+            finally:
+                self.commits.append((time.perf_counter() - start) * 1000)
+
+        dialect.do_commit = timed_commit
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info["probe_start"] = time.perf_counter()
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.pop("probe_start", None)
+        if start is not None and statement.lstrip()[:6].upper() in ("INSERT", "UPDATE", "DELETE"):
+            self.writes.append((time.perf_counter() - start) * 1000)
+
+    def _error(self, context):
+        if "database is locked" in str(context.original_exception):
+            self.locked_errors += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "write_statements": summarize(self.writes),
+            "commits": summarize(self.commits),
+            "lock_wait_total_ms": round(sum(self.writes) + sum(self.commits), 2),
+            "locked_errors": self.locked_errors,
+        }
+
+
+class Recorder:
+    """Per-endpoint latencies and error counts"""
+
+    def __init__(self):
+        self.latency: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.grading: List[float] = []
+        self.ungraded = 0
+
+    async def call(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        self.latency[endpoint].append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            self.errors[endpoint] += 1
+        return response
+
+
+async def seed(students: int, questions: int) -> Dict[str, Any]:
+    """Create a teacher, a published exam and the students"""
+    password_hash = hash_password("bench-password")
+
+    async with async_session_maker() as db:
+        teacher = User(email="teacher@bench.local", name="压测教师", password_hash=password_hash, role=UserRole.TEACHER)
+        db.add(teacher)
+        await db.flush()
+
+        course = Course(name="压测课程", teacher_id=teacher.id)
+        db.add(course)
+        await db.flush()
+
+        paper = Paper(title="压测试卷", course_id=course.id, created_by=teacher.id)
+        db.add(paper)
+        await db.flush()
+
+        question_ids = []
+        for i in range(questions):
+            q_type, options, answer, score = _QUESTION_MIX[i % len(_QUESTION_MIX)]
+            stem = f"压测题目 {i + 1}" + ("：____定律描述了____与力的关系。" if q_type == QuestionType.FILL_BLANK else "")
+            question = Question(
+                type=q_type,
+                stem=stem,
+                options=options,
+                answer=answer,
+                explanation="压测解析",
+                score=score,
+                course_id=course.id,
+                created_by=teacher.id,
+                status=QuestionStatus.APPROVED,
+            )
+            db.add(question)
+            await db.flush()
+            db.add(PaperQuestion(paper_id=paper.id, question_id=question.id, score=score, order=i))
+            question_ids.append((question.id, q_type))
+
+        now = datetime.now()
+        exam = Exam(
+            title="压测考试",
+            paper_id=paper.id,
+            start_time=now - timedelta(hours=1),
+            end_time=now + timedelta(hours=6),
+            duration_minutes=120,
+            published_by=teacher.id,
+            status=ExamStatus.PUBLISHED,
+        )
+        db.add(exam)
+
+        users = [
+            User(email=f"student{i}@bench.local", name=f"压测学生{i}", password_hash=password_hash, role=UserRole.STUDENT)
+            for i in range(students)
+        ]
+        db.add_all(users)
+        await db.commit()
+
+        tokens = [create_access_token({"sub": str(u.id)}) for u in users]
+        return {"exam_id": exam.id, "questions": question_ids, "tokens": tokens}
+
+
+def make_answer(rng: random.Random, q_type: QuestionType) -> Any:
+    """A plausible student answer (right or wrong)"""
+    if q_type == QuestionType.SINGLE_CHOICE:
+        return rng.choice("ABCD")
+    if q_type == QuestionType.MULTIPLE_CHOICE:
+        return sorted(rng.sample("ABCD", rng.choice([1, 2, 3])))
+    if q_type == QuestionType.FILL_BLANK:
+        return [rng.choice(["牛顿", "伽利略", "开普勒"]), rng.choice(["加速度", "速度", "质量"])]
+    # Varied wording, so short answers are not all served from the LLM cache
+    return f"力会改变物体的运动状态，第{rng.randrange(10 ** 6)}种表述：F=ma。"
+
+
+async def run_student(
+    client: httpx.AsyncClient,
+    recorder: Recorder,
+    exam_id: int,
+    questions: List,
+    token: str,
+    autosaves: int,
+    think_ms: float,
+    poll_ms: float,
+    grade_timeout: float,
+    rng: random.Random,
+) -> None:
+    """One student: start, autosave answers, submit, poll until graded"""
+    headers = {"Authorization": f"Bearer {token}"}
+    base = f"{settings.API_PREFIX}/exams/{exam_id}"
+
+    async def think():
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * think_ms / 1000)
+
+    # Stagger arrivals like students opening the exam over a few seconds
+    await think()
+    await recorder.call(client, "POST /exams/{id}/start", "POST", f"{base}/start", headers=headers)
+
+    # Every round re-saves each answer, as the front-end autosave does
+    for _ in range(max(autosaves, 1)):
+        for question_id, q_type in questions:
+            await think()
+            await recorder.call(
+                client, "POST /exams/{id}/answer", "POST", f"{base}/answer", headers=headers,
+                json={"question_id": question_id, "answer": make_answer(rng, q_type), "time_spent_seconds": 30},
+            )
+
+    response = await recorder.call(client, "POST /exams/{id}/submit", "POST", f"{base}/submit", headers=headers)
+    if response.status_code >= 400:
+        return
+    submitted = time.perf_counter()
+
+    while time.perf_counter() - submitted < grade_timeout:
+        await asyncio.sleep(poll_ms / 1000)
+        response = await recorder.call(client, "GET /exams/{id}/result", "GET", f"{base}/result", headers=headers)
+        if response.status_code == 200 and response.json().get("status") in _FINAL_STATUSES:
+            recorder.grading.append((time.perf_counter() - submitted) * 1000)
+            return
+    recorder.ungraded += 1
+
+
+async def run(args) -> Dict[str, Any]:
+    await init_db()
+    probe = DBProbe(engine.sync_engine)
+    data = await seed(args.students, args.questions)
+    # Only the load itself is measured
+    probe.writes.clear()
+    probe.commits.clear()
+
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            run_student(
+                client, recorder, data["exam_id"], data["questions"], token,
+                args.autosaves, args.think_ms, args.poll_ms, args.grade_timeout,
+                random.Random(rng.random()),
+            )
+            for token in data["tokens"]
+        ))
+        elapsed = time.perf_counter() - start
+
+    await grading_queue.stop()
+    await llm_log_writer.stop()
+
+    total_requests = sum(len(v) for v in recorder.latency.values())
+    endpoints = {}
+    for name, samples in recorder.latency.items():
+        endpoints[name] = {**summarize(samples), "errors": recorder.errors.get(name, 0)}
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "requests": total_requests,
+        "throughput_rps": round(total_requests / elapsed, 2) if elapsed else 0.0,
+        "endpoints": endpoints,
+        "grading": {**summarize(recorder.grading), "ungraded": recorder.ungraded},
+        "sqlite": probe.snapshot(),
+        "llm": {
+            "calls": provider_registry.flights.snapshot(),
+            "cache": provider_registry.cache.snapshot(),
+            "log_writer": llm_log_writer.snapshot(),
+        },
+    }
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(result: Dict[str, Any]) -> None:
+    print(f"\n耗时 {result['elapsed_s']}s, 请求 {result['requests']}, 吞吐 {result['throughput_rps']} req/s")
+    width = max(len(name) for name in result["endpoints"])
+    print(f"{'endpoint'.ljust(width)}  {'count':>6}  {'p50 ms':>9}  {'p95 ms':>9}  {'p99 ms':>9}  {'errors':>6}")
+    for name, s in sorted(result["endpoints"].items()):
+        print(f"{name.ljust(width)}  {s['count']:>6}  {s['p50_ms']:>9.2f}  {s['p95_ms']:>9.2f}  {s['p99_ms']:>9.2f}  {s['errors']:>6}")
+
+    g = result["grading"]
+    print(f"\n批改完成 {g['count']} (超时未完成 {g['ungraded']}): p50 {g['p50_ms']}ms  p95 {g['p95_ms']}ms  p99 {g['p99_ms']}ms")
+
+    db = result["sqlite"]
+    print(
+        f"SQLite 写语句 p95 {db['write_statements']['p95_ms']}ms / 提交 p95 {db['commits']['p95_ms']}ms, "
+        f"累计等待 {db['lock_wait_total_ms']}ms, database is locked {db['locked_errors']} 次"
+    )
+
+
+def main() -> None:
+    parser = arg_parser(__doc__.split("\n")[1])
+    parser.add_argument("--students", type=int, default=50)
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--autosaves", type=int, default=2, help="autosave rounds over all questions")
+    parser.add_argument("--think-ms", type=float, default=50, help="mean pause between student actions")
+    parser.add_argument("--poll-ms", type=float, default=500, help="result polling interval")
+    parser.add_argument("--grade-timeout", type=float, default=120, help="seconds to wait for grading")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="keep the app's own log output")
+    args = parser.parse_args()
+
+    print(
+        f"[压测] 学生 {args.students}, 题目 {args.questions}, 自动保存 {args.autosaves} 轮, "
+        f"LLM={settings.LLM_PROVIDER} 延迟 {settings.MOCK_LLM_LATENCY_MS}ms"
+    )
+    sink = sys.stdout if args.verbose else io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sink):
+            result = asyncio.run(run(args))
+    finally:
+        shutil.rmtree(_DB_DIR, ignore_errors=True)
+
+    print_report(result)
+    write_json(args.json_path, {
+        "benchmark": "load_exam",
+        "revision": git_revision(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "params": {k: v for k, v in vars(args).items() if k != "json_path"},
+        "llm_latency_ms": settings.MOCK_LLM_LATENCY_MS,
+        **result,
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Test Configuration
+
+The engine and settings are created at import time, so the test database
+and the offline mock provider are configured here, before any test module
+imports app.*
+"""
+
+import os
+import shutil
+import tempfile
+
+import pytest_asyncio
+
+DB_DIR = tempfile.mkdtemp(prefix="tests_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{os.path.join(DB_DIR, 'test.db')}"
+os.environ["SQL_ECHO"] = "false"
+os.environ["LLM_PROVIDER"] = "mock"
+os.environ["MOCK_LLM_LATENCY_MS"] = "0"
+
+
+@pytest_asyncio.fixture
+async def database():
+    """Freshly created tables, dropped again after the test"""
+    from app.db.base import Base
+    from app.db.init_db import init_db
+    from app.db.session import engine
+
+    await init_db()
+    yield
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    # Connections belong to this test's event loop
+    await engine.dispose()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(DB_DIR, ignore_errors=True)
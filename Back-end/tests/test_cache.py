@@ -0,0 +1,199 @@
+"""
+Response Cache Tests
+
+TTL expiry, LRU eviction, storing only complete answers and eviction
+from both memory and the SQLite copy, on a controllable clock
+"""
+
+import pytest
+
+from app.config import settings
+from app.core.llm.base import LLMResponse
+from app.core.llm.cache import ResponseCache
+from app.models.llm_log import LLMScene
+
+
+SCENE = LLMScene.GRADE
+
+
+class Clock:
+    """Wall clock the test moves by hand"""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture(autouse=True)
+def cache_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_CACHE_TTL_SECONDS", {SCENE.value: 60, LLMScene.OTHER.value: 0})
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def disk_path(tmp_path):
+    return str(tmp_path / "llm_cache.db")
+
+
+def response(content: str = "ok", finish_reason: str = "stop") -> LLMResponse:
+    return LLMResponse(content=content, model="m", provider="p", finish_reason=finish_reason, total_tokens=5)
+
+
+def make_cache(clock, max_entries: int = 10, sqlite_path: str = "") -> ResponseCache:
+    return ResponseCache(max_entries=max_entries, sqlite_path=sqlite_path, clock=clock)
+
+
+# ===================================
+# TTL
+# ===================================
+
+@pytest.mark.asyncio
+async def test_hit_until_ttl_expires(clock):
+    cache = make_cache(clock)
+    assert await cache.get(SCENE, ["k"]) is None
+    await cache.set(SCENE, "k", response())
+
+    clock.advance(59)
+    assert (await cache.get(SCENE, ["k"])).content == "ok"
+
+    clock.advance(2)
+    assert await cache.get(SCENE, ["k"]) is None
+    assert cache.snapshot()["entries"] == 0
+
+    stats = cache.stats(SCENE)
+    assert (stats.hits, stats.misses, stats.stores) == (1, 2, 1)
+
+
+@pytest.mark.asyncio
+async def test_scene_without_ttl_not_cached(clock):
+    cache = make_cache(clock)
+    await cache.set(LLMScene.OTHER, "k", response())
+    assert await cache.get(LLMScene.OTHER, ["k"]) is None
+
+
+@pytest.mark.asyncio
+async def test_disk_copy_expires_too(clock, disk_path):
+    cache = make_cache(clock, sqlite_path=disk_path)
+    await cache.set(SCENE, "k", response())
+    cache.clear()
+
+    clock.advance(30)
+    assert (await cache.get(SCENE, ["k"])).content == "ok"
+    assert cache.stats(SCENE).disk_hits == 1
+
+    cache.clear()
+    clock.advance(31)
+    assert await cache.get(SCENE, ["k"]) is None
+    cache.close()
+
+
+@pytest.mark.asyncio
+async def test_disk_copy_survives_restart(clock, disk_path):
+    first = make_cache(clock, sqlite_path=disk_path)
+    await first.set(SCENE, "k", response("persisted"))
+    first.close()
+
+    second = make_cache(clock, sqlite_path=disk_path)
+    hit = await second.get(SCENE, ["k"])
+    assert hit == response("persisted")
+    # Promoted into memory: the next lookup does not touch the disk
+    assert (await second.get(SCENE, ["k"])).content == "persisted"
+    assert second.stats(SCENE).disk_hits == 1
+    second.close()
+
+
+# ===================================
+# LRU
+# ===================================
+
+@pytest.mark.asyncio
+async def test_least_recently_used_evicted_first(clock):
+    cache = make_cache(clock, max_entries=2)
+    await cache.set(SCENE, "a", response("a"))
+    await cache.set(SCENE, "b", response("b"))
+    # Reading "a" makes "b" the least recently used
+    assert await cache.get(SCENE, ["a"]) is not None
+    await cache.set(SCENE, "c", response("c"))
+
+    assert await cache.get(SCENE, ["b"]) is None
+    assert (await cache.get(SCENE, ["a"])).content == "a"
+    assert (await cache.get(SCENE, ["c"])).content == "c"
+    assert cache.stats(SCENE).evictions == 1
+
+
+@pytest.mark.asyncio
+async def test_overwrite_refreshes_position(clock):
+    cache = make_cache(clock, max_entries=2)
+    await cache.set(SCENE, "a", response("a1"))
+    await cache.set(SCENE, "b", response("b"))
+    await cache.set(SCENE, "a", response("a2"))
+    await cache.set(SCENE, "c", response("c"))
+
+    assert await cache.get(SCENE, ["b"]) is None
+    assert (await cache.get(SCENE, ["a"])).content == "a2"
+
+
+@pytest.mark.asyncio
+async def test_first_live_candidate_key_wins(clock):
+    cache = make_cache(clock)
+    await cache.set(SCENE, "second", response("second"))
+    await cache.set(SCENE, "third", response("third"))
+    assert (await cache.get(SCENE, ["first", "second", "third"])).content == "second"
+
+
+@pytest.mark.asyncio
+async def test_zero_entries_disables_cache(clock):
+    cache = make_cache(clock, max_entries=0)
+    await cache.set(SCENE, "k", response())
+    assert await cache.get(SCENE, ["k"]) is None
+
+
+# ===================================
+# What is stored
+# ===================================
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("finish_reason", ["length", "content_filter", None])
+async def test_only_complete_answers_stored(clock, disk_path, finish_reason):
+    cache = make_cache(clock, sqlite_path=disk_path)
+    await cache.set(SCENE, "k", response(finish_reason=finish_reason))
+    assert await cache.get(SCENE, ["k"]) is None
+    assert cache.stats(SCENE).stores == 0
+    cache.close()
+
+    # Nothing was written to disk either
+    assert await make_cache(clock, sqlite_path=disk_path).get(SCENE, ["k"]) is None
+
+
+@pytest.mark.asyncio
+async def test_evict_removes_memory_and_disk_copies(clock, disk_path):
+    cache = make_cache(clock, sqlite_path=disk_path)
+    await cache.set(SCENE, "bad", response("unparseable"))
+    await cache.set(SCENE, "good", response("fine"))
+
+    await cache.evict(["bad", "missing"])
+    assert await cache.get(SCENE, ["bad"]) is None
+    assert (await cache.get(SCENE, ["good"])).content == "fine"
+    cache.close()
+
+    restarted = make_cache(clock, sqlite_path=disk_path)
+    assert await restarted.get(SCENE, ["bad"]) is None
+    assert (await restarted.get(SCENE, ["good"])).content == "fine"
+    restarted.close()
+
+
+@pytest.mark.asyncio
+async def test_evict_without_disk(clock):
+    cache = make_cache(clock)
+    await cache.set(SCENE, "k", response())
+    await cache.evict(["k"])
+    assert await cache.get(SCENE, ["k"]) is None
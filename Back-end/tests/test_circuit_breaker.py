@@ -0,0 +1,168 @@
+"""
+Circuit Breaker Tests
+
+State transitions and the half-open single-probe guarantee, both on the
+breaker itself and through LLMService with concurrent calls
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.llm.base import LLMResponse, Message
+from app.core.llm.circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState
+from app.models.llm_log import LLMScene
+from app.services.llm_service import LLMService, ProviderRegistry
+
+
+def open_breaker(recovery_timeout: float = 0.0) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=recovery_timeout)
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitState.OPEN
+    return breaker
+
+
+def test_opens_after_threshold():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=30)
+    assert breaker.record_failure() is None
+    assert breaker.record_failure() == (CircuitState.CLOSED, CircuitState.OPEN)
+    assert breaker.allow() == (False, None)
+    assert breaker.rejected_count == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=30)
+    breaker.record_failure()
+    breaker.record_success()
+    assert breaker.record_failure() is None
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_stays_open_until_recovery_due():
+    breaker = open_breaker(recovery_timeout=30)
+    assert not breaker.available()
+    assert breaker.allow() == (False, None)
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = open_breaker()
+    assert breaker.available()
+    assert breaker.allow() == (True, (CircuitState.OPEN, CircuitState.HALF_OPEN))
+    # Every other caller is rejected while the probe is in flight
+    assert not breaker.available()
+    assert breaker.allow() == (False, None)
+    assert breaker.allow() == (False, None)
+
+
+def test_probe_success_closes():
+    breaker = open_breaker()
+    breaker.allow()
+    assert breaker.record_success() == (CircuitState.HALF_OPEN, CircuitState.CLOSED)
+    assert breaker.allow() == (True, None)
+
+
+def test_probe_failure_reopens():
+    breaker = open_breaker(recovery_timeout=30)
+    breaker.opened_at -= 30
+    breaker.allow()
+    assert breaker.record_failure() == (CircuitState.HALF_OPEN, CircuitState.OPEN)
+    assert breaker.allow() == (False, None)
+
+
+def test_released_probe_slot_can_be_taken_again():
+    breaker = open_breaker()
+    breaker.allow()
+    breaker.release()
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.allow() == (True, None)
+    assert breaker.allow() == (False, None)
+
+
+class BlockingProvider:
+    """Provider stand-in whose calls wait until the test lets them finish"""
+
+    provider_name = "blocking"
+    model = "blocking-model"
+    max_tokens = 16
+
+    def __init__(self):
+        self.started = 0
+        self.gates = []
+
+    async def chat(self, messages, **kwargs):
+        self.started += 1
+        gate = asyncio.Event()
+        self.gates.append(gate)
+        await gate.wait()
+        return LLMResponse(content="ok", model=self.model, provider=self.provider_name, finish_reason="stop")
+
+
+async def wait_started(provider: BlockingProvider, count: int) -> None:
+    for _ in range(100):
+        if provider.started >= count:
+            return
+        await asyncio.sleep(0.001)
+    raise AssertionError(f"{count} calls never reached the provider")
+
+
+async def attempt(service: LLMService, provider: BlockingProvider) -> LLMResponse:
+    return await service._chat_attempt(
+        provider, [Message(role="user", content="hi")], LLMScene.OTHER,
+        1, None, None, None, False, {},
+    )
+
+
+@pytest.mark.asyncio
+async def test_stale_call_does_not_free_probe_slot():
+    registry = ProviderRegistry()
+    service = LLMService(registry)
+    provider = BlockingProvider()
+    breaker = registry.get_breaker(provider.provider_name)
+    breaker.failure_threshold = 1
+    breaker.recovery_timeout = 0
+
+    # Admitted while the circuit is closed
+    stale = asyncio.create_task(attempt(service, provider))
+    await wait_started(provider, 1)
+
+    # The provider goes down and the circuit opens, then a probe is admitted
+    breaker.record_failure()
+    probe = asyncio.create_task(attempt(service, provider))
+    await wait_started(provider, 2)
+    assert breaker.state == CircuitState.HALF_OPEN
+
+    # The stale call ends without a verdict (e.g. a cancelled hedge leg)
+    stale.cancel()
+    await asyncio.gather(stale, return_exceptions=True)
+
+    # The probe is still in flight, so nobody else gets through
+    with pytest.raises(CircuitOpenError):
+        await asyncio.wait_for(attempt(service, provider), 1)
+    assert provider.started == 2
+
+    provider.gates[1].set()
+    await probe
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_in_half_open_send_one_probe():
+    registry = ProviderRegistry()
+    service = LLMService(registry)
+    provider = BlockingProvider()
+    breaker = registry.get_breaker(provider.provider_name)
+    breaker.failure_threshold = 1
+    breaker.recovery_timeout = 0
+    breaker.record_failure()
+
+    results = asyncio.gather(*(attempt(service, provider) for _ in range(5)), return_exceptions=True)
+    await wait_started(provider, 1)
+    await asyncio.sleep(0.01)
+    assert provider.started == 1
+
+    provider.gates[0].set()
+    outcomes = await results
+    assert sum(isinstance(o, LLMResponse) for o in outcomes) == 1
+    assert sum(isinstance(o, CircuitOpenError) for o in outcomes) == 4
+    assert breaker.state == CircuitState.CLOSED
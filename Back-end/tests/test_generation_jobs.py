@@ -0,0 +1,359 @@
+"""
+Generation Job Runner Tests
+
+Resumption after a restart, cancellation, per-user limits and target
+mode trimming, against a temporary SQLite database with a stub in place
+of the generation pipeline
+"""
+
+import asyncio
+from datetime import timedelta
+from itertools import count
+from typing import Any, Dict, List, Optional
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from app.config import settings
+from app.db.session import async_session_maker
+from app.models.generation_job import GenerationJob, GenerationJobItem, GenerationJobStatus
+from app.models.user import User, UserRole
+from app.schemas.question import BatchGenerationRequest, QuestionType
+from app.services import generation_job_service
+from app.services.generation_job_service import GenerationJobService, _now, generation_job_runner
+from app.services.generation_pipeline import PipelineResult, ProcessedQuestion, QuestionStatus
+
+
+pytestmark = pytest.mark.usefixtures("database")
+
+_ids = count(1)
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def runner(monkeypatch):
+    monkeypatch.setattr(settings, "GENERATION_JOB_WORKERS", 2)
+    monkeypatch.setattr(settings, "GENERATION_JOB_POLL_INTERVAL_SECONDS", 0.02)
+    monkeypatch.setattr(settings, "GENERATION_JOB_LEASE_SECONDS", 60.0)
+    monkeypatch.setattr(settings, "GENERATION_JOB_MAX_RUNNING_PER_USER", 1)
+    yield generation_job_runner
+    await generation_job_runner.stop()
+
+
+class StubPipeline:
+    """
+    Stands in for GenerationPipeline
+
+    Produces shards of `shard_size` approved questions, reporting each one
+    through on_shard; with block=True it waits for `proceed` after every
+    shard but the last.
+    """
+
+    def __init__(self, monkeypatch, shard_size: int = 2, block: bool = False, surplus: int = 0):
+        self.shard_size = shard_size
+        self.surplus = surplus
+        self.block = block
+        self.proceed = asyncio.Event()
+        self.shard_saved = asyncio.Event()
+        self.calls: List[Dict[str, Any]] = []
+        self.produced: List[str] = []
+        self.raise_error: Optional[BaseException] = None
+        monkeypatch.setattr(generation_job_service, "GenerationPipeline", lambda llm: self)
+
+    async def _produce(self, wanted: int, on_shard) -> List[Dict[str, Any]]:
+        reports = []
+        made = 0
+        while made < wanted:
+            size = min(self.shard_size, wanted - made)
+            questions = [
+                ProcessedQuestion(question={"stem": f"题目{next(_ids)}"}, status=QuestionStatus.APPROVED)
+                for _ in range(size)
+            ]
+            report = {"requested": size, "tokens": 10 * size}
+            await on_shard(PipelineResult(approved=questions), report)
+            reports.append(report)
+            self.produced.extend(pq.question["stem"] for pq in questions)
+            made += size
+            if made < wanted and self.block:
+                self.shard_saved.set()
+                await self.proceed.wait()
+        return reports
+
+    async def generate_batch(self, request, user_id=None, skip_review=False, exclude=None, on_shard=None):
+        self.calls.append({"count": request.count, "exclude": exclude})
+        if self.raise_error is not None:
+            raise self.raise_error
+        reports = await self._produce(request.count, on_shard)
+        return PipelineResult(), reports
+
+    async def generate_target(self, request, user_id=None, skip_review=False, token_budget=None,
+                              exclude=None, on_shard=None):
+        self.calls.append({"count": request.count, "exclude": exclude, "token_budget": token_budget})
+        # The last round overshoots, as a real round asking for count / approval rate does
+        await self._produce(request.count + self.surplus, on_shard)
+        return PipelineResult()
+
+
+async def make_user() -> int:
+    n = next(_ids)
+    async with async_session_maker() as db:
+        user = User(email=f"t{n}@test.local", name=f"教师{n}", password_hash="x", role=UserRole.TEACHER)
+        db.add(user)
+        await db.commit()
+        return user.id
+
+
+async def make_job(user_id: int, total: int, target: bool = False, **values) -> int:
+    request = BatchGenerationRequest(course_name="物理", question_type=QuestionType.SINGLE_CHOICE, count=total)
+    async with async_session_maker() as db:
+        job = GenerationJob(
+            user_id=user_id, request=request.model_dump(mode="json"), target=target, total=total, **values,
+        )
+        db.add(job)
+        await db.commit()
+        return job.id
+
+
+async def get_job(job_id: int) -> GenerationJob:
+    async with async_session_maker() as db:
+        return await db.get(GenerationJob, job_id)
+
+
+async def get_items(job_id: int) -> List[GenerationJobItem]:
+    async with async_session_maker() as db:
+        return list((await db.scalars(
+            select(GenerationJobItem).where(GenerationJobItem.job_id == job_id).order_by(GenerationJobItem.id)
+        )).all())
+
+
+async def wait_for_status(job_id: int, *statuses: GenerationJobStatus, timeout: float = 5.0) -> GenerationJob:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while True:
+        job = await get_job(job_id)
+        if job.status in statuses:
+            return job
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError(f"job {job_id} still {job.status.value}")
+        await asyncio.sleep(0.02)
+
+
+# ===================================
+# Resume after a restart
+# ===================================
+
+@pytest.mark.asyncio
+async def test_job_completes(monkeypatch, runner):
+    pipeline = StubPipeline(monkeypatch)
+    job_id = await make_job(await make_user(), total=5)
+    runner.start()
+    job = await wait_for_status(job_id, GenerationJobStatus.COMPLETED)
+    assert (job.requested, job.approved, job.total_tokens, job.attempts) == (5, 5, 50, 1)
+    assert len(await get_items(job_id)) == 5
+    assert pipeline.calls[0]["count"] == 5
+
+
+@pytest.mark.asyncio
+async def test_stale_running_job_resumes_with_missing_questions(monkeypatch, runner):
+    pipeline = StubPipeline(monkeypatch)
+    job_id = await make_job(
+        await make_user(), total=6,
+        status=GenerationJobStatus.RUNNING, attempts=1, requested=2, approved=2,
+        heartbeat_at=_now() - timedelta(seconds=settings.GENERATION_JOB_LEASE_SECONDS * 2),
+    )
+    async with async_session_maker() as db:
+        db.add_all(
+            GenerationJobItem(job_id=job_id, status="approved", data={"question": {"stem": f"旧题{i}"}})
+            for i in range(2)
+        )
+        await db.commit()
+
+    runner.start()
+    job = await wait_for_status(job_id, GenerationJobStatus.COMPLETED)
+    assert job.attempts == 2
+    assert (job.requested, job.approved) == (6, 6)
+    # Only the missing questions, avoiding the ones produced before the crash
+    assert pipeline.calls[0]["count"] == 4
+    assert pipeline.calls[0]["exclude"] == [{"stem": "旧题0"}, {"stem": "旧题1"}]
+    assert len(await get_items(job_id)) == 6
+
+
+@pytest.mark.asyncio
+async def test_running_job_with_live_heartbeat_not_taken(monkeypatch, runner):
+    pipeline = StubPipeline(monkeypatch)
+    job_id = await make_job(
+        await make_user(), total=2, status=GenerationJobStatus.RUNNING, attempts=1, heartbeat_at=_now(),
+    )
+    runner.start()
+    await asyncio.sleep(0.2)
+    assert (await get_job(job_id)).status == GenerationJobStatus.RUNNING
+    assert pipeline.calls == []
+
+
+@pytest.mark.asyncio
+async def test_stale_job_given_up_after_max_attempts(monkeypatch, runner):
+    pipeline = StubPipeline(monkeypatch)
+    job_id = await make_job(
+        await make_user(), total=2,
+        status=GenerationJobStatus.RUNNING, attempts=settings.GENERATION_JOB_MAX_ATTEMPTS,
+        heartbeat_at=_now() - timedelta(seconds=settings.GENERATION_JOB_LEASE_SECONDS * 2),
+    )
+    runner.start()
+    job = await wait_for_status(job_id, GenerationJobStatus.FAILED)
+    assert job.error
+    assert pipeline.calls == []
+
+
+@pytest.mark.asyncio
+async def test_stop_queues_running_job_again(monkeypatch, runner):
+    pipeline = StubPipeline(monkeypatch, block=True)
+    job_id = await make_job(await make_user(), total=4)
+    runner.start()
+    await asyncio.wait_for(pipeline.shard_saved.wait(), 5)
+    await runner.stop()
+
+    job = await get_job(job_id)
+    assert job.status == GenerationJobStatus.QUEUED
+    assert job.finished_at is None
+    assert job.approved == 2
+
+    pipeline.block = False
+    runner.start()
+    job = await wait_for_status(job_id, GenerationJobStatus.COMPLETED)
+    assert job.approved == 4
+    assert pipeline.calls[1]["count"] == 2
+
+
+# ===================================
+# Cancellation
+# ===================================
+
+@pytest.mark.asyncio
+async def test_cancel_stops_job_between_shards(monkeypatch, runner):
+    pipeline = StubPipeline(monkeypatch, block=True)
+    job_id = await make_job(await make_user(), total=6)
+    runner.start()
+    await asyncio.wait_for(pipeline.shard_saved.wait(), 5)
+
+    async with async_session_maker() as db:
+        service = GenerationJobService(db)
+        job, error = await service.cancel_job(await db.get(GenerationJob, job_id))
+    assert error is None
+
+    job = await wait_for_status(job_id, GenerationJobStatus.CANCELLED)
+    assert job.cancel_requested
+    assert job.finished_at is not None
+    assert job.error is None
+    # The first shard is kept, nothing after it was produced
+    assert job.approved == 2
+    assert len(await get_items(job_id)) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancel_from_another_process_noticed_by_heartbeat(monkeypatch, runner):
+    monkeypatch.setattr(settings, "GENERATION_JOB_LEASE_SECONDS", 0.3)
+    pipeline = StubPipeline(monkeypatch, block=True)
+    job_id = await make_job(await make_user(), total=4)
+    runner.start()
+    await asyncio.wait_for(pipeline.shard_saved.wait(), 5)
+
+    # Only the flag: the job does not run in the cancelling process
+    async with async_session_maker() as db:
+        job = await db.get(GenerationJob, job_id)
+        job.cancel_requested = True
+        await db.commit()
+
+    job = await wait_for_status(job_id, GenerationJobStatus.CANCELLED)
+    assert job.approved == 2
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_job_at_once(monkeypatch, runner):
+    job_id = await make_job(await make_user(), total=2)
+    async with async_session_maker() as db:
+        job, error = await GenerationJobService(db).cancel_job(await db.get(GenerationJob, job_id))
+    assert error is None
+    assert job.status == GenerationJobStatus.CANCELLED
+
+
+@pytest.mark.asyncio
+async def test_cancelled_error_from_pipeline_fails_job(monkeypatch, runner):
+    pipeline = StubPipeline(monkeypatch)
+    pipeline.raise_error = asyncio.CancelledError()
+    job_id = await make_job(await make_user(), total=2)
+    runner.start()
+    job = await wait_for_status(job_id, GenerationJobStatus.FAILED, GenerationJobStatus.CANCELLED)
+    # Nobody cancelled it: not reported as a user cancellation
+    assert job.status == GenerationJobStatus.FAILED
+    assert "CancelledError" in job.error
+
+
+# ===================================
+# Per-user limits
+# ===================================
+
+@pytest.mark.asyncio
+async def test_running_jobs_limited_per_user(monkeypatch, runner):
+    pipeline = StubPipeline(monkeypatch, block=True)
+    user_id = await make_user()
+    first = await make_job(user_id, total=4)
+    second = await make_job(user_id, total=4)
+    runner.start()
+    await asyncio.wait_for(pipeline.shard_saved.wait(), 5)
+    # Both workers are idle-polling, yet the second job waits for the first
+    await asyncio.sleep(0.2)
+    assert (await get_job(first)).status == GenerationJobStatus.RUNNING
+    assert (await get_job(second)).status == GenerationJobStatus.QUEUED
+
+    # Another user's job is not held back
+    other = await make_job(await make_user(), total=1)
+    await wait_for_status(other, GenerationJobStatus.COMPLETED)
+    assert (await get_job(second)).status == GenerationJobStatus.QUEUED
+
+    pipeline.proceed.set()
+    await wait_for_status(first, GenerationJobStatus.COMPLETED)
+    await wait_for_status(second, GenerationJobStatus.COMPLETED)
+
+
+@pytest.mark.asyncio
+async def test_active_jobs_limited_per_user(monkeypatch):
+    monkeypatch.setattr(settings, "GENERATION_JOB_MAX_ACTIVE_PER_USER", 2)
+    user_id = await make_user()
+    request = BatchGenerationRequest(course_name="物理", question_type=QuestionType.SINGLE_CHOICE, count=2)
+    async with async_session_maker() as db:
+        service = GenerationJobService(db)
+        for _ in range(2):
+            job, error = await service.create_job(user_id, request)
+            assert job is not None and error is None
+        job, error = await service.create_job(user_id, request)
+    assert job is None
+    assert "上限" in error
+
+
+# ===================================
+# Target mode
+# ===================================
+
+@pytest.mark.asyncio
+async def test_target_mode_trims_surplus_approved(monkeypatch, runner):
+    pipeline = StubPipeline(monkeypatch, shard_size=3, surplus=3)
+    job_id = await make_job(await make_user(), total=5, target=True)
+    runner.start()
+    job = await wait_for_status(job_id, GenerationJobStatus.COMPLETED)
+    assert job.approved == 5
+    items = await get_items(job_id)
+    assert len([i for i in items if i.status == "approved"]) == 5
+    # The newest surplus questions are the ones dropped
+    assert len(pipeline.produced) == 8
+    assert [i.data["question"]["stem"] for i in items] == pipeline.produced[:5]
+    assert pipeline.calls[0]["count"] == 5
+
+
+@pytest.mark.asyncio
+async def test_target_mode_fails_short_of_target(monkeypatch, runner):
+    pipeline = StubPipeline(monkeypatch, surplus=-2)
+    job_id = await make_job(await make_user(), total=5, target=True)
+    runner.start()
+    job = await wait_for_status(job_id, GenerationJobStatus.FAILED)
+    assert job.approved == 3
+    assert "3/5" in job.error
+    assert pipeline.calls
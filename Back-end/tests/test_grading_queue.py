@@ -0,0 +1,356 @@
+"""
+Grading Queue Tests
+
+Claiming, leases, retries and shutdown of the durable grading queue,
+against a temporary SQLite database with a stub in place of ExamService
+"""
+
+import asyncio
+from datetime import timedelta
+from itertools import count
+from typing import List, Optional
+
+import pytest
+from sqlalchemy import select, update
+
+from app.config import settings
+from app.db.session import async_session_maker
+from app.models.exam import Attempt, AttemptStatus, Exam, GradingTask, GradingTaskStatus
+from app.models.user import User, UserRole
+from app.services import grading_queue_service
+from app.services.grading_queue_service import GradingQueue, _now
+
+
+pytestmark = pytest.mark.usefixtures("database")
+
+_ids = count(1)
+
+
+@pytest.fixture(autouse=True)
+def fast_queue(monkeypatch):
+    monkeypatch.setattr(settings, "GRADING_WORKERS", 2)
+    monkeypatch.setattr(settings, "GRADING_POLL_INTERVAL_SECONDS", 0.02)
+    monkeypatch.setattr(settings, "GRADING_LEASE_SECONDS", 30.0)
+    monkeypatch.setattr(settings, "GRADING_MAX_ATTEMPTS", 3)
+    monkeypatch.setattr(settings, "GRADING_RETRY_BACKOFF_SECONDS", 0.0)
+
+
+class StubGrader:
+    """Stands in for ExamService: records each try, fails the first ones, may block"""
+
+    def __init__(self, monkeypatch, fail_times: int = 0, block: bool = False):
+        self.strict: List[bool] = []
+        self.fail_times = fail_times
+        self.gate = asyncio.Event() if block else None
+        self.started = asyncio.Event()
+        monkeypatch.setattr(grading_queue_service, "ExamService", self._service)
+
+    def _service(self, db):
+        grader = self
+
+        class Service:
+            async def grade_submitted_attempt(self, exam_id, student_id, strict=False):
+                return await grader._grade(db, exam_id, student_id, strict)
+
+        return Service()
+
+    async def _grade(self, db, exam_id: int, student_id: int, strict: bool) -> Attempt:
+        self.strict.append(strict)
+        self.started.set()
+        if self.gate is not None:
+            await self.gate.wait()
+        if len(self.strict) <= self.fail_times:
+            raise RuntimeError("LLM down")
+        attempt = await db.scalar(
+            select(Attempt).where(Attempt.exam_id == exam_id, Attempt.student_id == student_id)
+        )
+        attempt.status = AttemptStatus.AI_GRADED
+        attempt.total_score = 10
+        await db.commit()
+        return attempt
+
+
+async def make_attempt(
+    status: AttemptStatus = AttemptStatus.SUBMITTED,
+    queued: bool = True,
+) -> int:
+    """A student's attempt, with its grading task unless queued=False; returns the attempt id"""
+    n = next(_ids)
+    async with async_session_maker() as db:
+        student = User(email=f"s{n}@test.local", name=f"学生{n}", password_hash="x", role=UserRole.STUDENT)
+        db.add(student)
+        await db.flush()
+        exam = Exam(title=f"考试{n}", published_by=student.id)
+        db.add(exam)
+        await db.flush()
+        now = _now()
+        attempt = Attempt(
+            exam_id=exam.id, student_id=student.id, started_at=now,
+            submitted_at=now if status != AttemptStatus.IN_PROGRESS else None, status=status,
+        )
+        db.add(attempt)
+        await db.flush()
+        if queued:
+            db.add(GradingTask(attempt_id=attempt.id, enqueued_at=now, available_at=now))
+        await db.commit()
+        return attempt.id
+
+
+async def task_of(attempt_id: int) -> Optional[GradingTask]:
+    async with async_session_maker() as db:
+        return await db.scalar(select(GradingTask).where(GradingTask.attempt_id == attempt_id))
+
+
+async def attempt_status(attempt_id: int) -> AttemptStatus:
+    async with async_session_maker() as db:
+        return (await db.get(Attempt, attempt_id)).status
+
+
+async def set_task(attempt_id: int, **values) -> None:
+    async with async_session_maker() as db:
+        await db.execute(update(GradingTask).where(GradingTask.attempt_id == attempt_id).values(**values))
+        await db.commit()
+
+
+async def wait_until(predicate, timeout: float = 5.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not await predicate():
+        if asyncio.get_running_loop().time() > deadline:
+            raise AssertionError("condition not reached in time")
+        await asyncio.sleep(0.02)
+
+
+async def wait_for_status(attempt_id: int, status: GradingTaskStatus) -> GradingTask:
+    async def reached():
+        task = await task_of(attempt_id)
+        return task is not None and task.status == status
+
+    await wait_until(reached)
+    return await task_of(attempt_id)
+
+
+def idle_queue() -> GradingQueue:
+    """A queue without workers, whose claims are driven by the test"""
+    queue = GradingQueue()
+    queue._loop = asyncio.get_running_loop()
+    queue._wakeup = asyncio.Event()
+    queue._claim_lock = asyncio.Lock()
+    return queue
+
+
+# ===================================
+# Claiming and leases
+# ===================================
+
+@pytest.mark.asyncio
+async def test_task_claimed_once_across_processes():
+    attempt_id = await make_attempt()
+    # Separate queues have separate locks, like separate processes
+    claims = await asyncio.gather(*(idle_queue()._claim() for _ in range(4)))
+    won = [c for c in claims if c is not None]
+    assert len(won) == 1
+    assert won[0][1:] == (attempt_id, 1)
+
+    task = await task_of(attempt_id)
+    assert task.status == GradingTaskStatus.RUNNING
+    assert task.attempts == 1
+    assert await idle_queue()._claim() is None
+
+
+@pytest.mark.asyncio
+async def test_concurrent_claims_get_distinct_tasks():
+    attempt_ids = {await make_attempt(), await make_attempt()}
+    claims = await asyncio.gather(*(idle_queue()._claim() for _ in range(3)))
+    won = [c for c in claims if c is not None]
+    assert {attempt_id for _, attempt_id, _ in won} == attempt_ids
+    assert claims.count(None) == 1
+
+
+@pytest.mark.asyncio
+async def test_retry_not_claimed_before_available_at():
+    attempt_id = await make_attempt()
+    await set_task(attempt_id, available_at=_now() + timedelta(minutes=1))
+    assert await idle_queue()._claim() is None
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reclaimed():
+    attempt_id = await make_attempt()
+    assert (await idle_queue()._claim())[2] == 1
+
+    # Lease still valid: the task belongs to its worker
+    assert await idle_queue()._claim() is None
+
+    # Its process died and the lease ran out
+    await set_task(attempt_id, lease_expires_at=_now() - timedelta(seconds=1))
+    claimed = await idle_queue()._claim()
+    assert claimed[1:] == (attempt_id, 2)
+    task = await task_of(attempt_id)
+    assert task.lease_expires_at > _now()
+
+
+@pytest.mark.asyncio
+async def test_expired_lease_on_last_try_fails_task():
+    attempt_id = await make_attempt()
+    await set_task(
+        attempt_id,
+        status=GradingTaskStatus.RUNNING,
+        attempts=settings.GRADING_MAX_ATTEMPTS,
+        lease_expires_at=_now() - timedelta(seconds=1),
+    )
+    assert await idle_queue()._claim() is None
+    task = await task_of(attempt_id)
+    assert task.status == GradingTaskStatus.FAILED
+    assert task.last_error
+    assert task.finished_at is not None
+
+
+@pytest.mark.asyncio
+async def test_lease_renewed_while_grading(monkeypatch):
+    monkeypatch.setattr(settings, "GRADING_LEASE_SECONDS", 0.3)
+    attempt_id = await make_attempt()
+    task_id, _, _ = await idle_queue()._claim()
+    first_lease = (await task_of(attempt_id)).lease_expires_at
+
+    heartbeat = asyncio.create_task(GradingQueue._renew_lease(task_id))
+    await asyncio.sleep(0.25)
+    heartbeat.cancel()
+    await asyncio.gather(heartbeat, return_exceptions=True)
+
+    assert (await task_of(attempt_id)).lease_expires_at > first_lease
+
+
+# ===================================
+# Workers
+# ===================================
+
+@pytest.mark.asyncio
+async def test_graded_on_first_try(monkeypatch):
+    grader = StubGrader(monkeypatch)
+    attempt_id = await make_attempt()
+    queue = GradingQueue()
+    queue.start()
+    try:
+        task = await wait_for_status(attempt_id, GradingTaskStatus.DONE)
+    finally:
+        await queue.stop()
+    assert task.attempts == 1
+    assert task.lease_expires_at is None
+    assert grader.strict == [True]
+    assert await attempt_status(attempt_id) == AttemptStatus.AI_GRADED
+
+
+@pytest.mark.asyncio
+async def test_failed_try_retried_after_backoff(monkeypatch):
+    monkeypatch.setattr(settings, "GRADING_RETRY_BACKOFF_SECONDS", 60.0)
+    grader = StubGrader(monkeypatch, fail_times=1)
+    attempt_id = await make_attempt()
+    queue = GradingQueue()
+    queue.start()
+    try:
+        await wait_until(lambda: _has_error(attempt_id))
+    finally:
+        await queue.stop()
+
+    task = await task_of(attempt_id)
+    assert task.status == GradingTaskStatus.PENDING
+    assert task.attempts == 1
+    assert "LLM down" in task.last_error
+    assert task.lease_expires_at is None
+    assert task.available_at - _now() > timedelta(seconds=50)
+    assert grader.strict == [True]
+
+
+async def _has_error(attempt_id: int) -> bool:
+    task = await task_of(attempt_id)
+    return task.last_error is not None and task.status == GradingTaskStatus.PENDING
+
+
+@pytest.mark.asyncio
+async def test_fallback_scores_kept_only_on_last_try(monkeypatch):
+    # The stub fails like grade_submitted_attempt(strict=True) does on a fallback score
+    grader = StubGrader(monkeypatch, fail_times=2)
+    attempt_id = await make_attempt()
+    queue = GradingQueue()
+    queue.start()
+    try:
+        task = await wait_for_status(attempt_id, GradingTaskStatus.DONE)
+    finally:
+        await queue.stop()
+    assert task.attempts == 3
+    assert grader.strict == [True, True, False]
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(settings, "GRADING_MAX_ATTEMPTS", 2)
+    grader = StubGrader(monkeypatch, fail_times=99)
+    attempt_id = await make_attempt()
+    queue = GradingQueue()
+    queue.start()
+    try:
+        task = await wait_for_status(attempt_id, GradingTaskStatus.FAILED)
+    finally:
+        await queue.stop()
+    assert task.attempts == 2
+    assert task.finished_at is not None
+    assert "LLM down" in task.last_error
+    assert grader.strict == [True, False]
+    assert await attempt_status(attempt_id) == AttemptStatus.SUBMITTED
+
+
+@pytest.mark.asyncio
+async def test_stop_during_grading_returns_task_to_pending(monkeypatch):
+    grader = StubGrader(monkeypatch, block=True)
+    attempt_id = await make_attempt()
+    queue = GradingQueue()
+    queue.start()
+    await asyncio.wait_for(grader.started.wait(), 5)
+    assert queue.running == 1
+    await queue.stop()
+
+    task = await task_of(attempt_id)
+    assert task.status == GradingTaskStatus.PENDING
+    # The interrupted try is not counted
+    assert task.attempts == 0
+    assert task.lease_expires_at is None
+    assert await attempt_status(attempt_id) == AttemptStatus.SUBMITTED
+
+    # Picked up again after the restart
+    grader.gate.set()
+    queue.start()
+    try:
+        task = await wait_for_status(attempt_id, GradingTaskStatus.DONE)
+    finally:
+        await queue.stop()
+    assert task.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_attempt_graded_before_crash_not_graded_again(monkeypatch):
+    grader = StubGrader(monkeypatch)
+    attempt_id = await make_attempt(status=AttemptStatus.AI_GRADED)
+    queue = GradingQueue()
+    queue.start()
+    try:
+        await wait_for_status(attempt_id, GradingTaskStatus.DONE)
+    finally:
+        await queue.stop()
+    assert grader.strict == []
+
+
+@pytest.mark.asyncio
+async def test_submitted_attempts_without_task_queued_on_start(monkeypatch):
+    grader = StubGrader(monkeypatch)
+    orphan = await make_attempt(queued=False)
+    in_progress = await make_attempt(status=AttemptStatus.IN_PROGRESS, queued=False)
+    queue = GradingQueue()
+    queue.start()
+    try:
+        task = await wait_for_status(orphan, GradingTaskStatus.DONE)
+    finally:
+        await queue.stop()
+    assert task.enqueued_at is not None
+    assert await task_of(in_progress) is None
+    assert await attempt_status(orphan) == AttemptStatus.AI_GRADED
+    assert grader.strict == [True]
@@ -0,0 +1,302 @@
+"""
+Request Hedging Tests
+
+The hedge budget and delay of HedgeController, and the race in
+LLMService._chat_hedged between two fake providers whose answers the test
+releases by hand: who wins, that the loser is cancelled, and which legs
+end up in the call log
+"""
+
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import pytest
+
+from app.config import settings
+from app.core.llm.base import LLMResponse, Message
+from app.core.llm.hedging import HedgeController
+from app.models.llm_log import LLMScene, LLMStatus
+from app.services import llm_service
+from app.services.llm_service import LLMService, ProviderRegistry
+
+
+SCENE = LLMScene.REVIEW
+MESSAGES = [Message(role="user", content="审核这道题")]
+
+
+@pytest.fixture(autouse=True)
+def hedge_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_MAX_RATIO", 1.0)
+    monkeypatch.setattr(settings, "LLM_HEDGE_DELAY_MS", 50)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY_MS", 0)
+    monkeypatch.setattr(settings, "LLM_HEDGE_PERCENTILE", 95.0)
+    monkeypatch.setattr(settings, "LLM_ROUTER_MIN_SAMPLES", 5)
+
+
+# ===================================
+# Budget and delay
+# ===================================
+
+def test_hedges_capped_at_budget_ratio(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_MAX_RATIO", 0.25)
+    hedger = HedgeController()
+    granted = []
+    for _ in range(20):
+        hedger.start()
+        granted.append(hedger.try_hedge())
+
+    assert sum(granted) == 5
+    # Credit is earned before it is spent: no hedge until 1 / ratio calls
+    assert granted[:3] == [False, False, False]
+    assert granted[3]
+    assert hedger.stats.hedged == 5
+    assert hedger.stats.budget_denied == 15
+    assert hedger.stats.hedge_ratio == 0.25
+
+
+def test_quiet_period_cannot_fund_hedge_storm(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_MAX_RATIO", 0.5)
+    hedger = HedgeController()
+    for _ in range(100):
+        hedger.start()
+    # 50 credits earned, but only the burst of 5 was kept
+    assert sum(hedger.try_hedge() for _ in range(10)) == 5
+
+
+def test_zero_ratio_never_hedges(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_MAX_RATIO", 0.0)
+    hedger = HedgeController()
+    for _ in range(10):
+        hedger.start()
+    assert not hedger.try_hedge()
+
+
+def test_delay_default_until_enough_samples():
+    hedger = HedgeController()
+    for latency_ms in (100, 200, 300, 400):
+        hedger.record_latency(SCENE, "fast", latency_ms)
+    assert hedger.delay_for(SCENE, "fast") == 0.05
+
+    hedger.record_latency(SCENE, "fast", 500)
+    assert hedger.delay_for(SCENE, "fast") == 0.5
+    # Tracked per scene: grading latency says nothing about reviews
+    assert hedger.delay_for(LLMScene.GRADE, "fast") == 0.05
+
+
+def test_delay_not_below_minimum(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_DELAY_MS", 300)
+    hedger = HedgeController()
+    for _ in range(5):
+        hedger.record_latency(SCENE, "fast", 10)
+    assert hedger.delay_for(SCENE, "fast") == 0.3
+
+
+# ===================================
+# Racing two providers
+# ===================================
+
+class FakeProvider:
+    """A provider whose answer waits until the test releases it"""
+
+    max_tokens = 100
+    temperature = 0.0
+
+    def __init__(self, name: str, error: Optional[Exception] = None):
+        self.provider_name = name
+        self.model = f"{name}-model"
+        self.error = error
+        self.release = asyncio.Event()
+        self.started = asyncio.Event()
+        self.calls = 0
+        self.cancelled = False
+
+    async def chat(self, messages: List[Message], **kwargs) -> LLMResponse:
+        self.calls += 1
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return LLMResponse(
+            content=f"answer from {self.provider_name}", model=self.model,
+            provider=self.provider_name, prompt_tokens=10, completion_tokens=5,
+            total_tokens=15, finish_reason="stop",
+        )
+
+
+class FakeRegistry(ProviderRegistry):
+    """Registry serving the fake providers by name"""
+
+    def __init__(self, *providers: FakeProvider):
+        super().__init__()
+        self.fakes = {p.provider_name: p for p in providers}
+
+    def get(self, provider_type: Optional[str] = None, **override_kwargs) -> FakeProvider:
+        return self.fakes[provider_type]
+
+
+class LogRecorder:
+    """Stands in for the background log writer"""
+
+    def __init__(self):
+        self.rows: List[Dict[str, Any]] = []
+
+    async def write(self, **row) -> None:
+        self.rows.append(row)
+
+    def by_provider(self) -> Dict[str, LLMStatus]:
+        return {row["provider"]: row["status"] for row in self.rows}
+
+
+@pytest.fixture
+def log_rows(monkeypatch) -> LogRecorder:
+    recorder = LogRecorder()
+    monkeypatch.setattr(llm_service, "llm_log_writer", recorder)
+    return recorder
+
+
+@pytest.fixture
+def primary():
+    return FakeProvider("primary")
+
+
+@pytest.fixture
+def backup():
+    return FakeProvider("backup")
+
+
+@pytest.fixture
+def service(primary, backup):
+    return LLMService(FakeRegistry(primary, backup))
+
+
+def race(service: LLMService) -> "asyncio.Task[LLMResponse]":
+    return asyncio.create_task(service._chat_hedged(
+        ["primary", "backup"], 0, MESSAGES, SCENE, 1, time.monotonic() + 10,
+        7, "review", True, {},
+    ))
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged(service, primary, backup, log_rows):
+    call = race(service)
+    await primary.started.wait()
+    primary.release.set()
+    response = await call
+
+    assert response.provider == "primary"
+    assert backup.calls == 0
+    assert log_rows.by_provider() == {"primary": LLMStatus.SUCCESS}
+    stats = service.registry.hedger.stats
+    assert (stats.requests, stats.hedged) == (1, 0)
+
+
+@pytest.mark.asyncio
+async def test_hedge_wins_and_slow_primary_is_cancelled(service, primary, backup, log_rows):
+    call = race(service)
+    await asyncio.wait_for(backup.started.wait(), 5)
+    backup.release.set()
+    response = await call
+
+    assert response.provider == "backup"
+    assert primary.cancelled
+    # The cancelled loser leaves no trace: no log row, no router sample
+    assert log_rows.by_provider() == {"backup": LLMStatus.SUCCESS}
+    assert service.registry.router.stats("primary").samples == 0
+    row = log_rows.rows[0]
+    assert (row["attempt"], row["user_id"], row["request_summary"]) == (1, 7, "review")
+    stats = service.registry.hedger.stats
+    assert (stats.hedged, stats.hedge_wins, stats.primary_wins) == (1, 1, 0)
+
+
+@pytest.mark.asyncio
+async def test_primary_wins_after_hedge_fired(service, primary, backup, log_rows):
+    call = race(service)
+    await asyncio.wait_for(backup.started.wait(), 5)
+    primary.release.set()
+    response = await call
+
+    assert response.provider == "primary"
+    assert backup.cancelled
+    assert log_rows.by_provider() == {"primary": LLMStatus.SUCCESS}
+    stats = service.registry.hedger.stats
+    assert (stats.hedge_wins, stats.primary_wins) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_primary_preferred_when_both_finish_in_same_tick(service, primary, backup, log_rows):
+    call = race(service)
+    await asyncio.wait_for(backup.started.wait(), 5)
+    # The backup is released first, but both answers land before the race is checked
+    backup.release.set()
+    primary.release.set()
+    response = await call
+
+    assert response.provider == "primary"
+    assert not primary.cancelled and not backup.cancelled
+    # Both calls completed and used tokens, so both are logged
+    assert log_rows.by_provider() == {"primary": LLMStatus.SUCCESS, "backup": LLMStatus.SUCCESS}
+    assert service.registry.hedger.stats.primary_wins == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_leg_logged_and_other_leg_wins(primary, log_rows):
+    broken = FakeProvider("backup", error=ValueError("bad request"))
+    service = LLMService(FakeRegistry(primary, broken))
+    call = race(service)
+    await asyncio.wait_for(broken.started.wait(), 5)
+    broken.release.set()
+    await asyncio.sleep(0.01)
+    assert not call.done()
+
+    primary.release.set()
+    assert (await call).provider == "primary"
+    assert log_rows.by_provider() == {"backup": LLMStatus.FAILED, "primary": LLMStatus.SUCCESS}
+
+
+@pytest.mark.asyncio
+async def test_both_legs_fail_raises_primary_error(log_rows):
+    primary = FakeProvider("primary", error=ValueError("primary broke"))
+    backup = FakeProvider("backup", error=ValueError("backup broke"))
+    service = LLMService(FakeRegistry(primary, backup))
+    call = race(service)
+    await asyncio.wait_for(backup.started.wait(), 5)
+    backup.release.set()
+    primary.release.set()
+
+    with pytest.raises(ValueError, match="primary broke"):
+        await call
+    assert log_rows.by_provider() == {"primary": LLMStatus.FAILED, "backup": LLMStatus.FAILED}
+    assert service.registry.hedger.stats.hedge_wins == 0
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_without_budget(monkeypatch, primary, backup, log_rows):
+    monkeypatch.setattr(settings, "LLM_HEDGE_MAX_RATIO", 0.0)
+    service = LLMService(FakeRegistry(primary, backup))
+    call = race(service)
+    await asyncio.sleep(0.1)
+    assert backup.calls == 0
+
+    primary.release.set()
+    assert (await call).provider == "primary"
+    stats = service.registry.hedger.stats
+    assert (stats.hedged, stats.budget_denied) == (0, 1)
+    assert log_rows.by_provider() == {"primary": LLMStatus.SUCCESS}
+
+
+@pytest.mark.asyncio
+async def test_hedges_same_provider_without_alternative(primary, log_rows):
+    service = LLMService(FakeRegistry(primary))
+    call = asyncio.create_task(service._chat_hedged(
+        ["primary"], 0, MESSAGES, SCENE, 1, time.monotonic() + 10, None, None, True, {},
+    ))
+    while primary.calls < 2:
+        await asyncio.sleep(0.01)
+    primary.release.set()
+    assert (await call).provider == "primary"
+    assert service.registry.hedger.stats.hedged == 1
@@ -0,0 +1,84 @@
+"""
+Incremental JSON Array Parser Tests
+
+Objects must be emitted as soon as they close, whatever the chunking,
+and quotes or brackets inside strings must not confuse the scanner
+"""
+
+import json
+
+from app.core.llm.json_stream import JSONArrayStreamParser
+
+
+QUESTIONS = [
+    {"stem": 'He said "hi" \\ then left', "options": ["A", "B"]},
+    {"stem": "Brackets [inside] {a string} ]}", "answer": "}"},
+    {"stem": "末尾是反斜杠 \\", "explanation": "转义的引号 \" 和 ]"},
+]
+
+TEXT = "好的, 题目如下:\n```json\n" + json.dumps(QUESTIONS, ensure_ascii=False, indent=2) + "\n```"
+
+
+def parse_chunks(chunks):
+    parser = JSONArrayStreamParser()
+    objects = []
+    for chunk in chunks:
+        objects.extend(parser.feed(chunk))
+    return parser, objects
+
+
+def test_whole_text():
+    parser, objects = parse_chunks([TEXT])
+    assert objects == QUESTIONS
+    assert parser.done
+    assert parser.emitted == 3
+    assert parser.errors == 0
+
+
+def test_every_split_point():
+    for cut in range(1, len(TEXT)):
+        _, objects = parse_chunks([TEXT[:cut], TEXT[cut:]])
+        assert objects == QUESTIONS, cut
+
+
+def test_character_by_character():
+    _, objects = parse_chunks(list(TEXT))
+    assert objects == QUESTIONS
+
+
+def test_object_emitted_when_closed():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"stem": "a"}') == [{"stem": "a"}]
+    assert parser.feed(', {"stem": "b') == []
+    assert parser.feed('"}]') == [{"stem": "b"}]
+    assert parser.done
+
+
+def test_escaped_quote_before_closing_brace():
+    parser = JSONArrayStreamParser()
+    assert parser.feed('[{"stem": "x\\"}"') == []
+    assert parser.feed("}]") == [{"stem": 'x"}'}]
+
+
+def test_escaped_backslash_ends_string():
+    # "\\\\" is an escaped backslash, so the following quote closes the string
+    _, objects = parse_chunks(['[{"stem": "a\\\\', '"}]'])
+    assert objects == [{"stem": "a\\"}]
+
+
+def test_prose_brackets_before_array_skipped():
+    _, objects = parse_chunks(['注意 [1] 和 [ "x" ] 之后: [ {"stem": "q"} ]'])
+    assert objects == [{"stem": "q"}]
+
+
+def test_invalid_element_counted_and_skipped():
+    parser, objects = parse_chunks(['[{"stem": nope}, {"stem": "ok"}]'])
+    assert objects == [{"stem": "ok"}]
+    assert parser.errors == 1
+    assert parser.emitted == 1
+
+
+def test_text_after_array_ignored():
+    parser, objects = parse_chunks(['[{"a": 1}] and then {"b": 2}'])
+    assert objects == [{"a": 1}]
+    assert parser.done
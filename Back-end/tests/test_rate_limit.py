@@ -0,0 +1,98 @@
+"""
+Rate Limiter Tests
+
+Token bucket clamping, settlement against the clamped reservation and
+admission bounded by the caller's deadline
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from app.core.llm.rate_limit import ProviderLimiter, RateLimitTimeout, TokenBucket
+
+
+@pytest.mark.asyncio
+async def test_acquire_clamps_to_capacity():
+    bucket = TokenBucket(rate=1.0, capacity=10)
+    taken = await bucket.acquire(50)
+    assert taken == 10
+    assert bucket.tokens == pytest.approx(0, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_settle_uses_clamped_reservation():
+    limiter = ProviderLimiter("test", tpm=600)
+    async with limiter.slot(1000) as slot:
+        # Only the 600 the bucket could hold were taken
+        assert slot.reserved_tokens == 600
+        slot.settle(100)
+    assert limiter.tpm_bucket.tokens == pytest.approx(500, abs=1)
+
+
+@pytest.mark.asyncio
+async def test_settle_charges_overuse():
+    limiter = ProviderLimiter("test", tpm=600)
+    async with limiter.slot(100) as slot:
+        slot.settle(300)
+    assert limiter.tpm_bucket.tokens == pytest.approx(300, abs=1)
+
+
+def test_adjust_never_exceeds_capacity():
+    bucket = TokenBucket(rate=1.0, capacity=10)
+    bucket.adjust(100)
+    assert bucket.tokens == 10
+
+
+@pytest.mark.asyncio
+async def test_bucket_wait_past_deadline_fails_fast():
+    bucket = TokenBucket(rate=1.0, capacity=10)
+    await bucket.acquire(10)
+    start = time.monotonic()
+    with pytest.raises(asyncio.TimeoutError):
+        # Refilling 5 tokens takes 5s, the deadline is 1s away
+        await bucket.acquire(5, deadline_at=time.monotonic() + 1)
+    assert time.monotonic() - start < 0.5
+    # Nothing was taken by the rejected call
+    assert bucket.tokens < 1
+
+
+@pytest.mark.asyncio
+async def test_slot_bounded_by_caller_deadline():
+    limiter = ProviderLimiter("test", tpm=60, queue_timeout=120)
+    async with limiter.slot(60):
+        pass
+    start = time.monotonic()
+    with pytest.raises(RateLimitTimeout):
+        async with limiter.slot(30, timeout=1):
+            pass
+    assert time.monotonic() - start < 0.5
+    assert limiter.stats.timeouts_total == 1
+    assert limiter.stats.queue_depth == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrency_wait_bounded_and_slot_returned():
+    limiter = ProviderLimiter("test", max_concurrency=1)
+    async with limiter.slot():
+        with pytest.raises(RateLimitTimeout):
+            async with limiter.slot(timeout=0.05):
+                pass
+    # The held slot was released and the timed-out waiter took nothing
+    async with limiter.slot(timeout=0.05):
+        assert limiter.stats.in_flight == 1
+    assert limiter.stats.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_queue_timeout_applies_without_deadline():
+    limiter = ProviderLimiter("test", max_concurrency=1, queue_timeout=0.05)
+    async with limiter.slot():
+        with pytest.raises(RateLimitTimeout):
+            async with limiter.slot():
+                pass
+
+
+def test_rate_limit_timeout_is_a_timeout():
+    assert issubclass(RateLimitTimeout, asyncio.TimeoutError)
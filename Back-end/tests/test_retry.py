@@ -0,0 +1,170 @@
+"""
+Retry Policy Tests
+
+Retry-After parsing, full-jitter backoff bounds and giving up at the
+attempt limit or the request deadline
+"""
+
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+from app.config import settings
+from app.core.llm import retry
+from app.core.llm.retry import RetryPolicy, get_retry_policy, is_retryable, retry_after_seconds
+from app.models.llm_log import LLMScene
+
+
+def http_error(status: int = 429, retry_after: str = None) -> httpx.HTTPStatusError:
+    headers = {"Retry-After": retry_after} if retry_after is not None else {}
+    request = httpx.Request("POST", "https://llm.test/v1/chat/completions")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError("upstream error", request=request, response=response)
+
+
+@pytest.fixture
+def no_jitter(monkeypatch):
+    """Backoff always takes the top of its jitter range"""
+    monkeypatch.setattr(retry.random, "uniform", lambda low, high: high)
+
+
+# ===================================
+# Retry-After
+# ===================================
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("3", 3.0),
+        ("0.5", 0.5),
+        ("0", 0.0),
+        ("-5", 0.0),
+    ],
+)
+def test_retry_after_delta_seconds(value, expected):
+    assert retry_after_seconds(http_error(retry_after=value)) == expected
+
+
+def test_retry_after_http_date():
+    when = datetime.now(timezone.utc) + timedelta(seconds=30)
+    seconds = retry_after_seconds(http_error(retry_after=format_datetime(when, usegmt=True)))
+    # HTTP dates have one-second resolution
+    assert 28 <= seconds <= 30
+
+
+def test_retry_after_date_in_past_is_zero():
+    when = datetime.now(timezone.utc) - timedelta(minutes=5)
+    assert retry_after_seconds(http_error(retry_after=format_datetime(when, usegmt=True))) == 0.0
+
+
+@pytest.mark.parametrize("value", ["soon", "Fri, 99 Foo 2024", ""])
+def test_retry_after_garbage_ignored(value):
+    assert retry_after_seconds(http_error(retry_after=value)) is None
+
+
+def test_retry_after_missing_or_not_http():
+    assert retry_after_seconds(http_error()) is None
+    assert retry_after_seconds(httpx.ConnectError("refused")) is None
+    assert retry_after_seconds(ValueError("bad json")) is None
+
+
+# ===================================
+# Retryable errors
+# ===================================
+
+@pytest.mark.parametrize(
+    "error, expected",
+    [
+        (http_error(429), True),
+        (http_error(503), True),
+        (http_error(400), False),
+        (http_error(401), False),
+        (httpx.ReadTimeout("slow"), True),
+        (httpx.ConnectError("refused"), True),
+        (ValueError("bad json"), False),
+    ],
+)
+def test_is_retryable(error, expected):
+    assert is_retryable(error) is expected
+
+
+# ===================================
+# Backoff
+# ===================================
+
+@pytest.mark.parametrize("attempt, cap", [(1, 0.5), (2, 1.0), (3, 2.0), (4, 4.0), (5, 4.0), (10, 4.0)])
+def test_full_jitter_within_capped_exponential(attempt, cap):
+    policy = RetryPolicy(base_delay=0.5, max_delay=4.0)
+    delays = [policy.backoff(attempt) for _ in range(200)]
+    assert all(0 <= d <= cap for d in delays)
+    # Full jitter spreads over the whole range rather than clustering at the cap
+    assert min(delays) < cap / 4
+    assert max(delays) > cap * 3 / 4
+
+
+def test_next_delay_uses_backoff(no_jitter):
+    policy = RetryPolicy(max_attempts=5, base_delay=0.5, max_delay=4.0, deadline=None)
+    assert [policy.next_delay(n, http_error(503)) for n in (1, 2, 3, 4)] == [0.5, 1.0, 2.0, 4.0]
+
+
+def test_next_delay_gives_up_at_max_attempts(no_jitter):
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.next_delay(2, http_error(503)) is not None
+    assert policy.next_delay(3, http_error(503)) is None
+
+
+def test_next_delay_gives_up_on_permanent_error(no_jitter):
+    policy = RetryPolicy(max_attempts=3)
+    assert policy.next_delay(1, http_error(400)) is None
+    assert policy.next_delay(1, ValueError("bad json")) is None
+
+
+def test_next_delay_honours_longer_retry_after(no_jitter):
+    policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=4.0)
+    assert policy.next_delay(1, http_error(429, retry_after="3")) == 3.0
+    # A shorter Retry-After does not cut the backoff
+    assert policy.next_delay(2, http_error(429, retry_after="0")) == 1.0
+
+
+def test_next_delay_caps_retry_after(no_jitter):
+    policy = RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=4.0)
+    assert policy.next_delay(1, http_error(429, retry_after="3600")) == 16.0
+
+
+# ===================================
+# Deadline
+# ===================================
+
+def test_next_delay_within_deadline(no_jitter):
+    policy = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=8.0)
+    assert policy.next_delay(1, http_error(503), deadline_at=time.monotonic() + 10) == 1.0
+
+
+def test_next_delay_none_when_wait_would_pass_deadline(no_jitter):
+    policy = RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=8.0)
+    assert policy.next_delay(1, http_error(503), deadline_at=time.monotonic() + 0.5) is None
+    # The server asking for longer than the time left also ends the retries
+    assert policy.next_delay(1, http_error(429, retry_after="5"), deadline_at=time.monotonic() + 3) is None
+
+
+def test_next_delay_none_after_deadline(no_jitter):
+    policy = RetryPolicy(max_attempts=3, base_delay=0.0)
+    assert policy.next_delay(1, http_error(503), deadline_at=time.monotonic() - 1) is None
+
+
+# ===================================
+# Scene policies
+# ===================================
+
+def test_scene_policy_overrides(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_RETRY_POLICIES", {"grade": {"max_attempts": 6.0, "deadline": 300}})
+    policy = get_retry_policy(LLMScene.GRADE)
+    assert policy.max_attempts == 6
+    assert isinstance(policy.max_attempts, int)
+    assert policy.deadline == 300
+    assert policy.base_delay == retry.DEFAULT_SCENE_POLICIES[LLMScene.GRADE].base_delay
+    # Other scenes keep their defaults
+    assert get_retry_policy(LLMScene.GENERATE) == retry.DEFAULT_SCENE_POLICIES[LLMScene.GENERATE]
@@ -0,0 +1,207 @@
+"""
+Provider Router Tests
+
+Candidate ordering under each routing policy, driven by synthetic rolling
+stats: measured latency, error rates, configured costs and degradation
+"""
+
+from typing import Dict, List, Tuple
+
+import pytest
+
+from app.config import settings
+from app.core.llm import router as router_module
+from app.core.llm.router import LLMRouter, RoutingPolicy
+from app.models.llm_log import LLMScene
+
+
+SCENE = LLMScene.GRADE
+CANDIDATES = ["deepseek", "qwen", "glm"]
+
+# Shorthand for synthetic call outcomes
+OK = True
+FAIL = False
+
+
+@pytest.fixture(autouse=True)
+def router_settings(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "deepseek")
+    monkeypatch.setattr(settings, "LLM_PROVIDER_COSTS", {"deepseek": 1.0, "qwen": 1.5, "glm": 0.1})
+    monkeypatch.setattr(settings, "LLM_ROUTER_MIN_SAMPLES", 5)
+    monkeypatch.setattr(settings, "LLM_ROUTER_ERROR_THRESHOLD", 0.5)
+    monkeypatch.setattr(settings, "LLM_ROUTING_POLICIES", {})
+
+
+def make_router(monkeypatch, policy: str, calls: Dict[str, List[Tuple[int, bool]]]) -> LLMRouter:
+    """A router for SCENE under the given policy, fed (latency_ms, ok) outcomes per provider"""
+    monkeypatch.setattr(settings, "LLM_ROUTING_POLICIES", {SCENE.value: policy})
+    router = LLMRouter()
+    for provider, outcomes in calls.items():
+        for latency_ms, ok in outcomes:
+            router.record(provider, latency_ms, ok)
+    return router
+
+
+def times(n: int, latency_ms: int, ok: bool = OK) -> List[Tuple[int, bool]]:
+    return [(latency_ms, ok)] * n
+
+
+# ===================================
+# Ordering table
+# ===================================
+
+RANKING_CASES = [
+    # --- primary ---
+    pytest.param("primary", {}, ["deepseek", "qwen", "glm"], id="primary-no-data"),
+    pytest.param(
+        "primary",
+        {"deepseek": times(5, 900), "qwen": times(5, 100), "glm": times(5, 50)},
+        ["deepseek", "qwen", "glm"],
+        id="primary-ignores-latency",
+    ),
+    pytest.param(
+        "primary",
+        {"deepseek": times(5, 100, FAIL)},
+        ["qwen", "glm", "deepseek"],
+        id="primary-degraded-last",
+    ),
+    # --- fastest ---
+    pytest.param(
+        "fastest",
+        {"deepseek": times(5, 300), "qwen": times(5, 100), "glm": times(5, 200)},
+        ["qwen", "glm", "deepseek"],
+        id="fastest-by-p50",
+    ),
+    pytest.param(
+        "fastest",
+        {"deepseek": times(5, 300), "glm": times(5, 100)},
+        ["qwen", "glm", "deepseek"],
+        id="fastest-unmeasured-first",
+    ),
+    pytest.param(
+        "fastest",
+        {},
+        ["deepseek", "qwen", "glm"],
+        id="fastest-all-unmeasured-keeps-primary-first",
+    ),
+    pytest.param(
+        "fastest",
+        {"deepseek": times(2, 0, FAIL), "qwen": times(5, 400)},
+        ["glm", "qwen", "deepseek"],
+        id="fastest-failures-only-after-measured",
+    ),
+    pytest.param(
+        "fastest",
+        {"deepseek": times(5, 200), "qwen": times(5, 200), "glm": times(5, 200)},
+        ["deepseek", "qwen", "glm"],
+        id="fastest-tie-keeps-primary-first",
+    ),
+    pytest.param(
+        "fastest",
+        {"deepseek": times(5, 300), "qwen": times(2, 10) + times(3, 0, FAIL), "glm": times(5, 100)},
+        ["glm", "deepseek", "qwen"],
+        id="fastest-degraded-last",
+    ),
+    # --- healthiest ---
+    pytest.param(
+        "healthiest",
+        {
+            "deepseek": times(3, 100) + times(1, 0, FAIL),
+            "qwen": times(4, 500),
+            "glm": times(4, 200),
+        },
+        ["glm", "qwen", "deepseek"],
+        id="healthiest-error-rate-then-p95",
+    ),
+    pytest.param(
+        "healthiest",
+        {"qwen": times(4, 500), "glm": times(4, 200)},
+        ["glm", "qwen", "deepseek"],
+        id="healthiest-unmeasured-after-measured",
+    ),
+    pytest.param(
+        "healthiest",
+        {"deepseek": times(4, 200), "qwen": times(2, 10) + times(3, 0, FAIL)},
+        ["deepseek", "glm", "qwen"],
+        id="healthiest-degraded-last",
+    ),
+    # --- cheapest ---
+    pytest.param("cheapest", {}, ["glm", "deepseek", "qwen"], id="cheapest-by-cost"),
+    pytest.param(
+        "cheapest",
+        {"glm": times(5, 100, FAIL)},
+        ["deepseek", "qwen", "glm"],
+        id="cheapest-degraded-last",
+    ),
+    # --- misconfiguration ---
+    pytest.param("no-such-policy", {"qwen": times(5, 10)}, ["deepseek", "qwen", "glm"], id="unknown-policy-is-primary"),
+]
+
+
+@pytest.mark.parametrize("policy, calls, expected", RANKING_CASES)
+def test_rank(monkeypatch, policy, calls, expected):
+    router = make_router(monkeypatch, policy, calls)
+    assert router.rank(SCENE, CANDIDATES) == expected
+
+
+def test_rank_does_not_depend_on_candidate_order(monkeypatch):
+    router = make_router(monkeypatch, "fastest", {"deepseek": times(5, 300), "glm": times(5, 100)})
+    expected = ["qwen", "glm", "deepseek"]
+    assert router.rank(SCENE, ["glm", "deepseek", "qwen"]) == expected
+    assert router.rank(SCENE, ["qwen", "deepseek", "glm"]) == expected
+
+
+def test_provider_without_cost_sorts_last(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PROVIDER_COSTS", {"qwen": 0.5})
+    router = make_router(monkeypatch, "cheapest", {})
+    assert router.rank(SCENE, CANDIDATES) == ["qwen", "deepseek", "glm"]
+
+
+def test_policy_is_per_scene(monkeypatch):
+    router = make_router(monkeypatch, "cheapest", {})
+    assert router.policy_for(SCENE) == RoutingPolicy.CHEAPEST
+    assert router.policy_for(LLMScene.GENERATE) == RoutingPolicy.PRIMARY
+    assert router.rank(LLMScene.GENERATE, CANDIDATES) == ["deepseek", "qwen", "glm"]
+
+
+# ===================================
+# Rolling stats
+# ===================================
+
+def test_degraded_needs_min_samples(monkeypatch):
+    router = make_router(monkeypatch, "primary", {"deepseek": times(4, 0, FAIL)})
+    assert not router.is_degraded("deepseek")
+    router.record("deepseek", 0, FAIL)
+    assert router.is_degraded("deepseek")
+
+
+def test_percentiles_count_only_successful_calls(monkeypatch):
+    router = make_router(
+        monkeypatch, "fastest",
+        {"qwen": [(100, OK), (200, OK), (300, OK), (400, OK), (500, OK), (5, FAIL)]},
+    )
+    stats = router.stats("qwen")
+    assert stats.samples == 6
+    assert stats.percentile(50) == 300
+    assert stats.percentile(95) == 500
+    assert stats.error_rate == pytest.approx(1 / 6)
+
+
+def test_old_samples_leave_the_window(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(router_module.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(settings, "LLM_ROUTING_POLICIES", {SCENE.value: "fastest"})
+    router = LLMRouter(window_seconds=60)
+    for _ in range(5):
+        router.record("deepseek", 0, FAIL)
+    router.record("qwen", 100, OK)
+    router.record("glm", 50, OK)
+    assert router.rank(SCENE, CANDIDATES) == ["glm", "qwen", "deepseek"]
+
+    # Failures aged out: deepseek is unmeasured again and explored first
+    now[0] += 30
+    router.record("glm", 500, OK)
+    now[0] += 31
+    assert not router.is_degraded("deepseek")
+    assert router.stats("deepseek").samples == 0
+    assert router.rank(SCENE, CANDIDATES) == ["deepseek", "qwen", "glm"]
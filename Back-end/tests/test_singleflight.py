@@ -0,0 +1,230 @@
+"""
+Single-Flight Tests
+
+Coalescing of identical calls and streams: shared work survives callers
+giving up, late subscribers replay, the last subscriber leaving stops the
+upstream, and errors reach everyone
+"""
+
+import asyncio
+from typing import AsyncIterator, List
+
+import pytest
+
+from app.core.llm.base import LLMResponse, StreamChunk
+from app.core.llm.singleflight import SingleFlight, _StreamFlight
+
+
+def response(content: str = "ok") -> LLMResponse:
+    return LLMResponse(content=content, model="m", provider="p", finish_reason="stop")
+
+
+class Upstream:
+    """A controllable upstream call or stream that counts its runs"""
+
+    def __init__(self, chunks: int = 3, error: Exception = None):
+        self.runs = 0
+        self.chunks = chunks
+        self.error = error
+        self.release = asyncio.Event()
+        self.sent = asyncio.Event()
+        self.closed = False
+        self.cancelled = False
+
+    async def call(self) -> LLMResponse:
+        self.runs += 1
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.error is not None:
+            raise self.error
+        return response(f"run {self.runs}")
+
+    async def stream(self) -> AsyncIterator[StreamChunk]:
+        """First chunk at once, the rest after release"""
+        self.runs += 1
+        try:
+            yield StreamChunk(content="c0")
+            self.sent.set()
+            await self.release.wait()
+            if self.error is not None:
+                raise self.error
+            for i in range(1, self.chunks):
+                yield StreamChunk(content=f"c{i}")
+        finally:
+            self.closed = True
+
+
+async def collect(stream: AsyncIterator[StreamChunk]) -> List[str]:
+    return [chunk.content async for chunk in stream]
+
+
+# ===================================
+# do()
+# ===================================
+
+@pytest.mark.asyncio
+async def test_identical_calls_share_one_upstream():
+    flights = SingleFlight()
+    upstream = Upstream()
+    callers = asyncio.gather(*(flights.do("k", upstream.call) for _ in range(3)))
+    await asyncio.sleep(0)
+    upstream.release.set()
+    results = await callers
+    assert upstream.runs == 1
+    assert {r.content for r in results} == {"run 1"}
+    assert flights.stats.coalesced == 2
+    assert flights.snapshot()["in_flight_calls"] == 0
+
+    # Finished flights are forgotten: the next call runs again
+    assert (await flights.do("k", upstream.call)).content == "run 2"
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_call():
+    flights = SingleFlight()
+    upstream = Upstream()
+    first = asyncio.create_task(flights.do("k", upstream.call))
+    second = asyncio.create_task(flights.do("k", upstream.call))
+    await asyncio.sleep(0)
+
+    first.cancel()
+    await asyncio.gather(first, return_exceptions=True)
+    assert first.cancelled()
+
+    upstream.release.set()
+    assert (await second).content == "run 1"
+    assert not upstream.cancelled
+    assert upstream.runs == 1
+
+
+@pytest.mark.asyncio
+async def test_call_error_reaches_every_caller():
+    flights = SingleFlight()
+    upstream = Upstream(error=RuntimeError("boom"))
+    callers = asyncio.gather(*(flights.do("k", upstream.call) for _ in range(3)), return_exceptions=True)
+    await asyncio.sleep(0)
+    upstream.release.set()
+    results = await callers
+    assert all(isinstance(r, RuntimeError) and str(r) == "boom" for r in results)
+    assert upstream.runs == 1
+    assert flights.snapshot()["in_flight_calls"] == 0
+
+
+@pytest.mark.asyncio
+async def test_different_keys_not_coalesced():
+    flights = SingleFlight()
+    upstream = Upstream()
+    upstream.release.set()
+    await asyncio.gather(flights.do("a", upstream.call), flights.do("b", upstream.call))
+    assert upstream.runs == 2
+    assert flights.stats.coalesced == 0
+
+
+# ===================================
+# stream()
+# ===================================
+
+@pytest.mark.asyncio
+async def test_identical_streams_share_one_upstream():
+    flights = SingleFlight()
+    upstream = Upstream()
+    subscribers = asyncio.gather(*(collect(flights.stream("k", upstream.stream)) for _ in range(3)))
+    await upstream.sent.wait()
+    upstream.release.set()
+    results = await subscribers
+    assert results == [["c0", "c1", "c2"]] * 3
+    assert upstream.runs == 1
+    assert flights.stats.streams_coalesced == 2
+    assert flights.snapshot()["in_flight_streams"] == 0
+
+
+@pytest.mark.asyncio
+async def test_late_subscriber_replays_buffered_chunks():
+    flights = SingleFlight()
+    upstream = Upstream()
+    early = flights.stream("k", upstream.stream)
+    assert (await early.__anext__()).content == "c0"
+    await upstream.sent.wait()
+
+    # Joins after c0 was sent
+    late = asyncio.create_task(collect(flights.stream("k", upstream.stream)))
+    await asyncio.sleep(0)
+    upstream.release.set()
+    assert await collect(early) == ["c1", "c2"]
+    assert await late == ["c0", "c1", "c2"]
+    assert upstream.runs == 1
+
+
+@pytest.mark.asyncio
+async def test_last_subscriber_leaving_cancels_upstream():
+    flights = SingleFlight()
+    upstream = Upstream()
+    first = flights.stream("k", upstream.stream)
+    second = flights.stream("k", upstream.stream)
+    assert (await first.__anext__()).content == "c0"
+    assert (await second.__anext__()).content == "c0"
+
+    # One subscriber leaving keeps the stream going for the other
+    await first.aclose()
+    await asyncio.sleep(0)
+    assert not upstream.closed
+    assert flights.snapshot()["in_flight_streams"] == 1
+
+    await second.aclose()
+    await asyncio.sleep(0.01)
+    assert upstream.closed
+    assert flights.snapshot()["in_flight_streams"] == 0
+
+    # A new caller starts afresh instead of joining the truncated stream
+    upstream.release.set()
+    assert await collect(flights.stream("k", upstream.stream)) == ["c0", "c1", "c2"]
+    assert upstream.runs == 2
+
+
+@pytest.mark.asyncio
+async def test_upstream_cancelled_between_chunks_is_closed():
+    closed = asyncio.Event()
+
+    async def source():
+        try:
+            yield StreamChunk(content="c0")
+            yield StreamChunk(content="c1")
+            await asyncio.Event().wait()
+        finally:
+            closed.set()
+
+    flight = _StreamFlight()
+    # A subscriber holding the lock makes the producer wait between chunks,
+    # with the source suspended at a yield rather than inside an await
+    await flight._cond.acquire()
+    flight.task = asyncio.create_task(flight.produce(source()))
+    for _ in range(5):
+        await asyncio.sleep(0)
+    flight.task.cancel()
+    flight._cond.release()
+    await asyncio.gather(flight.task, return_exceptions=True)
+    assert flight.done
+    assert closed.is_set()
+
+
+@pytest.mark.asyncio
+async def test_stream_error_reaches_every_subscriber():
+    flights = SingleFlight()
+    upstream = Upstream(error=RuntimeError("stream broke"))
+
+    async def consume():
+        received = []
+        with pytest.raises(RuntimeError, match="stream broke"):
+            async for chunk in flights.stream("k", upstream.stream):
+                received.append(chunk.content)
+        return received
+
+    subscribers = asyncio.gather(consume(), consume())
+    await upstream.sent.wait()
+    upstream.release.set()
+    assert await subscribers == [["c0"], ["c0"]]
+    assert upstream.runs == 1
+    assert flights.snapshot()["in_flight_streams"] == 0
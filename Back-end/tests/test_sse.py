@@ -0,0 +1,81 @@
+"""
+SSE Decoder Tests
+
+Events must come out the same however the byte stream is cut into
+network chunks
+"""
+
+from app.core.llm.sse import SSEDecoder
+
+
+def feed_all(chunks):
+    decoder = SSEDecoder()
+    events = []
+    for chunk in chunks:
+        events.extend(decoder.feed(chunk))
+    events.extend(decoder.flush())
+    return events
+
+
+def split_every(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+STREAM = (
+    'data: {"content": "你好"}\r\n\r\n'
+    ': keep-alive\r\n\r\n'
+    'event: message\r\ndata: {"content": "世界"}\r\n\r\n'
+    'data: [DONE]\r\n\r\n'
+).encode("utf-8")
+
+EXPECTED = [
+    '{"content": "你好"}'.encode("utf-8"),
+    '{"content": "世界"}'.encode("utf-8"),
+    b"[DONE]",
+]
+
+
+def test_whole_stream():
+    assert feed_all([STREAM]) == EXPECTED
+
+
+def test_every_split_point():
+    # Covers cuts between \r and \n and inside multi-byte UTF-8 characters
+    for cut in range(1, len(STREAM)):
+        assert feed_all([STREAM[:cut], STREAM[cut:]]) == EXPECTED, cut
+
+
+def test_byte_by_byte():
+    assert feed_all(split_every(STREAM, 1)) == EXPECTED
+
+
+def test_split_inside_crlf():
+    decoder = SSEDecoder()
+    assert decoder.feed(b"data: a\r") == []
+    assert decoder.feed(b"\n\r") == []
+    assert decoder.feed(b"\n") == [b"a"]
+
+
+def test_split_inside_utf8_character():
+    payload = "data: 测试\n\n".encode("utf-8")
+    cut = payload.index("测".encode("utf-8")) + 1
+    decoder = SSEDecoder()
+    assert decoder.feed(payload[:cut]) == []
+    events = decoder.feed(payload[cut:])
+    assert events == ["测试".encode("utf-8")]
+    assert events[0].decode("utf-8") == "测试"
+
+
+def test_multiline_data_joined():
+    assert feed_all([b"data: line1\ndata: line2\n\n"]) == [b"line1\nline2"]
+
+
+def test_data_without_space():
+    assert feed_all([b"data:x\n\n"]) == [b"x"]
+
+
+def test_flush_dispatches_unterminated_event():
+    decoder = SSEDecoder()
+    assert decoder.feed(b"data: tail") == []
+    assert decoder.flush() == [b"tail"]
+    assert decoder.flush() == []